@@ -1,41 +1,341 @@
-__all__ = ["get_filesize_and_checksum", "get_size_and_checksum"]
+import hashlib as _hashlib
 
+__all__ = [
+    "get_filesize_and_checksum",
+    "get_size_and_checksum",
+    "get_checksum",
+    "get_chunk_checksum",
+    "get_checksum_algorithm",
+    "combine_checksums",
+    "register_checksum_algorithm",
+    "get_checksum_algorithms",
+    "set_default_checksum_algorithm",
+    "get_default_checksum_algorithm",
+]
 
-def get_size_and_checksum(data):
-    """Calculates the size and md5 of the passed data
+# The hash functions that can be used for checksums, indexed by name.
+# MD5 checksums are written as just the hex digest, so that they are
+# compatible with older checksums. All other checksums are written as
+# 'algorithm:hexdigest'. Appending '-tree' to an algorithm name gives
+# a tree checksum, which is the hash of the digests of each
+# _tree_chunk_size chunk of the data. The chunks can be hashed
+# independently, and the whole checksum can be calculated from the
+# chunk checksums using 'combine_checksums'
+_algorithms = {
+    "md5": _hashlib.md5,
+    "sha256": _hashlib.sha256,
+    "blake2b": lambda: _hashlib.blake2b(digest_size=32),
+}
+
+_tree_suffix = "-tree"
+_tree_chunk_size = 4 * 1048576
+
+# The number of chunks of a tree checksum that are hashed in parallel
+_tree_workers = 4
+
+# The size of the blocks read when hashing a file
+_read_size = 1048576
+
+_default_algorithm = {"algorithm": "md5"}
+
+
+def _get_hash_function(algorithm):
+    """Internal function returning the hash function and whether or
+    not this is a tree checksum for the passed algorithm
+    """
+    if algorithm is None:
+        algorithm = _default_algorithm["algorithm"]
+
+    algorithm = str(algorithm)
+
+    is_tree = algorithm.endswith(_tree_suffix)
+
+    if is_tree:
+        algorithm = algorithm[0 : -len(_tree_suffix)]
+
+    try:
+        return (algorithm, _algorithms[algorithm], is_tree)
+    except KeyError:
+        raise ValueError(
+            "Unknown checksum algorithm '%s'. Available algorithms are %s" % (algorithm, get_checksum_algorithms())
+        )
+
+
+def _to_checksum(algorithm, digest, is_tree=False):
+    """Internal function returning the checksum string for the
+    passed algorithm and (binary) digest
+    """
+    if is_tree:
+        return "%s%s:%s" % (algorithm, _tree_suffix, digest.hex())
+    elif algorithm == "md5":
+        return digest.hex()
+    else:
+        return "%s:%s" % (algorithm, digest.hex())
+
+
+def _from_checksum(checksum):
+    """Internal function returning the (binary) digest from the
+    passed checksum string
+    """
+    return bytes.fromhex(str(checksum).split(":")[-1])
+
+
+def register_checksum_algorithm(name, hash_function):
+    """Register a new checksum algorithm called 'name'. The
+    'hash_function' should be a function that returns a new
+    hashlib-style object (with 'update' and 'digest' functions)
+
+    Args:
+         name (str): Name of the algorithm
+         hash_function (function): Function returning a new hash object
+    Returns:
+         None
+    """
+    name = str(name)
+
+    if len(name) == 0 or ":" in name or name.endswith(_tree_suffix):
+        raise ValueError("Invalid checksum algorithm name '%s'" % name)
+
+    _algorithms[name] = hash_function
+
+
+def get_checksum_algorithms():
+    """Return the names of all of the checksum algorithms that
+    can be used
+
+    Returns:
+         list: Names of the algorithms (including the tree versions)
+    """
+    names = []
+
+    for name in _algorithms.keys():
+        names.append(name)
+        names.append("%s%s" % (name, _tree_suffix))
+
+    return names
+
+
+def set_default_checksum_algorithm(algorithm):
+    """Set the algorithm used to calculate all new checksums. This
+    defaults to "md5", which can be checked by all services.
+    Tree checksums (e.g. "blake2b-tree") are faster to calculate
+    for large files
+
+    Args:
+         algorithm (str): Name of the algorithm
+    Returns:
+         None
+    """
+    _get_hash_function(algorithm)
+    _default_algorithm["algorithm"] = str(algorithm)
+
+
+def get_default_checksum_algorithm():
+    """Return the algorithm used to calculate all new checksums
+
+    Returns:
+         str: Name of the algorithm
+    """
+    return _default_algorithm["algorithm"]
+
+
+def get_checksum_algorithm(checksum):
+    """Return the name of the algorithm used to calculate the
+    passed checksum, so that data can be checked against it
+
+    Args:
+         checksum (str): Checksum to query
+    Returns:
+         str: Name of the algorithm
+    """
+    if checksum is None:
+        return get_default_checksum_algorithm()
+
+    checksum = str(checksum)
+
+    if ":" in checksum:
+        return checksum.split(":")[0]
+    else:
+        return "md5"
+
+
+def _get_tree_digest(hash_function, chunks):
+    """Internal function that returns the tree digest of the passed
+    iterator over chunks. The chunks are hashed in parallel
+    (hashlib releases the GIL when hashing large buffers)
+    """
+    from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+    def _digest(chunk):
+        h = hash_function()
+        h.update(chunk)
+        return h.digest()
+
+    root = hash_function()
+    size = 0
+
+    with _ThreadPoolExecutor(max_workers=_tree_workers) as pool:
+        while True:
+            batch = []
+
+            for chunk in chunks:
+                batch.append(chunk)
+
+                if len(batch) == _tree_workers:
+                    break
+
+            if len(batch) == 0:
+                break
+
+            for (chunk, digest) in zip(batch, pool.map(_digest, batch)):
+                size += len(chunk)
+                root.update(digest)
+
+            if len(batch) < _tree_workers:
+                break
+
+    return (size, root.digest())
+
+
+def get_checksum(data, algorithm=None):
+    """Return the checksum of the passed data, calculated using
+    'algorithm' (or the default algorithm if this is not set)
+
+    Args:
+         data (bytes): data to calculate checksum for
+         algorithm (str, default=None): Algorithm to use
+    Returns:
+         str: Checksum of the data
+    """
+    return get_size_and_checksum(data, algorithm=algorithm)[1]
+
+
+def get_chunk_checksum(data, algorithm=None):
+    """Return the checksum of the passed chunk of a file, calculated
+    using 'algorithm' (or the default algorithm if this is not set).
+    Tree algorithms use their (non-tree) hash, so that the chunk
+    checksums can be combined using 'combine_checksums'
+
+    Args:
+         data (bytes): chunk to calculate checksum for
+         algorithm (str, default=None): Algorithm to use
+    Returns:
+         str: Checksum of the chunk
+    """
+    (algorithm, _, _) = _get_hash_function(algorithm)
+
+    return get_size_and_checksum(data, algorithm=algorithm)[1]
+
+
+def get_size_and_checksum(data, algorithm=None):
+    """Calculates the size and checksum of the passed data
 
     Args:
          data (byte): data to calculate checksum for
+         algorithm (str, default=None): Algorithm to use
      Returns:
-         tuple (int,str): size of data and its md5 hash
+         tuple (int,str): size of data and its checksum
     """
-    from hashlib import md5 as _md5
+    (algorithm, hash_function, is_tree) = _get_hash_function(algorithm)
 
-    md5 = _md5()
-    md5.update(data)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
 
-    return (len(data), str(md5.hexdigest()))
+    if is_tree:
+        view = memoryview(data)
+        chunks = (view[i : i + _tree_chunk_size] for i in range(0, max(len(data), 1), _tree_chunk_size))
+        (_, digest) = _get_tree_digest(hash_function, chunks)
+    else:
+        h = hash_function()
+        h.update(data)
+        digest = h.digest()
 
+    return (len(data), _to_checksum(algorithm, digest, is_tree))
 
-def get_filesize_and_checksum(filename):
+
+def get_filesize_and_checksum(filename, algorithm=None):
     """Opens the file with the passed filename and calculates
-     its size and md5 hash
+     its size and checksum
 
     Args:
          filename (str): filename to calculate size and checksum for
+         algorithm (str, default=None): Algorithm to use
      Returns:
-         tuple (int,str): size of data and its md5 hash
+         tuple (int,str): size of data and its checksum
 
     """
+    (algorithm, hash_function, is_tree) = _get_hash_function(algorithm)
 
-    from hashlib import md5 as _md5
+    with open(filename, "rb") as f:
+        if is_tree:
 
-    md5 = _md5()
-    size = 0
+            def _chunks():
+                chunk = f.read(_tree_chunk_size)
+                yield chunk
 
-    with open(filename, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            md5.update(chunk)
-            size += len(chunk)
+                while len(chunk) == _tree_chunk_size:
+                    chunk = f.read(_tree_chunk_size)
+
+                    if len(chunk) == 0:
+                        break
+
+                    yield chunk
+
+            (size, digest) = _get_tree_digest(hash_function, _chunks())
+        else:
+            h = hash_function()
+            size = 0
+
+            for chunk in iter(lambda: f.read(_read_size), b""):
+                h.update(chunk)
+                size += len(chunk)
+
+            digest = h.digest()
+
+    return (size, _to_checksum(algorithm, digest, is_tree))
+
+
+def combine_checksums(checksums):
+    """Return the checksum of a whole file from the checksums of each
+    of its chunks, so that the whole file does not need to be read.
+    If the chunks are checksummed with a non-MD5 algorithm then this
+    is the tree checksum using that algorithm. MD5 checksums are
+    combined by taking the MD5 of the concatenated checksums, as has
+    always been done
+
+    Note that the tree checksum only equals the checksum of the whole
+    file (from 'get_filesize_and_checksum' using the '-tree'
+    algorithm) if every chunk except the last is exactly
+    _tree_chunk_size (4 MB) long. Chunks of any other size give a
+    checksum that only identifies the file as a list of those chunks,
+    so it can't be compared with a checksum of the whole file
+
+    Args:
+         checksums (list): Checksums of the chunks, in order
+    Returns:
+         str: Combined checksum
+    """
+    algorithms = set([get_checksum_algorithm(checksum) for checksum in checksums])
+
+    if len(algorithms) == 0:
+        algorithms = set([get_default_checksum_algorithm()])
+    elif len(algorithms) > 1:
+        raise ValueError("Cannot combine checksums calculated using different algorithms: %s" % algorithms)
+
+    (algorithm, hash_function, is_tree) = _get_hash_function(algorithms.pop())
+
+    if is_tree:
+        raise ValueError("Cannot combine tree checksums")
+
+    h = hash_function()
+
+    if algorithm == "md5":
+        for checksum in checksums:
+            h.update(str(checksum).encode("utf-8"))
+
+        return h.hexdigest()
+
+    for checksum in checksums:
+        h.update(_from_checksum(checksum))
 
-    return (size, str(md5.hexdigest()))
+    return _to_checksum(algorithm, h.digest(), is_tree=True)
@@ -1,5 +1,94 @@
 __all__ = ["WorkSheet"]
 
+# Maximum number of steps of a WorkSheet that are run at the same time
+_max_concurrent_steps = 4
+
+
+class _Step:
+    """Internal class holding a single step of work. The step calls
+    'function(context)' once all of the steps named in 'after' have
+    completed. If 'persist' is True then the completion of this
+    step is saved, so it is not run again on resume
+    """
+
+    def __init__(self, name, after, function, persist=False):
+        self.name = name
+        self.after = after
+        self.function = function
+        self.persist = persist
+
+
+def _run_step_graph(steps, context, completed, on_complete):
+    """Internal function that runs the passed steps concurrently, with
+    each step started as soon as the steps it depends on have
+    completed. Persisted steps named in 'completed' are skipped, as
+    are the unpersisted steps that no remaining step depends on.
+    'on_complete(step)' is called after each persisted step
+    completes. If any step fails then no new steps are started,
+    and the exception is raised once the running steps have finished
+    """
+    from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+    from concurrent.futures import wait as _wait
+    from concurrent.futures import FIRST_COMPLETED as _FIRST_COMPLETED
+
+    steps = {step.name: step for step in steps}
+    done = set(name for name in completed if name in steps and steps[name].persist)
+
+    # find the steps that still need to run
+    needed = set()
+    remaining = [name for name in steps.keys() if steps[name].persist and name not in done]
+
+    while len(remaining) > 0:
+        name = remaining.pop()
+
+        if name in needed or name in done:
+            continue
+
+        needed.add(name)
+        remaining += steps[name].after
+
+    from Acquire.Service._get_service_account_bucket import _is_using_testing_objstore_stack
+
+    if _is_using_testing_objstore_stack():
+        max_workers = 1
+    else:
+        max_workers = _max_concurrent_steps
+
+    running = {}
+    error = None
+
+    with _ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            if error is None:
+                for name in list(needed):
+                    if all(dep in done for dep in steps[name].after):
+                        needed.remove(name)
+                        running[pool.submit(steps[name].function, context)] = steps[name]
+
+            if len(running) == 0:
+                break
+
+            (finished, _) = _wait(list(running.keys()), return_when=_FIRST_COMPLETED)
+
+            for future in finished:
+                step = running.pop(future)
+
+                try:
+                    future.result()
+                except Exception as e:
+                    if error is None:
+                        error = e
+
+                    continue
+
+                done.add(step.name)
+
+                if step.persist:
+                    on_complete(step)
+
+    if error is not None:
+        raise error
+
 
 class WorkSheet:
     """This class holds a complete record of the work that the access
@@ -34,6 +123,8 @@ class WorkSheet:
             self._status = None
 
         self._credit_notes = None
+        self._accounting_service_url = None
+        self._completed_steps = []
 
     def is_null(self):
         """Return whether or not this WorkSheet is null"""
@@ -115,7 +206,11 @@ class WorkSheet:
 
     def execute(self, cheque):
         """Execute (start) this work, using the passed cheque for
-        payment. Note that you can't perform the same work twice
+        payment. Note that you can't perform the same work twice.
+        The steps of the work that do not depend on each other
+        (e.g. writing the compute and storage cheques) are run
+        concurrently. The state of each completed step is saved,
+        so an interrupted execution can be continued using 'resume'
         """
         if self.is_null():
             from Acquire.Accounting import PaymentError
@@ -130,28 +225,115 @@ class WorkSheet:
         if self._credit_notes is not None:
             raise PermissionError("You cannot start a piece of work twice!")
 
+        self._accounting_service_url = cheque.accounting_service_url()
+
+        self._run_steps(cheque=cheque)
+
+    def resume(self):
+        """Resume the execution of this work from the last completed
+        step. This is used to finish work whose execution was
+        interrupted after it had been paid for
+        """
+        if self.is_null():
+            return
+
+        if self._status == "submitted":
+            return
+
+        if self._credit_notes is None:
+            raise PermissionError(
+                "You cannot resume work that has not been paid for. " "Execute the work using a valid cheque"
+            )
+
+        self._run_steps(cheque=None)
+
+    def _run_steps(self, cheque):
+        """Internal function that runs the steps of the work that have
+        not yet been completed. 'cheque' is only needed if the work
+        has not yet been paid for
+        """
+        import threading as _threading
+
+        from Acquire.ObjectStore import get_datetime_future as _get_datetime_future
+
+        # work out when this job MUST have finished. If the job
+        # has not completed before this time then it will be killed
+        endtime = _get_datetime_future(days=2)  # this should be calculated
+
+        context = {"cheque": cheque, "endtime": endtime}
+        save_lock = _threading.Lock()
+
+        steps = [
+            _Step("compute_service", [], self._step_compute_service),
+            _Step("storage_service", [], self._step_storage_service),
+            _Step("access_account", [], self._step_access_account),
+            _Step("cash", ["access_account"], self._step_cash, persist=True),
+            _Step("compute_cheque", ["cash", "compute_service"], self._step_compute_cheque, persist=True),
+            _Step("storage_cheque", ["cash", "storage_service"], self._step_storage_cheque, persist=True),
+            _Step("drive", ["storage_cheque", "access_account"], self._step_drive, persist=True),
+            _Step(
+                "submit",
+                ["drive", "compute_cheque", "compute_service", "access_account"],
+                self._step_submit,
+                persist=True,
+            ),
+        ]
+
+        def _save():
+            with save_lock:
+                self.save()
+
+        def _completed(step):
+            # save the WorkSheet to the object store after every step,
+            # so that we don't lose the state (e.g. the credit notes)
+            with save_lock:
+                self._completed_steps.append(step.name)
+                self.save()
+
+        context["save"] = _save
+
+        # the service user is not logged out, as the logged in user is
+        # cached and shared by all work run by this service (e.g. when
+        # this work is resumed)
+        _run_step_graph(steps, context, completed=self._completed_steps, on_complete=_completed)
+
+    def _step_compute_service(self, context):
+        """Step that finds the compute service"""
+        context["compute_service"] = self.compute_service()
+
+    def _step_storage_service(self, context):
+        """Step that finds the storage service"""
+        context["storage_service"] = self.storage_service()
+
+    def _step_access_account(self, context):
+        """Step that logs in the access service user and finds its
+        account on the accounting service
+        """
         from Acquire.Service import get_this_service as _get_this_service
+        from Acquire.Service import get_trusted_service as _get_trusted_service
+        from Acquire.Client import Account as _Account
 
         access_service = _get_this_service(need_private_access=True)
-        compute_service = self.compute_service()
-        storage_service = self.storage_service()
-        accounting_service = cheque.accounting_service()
+        accounting_service = _get_trusted_service(self._accounting_service_url)
 
         access_user = access_service.login_service_user()
+        context["access_user"] = access_user
 
         account_uid = access_service.service_user_account_uid(accounting_service=accounting_service)
 
-        from Acquire.Client import Account as _Account
-
-        access_account = _Account(
+        context["access_account"] = _Account(
             user=access_user, account_uid=account_uid, accounting_service=accounting_service
         )
 
+    def _step_cash(self, context):
+        """Step that cashes the cheque used to pay for the work"""
+        access_account = context["access_account"]
+
         # TODO - validate that the cost of the work on the compute
         #        and storage services is covered by the passed cheque
 
         try:
-            credit_notes = cheque.cash(spend=self.total_cost(), resource=self.request().fingerprint())
+            credit_notes = context["cheque"].cash(spend=self.total_cost(), resource=self.request().fingerprint())
         except Exception as e:
             from Acquire.Service import exception_to_string
             from Acquire.Accounting import PaymentError
@@ -169,49 +351,48 @@ class WorkSheet:
         # make sure that we have been paid!
         for credit_note in credit_notes:
             if credit_note.credit_account_uid() != access_account.uid():
+                from Acquire.Accounting import PaymentError
+
                 raise PaymentError("The wrong account has been paid!?!")
 
         self._status = "awaiting (paid)"
         self._credit_notes = credit_notes
 
-        # work out when this job MUST have finished. If the job
-        # has not completed before this time then it will be killed
-        from Acquire.ObjectStore import get_datetime_future as _get_datetime_future
-
-        endtime = _get_datetime_future(days=2)  # this should be calculated
-
-        # save the WorkSheet to the object store so we don't lose the
-        # value in the credit notes
-        self.save()
+    def _write_cheque(self, context, service):
+        """Internal function that writes a cheque from the access
+        service account to pay 'service' for this work
+        """
+        from Acquire.Client import Cheque as _Cheque
 
-        compute_cheque = _Cheque.write(
-            account=access_account,
+        return _Cheque.write(
+            account=context["access_account"],
             resource="work %s" % self.uid(),
             max_spend=10.0,
-            recipient_url=compute_service.canonical_url(),
-            expiry_date=endtime,
+            recipient_url=service.canonical_url(),
+            expiry_date=context["endtime"],
         )
 
-        storage_cheque = _Cheque.write(
-            account=access_account,
-            resource="work %s" % self.uid(),
-            max_spend=10.0,
-            recipient_url=storage_service.canonical_url(),
-            expiry_date=endtime,
-        )
+    def _step_compute_cheque(self, context):
+        """Step that writes the cheque to pay the compute service"""
+        self._compute_cheque = self._write_cheque(context, context["compute_service"])
 
-        self._compute_cheque = compute_cheque
-        self._storage_cheque = storage_cheque
+    def _step_storage_cheque(self, context):
+        """Step that writes the cheque to pay the storage service"""
+        self._storage_cheque = self._write_cheque(context, context["storage_service"])
 
-        # now create a Drive on the storage service that will hold
-        # the output for this job
+    def _step_drive(self, context):
+        """Step that creates the Drive on the storage service that
+        will hold the output for this job
+        """
         from Acquire.Client import Drive as _Drive
         from Acquire.Client import StorageCreds as _StorageCreds
         from Acquire.Client import ACLRule as _ACLRule
         from Acquire.Client import ACLRules as _ACLRules
         from Acquire.Client import ACLUserRules as _ACLUserRules
 
-        creds = _StorageCreds(user=access_user, storage_service=storage_service)
+        access_user = context["access_user"]
+
+        creds = _StorageCreds(user=access_user, storage_service=context["storage_service"])
 
         rule = _ACLUserRules.owner(user_guid=access_user.guid()).add(
             user_guid=self.user_guid(), rule=_ACLRule.reader()
@@ -223,19 +404,28 @@ class WorkSheet:
             name="output_%s" % self.uid(),
             creds=creds,
             aclrules=aclrules,
-            cheque=storage_cheque,
+            cheque=self._storage_cheque,
             max_size="10MB",
             autocreate=True,
         )
 
         self._output_loc = output_drive.metadata().location()
         self._status = "awaiting (paid, have drive)"
-        self.save()
 
+    def _step_submit(self, context):
+        """Step that submits the job to the compute service, passing
+        a PAR that lets the job write its output to the drive
+        """
         from Acquire.Client import PAR as _PAR
+        from Acquire.Client import ACLRule as _ACLRule
+
+        compute_service = context["compute_service"]
 
         par = _PAR(
-            location=self._output_loc, user=access_user, aclrule=_ACLRule.writer(), expires_datetime=endtime
+            location=self._output_loc,
+            user=context["access_user"],
+            aclrule=_ACLRule.writer(),
+            expires_datetime=context["endtime"],
         )
 
         secret = compute_service.encrypt_data(par.secret())
@@ -245,22 +435,23 @@ class WorkSheet:
             "request": self.request().to_data(),
             "par": par.to_data(),
             "secret": secret,
-            "cheque": compute_cheque.to_data(),
+            "cheque": self._compute_cheque.to_data(),
+            "authorisation": self.authorisation().to_data(),
         }
 
         self._status = "submitting"
-        self.save()
+        context["save"]()
 
+        # the compute service only runs the first submission of this
+        # worksheet, so this is safe to retry on resume
         response = compute_service.call_function(function="submit_job", args=args)
 
-        print(response)
+        if isinstance(response, dict) and "Error" in response:
+            from Acquire.Service import ServiceError as _ServiceError
 
-        self._status = "submitted"
-        self.save()
+            raise _ServiceError("Unable to submit the job: %s" % response["Error"])
 
-        # the service user will log out automatically on destruction, but
-        # let us make sure!
-        access_user.logout()
+        self._status = "submitted"
 
         # TODO - should collect something from the response that
         #        can be saved in the job sheet so that we know
@@ -344,6 +535,12 @@ class WorkSheet:
 
         data["status"] = self._status
 
+        if self._accounting_service_url is not None:
+            data["accounting_service_url"] = self._accounting_service_url
+
+        if len(self._completed_steps) > 0:
+            data["completed_steps"] = list(self._completed_steps)
+
         try:
             data["output_location"] = self._output_loc.to_string()
         except:
@@ -391,6 +588,12 @@ class WorkSheet:
 
         j._status = data["status"]
 
+        if "accounting_service_url" in data:
+            j._accounting_service_url = data["accounting_service_url"]
+
+        if "completed_steps" in data:
+            j._completed_steps = list(data["completed_steps"])
+
         if "output_location" in data:
             j._output_loc = _Location.from_string(data["output_location"])
 
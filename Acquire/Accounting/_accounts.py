@@ -191,12 +191,9 @@ class Accounts:
 
             bucket = _get_service_account_bucket()
 
-        try:
-            from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
 
-            account_uid = _ObjectStore.get_string_object(bucket, self._account_key(name))
-        except:
-            account_uid = None
+        account_uid = _ObjectStore.get_string_object_or_none(bucket, self._account_key(name))
 
         if account_uid is None:
             # ensure that the user always has a "main" account
@@ -40,18 +40,27 @@ class Ledger:
 
         from Acquire.Accounting import TransactionRecord as _TransactionRecord
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        import json as _json
 
-        data = _ObjectStore.get_object_from_json(bucket, Ledger.get_key(uid))
+        key = Ledger.get_key(uid)
+        raw = _ObjectStore.get_object(bucket, key)
+        data = _json.loads(raw.decode("utf-8"))
 
         if data is None:
             from Acquire.Accounting import LedgerError
 
             raise LedgerError(
                 "There is no transaction recorded in the "
-                "ledger with UID=%s (at key %s)" % (uid, Ledger.get_key(uid))
+                "ledger with UID=%s (at key %s)" % (uid, key)
             )
 
-        return _TransactionRecord.from_data(data)
+        record = _TransactionRecord.from_data(data)
+
+        if record.is_receipted() or record.is_refunded():
+            # the record is settled and will never change again
+            _ObjectStore.cache_immutable_object(bucket, key, raw)
+
+        return record
 
     @staticmethod
     def save_transaction(record, bucket=None):
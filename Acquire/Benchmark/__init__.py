@@ -0,0 +1,32 @@
+"""
+Acquire: (C) Christopher Woods 2019
+
+This module provides a benchmark suite that runs scenarios against
+in-process (mocked) versions of all of the Acquire services, so that
+performance regressions can be caught before they are deployed
+
+"""
+
+from ._mocked_services import *
+from ._benchmark import *
+from ._scenarios import *
+from ._micro import *
+
+try:
+    if __IPYTHON__:
+
+        def _set_printer(C):
+            """Function to tell ipython to use __str__ if available"""
+            get_ipython().display_formatter.formatters["text/plain"].for_type(
+                C, lambda obj, p, cycle: p.text(str(obj) if not cycle else "...")
+            )
+
+        import sys as _sys
+        import inspect as _inspect
+
+        _clsmembers = _inspect.getmembers(_sys.modules[__name__], _inspect.isclass)
+
+        for _clsmember in _clsmembers:
+            _set_printer(_clsmember[1])
+except:
+    pass
@@ -0,0 +1,326 @@
+import json as _json
+import os as _os
+import time as _time
+
+__all__ = [
+    "run_benchmark",
+    "get_percentile",
+    "load_baseline",
+    "save_baseline",
+    "append_history",
+    "load_history",
+    "compare_to_baseline",
+    "format_results",
+]
+
+# The metrics compared against the baseline, and whether or not they
+# are timings (which are noisy, so are compared with a tolerance)
+_compared_metrics = [
+    ("p50_ms", True),
+    ("p95_ms", True),
+    ("objstore_ops", False),
+    ("alloc_peak_kb", False),
+]
+
+
+def get_percentile(values, q):
+    """Return the q'th percentile of 'values', interpolating
+    linearly between the closest ranks
+    """
+    if len(values) == 0:
+        return 0.0
+
+    values = sorted(values)
+
+    rank = (len(values) - 1) * q / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def _count_objstore_ops():
+    """Return the number of object store calls made by this process"""
+    from Acquire.ObjectStore import get_container_objstore_metrics as _get_container_objstore_metrics
+
+    return _get_container_objstore_metrics().count()
+
+
+def run_benchmark(name, function, repeats=10, warmup=1, measure_allocations=True):
+    """Benchmark 'function' by calling it 'warmup' times and then
+    'repeats' times. This returns a dictionary of the latency
+    percentiles (in milliseconds), the mean number of object store
+    calls per call and, if 'measure_allocations' is True, the peak
+    and total memory allocated (in KB) by one further call, which
+    is traced separately so that tracing does not slow the timed
+    calls.
+
+    Args:
+         name (str): Name of the benchmark
+         function (callable): Function to call (with no arguments)
+         repeats (int, default=10): Number of timed calls
+         warmup (int, default=1): Number of untimed calls first
+         measure_allocations (bool, default=True): Whether to trace memory
+    Returns:
+         dict: The results
+    """
+    from Acquire.ObjectStore import enable_objstore_metrics as _enable_objstore_metrics
+    from Acquire.ObjectStore import disable_objstore_metrics as _disable_objstore_metrics
+    from Acquire.ObjectStore import is_collecting_objstore_metrics as _is_collecting_objstore_metrics
+
+    collecting = _is_collecting_objstore_metrics()
+    _enable_objstore_metrics()
+
+    try:
+        for _ in range(0, warmup):
+            function()
+
+        timings = []
+        nops = _count_objstore_ops()
+
+        for _ in range(0, repeats):
+            start = _time.perf_counter()
+            function()
+            timings.append(1000.0 * (_time.perf_counter() - start))
+
+        nops = _count_objstore_ops() - nops
+    finally:
+        if not collecting:
+            _disable_objstore_metrics()
+
+    result = {
+        "name": name,
+        "repeats": repeats,
+        "mean_ms": sum(timings) / len(timings) if len(timings) > 0 else 0.0,
+        "min_ms": min(timings) if len(timings) > 0 else 0.0,
+        "p50_ms": get_percentile(timings, 50),
+        "p95_ms": get_percentile(timings, 95),
+        "p99_ms": get_percentile(timings, 99),
+        "max_ms": max(timings) if len(timings) > 0 else 0.0,
+        "objstore_ops": nops / repeats if repeats > 0 else 0,
+    }
+
+    if measure_allocations:
+        import tracemalloc as _tracemalloc
+
+        was_tracing = _tracemalloc.is_tracing()
+
+        if not was_tracing:
+            _tracemalloc.start()
+
+        if hasattr(_tracemalloc, "reset_peak"):
+            _tracemalloc.reset_peak()
+
+        (start_size, _peak) = _tracemalloc.get_traced_memory()
+
+        try:
+            function()
+            (end_size, peak) = _tracemalloc.get_traced_memory()
+        finally:
+            if not was_tracing:
+                _tracemalloc.stop()
+
+        result["alloc_peak_kb"] = max(peak - start_size, 0) / 1024.0
+        result["alloc_retained_kb"] = (end_size - start_size) / 1024.0
+
+    return result
+
+
+def load_baseline(filename):
+    """Load and return the baseline results stored in 'filename',
+    as a dictionary of results keyed by benchmark name. This
+    returns an empty dictionary if the file does not exist
+    """
+    try:
+        with open(filename, "r") as FILE:
+            return _json.load(FILE)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(filename, results):
+    """Save the passed results (list or dictionary keyed by name) as
+    the baseline in 'filename'. Existing baselines for other
+    benchmarks are kept
+    """
+    if isinstance(results, list):
+        results = {result["name"]: result for result in results}
+
+    baseline = load_baseline(filename)
+    baseline.update(results)
+
+    with open(filename, "w") as FILE:
+        _json.dump(baseline, FILE, indent=2, sort_keys=True)
+
+
+def _get_environment():
+    """Return a description of the environment in which the benchmarks
+    were run, so that results from different machines (or versions of
+    python) are not compared against each other by mistake
+    """
+    import platform as _platform
+
+    try:
+        import subprocess as _subprocess
+
+        commit = _subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=_subprocess.DEVNULL, cwd=_os.path.dirname(__file__)
+        )
+        commit = commit.decode("utf-8").strip()
+    except Exception:
+        commit = None
+
+    return {
+        "python": _platform.python_version(),
+        "machine": _platform.machine(),
+        "node": _platform.node(),
+        "commit": commit,
+    }
+
+
+def append_history(filename, results, label=None):
+    """Append the passed results to the history in 'filename'. The
+    history is a JSON-lines file with one record per result, holding
+    the result together with the time, the git commit and the python
+    version and machine used, so that the history can be plotted or
+    used to gate changes on the measured throughput
+
+    Args:
+         filename (str): File to append to
+         results (list): Results from run_benchmark
+         label (str, optional): Label for this run (e.g. a branch name)
+    Returns:
+         None
+    """
+    from Acquire.ObjectStore import get_datetime_now_to_string as _get_datetime_now_to_string
+
+    record = _get_environment()
+    record["datetime"] = _get_datetime_now_to_string()
+
+    if label is not None:
+        record["label"] = str(label)
+
+    with open(filename, "a") as FILE:
+        for result in results:
+            line = dict(record)
+            line.update(result)
+            FILE.write(_json.dumps(line, sort_keys=True) + "\n")
+
+
+def load_history(filename, name=None):
+    """Return the list of records in the history in 'filename', in the
+    order they were added, optionally only those for the benchmark
+    called 'name'. This returns an empty list if there is no history
+    """
+    records = []
+
+    try:
+        with open(filename, "r") as FILE:
+            for line in FILE:
+                line = line.strip()
+
+                if len(line) == 0:
+                    continue
+
+                record = _json.loads(line)
+
+                if name is None or record.get("name") == name:
+                    records.append(record)
+    except FileNotFoundError:
+        pass
+
+    return records
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25):
+    """Compare the passed results against the baseline, returning
+    the list of regressions. A timing regresses if it is more than
+    'tolerance' (fractionally) slower than the baseline, while the
+    number of object store calls and the peak allocation regress
+    if they increase at all (allowing 1 KB of noise in allocations)
+
+    Args:
+         results (list): Results from run_benchmark
+         baseline (dict): Baseline results keyed by name
+         tolerance (float, default=0.25): Allowed fractional slowdown
+    Returns:
+         list: Dictionaries describing each regression
+    """
+    regressions = []
+
+    for result in results:
+        try:
+            base = baseline[result["name"]]
+        except KeyError:
+            continue
+
+        for (metric, is_timing) in _compared_metrics:
+            if metric not in result or metric not in base:
+                continue
+
+            value = result[metric]
+            base_value = base[metric]
+
+            if is_timing:
+                limit = base_value * (1.0 + tolerance)
+            elif metric == "alloc_peak_kb":
+                limit = base_value + 1.0
+            else:
+                limit = base_value
+
+            if value > limit:
+                regressions.append(
+                    {"name": result["name"], "metric": metric, "value": value, "baseline": base_value}
+                )
+
+    return regressions
+
+
+def format_results(results, baseline=None, regressions=None):
+    """Return a human-readable table of the passed results, with the
+    change relative to the baseline (if passed), and flagging any
+    regressions
+    """
+    lines = [
+        "%-32s %10s %10s %10s %10s %12s %10s"
+        % ("benchmark", "p50 (ms)", "p95 (ms)", "p99 (ms)", "os ops", "peak (KB)", "MB/s")
+    ]
+
+    regressed = set()
+
+    for regression in regressions or []:
+        regressed.add(regression["name"])
+
+    for result in results:
+        line = "%-32s %10.2f %10.2f %10.2f %10.1f %12.1f" % (
+            result["name"],
+            result["p50_ms"],
+            result["p95_ms"],
+            result["p99_ms"],
+            result["objstore_ops"],
+            result.get("alloc_peak_kb", 0.0),
+        )
+
+        if "throughput_mb_s" in result:
+            line += " %10.1f" % result["throughput_mb_s"]
+        else:
+            line += " %10s" % "-"
+
+        if baseline is not None and result["name"] in baseline:
+            base = baseline[result["name"]]
+
+            if base.get("p50_ms", 0) > 0:
+                line += "  %+6.1f%%" % (100.0 * (result["p50_ms"] - base["p50_ms"]) / base["p50_ms"])
+
+        if result["name"] in regressed:
+            line += "  REGRESSION"
+
+        lines.append(line)
+
+    for regression in regressions or []:
+        lines.append(
+            "REGRESSION: %s %s = %.2f (baseline %.2f)"
+            % (regression["name"], regression["metric"], regression["value"], regression["baseline"])
+        )
+
+    return "\n".join(lines)
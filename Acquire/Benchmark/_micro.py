@@ -0,0 +1,272 @@
+import os as _os
+
+__all__ = ["register_micro_benchmark", "get_micro_benchmark_names", "run_micro_benchmarks"]
+
+# The payload sizes (in bytes) used for the benchmarks that depend
+# on the size of the data, from typical arguments up to file data
+_default_sizes = [1024, 64 * 1024, 1024 * 1024]
+
+# The registered micro-benchmarks. Each is a tuple of the setup
+# function and whether or not it is run for each payload size. The
+# setup function is passed the size (or None) and returns the
+# function (with no arguments) that will be timed
+_micro_benchmarks = {}
+
+
+def register_micro_benchmark(name, setup, sized=True):
+    """Register the micro-benchmark called 'name'. 'setup' is called
+    with the payload size in bytes (or None if not 'sized') and must
+    return the function to benchmark
+
+    Args:
+         name (str): Name of the micro-benchmark
+         setup (callable): Function that sets up the micro-benchmark
+         sized (bool, default=True): Whether to run for each payload size
+    Returns:
+         None
+    """
+    _micro_benchmarks[name] = (setup, sized)
+
+
+def get_micro_benchmark_names():
+    """Return the names of all of the registered micro-benchmarks"""
+    return list(_micro_benchmarks.keys())
+
+
+def _format_size(size):
+    """Return a short human-readable version of 'size' bytes"""
+    if size >= 1024 * 1024 and size % (1024 * 1024) == 0:
+        return "%dMB" % (size // (1024 * 1024))
+    elif size >= 1024 and size % 1024 == 0:
+        return "%dKB" % (size // 1024)
+    else:
+        return "%dB" % size
+
+
+def _get_args(size):
+    """Return the arguments of a typical call that sends 'size' bytes
+    of (string-encoded) file data
+    """
+    from Acquire.ObjectStore import bytes_to_string
+
+    return {
+        "filename": "example/input.dat",
+        "filesize": size,
+        "filedata": bytes_to_string(_os.urandom(size)),
+        "authorisation": {"user_uid": "benchmark", "signature": bytes_to_string(_os.urandom(256))},
+    }
+
+
+def _get_keys():
+    """Return the private key (and its public key) used to encrypt
+    and sign the benchmark data
+    """
+    from Acquire.Crypto import get_private_key
+
+    privkey = get_private_key("testing")
+    return (privkey, privkey.public_key())
+
+
+def _setup_pack_unpack(size):
+    """Pack, encrypt and sign arguments, and then unpack them, as
+    is done for every call to a service
+    """
+    from Acquire.Service import pack_arguments, unpack_arguments
+
+    (privkey, pubkey) = _get_keys()
+    args = _get_args(size)
+
+    def _pack_unpack():
+        packed = pack_arguments(function="benchmark", args=args, key=pubkey, response_key=pubkey, public_cert=pubkey)
+        unpack_arguments(function="benchmark", args=packed, key=privkey)
+
+    return _pack_unpack
+
+
+def _setup_pack_return_value(size):
+    """Pack, encrypt and sign a return value, and then unpack it, as
+    is done for every response from a service
+    """
+    from Acquire.Service import create_return_value, pack_return_value, unpack_return_value
+    from Acquire.Service import pack_arguments, unpack_arguments
+
+    (privkey, pubkey) = _get_keys()
+    result = create_return_value(_get_args(size))
+
+    # get the response keys in the same way as a service
+    packed = pack_arguments(function="benchmark", args={}, key=pubkey, response_key=pubkey, public_cert=pubkey)
+    (_function, _args, keys) = unpack_arguments(function="benchmark", args=packed, key=privkey)
+
+    def _pack_return_value():
+        packed = pack_return_value(function="benchmark", payload=result, key=keys, private_cert=privkey)
+        unpack_return_value(return_value=packed, key=privkey, public_cert=pubkey)
+
+    return _pack_return_value
+
+
+def _setup_encrypt(size):
+    """Encrypt 'size' bytes using a public key"""
+    (_privkey, pubkey) = _get_keys()
+    data = _os.urandom(size)
+
+    return lambda: pubkey.encrypt(data)
+
+
+def _setup_decrypt(size):
+    """Decrypt 'size' bytes using a private key"""
+    (privkey, pubkey) = _get_keys()
+    data = pubkey.encrypt(_os.urandom(size))
+
+    return lambda: privkey.decrypt(data)
+
+
+def _setup_fingerprint(size):
+    """Calculate the fingerprint of a public key"""
+    (_privkey, pubkey) = _get_keys()
+
+    return lambda: pubkey.fingerprint()
+
+
+def _setup_checksum(algorithm):
+    """Return the setup function to checksum 'size' bytes using 'algorithm'"""
+
+    def _setup(size):
+        from Acquire.Access import get_checksum as _get_checksum
+
+        data = _os.urandom(size)
+
+        return lambda: _get_checksum(data, algorithm=algorithm)
+
+    return _setup
+
+
+def _setup_bytes_to_string(size):
+    """Convert 'size' bytes to a string and back"""
+    from Acquire.ObjectStore import bytes_to_string, string_to_bytes
+
+    data = _os.urandom(size)
+
+    return lambda: string_to_bytes(bytes_to_string(data))
+
+
+def _setup_datetime(size, count=1000):
+    """Convert 'count' datetimes to strings and back"""
+    from Acquire.ObjectStore import datetime_to_string, string_to_datetime, get_datetime_now
+
+    now = get_datetime_now()
+
+    def _datetime():
+        for _ in range(0, count):
+            string_to_datetime(datetime_to_string(now))
+
+    return _datetime
+
+
+def _setup_transaction_info(size, count=1000):
+    """Decode 'count' ledger keys using TransactionInfo.from_key, as is
+    done for every transaction when calculating an account balance
+    """
+    from Acquire.Accounting import TransactionInfo, TransactionCode
+    from Acquire.ObjectStore import datetime_to_string, get_datetime_now, create_uuid
+
+    key = "accounting/transactions/%s/%s/%s" % (
+        datetime_to_string(get_datetime_now()),
+        create_uuid(),
+        TransactionInfo.encode(code=TransactionCode.SENT_RECEIPT, value=100.005, receipted_value=90.0),
+    )
+
+    def _from_key():
+        for _ in range(0, count):
+            TransactionInfo.from_key(key)
+
+    return _from_key
+
+
+def _setup_aclrules(size, count=1000):
+    """Resolve the ACL of a file 'count' times, from the owner and
+    reader rules of the file and the ACL of its drive, as is done
+    for every file that is listed or opened
+    """
+    from Acquire.Identity import ACLRules, ACLRule
+
+    rules = ACLRules.owner(user_guid="12345@z0-z0").append(ACLRules.reader(user_guid="67890@z0-z0"))
+    upstream = ACLRule.reader()
+    identifiers = {"user_guid": "12345@z0-z0"}
+
+    def _resolve():
+        for _ in range(0, count):
+            rules.resolve(identifiers=identifiers, upstream=upstream)
+
+    return _resolve
+
+
+register_micro_benchmark("pack_unpack_arguments", _setup_pack_unpack)
+register_micro_benchmark("pack_unpack_return_value", _setup_pack_return_value)
+register_micro_benchmark("encrypt", _setup_encrypt)
+register_micro_benchmark("decrypt", _setup_decrypt)
+register_micro_benchmark("fingerprint", _setup_fingerprint, sized=False)
+register_micro_benchmark("checksum_md5", _setup_checksum("md5"))
+register_micro_benchmark("checksum_blake2b", _setup_checksum("blake2b"))
+register_micro_benchmark("checksum_blake2b_tree", _setup_checksum("blake2b-tree"))
+register_micro_benchmark("bytes_to_string", _setup_bytes_to_string)
+register_micro_benchmark("datetime_x1000", _setup_datetime, sized=False)
+register_micro_benchmark("transaction_info_x1000", _setup_transaction_info, sized=False)
+register_micro_benchmark("aclrules_resolve_x1000", _setup_aclrules, sized=False)
+
+
+def run_micro_benchmarks(names=None, sizes=None, repeats=20, warmup=2, measure_allocations=True):
+    """Run the named micro-benchmarks (or all of them if 'names' is
+    None) for each of the payload 'sizes' (in bytes, default 1KB, 64KB
+    and 1MB), returning the list of results from run_benchmark. Each
+    result of a sized benchmark is named 'name[size]', and includes
+    the 'payload_bytes' and 'throughput_mb_s' (calculated from the
+    median time)
+
+    Args:
+         names (list, optional): Names of the micro-benchmarks to run
+         sizes (list, optional): Payload sizes in bytes
+         repeats (int, default=20): Number of timed calls per benchmark
+         warmup (int, default=2): Number of untimed calls per benchmark
+         measure_allocations (bool, default=True): Whether to trace memory
+    Returns:
+         list: The results of each micro-benchmark
+    """
+    from Acquire.Benchmark import run_benchmark
+
+    if names is None:
+        names = get_micro_benchmark_names()
+
+    if sizes is None:
+        sizes = _default_sizes
+
+    for name in names:
+        if name not in _micro_benchmarks:
+            raise KeyError(
+                "There is no micro-benchmark called '%s'. Available micro-benchmarks are %s"
+                % (name, get_micro_benchmark_names())
+            )
+
+    results = []
+
+    for name in names:
+        (setup, sized) = _micro_benchmarks[name]
+
+        for size in sizes if sized else [None]:
+            if size is None:
+                label = name
+            else:
+                label = "%s[%s]" % (name, _format_size(size))
+
+            result = run_benchmark(
+                label, setup(size), repeats=repeats, warmup=warmup, measure_allocations=measure_allocations
+            )
+
+            if size is not None:
+                result["payload_bytes"] = size
+
+                if result["p50_ms"] > 0:
+                    result["throughput_mb_s"] = (size / (1024.0 * 1024.0)) / (result["p50_ms"] / 1000.0)
+
+            results.append(result)
+
+    return results
@@ -0,0 +1,344 @@
+import os as _os
+import sys as _sys
+
+__all__ = [
+    "MockedRequests",
+    "MockedAsyncRequests",
+    "install_mocked_services",
+    "create_mocked_services",
+    "create_mocked_user",
+]
+
+# The names of the services that are run in-process
+_service_names = ["registry", "identity", "accounting", "access", "compute", "storage"]
+
+# The handlers for each service, and the directories holding the
+# testing object store of each service (plus 'userdata')
+_handlers = {}
+_services = {}
+
+_wallet = {"dir": None, "password": None}
+
+
+class MockedRequests:
+    """Mocked requests object. This provides a requests interface which calls
+    the 'handler' functions of the services directly, rather
+    than posting the arguments to the online services via a requests
+    call. In addition, as services can call services, this also
+    handles switching between the different local object stores for
+    each of the services
+    """
+
+    def __init__(self, status_code, content, encoding=None):
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+
+    @staticmethod
+    def get(url, data, timeout=None):
+        return MockedRequests._perform(url, data, is_post=False)
+
+    @staticmethod
+    def post(url, data, timeout=None):
+        return MockedRequests._perform(url, data, is_post=True)
+
+    @staticmethod
+    def _perform(url, data, is_post=False):
+        if "identity" not in _services:
+            raise ValueError("There are no mocked services - call create_mocked_services first")
+
+        from Acquire.Service import push_testing_objstore, pop_testing_objstore
+
+        if url.startswith("http://"):
+            url = url[7:]
+        elif url.startswith("https://"):
+            url = url[8:]
+
+        for name in _service_names:
+            if url.startswith(name):
+                break
+        else:
+            raise ValueError("Cannot recognise service from '%s'" % url)
+
+        push_testing_objstore(_services[name])
+
+        try:
+            result = _handlers[name](data=data)
+        finally:
+            pop_testing_objstore()
+
+        return MockedRequests(status_code=200, content=result)
+
+
+class MockedAsyncRequests:
+    """Mocked version of Acquire.Stubs.async_requests, which (synchronously)
+    calls the 'handler' functions of the services directly
+    """
+
+    @staticmethod
+    async def get(url, data=None, timeout=None):
+        return MockedRequests._perform(url, data, is_post=False)
+
+    @staticmethod
+    async def post(url, data, timeout=None):
+        return MockedRequests._perform(url, data, is_post=True)
+
+    @staticmethod
+    async def close():
+        pass
+
+
+def _get_wallet_dir(**kwargs):
+    return _wallet["dir"]
+
+
+def _get_wallet_password(**kwargs):
+    return _wallet["password"]
+
+
+def _mocked_input(s):
+    return "y"
+
+
+def _mocked_output(s, end=None):
+    pass
+
+
+def _mocked_flush_output():
+    pass
+
+
+def _find_services_dir(services_dir=None):
+    """Return the directory containing the service functions. This
+    is 'services_dir', ACQUIRE_SERVICES_DIR, or the 'services'
+    directory in (or above) the current directory
+    """
+    if services_dir is None:
+        services_dir = _os.getenv("ACQUIRE_SERVICES_DIR")
+
+    if services_dir is None:
+        d = _os.path.abspath(_os.getcwd())
+
+        while True:
+            if _os.path.exists(_os.path.join(d, "services", "identity", "route.py")):
+                services_dir = _os.path.join(d, "services")
+                break
+
+            parent = _os.path.dirname(d)
+
+            if parent == d:
+                raise FileNotFoundError(
+                    "Cannot find the 'services' directory. Pass it in, or set ACQUIRE_SERVICES_DIR"
+                )
+
+            d = parent
+
+    return _os.path.abspath(services_dir)
+
+
+def install_mocked_services(services_dir=None):
+    """Monkey-patch Acquire so that all calls to services are handled
+    in-process by the service functions in 'services_dir' (see
+    _find_services_dir). Input is answered with 'y' and client output
+    is silenced. This is safe to call more than once
+
+    Args:
+         services_dir (str, optional): Directory containing the services
+    Returns:
+         None
+    """
+    if len(_handlers) > 0:
+        return
+
+    services_dir = _find_services_dir(services_dir)
+
+    if services_dir not in _sys.path:
+        _sys.path.insert(0, services_dir)
+
+    from importlib import import_module as _import_module
+    from Acquire.Service import create_handler as _create_handler
+
+    for name in _service_names:
+        route = getattr(_import_module("%s.route" % name), "route")
+        _handlers[name] = _create_handler(route)
+
+    import Acquire.Stubs
+
+    # Acquire.Client may be a lazily-loaded module, so import the
+    # submodules from it (which loads it) rather than importing them
+    # directly, which would load a second copy of each submodule
+    from Acquire.Client import _wallet as _client_wallet
+    from Acquire.Client import _user as _client_user
+
+    # monkey-patch requests so that we can mock calls
+    Acquire.Stubs.requests = MockedRequests
+    Acquire.Stubs.async_requests = MockedAsyncRequests
+
+    # monkey-patch input so that we can say "y", and so there is no output
+    _client_wallet._get_wallet_dir = _get_wallet_dir
+    _client_wallet._get_wallet_password = _get_wallet_password
+    _client_wallet._input = _mocked_input
+    _client_wallet._output = _mocked_output
+    _client_wallet._flush_output = _mocked_flush_output
+    _client_user._output = _mocked_output
+
+
+def _login_admin(service_url, username, password, otp):
+    """Internal function used to get a valid login to the specified
+    service for the passed username, password and otp
+    """
+    from Acquire.Client import User, Wallet
+
+    wallet = Wallet()
+
+    user = User(username=username, identity_url=service_url, auto_logout=False)
+
+    result = user.request_login()
+    login_url = result["login_url"]
+
+    wallet.send_password(
+        url=login_url,
+        username=username,
+        password=password,
+        otpcode=otp.generate(),
+        remember_password=False,
+        remember_device=False,
+    )
+
+    user.wait_for_login()
+
+    return user
+
+
+def _clear_caches():
+    """Internal function that clears all of the caches that may hold
+    services (or their objects) from an earlier set of mocked services.
+    This is needed as new services reuse the same UIDs
+    """
+    from Acquire.Service import clear_service_cache
+    from Acquire.Service._service import _cache_service_user
+    from Acquire.ObjectStore import clear_object_cache
+    from Acquire.Identity import clear_acl_cache
+    from Acquire.Storage import clear_transfer_cache
+
+    clear_service_cache()
+    _cache_service_user.clear()
+    clear_object_cache()
+    clear_acl_cache()
+    clear_transfer_cache()
+
+
+def create_mocked_services(root_dir, services_dir=None):
+    """Create and set up mocked versions of all of the main services
+    of the system, with their object stores in sub-directories of
+    'root_dir'. This returns a dictionary containing the Service,
+    admin User and setup response for each service, plus the
+    directories of the object stores in '_services'
+
+    Args:
+         root_dir (str): Directory in which to create the services
+         services_dir (str, optional): Directory containing the services
+    Returns:
+         dict: The services, admin users and setup responses
+    """
+    install_mocked_services(services_dir)
+
+    from Acquire.Identity import Authorisation
+    from Acquire.Crypto import PrivateKey, OTP
+    from Acquire.Service import call_function, Service
+
+    _services.clear()
+    _clear_caches()
+
+    for name in _service_names + ["userdata"]:
+        d = _os.path.join(str(root_dir), name)
+        _os.makedirs(d, exist_ok=True)
+        _services[name] = d
+
+    _wallet["dir"] = _os.path.join(str(root_dir), "wallet")
+    _os.makedirs(_wallet["dir"], exist_ok=True)
+    _wallet["password"] = PrivateKey.random_passphrase()
+
+    password = PrivateKey.random_passphrase()
+    args = {"password": password}
+
+    responses = {}
+
+    _os.environ["SERVICE_PASSWORD"] = "Service_pa33word"
+    _os.environ["STORAGE_COMPARTMENT"] = str(_services["userdata"])
+
+    args["registry_uid"] = "Z9-Z9"  # UID of testing registry
+
+    service_uids = []
+
+    for name in _service_names:
+        args["canonical_url"] = name
+        args["service_type"] = name
+        response = call_function(name, function="admin.setup", args=args)
+
+        service = Service.from_data(response["service"])
+        otp = OTP(OTP.extract_secret(response["provisioning_uri"]))
+        user = _login_admin(name, "admin", password, otp)
+
+        responses[name] = {"service": service, "user": user, "response": response}
+
+        if name == "registry":
+            assert service.registry_uid() == service.uid()
+        else:
+            assert service.registry_uid() == responses["registry"]["service"].uid()
+
+        assert service.uid() not in service_uids
+        service_uids.append(service.uid())
+
+    accounting_service = responses["accounting"]["service"]
+
+    for name in ["access", "compute"]:
+        resource = "trust_accounting_service %s" % accounting_service.uid()
+        args = {
+            "service_url": accounting_service.canonical_url(),
+            "authorisation": Authorisation(user=responses[name]["user"], resource=resource).to_data(),
+        }
+        responses[name]["service"].call_function(function="admin.trust_accounting_service", args=args)
+
+    responses["_services"] = dict(_services)
+
+    return responses
+
+
+def create_mocked_user(username=None, password=None):
+    """Register a new user on the mocked identity service and log
+    them in. This returns (user, password, otp) so that the user
+    can log in again
+    """
+    import uuid as _uuid
+    from Acquire.Crypto import PrivateKey, OTP
+    from Acquire.Client import User, Wallet
+
+    if username is None:
+        username = str(_uuid.uuid4())
+
+    if password is None:
+        password = PrivateKey.random_passphrase()
+
+    result = User.register(username=username, password=password, identity_url="identity")
+
+    otp = OTP(result["otpsecret"])
+
+    user = User(username=username, identity_url="identity", auto_logout=False)
+
+    result = user.request_login()
+
+    Wallet().send_password(
+        url=result["login_url"],
+        username=username,
+        password=password,
+        otpcode=otp.generate(),
+        remember_password=False,
+        remember_device=False,
+    )
+
+    user.wait_for_login()
+
+    assert user.is_logged_in()
+
+    return (user, password, otp)
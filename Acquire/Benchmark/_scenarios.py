@@ -0,0 +1,345 @@
+import os as _os
+
+__all__ = ["register_scenario", "get_scenario_names", "run_scenarios"]
+
+# The value deposited into each account that pays for the scenarios,
+# and the cost of each job (the dummy cost quoted by the access service)
+_deposit_value = 100.0
+_job_cost = 10.0
+
+# The registered scenarios, in the order they are run. Each is a
+# function that is passed the scenario context (the mocked services,
+# a logged-in user and a scratch directory) and that returns the
+# function (with no arguments) that will be timed
+_scenarios = {}
+
+
+def register_scenario(name, setup):
+    """Register the scenario called 'name'. 'setup' is called with
+    the context dictionary and must return the function to benchmark
+
+    Args:
+         name (str): Name of the scenario
+         setup (callable): Function that sets up the scenario
+    Returns:
+         None
+    """
+    _scenarios[name] = setup
+
+
+def get_scenario_names():
+    """Return the names of all of the registered scenarios"""
+    return list(_scenarios.keys())
+
+
+def _write_file(filename, size):
+    """Write 'size' random bytes to 'filename', returning the filename"""
+    with open(filename, "wb") as FILE:
+        FILE.write(_os.urandom(size))
+
+    return filename
+
+
+def _get_drive(context, name):
+    """Return the drive called 'name' owned by the context's user"""
+    from Acquire.Client import Drive, StorageCreds
+
+    creds = StorageCreds(user=context["user"], service_url="storage")
+    return Drive(name=name, creds=creds, autocreate=True)
+
+
+def _get_funded_account(user):
+    """Deposit funds for 'user' and return their 'deposits' account.
+    Deposits are limited by the overdraft of the user's billing
+    account, so this can only be done once per user
+    """
+    from Acquire.Client import Account, deposit
+
+    deposit(user, _deposit_value, "Benchmark funds", accounting_url="accounting")
+    return Account(user=user, account_name="deposits", accounting_url="accounting")
+
+
+def _get_account(context):
+    """Return the funded 'deposits' account of the context's user"""
+    if "account" not in context:
+        context["account"] = _get_funded_account(context["user"])
+
+    return context["account"]
+
+
+def _setup_login(context):
+    """Log a user in using the full login handshake with the identity
+    service (request the login, send the password and one-time-code
+    from the wallet, then wait for the login to complete)
+    """
+    from Acquire.Client import User, Wallet
+
+    (_user, password, otp) = context["create_user"]()
+    username = _user.username()
+
+    def _login():
+        user = User(username=username, identity_url="identity", auto_logout=False)
+        result = user.request_login()
+
+        Wallet().send_password(
+            url=result["login_url"],
+            username=username,
+            password=password,
+            otpcode=otp.generate(),
+            remember_password=False,
+            remember_device=False,
+        )
+
+        user.wait_for_login()
+        user.logout()
+
+    return _login
+
+
+def _setup_cheque(context):
+    """Write a cheque to the access service and have the access
+    service cash it with the accounting service
+    """
+    from Acquire.Client import Cheque
+    from Acquire.Service import push_testing_objstore, pop_testing_objstore
+    from Acquire.Service import push_is_running_service, pop_is_running_service
+
+    account = _get_account(context)
+    access_dir = context["services"]["_services"]["access"]
+
+    def _write_and_cash():
+        cheque = Cheque.write(account=account, recipient_url="access", resource="benchmark", max_spend=1.0)
+
+        push_testing_objstore(access_dir)
+        push_is_running_service()
+
+        try:
+            cheque.cash(spend=1.0, resource="benchmark")
+        finally:
+            pop_is_running_service()
+            pop_testing_objstore()
+
+    return _write_and_cash
+
+
+def _setup_ledger(context, num_transactions=50):
+    """Perform 'num_transactions' transactions as a single ledger
+    operation between two accounts in their own object store
+    """
+    from Acquire.Accounting import Account, Accounts, Ledger, Transaction
+    from Acquire.Crypto import get_private_key
+    from Acquire.Identity import Authorisation
+    from Acquire.Service import push_testing_objstore, pop_testing_objstore
+    from Acquire.Service import push_is_running_service, pop_is_running_service
+    from Acquire.Service import get_service_account_bucket
+
+    ledger_dir = _os.path.join(context["root_dir"], "ledger")
+    _os.makedirs(ledger_dir, exist_ok=True)
+
+    def _run(function):
+        push_testing_objstore(ledger_dir)
+        push_is_running_service()
+
+        try:
+            return function(get_service_account_bucket())
+        finally:
+            pop_is_running_service()
+            pop_testing_objstore()
+
+    def _create_accounts(bucket):
+        accounts = []
+
+        for name in ["debit", "credit"]:
+            group = Accounts(user_guid="%s@benchmark" % name)
+            account = Account(name=name, description="Benchmark account", group_name=group.name(), bucket=bucket)
+            account.set_overdraft_limit(1000000)
+            accounts.append(account)
+
+        return accounts
+
+    (debit_account, credit_account) = _run(_create_accounts)
+
+    authorisation = Authorisation(
+        resource="benchmark", testing_key=get_private_key("testing"), testing_user_guid=debit_account.group_name()
+    )
+
+    def _perform(bucket):
+        transactions = [Transaction(0.01, "Benchmark item %d" % i) for i in range(0, num_transactions)]
+
+        Ledger.perform(
+            transactions=transactions,
+            debit_account=debit_account,
+            credit_account=credit_account,
+            authorisation=authorisation,
+            authorisation_resource="benchmark",
+            is_provisional=False,
+            bucket=bucket,
+        )
+
+    return lambda: _run(_perform)
+
+
+def _setup_upload_download(context, size):
+    """Upload a file of 'size' bytes to a drive and download it again"""
+    drive = _get_drive(context, "benchmark_%d" % size)
+
+    filename = _write_file(_os.path.join(context["root_dir"], "upload_%d.dat" % size), size)
+    download_dir = _os.path.join(context["root_dir"], "download_%d" % size)
+    _os.makedirs(download_dir, exist_ok=True)
+
+    def _upload_download():
+        drive.upload(filename)
+        drive.download(_os.path.basename(filename), directory=download_dir)
+
+    return _upload_download
+
+
+def _setup_chunked_upload(context, size=4 * 1024 * 1024, chunk_size=256 * 1024):
+    """Upload 'size' bytes to a drive in chunks of 'chunk_size'"""
+    drive = _get_drive(context, "benchmark_chunked")
+    chunk = _os.urandom(chunk_size)
+
+    def _chunk_upload():
+        uploader = drive.chunk_upload("chunked.dat")
+
+        for _ in range(0, size // chunk_size):
+            uploader.upload(chunk)
+
+        uploader.close()
+
+    return _chunk_upload
+
+
+def _setup_list_files(context, num_files=200):
+    """List the files in a drive that holds 'num_files' files"""
+    drive = _get_drive(context, "benchmark_large")
+
+    files_dir = _os.path.join(context["root_dir"], "list_files")
+    _os.makedirs(files_dir, exist_ok=True)
+
+    existing = len(drive.list_files())
+
+    for i in range(existing, num_files):
+        drive.upload(_write_file(_os.path.join(files_dir, "file_%05d.dat" % i), 16))
+
+    return lambda: drive.list_files(include_metadata=True)
+
+
+def _setup_job_submission(context):
+    """Submit a job to the access service (paid for by cheque) and
+    then have the cluster take it from the compute service. Each job
+    costs more than the cheques, so the jobs are paid for by as many
+    newly funded users as are needed for 'calls' submissions
+    """
+    from Acquire.Access import RunRequest
+    from Acquire.Client import Cheque, Service
+    from Acquire.Compute import Cluster
+    from Acquire.Identity import Authorisation
+
+    cluster = Cluster.create(service_url="compute", user=context["services"]["compute"]["user"])
+
+    jobs_per_user = int(_deposit_value // _job_cost) - 1
+    num_users = max(1, -(-context["calls"] // jobs_per_user))
+
+    payers = []
+
+    for _ in range(0, num_users):
+        user = context["create_user"]()[0]
+        payers += [(user, _get_funded_account(user))] * jobs_per_user
+
+    drive = _get_drive(context, "benchmark_job")
+    input_dir = _os.path.join(context["root_dir"], "job_input")
+    _os.makedirs(input_dir, exist_ok=True)
+    _write_file(_os.path.join(input_dir, "input.dat"), 1024)
+
+    location = drive.upload(input_dir).location()
+    access_service = Service("access")
+
+    def _submit():
+        (payer, account) = payers.pop(0)
+
+        request = RunRequest(image="docker://benchmark:latest", input=location)
+        cheque = Cheque.write(account=account, recipient_url="access", resource=request.fingerprint(), max_spend=_job_cost)
+
+        args = {
+            "request": request.to_data(),
+            "authorisation": Authorisation(user=payer, resource=request.fingerprint()).to_data(),
+            "cheque": cheque.to_data(),
+        }
+
+        access_service.call_function("run_calculation", args)
+
+        for uid in cluster.get_pending_job_uids():
+            cluster.submit_job(uid)
+
+    return _submit
+
+
+register_scenario("login", _setup_login)
+register_scenario("cheque", _setup_cheque)
+register_scenario("ledger", _setup_ledger)
+register_scenario("upload_small", lambda context: _setup_upload_download(context, 1024))
+register_scenario("upload_large", lambda context: _setup_upload_download(context, 4 * 1024 * 1024))
+register_scenario("upload_chunked", _setup_chunked_upload)
+register_scenario("list_files", _setup_list_files)
+register_scenario("job_submission", _setup_job_submission)
+
+
+def run_scenarios(names=None, repeats=10, warmup=1, root_dir=None, services_dir=None, measure_allocations=True):
+    """Run the named scenarios (or all scenarios if 'names' is None)
+    against freshly created mocked services, returning the list of
+    results from run_benchmark. The services are created in 'root_dir',
+    or in a temporary directory that is removed afterwards
+
+    Args:
+         names (list, optional): Names of the scenarios to run
+         repeats (int, default=10): Number of timed calls per scenario
+         warmup (int, default=1): Number of untimed calls per scenario
+         root_dir (str, optional): Directory in which to create the services
+         services_dir (str, optional): Directory containing the services
+         measure_allocations (bool, default=True): Whether to trace memory
+    Returns:
+         list: The results of each scenario
+    """
+    from Acquire.Benchmark import create_mocked_services, create_mocked_user, run_benchmark
+
+    if names is None:
+        names = get_scenario_names()
+
+    for name in names:
+        if name not in _scenarios:
+            raise KeyError("There is no benchmark scenario called '%s'. Available scenarios are %s" % (name, get_scenario_names()))
+
+    if root_dir is None:
+        import tempfile as _tempfile
+
+        with _tempfile.TemporaryDirectory() as tmpdir:
+            return run_scenarios(
+                names=names,
+                repeats=repeats,
+                warmup=warmup,
+                root_dir=tmpdir,
+                services_dir=services_dir,
+                measure_allocations=measure_allocations,
+            )
+
+    root_dir = str(root_dir)
+
+    context = {
+        "root_dir": root_dir,
+        "services": create_mocked_services(_os.path.join(root_dir, "services"), services_dir=services_dir),
+        "create_user": create_mocked_user,
+        "calls": warmup + repeats + (1 if measure_allocations else 0),
+    }
+
+    context["user"] = create_mocked_user()[0]
+
+    results = []
+
+    for name in names:
+        function = _scenarios[name](context)
+        results.append(
+            run_benchmark(name, function, repeats=repeats, warmup=warmup, measure_allocations=measure_allocations)
+        )
+
+    return results
@@ -0,0 +1,125 @@
+#!/bin/env python3
+
+
+def main():
+    import argparse
+    import sys
+
+    from Acquire.Benchmark import (
+        get_scenario_names,
+        get_micro_benchmark_names,
+        run_scenarios,
+        run_micro_benchmarks,
+        load_baseline,
+        save_baseline,
+        append_history,
+        compare_to_baseline,
+        format_results,
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark Acquire by running scenarios against "
+        "in-process (mocked) versions of all of the services, or by "
+        "running micro-benchmarks of the per-call hot paths",
+        prog="aq_benchmark",
+    )
+
+    parser.add_argument(
+        "scenario",
+        type=str,
+        nargs="*",
+        help="Scenarios to run (default all of %s), or micro-benchmarks to run "
+        "if --micro is passed (default all of %s)" % (get_scenario_names(), get_micro_benchmark_names()),
+    )
+
+    parser.add_argument(
+        "-m",
+        "--micro",
+        action="store_true",
+        default=False,
+        help="Run the micro-benchmarks of the serialisation and crypto functions",
+    )
+
+    parser.add_argument(
+        "-s", "--sizes", type=int, nargs="*", help="Payload sizes (in bytes) for the micro-benchmarks"
+    )
+
+    parser.add_argument("-r", "--repeats", type=int, help="Number of timed calls per benchmark")
+
+    parser.add_argument("-w", "--warmup", type=int, help="Number of untimed calls per benchmark")
+
+    parser.add_argument("-b", "--baseline", type=str, help="JSON file of baseline results to compare against")
+
+    parser.add_argument(
+        "--save-baseline", action="store_true", default=False, help="Save the results as the new baseline"
+    )
+
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Fractional slowdown allowed before a timing is a regression",
+    )
+
+    parser.add_argument("--history", type=str, help="JSON-lines file to which to append the results")
+
+    parser.add_argument("--label", type=str, help="Label for the results added to the history")
+
+    parser.add_argument(
+        "--no-allocations", action="store_true", default=False, help="Don't trace memory allocations"
+    )
+
+    parser.add_argument(
+        "--services-dir", type=str, help="Directory containing the services (default search for 'services')"
+    )
+
+    args = parser.parse_args()
+
+    names = args.scenario
+
+    if len(names) == 0:
+        names = None
+
+    if args.micro:
+        results = run_micro_benchmarks(
+            names=names,
+            sizes=args.sizes if args.sizes else None,
+            repeats=args.repeats if args.repeats is not None else 20,
+            warmup=args.warmup if args.warmup is not None else 2,
+            measure_allocations=not args.no_allocations,
+        )
+    else:
+        results = run_scenarios(
+            names=names,
+            repeats=args.repeats if args.repeats is not None else 10,
+            warmup=args.warmup if args.warmup is not None else 1,
+            services_dir=args.services_dir,
+            measure_allocations=not args.no_allocations,
+        )
+
+    if args.history:
+        append_history(args.history, results, label=args.label)
+
+    baseline = None
+    regressions = []
+
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        regressions = compare_to_baseline(results, baseline, tolerance=args.tolerance)
+
+    print(format_results(results, baseline, regressions))
+
+    if args.save_baseline:
+        if not args.baseline:
+            print("You must pass the baseline file (--baseline) to save the baseline")
+            sys.exit(-1)
+
+        save_baseline(args.baseline, results)
+        print("Saved the baseline to %s" % args.baseline)
+    elif len(regressions) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -433,6 +433,14 @@ class Account:
         Returns:
              None
         """
+        from ._calls import _run_calls
+
+        _run_calls(self._get_info(force_update))
+
+    def _get_info(self, force_update=False):
+        """Generator that fetches the latest data for this account
+        (run via _run_calls or _async_run_calls)
+        """
         if self.is_null():
             from Acquire.Accounting import create_decimal as _create_decimal
             from Acquire.Accounting import Balance as _Balance
@@ -469,7 +477,7 @@ class Account:
 
         args = {"authorisation": auth.to_data(), "account_name": self.name(), "account_uid": self.uid()}
 
-        result = service.call_function(function="get_info", args=args)
+        result = yield (service, "get_info", args)
 
         from Acquire.Accounting import Balance as _Balance
 
@@ -510,6 +518,20 @@ class Account:
         self._refresh(force_update)
         return self._balance.balance()
 
+    async def async_balance(self, force_update=False):
+        """Asynchronous version of 'balance', so that the balances
+        of many accounts can be queried concurrently
+
+        Args:
+             force_update (bool, default=False): Force the refresh
+        Returns:
+             Decimal: Balance of the account
+        """
+        from ._calls import _async_run_calls
+
+        await _async_run_calls(self._get_info(force_update))
+        return self._balance.balance()
+
     def liability(self, force_update=False):
         """Return the current total liability of this account
 
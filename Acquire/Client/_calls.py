@@ -0,0 +1,58 @@
+__all__ = []
+
+
+def _run_calls(calls):
+    """Run the generator 'calls' synchronously, returning its result.
+
+    This lets a client function be written once and then run either
+    synchronously or asynchronously (using _async_run_calls). The
+    generator yields either a tuple of (service, function, args),
+    which is sent the result of calling 'function' on 'service', or a
+    function (e.g. that reads or writes a file), which is sent the
+    result of calling it. Any exception is raised in the generator
+    """
+    try:
+        request = next(calls)
+
+        while True:
+            try:
+                if isinstance(request, tuple):
+                    (service, function, args) = request
+                    result = service.call_function(function=function, args=args)
+                else:
+                    result = request()
+            except Exception as e:
+                request = calls.throw(e)
+            else:
+                request = calls.send(result)
+    except StopIteration as e:
+        return e.value
+
+
+async def _async_run_calls(calls):
+    """Run the generator 'calls' (see _run_calls) asynchronously,
+    returning its result. Calls to services are awaited using
+    'async_call_function', while the functions that are yielded
+    are run in the default executor so that they don't block the
+    event loop
+    """
+    import asyncio as _asyncio
+
+    loop = _asyncio.get_running_loop()
+
+    try:
+        request = next(calls)
+
+        while True:
+            try:
+                if isinstance(request, tuple):
+                    (service, function, args) = request
+                    result = await service.async_call_function(function=function, args=args)
+                else:
+                    result = await loop.run_in_executor(None, request)
+            except Exception as e:
+                request = calls.throw(e)
+            else:
+                request = calls.send(result)
+    except StopIteration as e:
+        return e.value
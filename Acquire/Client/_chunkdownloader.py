@@ -123,13 +123,16 @@ class ChunkDownloader:
 
             chunk = _string_to_bytes(response["chunk"])
 
-            md5 = _Hash.md5(chunk)
+            from Acquire.Access import get_checksum as _get_checksum
+            from Acquire.Access import get_checksum_algorithm as _get_checksum_algorithm
 
-            if checksum != md5:
+            check = _get_checksum(chunk, algorithm=_get_checksum_algorithm(checksum))
+
+            if checksum != check:
                 from Acquire.Storage import FileValidationError
 
                 raise FileValidationError(
-                    "Problem downloading - checksums don't agree: %s vs %s" % (checksum, md5)
+                    "Problem downloading - checksums don't agree: %s vs %s" % (checksum, check)
                 )
 
             import bz2 as _bz2
@@ -59,13 +59,14 @@ class ChunkUploader:
         # first, compress the chunk
         from Acquire.ObjectStore import bytes_to_string as _bytes_to_string
         from Acquire.Crypto import Hash as _Hash
+        from Acquire.Access import get_chunk_checksum as _get_chunk_checksum
         import bz2 as _bz2
 
         if isinstance(chunk, str):
             chunk = chunk.encode("utf-8")
 
         chunk = _bz2.compress(chunk)
-        md5 = _Hash.md5(chunk)
+        checksum = _get_chunk_checksum(chunk)
         chunk = _bytes_to_string(chunk)
 
         if self._chunk_idx is None:
@@ -81,7 +82,7 @@ class ChunkUploader:
         args["chunk_index"] = self._chunk_idx
         args["secret"] = secret
         args["data"] = chunk
-        args["checksum"] = md5
+        args["checksum"] = checksum
 
         service.call_function(function="upload_chunk", args=args)
 
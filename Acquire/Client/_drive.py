@@ -268,6 +268,52 @@ class Drive:
 
             return filemeta.open().upload(filename=filename, force_par=force_par, aclrules=aclrules)
 
+    async def async_upload(self, filename, directory=None, uploaded_name=None, aclrules=None, force_par=False):
+        """Asynchronous version of 'upload'. The files in a directory
+        are uploaded concurrently, and many uploads can be run
+        concurrently from a single event loop
+        """
+        if self.is_null():
+            raise PermissionError("Cannot upload a file to a null drive!")
+
+        import os as _os
+
+        if uploaded_name is None:
+            uploaded_name = _os.path.split(filename)[1]
+
+        if directory is not None:
+            uploaded_name = "%s/%s" % (directory, uploaded_name)
+
+        if _os.path.isdir(filename):
+            import asyncio as _asyncio
+
+            await _asyncio.gather(
+                *[
+                    self.async_upload(
+                        filename="%s/%s" % (filename, f),
+                        uploaded_name="%s/%s" % (uploaded_name, f),
+                        directory=None,
+                        aclrules=aclrules,
+                        force_par=force_par,
+                    )
+                    for f in _os.listdir(filename)
+                ]
+            )
+
+            from Acquire.Client import DirMeta as _DirMeta
+
+            dirmeta = _DirMeta(name=uploaded_name)
+            dirmeta._set_drive_metadata(self._metadata, self._creds)
+
+            return dirmeta
+        else:
+            from Acquire.Client import FileMeta as _FileMeta
+
+            filemeta = _FileMeta(filename=uploaded_name)
+            filemeta._set_drive_metadata(self._metadata, self._creds)
+
+            return await filemeta.open().async_upload(filename=filename, force_par=force_par, aclrules=aclrules)
+
     def chunk_download(self, filename, directory=None, download_name=None, version=None):
         """Download the file 'filename' from the Drive to directory 'directory' on
         this computer (or current directory if not specified), calling
@@ -302,6 +348,20 @@ class Drive:
             filename=download_name, version=version, directory=directory, force_par=force_par
         )
 
+    async def async_download(self, filename, directory=None, download_name=None, version=None, force_par=False):
+        """Asynchronous version of 'download'"""
+        if self.is_null():
+            raise PermissionError("Cannot upload a file to a null drive!")
+
+        from Acquire.Client import FileMeta as _FileMeta
+
+        filemeta = _FileMeta(filename=filename)
+        filemeta._set_drive_metadata(self._metadata, self._creds)
+
+        return await filemeta.open().async_download(
+            filename=download_name, version=version, directory=directory, force_par=force_par
+        )
+
     @staticmethod
     def _list_drives(creds, drive_uid=None):
         """Return a list of all of the DriveMetas of the drives accessible
@@ -372,6 +432,24 @@ class Drive:
         files that are contained in 'directory'. If 'filename' is specified
         then return only the files that match the passed filename
         """
+        from ._calls import _run_calls
+
+        return _run_calls(
+            self._list_files(directory=directory, filename=filename, include_metadata=include_metadata)
+        )
+
+    async def async_list_files(self, directory=None, filename=None, include_metadata=False):
+        """Asynchronous version of 'list_files'"""
+        from ._calls import _async_run_calls
+
+        return await _async_run_calls(
+            self._list_files(directory=directory, filename=filename, include_metadata=include_metadata)
+        )
+
+    def _list_files(self, directory=None, filename=None, include_metadata=False):
+        """Generator that lists the files in this drive (run via
+        _run_calls or _async_run_calls)
+        """
         if self.is_null():
             return []
 
@@ -402,7 +480,7 @@ class Drive:
             args["par_uid"] = par.uid()
             args["secret"] = self._creds.secret()
 
-        response = self.storage_service().call_function(function="list_files", args=args)
+        response = yield (self.storage_service(), "list_files", args)
 
         files = _string_to_list(response["files"], _FileMeta)
 
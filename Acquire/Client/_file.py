@@ -142,6 +142,22 @@ class File:
 
     def upload(self, filename, force_par=False, aclrules=None):
         """Upload 'filename' as the new version of this file"""
+        from ._calls import _run_calls
+
+        return _run_calls(self._upload(filename=filename, force_par=force_par, aclrules=aclrules))
+
+    async def async_upload(self, filename, force_par=False, aclrules=None):
+        """Asynchronous version of 'upload', so that many files can
+        be uploaded concurrently from a single event loop
+        """
+        from ._calls import _async_run_calls
+
+        return await _async_run_calls(self._upload(filename=filename, force_par=force_par, aclrules=aclrules))
+
+    def _upload(self, filename, force_par=False, aclrules=None):
+        """Generator that uploads 'filename' as the new version of
+        this file (run via _run_calls or _async_run_calls)
+        """
         if self.is_null():
             raise PermissionError("Cannot download a null File!")
 
@@ -162,7 +178,8 @@ class File:
         uploaded_name = self._metadata.filename()
         drive_uid = self._metadata.drive().uid()
 
-        filehandle = _FileHandle(
+        # reading (and compressing) the file is blocking
+        filehandle = yield lambda: _FileHandle(
             filename=filename,
             remote_filename=uploaded_name,
             drive_uid=drive_uid,
@@ -202,7 +219,7 @@ class File:
             # will eventually need to authorise payment...
             storage_service = self._creds.storage_service()
 
-            response = storage_service.call_function(function="upload", args=args)
+            response = yield (storage_service, "upload", args)
 
             if "Error" in response:
                 raise ValueError(f"Error calling function: {response['Error']}")
@@ -213,8 +230,12 @@ class File:
             # which must be used to upload the file
             if not filehandle.is_localdata():
                 par = _OSPar.from_data(response["upload_par"])
-                par.write(privkey).set_object_from_file(filehandle.local_filename())
-                par.close(privkey)
+
+                def _write_par():
+                    par.write(privkey).set_object_from_file(filehandle.local_filename())
+                    par.close(privkey)
+
+                yield _write_par
 
             filemeta._set_drive_metadata(self._metadata._drive_metadata, self._creds)
 
@@ -297,6 +318,26 @@ class File:
         of the file. Otherwise download the version associated
         with this file object
         """
+        from ._calls import _run_calls
+
+        return _run_calls(
+            self._download(filename=filename, version=version, directory=directory, force_par=force_par)
+        )
+
+    async def async_download(self, filename=None, version=None, directory=None, force_par=False):
+        """Asynchronous version of 'download', so that many files can
+        be downloaded concurrently from a single event loop
+        """
+        from ._calls import _async_run_calls
+
+        return await _async_run_calls(
+            self._download(filename=filename, version=version, directory=directory, force_par=force_par)
+        )
+
+    def _download(self, filename=None, version=None, directory=None, force_par=False):
+        """Generator that downloads this file (run via _run_calls
+        or _async_run_calls)
+        """
         if self.is_null():
             raise PermissionError("Cannot download a null File!")
 
@@ -308,8 +349,6 @@ class File:
 
         drive_uid = self._metadata.drive().uid()
 
-        from Acquire.Client import create_new_file as _create_new_file
-
         if self._creds.is_user():
             privkey = self._creds.user().session_key()
         else:
@@ -348,12 +387,34 @@ class File:
 
         storage_service = self._creds.storage_service()
 
-        response = storage_service.call_function(function="download", args=args)
+        response = yield (storage_service, "download", args)
 
         from Acquire.Client import FileMeta as _FileMeta
 
         filemeta = _FileMeta.from_data(response["filemeta"])
 
+        # writing the file (and any transfer via a PAR) is blocking
+        filename = yield lambda: self._save_download(
+            response=response,
+            filemeta=filemeta,
+            filename=filename,
+            directory=directory,
+            privkey=privkey,
+            storage_service=storage_service,
+        )
+
+        filemeta._copy_credentials(self._metadata)
+        self._metadata = filemeta
+
+        return filename
+
+    @staticmethod
+    def _save_download(response, filemeta, filename, directory, privkey, storage_service):
+        """Save the file described by the 'response' of the storage
+        service to 'filename', returning the full path to the file
+        """
+        from Acquire.Client import create_new_file as _create_new_file
+
         if "filedata" in response:
             # we have already downloaded the file to 'filedata'
             filedata = response["filedata"]
@@ -405,9 +466,6 @@ class File:
 
             filename = downloader.download(filename=filename, directory=directory)
 
-        filemeta._copy_credentials(self._metadata)
-        self._metadata = filemeta
-
         return filename
 
     def list_versions(self, include_metadata=False):
@@ -415,6 +473,20 @@ class File:
         If 'include_metadata' is True then this will include
         the full metadata of every version
         """
+        from ._calls import _run_calls
+
+        return _run_calls(self._list_versions(include_metadata=include_metadata))
+
+    async def async_list_versions(self, include_metadata=False):
+        """Asynchronous version of 'list_versions'"""
+        from ._calls import _async_run_calls
+
+        return await _async_run_calls(self._list_versions(include_metadata=include_metadata))
+
+    def _list_versions(self, include_metadata=False):
+        """Generator that lists the versions of this file (run via
+        _run_calls or _async_run_calls)
+        """
         if self.is_null():
             return []
 
@@ -445,7 +517,7 @@ class File:
 
         storage_service = self._creds.storage_service()
 
-        response = storage_service.call_function(function="list_versions", args=args)
+        response = yield (storage_service, "list_versions", args)
 
         from Acquire.ObjectStore import string_to_list as _string_to_list
         from Acquire.Storage import FileMeta as _FileMeta
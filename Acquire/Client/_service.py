@@ -284,6 +284,11 @@ class Service:
         self._fail()
         return {}
 
+    async def async_call_function(self, function, args=None):
+        """Asynchronous version of call_function"""
+        self._fail()
+        return {}
+
     def sign(self, message):
         """Sign the specified message"""
         self._fail()
@@ -387,6 +392,13 @@ class Service:
         self._fail()
         return None
 
+    def get_session_infos(self, sessions):
+        """Return information about all of the passed sessions,
+        which are fetched in a single call
+        """
+        self._fail()
+        return None
+
     def to_data(self, password=None):
         """Serialise this key to a dictionary, using the supplied
         password to encrypt the private key and certificate"""
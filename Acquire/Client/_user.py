@@ -2,6 +2,10 @@ from enum import Enum as _Enum
 
 __all__ = ["User"]
 
+# the maximum time to ask the identity service to wait (long-poll)
+# for a login to be approved in a single call
+_max_login_wait_seconds = 20
+
 
 class _LoginStatus(_Enum):
     EMPTY = 0
@@ -477,8 +481,8 @@ class User:
         # to sign all requests and identify this login
         from Acquire.Client import PrivateKey as _PrivateKey
 
-        session_key = _PrivateKey(name="user_session_key %s" % self._username)
-        signing_key = _PrivateKey(name="user_session_cert %s" % self._username)
+        session_key = _PrivateKey.from_pool(name="user_session_key %s" % self._username)
+        signing_key = _PrivateKey.from_pool(name="user_session_cert %s" % self._username)
 
         args = {
             "username": self._username,
@@ -555,15 +559,19 @@ class User:
             "short_uid": _LoginSession.to_short_uid(session_uid),
         }
 
-    def _poll_session_status(self):
+    def _poll_session_status(self, wait_seconds=0):
         """Function used to query the identity service for this session
-        to poll for the session status"""
-        from Acquire.ObjectStore import bytes_to_string as _bytes_to_string
-
+        to poll for the session status. If 'wait_seconds' is set then
+        the identity service will wait for up to this long for the
+        session to stop pending before returning"""
         service = self.identity_service()
 
         args = {"session_uid": self._session_uid}
 
+        if wait_seconds > 0:
+            args["wait_for_status"] = "pending"
+            args["wait_seconds"] = wait_seconds
+
         result = service.call_function(function="get_session_info", args=args)
 
         # now update the status...
@@ -576,12 +584,16 @@ class User:
                 assert user_uid is not None
                 self._user_uid = user_uid
 
-    def wait_for_login(self, timeout=None, polling_delta=5):
+    def wait_for_login(self, timeout=None, polling_delta=5, long_poll=True):
         """Block until the user has logged in. If 'timeout' is set
         then we will wait for a maximum of that number of seconds
 
-        This will check whether we have logged in by polling
-        the identity service every 'polling_delta' seconds.
+        If 'long_poll' is True then each call to the identity service
+        will wait until the login is approved (or for up to
+        20 seconds), so that this returns as soon as the user
+        has logged in. Otherwise (or if the identity service
+        returns early) this will check whether we have logged in by
+        polling the identity service every 'polling_delta' seconds.
         """
         self._check_for_error()
 
@@ -598,35 +610,47 @@ class User:
 
         if timeout is None:
             # block forever....
-            while True:
-                self._poll_session_status()
-
-                if self.is_logged_in():
-                    return True
-
-                elif not self.is_logging_in():
-                    return False
-
-                _time.sleep(polling_delta)
+            deadline = None
         else:
             # only block until the timeout has been reached
             timeout = int(timeout)
             if timeout < 1:
                 timeout = 1
 
-            from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+            deadline = _time.monotonic() + timeout
+
+        while True:
+            start_time = _time.monotonic()
+
+            if deadline is None:
+                remaining = _max_login_wait_seconds
+            else:
+                remaining = deadline - start_time
+
+            if long_poll:
+                wait_seconds = min(remaining, _max_login_wait_seconds)
+            else:
+                wait_seconds = 0
+
+            self._poll_session_status(wait_seconds=wait_seconds)
+
+            if self.is_logged_in():
+                return True
 
-            start_time = _get_datetime_now()
+            elif not self.is_logging_in():
+                return False
 
-            while (_get_datetime_now() - start_time).seconds < timeout:
-                self._poll_session_status()
+            now = _time.monotonic()
 
-                if self.is_logged_in():
-                    return True
+            if deadline is not None and now >= deadline:
+                return False
 
-                elif not self.is_logging_in():
-                    return False
+            # only sleep for whatever of 'polling_delta' was not
+            # already spent waiting in the identity service
+            delay = polling_delta - (now - start_time)
 
-                _time.sleep(polling_delta)
+            if deadline is not None:
+                delay = min(delay, deadline - now)
 
-            return False
+            if delay > 0:
+                _time.sleep(delay)
@@ -9,6 +9,7 @@ Service
 from ._compute_service import *
 from ._cluster import *
 from ._computejob import *
+from ._scheduler import *
 from ._errors import *
 
 try:
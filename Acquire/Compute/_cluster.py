@@ -1,10 +1,38 @@
+import threading as _threading
 from enum import Enum as _Enum
 
 __all__ = ["Cluster"]
 
 
+# Limits on the number of jobs that can be claimed in one call, the
+# length of the lease on claimed jobs, and the time a claim will wait
+# for a job to be submitted if there are no pending jobs (this must be
+# less than the timeout of the compute service function)
+_max_claim_jobs = 100
+_max_lease_seconds = 86400
+_max_claim_wait_seconds = 25
+
+# Claims whose leases have expired are returned to the pending pool by
+# a sweep that reads every claimed job. This is run at most every
+# '_claim_sweep_seconds', or sooner if a lease granted by this process
+# expires first, rather than on every attempt to claim jobs. The number
+# of jobs each user has claimed or is running (used to share the cluster
+# fairly) is kept from the last sweep, plus the jobs claimed since by
+# this process
+_claim_sweep_seconds = 30
+
+# Jobs that have been claimed and moved on to one of these states are
+# indexed by user at "compute/active/<user>/<uid>" until they move out
+# of them, so that the sweep can count them without reading each job
+_active_root = "compute/active"
+
+_claim_sweep = {"next": None, "running": {}}
+_claim_sweep_lock = _threading.Lock()
+
+
 class JobState(_Enum):
     PENDING = "pending"
+    CLAIMED = "claimed"
     SUBMITTING = "submitting"
     STARTING = "starting"
     RUNNING = "running"
@@ -13,6 +41,9 @@ class JobState(_Enum):
     COMPLETED = "completed"
 
 
+_active_states = (JobState.SUBMITTING, JobState.STARTING, JobState.RUNNING)
+
+
 class Cluster:
     """This class provides a handle to the unique compute
     cluster associated with a Compute service. There is only
@@ -225,7 +256,7 @@ class Cluster:
 
         self._oldkeys.append(self._private_key)
 
-        self._private_key = _PrivateKey()
+        self._private_key = _PrivateKey.from_pool()
         self._public_key = self._private_key.public_key()
         self._secret = _PrivateKey.random_passphrase()
 
@@ -348,6 +379,13 @@ class Cluster:
                 except:
                     data = None
 
+                if data is not None and start_state == JobState.PENDING and "queue_key" in data:
+                    # the job is no longer waiting in the queue
+                    _ObjectStore.delete_object(bucket=bucket, key=data["queue_key"])
+
+                if data is not None:
+                    Cluster._update_active_index(bucket, data, start_state, end_state)
+
             if data is None:
                 raise KeyError("There is no job with UID %s in state %s" % (uid, start_state.value))
 
@@ -373,11 +411,15 @@ class Cluster:
 
             return _ComputeJob.from_data(self.decrypt_data(result["job"]))
 
-    def submit_job(self, uid):
+    def submit_job(self, uid, request=None, user_guid=None):
         """Submit the job with specified UID to this cluster.
 
         On the service this will put the UID of the job into the
-        "pending" pool, and will signal the cluster to pull that job
+        "pending" pool, and will signal the cluster to pull that job.
+        The job is queued according to the priority and resources
+        in the passed RunRequest (up to the maximum priority allowed
+        for the user), and is shared fairly with the other jobs
+        submitted by the user with GUID 'user_guid'
 
         On the client this will pull the job with that UID from the
         pending pool, moving it to the "submitting" pool and will
@@ -388,11 +430,27 @@ class Cluster:
             from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
             from Acquire.ObjectStore import get_datetime_now_to_string as _get_datetime_now_to_string
 
+            from Acquire.Compute import JobScheduler as _JobScheduler
+
             bucket = _get_service_account_bucket()
             key = "compute/pending/%s" % uid
-            resource = {"pending": _get_datetime_now_to_string(), "uid": uid}
 
-            _ObjectStore.set_object_from_json(bucket, key, resource)
+            max_priority = _JobScheduler.get_max_priority(bucket, user_guid)
+            entry = _JobScheduler.create_entry(
+                uid=uid, request=request, user_guid=user_guid, max_priority=max_priority
+            )
+            queue_key = _JobScheduler.get_queue_key(entry)
+
+            resource = {
+                "pending": _get_datetime_now_to_string(),
+                "uid": uid,
+                "queue_key": queue_key,
+                "user_guid": user_guid,
+            }
+
+            with _ObjectStore.batch() as batch:
+                batch.set_object_from_json(bucket, key, resource)
+                batch.set_object_from_json(bucket, queue_key, entry)
         else:
             # fetch the pending job and change the status to "submitting"
             return self.get_job(uid=uid, start_state="pending", end_state="submitting")
@@ -421,6 +479,318 @@ class Cluster:
 
             return self.decrypt_data(result["job_uids"])
 
+    def claim_jobs(self, max_jobs=10, lease_seconds=600, wait_seconds=0, passphrase=None):
+        """Claim up to 'max_jobs' pending jobs, returning the list of
+        ComputeJobs that were claimed. The jobs are moved to the
+        "claimed" pool with a lease of 'lease_seconds'. The cluster
+        must move each job on from "claimed" (e.g. to "submitting" using
+        'get_job') before the lease expires, else the job is returned
+        to the "pending" pool to be claimed again. If there are no
+        pending jobs then this will wait for up to 'wait_seconds' for
+        one to be submitted. If you are on the service you need to
+        supply a valid passphrase
+        """
+        if self.is_null():
+            return []
+
+        max_jobs = min(max(int(max_jobs), 1), _max_claim_jobs)
+        lease_seconds = min(max(int(lease_seconds), 1), _max_lease_seconds)
+        wait_seconds = min(max(float(wait_seconds), 0), _max_claim_wait_seconds)
+
+        if Cluster._is_running_service():
+            self.verify_passphrase(resource="claim_jobs", passphrase=passphrase)
+
+            import time as _time
+
+            deadline = _time.monotonic() + wait_seconds
+            delay = 0.25
+
+            while True:
+                running = Cluster._get_running_claims()
+
+                jobs = Cluster._claim_pending_jobs(max_jobs=max_jobs, lease_seconds=lease_seconds, running=running)
+
+                if len(jobs) > 0 or _time.monotonic() + delay > deadline:
+                    return jobs
+
+                # long-poll - wait for a job to be submitted
+                _time.sleep(delay)
+                delay = min(2 * delay, 2.0)
+        else:
+            passphrase = self.passphrase(resource="claim_jobs")
+            args = {
+                "passphrase": passphrase,
+                "max_jobs": max_jobs,
+                "lease_seconds": lease_seconds,
+                "wait_seconds": wait_seconds,
+            }
+
+            result = self.compute_service().call_function(function="claim_jobs", args=args)
+
+            from Acquire.Compute import ComputeJob as _ComputeJob
+
+            return [_ComputeJob.from_data(data) for data in self.decrypt_data(result["jobs"])]
+
+    @staticmethod
+    def _claim_pending_jobs(max_jobs, lease_seconds, running=None):
+        """Internal function called on the service to claim up to
+        'max_jobs' pending jobs with a lease of 'lease_seconds'. The
+        jobs are chosen by the JobScheduler, taking into account the
+        number of jobs each user has 'running'. A job is claimed by
+        taking (conditionally deleting) its record from the "pending"
+        pool, so only one claimer can succeed for each job. If the
+        claim of a job can't be recorded then its record is put back
+        into the "pending" pool and the job is not returned
+        """
+        import datetime as _datetime
+        from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import ObjectStoreError as _ObjectStoreError
+        from Acquire.ObjectStore import ObjectStoreBatchError as _ObjectStoreBatchError
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+        from Acquire.ObjectStore import datetime_to_string as _datetime_to_string
+        from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
+        from Acquire.Compute import ComputeJob as _ComputeJob
+        from Acquire.Compute import JobScheduler as _JobScheduler
+
+        import json as _json
+
+        bucket = _get_service_account_bucket()
+        pending = "compute/%s" % JobState.PENDING.value
+        claimed = "compute/%s" % JobState.CLAIMED.value
+
+        entries = _JobScheduler.get_entries(bucket)
+
+        # jobs submitted before they were queued by the scheduler
+        queued = set(entry["uid"] for entry in entries)
+
+        for uid in _ObjectStore.get_all_object_names(bucket=bucket, prefix="%s/" % pending, without_prefix=True):
+            if uid not in queued:
+                entries.append(_JobScheduler.create_entry(uid=uid))
+
+        now = _get_datetime_now()
+        lease = _datetime_to_string(now + _datetime.timedelta(seconds=lease_seconds))
+
+        claimed_uids = []
+        claimed_users = []
+        records = {}
+
+        # select a few spare jobs in case some have already been claimed
+        for entry in _JobScheduler.select(entries, max_jobs=2 * max_jobs, running=running, now=now):
+            if len(claimed_uids) >= max_jobs:
+                break
+
+            uid = entry["uid"]
+
+            try:
+                data = _ObjectStore.take_object(bucket, "%s/%s" % (pending, uid))
+            except _ObjectStoreError:
+                # claimed by someone else
+                continue
+
+            data = _json.loads(data.decode("utf-8"))
+            data[JobState.CLAIMED.value] = _datetime_to_string(now)
+            data["lease"] = lease
+            data["entry"] = entry
+
+            claimed_uids.append(uid)
+            claimed_users.append(entry["user_guid"])
+            records[uid] = data
+
+        if len(claimed_uids) == 0:
+            return []
+
+        # the queue entry is only removed once the claim is recorded
+        writes = {}
+
+        try:
+            with _ObjectStore.batch() as batch:
+                for uid, data in records.items():
+                    writes[uid] = batch.set_object_from_json(bucket, "%s/%s" % (claimed, uid), data)
+                    batch.delete_object(bucket, _JobScheduler.get_queue_key(data["entry"]), after=writes[uid])
+        except _ObjectStoreBatchError:
+            failed = set(uid for (uid, write) in writes.items() if write.error is not None)
+
+            # return the jobs whose claims were not recorded to the
+            # "pending" pool - their queue entries were not removed
+            with _ObjectStore.batch() as batch:
+                for uid in failed:
+                    data = records[uid]
+                    data.pop(JobState.CLAIMED.value, None)
+                    data.pop("lease", None)
+                    data.pop("entry", None)
+                    batch.set_object_from_json(bucket, "%s/%s" % (pending, uid), data)
+
+            claimed_users = [
+                user_guid for (uid, user_guid) in zip(claimed_uids, claimed_users) if uid not in failed
+            ]
+            claimed_uids = [uid for uid in claimed_uids if uid not in failed]
+
+            if len(claimed_uids) == 0:
+                return []
+
+        Cluster._record_claims(claimed_users, lease_seconds)
+
+        with _ThreadPoolExecutor(max_workers=8) as pool:
+            return list(pool.map(lambda uid: _ComputeJob.load(uid=uid), claimed_uids))
+
+    @staticmethod
+    def _update_active_index(bucket, data, start_state, end_state):
+        """Internal function called on the service when the job whose
+        record is 'data' has moved from 'start_state' to 'end_state'.
+        This adds the job to, or removes it from, the per-user index
+        of jobs that are being submitted or are running
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from ._scheduler import _encode_user
+
+        was_active = start_state in _active_states
+        is_active = end_state in _active_states
+
+        if was_active == is_active:
+            return
+
+        user_guid = data.get("user_guid", data.get("entry", {}).get("user_guid", None))
+        key = "%s/%s/%s" % (_active_root, _encode_user(user_guid), data["uid"])
+
+        if is_active:
+            _ObjectStore.set_string_object(bucket=bucket, key=key, string_data=end_state.value)
+        else:
+            _ObjectStore.delete_object(bucket=bucket, key=key)
+
+    @staticmethod
+    def _get_running_claims():
+        """Internal function called on the service that returns the
+        number of jobs that each user has claimed or is running
+        (submitting, starting or running). This sweeps the
+        expired claims back to the "pending" pool if a sweep is due,
+        and otherwise uses the counts from the last sweep
+        """
+        import time as _time
+
+        with _claim_sweep_lock:
+            now = _time.monotonic()
+
+            if _claim_sweep["next"] is not None and now < _claim_sweep["next"]:
+                return dict(_claim_sweep["running"])
+
+            # stop other threads from sweeping at the same time
+            _claim_sweep["next"] = now + _claim_sweep_seconds
+
+        running = Cluster._return_expired_claims()
+
+        with _claim_sweep_lock:
+            _claim_sweep["running"] = dict(running)
+
+        return running
+
+    @staticmethod
+    def _record_claims(user_guids, lease_seconds):
+        """Internal function that records that this process has claimed
+        jobs for the users with the passed GUIDs, with a lease of
+        'lease_seconds', so that the next sweep happens by the time
+        that the leases expire. The jobs are added to the number of
+        jobs that each user has running until the next sweep
+        """
+        import time as _time
+
+        with _claim_sweep_lock:
+            running = _claim_sweep["running"]
+
+            for user_guid in user_guids:
+                running[user_guid] = running.get(user_guid, 0) + 1
+
+            expires = _time.monotonic() + lease_seconds
+
+            if _claim_sweep["next"] is None or expires < _claim_sweep["next"]:
+                _claim_sweep["next"] = expires
+
+    @staticmethod
+    def _return_expired_claims():
+        """Internal function called on the service that returns the
+        claimed jobs whose leases have expired to the "pending" pool.
+        This returns the number of jobs that each user has claimed,
+        plus the number that they have in the "submitting", "starting"
+        and "running" pools (read from the names in the active index)
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import get_datetime_now_to_string as _get_datetime_now_to_string
+        from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
+        from Acquire.Compute import JobScheduler as _JobScheduler
+
+        bucket = _get_service_account_bucket()
+        pending = "compute/%s" % JobState.PENDING.value
+        claimed = "compute/%s" % JobState.CLAIMED.value
+
+        now = _get_datetime_now_to_string()
+        running = {}
+
+        for (key, data) in _ObjectStore.get_all_objects_from_json(bucket=bucket, prefix="%s/" % claimed).items():
+            entry = data.get("entry", {})
+
+            if data.get("lease", now) >= now:
+                user_guid = entry.get("user_guid", None)
+                running[user_guid] = running.get(user_guid, 0) + 1
+                continue
+
+            uid = data["uid"]
+
+            try:
+                data = _ObjectStore.take_object_from_json(bucket, "%s/%s" % (claimed, uid))
+            except:
+                # the job has been moved on
+                continue
+
+            data.pop(JobState.CLAIMED.value, None)
+            data.pop("lease", None)
+            entry = data.pop("entry", None)
+
+            with _ObjectStore.batch() as batch:
+                batch.set_object_from_json(bucket, "%s/%s" % (pending, uid), data)
+
+                if entry is not None:
+                    # the job keeps its place (and waiting time) in the queue
+                    batch.set_object_from_json(bucket, _JobScheduler.get_queue_key(entry), entry)
+
+        from ._scheduler import _decode_user
+
+        active = _ObjectStore.get_all_object_names(bucket=bucket, prefix="%s/" % _active_root, without_prefix=True)
+
+        for name in active:
+            user_guid = _decode_user(name.split("/")[0])
+            running[user_guid] = running.get(user_guid, 0) + 1
+
+        return running
+
+    def get_queue_statistics(self, passphrase=None):
+        """Return statistics about the queue of pending jobs, e.g. the
+        number of queued jobs per priority and per user, and how long
+        they have been waiting. If you are on the service you need to
+        supply a valid passphrase
+        """
+        if self.is_null():
+            return {}
+
+        if Cluster._is_running_service():
+            from Acquire.ObjectStore import ObjectStore as _ObjectStore
+            from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
+            from Acquire.Compute import JobScheduler as _JobScheduler
+
+            self.verify_passphrase(resource="get_queue_statistics", passphrase=passphrase)
+
+            bucket = _get_service_account_bucket()
+
+            claimed = _ObjectStore.get_all_object_names(bucket=bucket, prefix="compute/%s/" % JobState.CLAIMED.value)
+
+            return _JobScheduler.get_statistics(bucket, claimed=len(claimed))
+        else:
+            passphrase = self.passphrase(resource="get_queue_statistics")
+            args = {"passphrase": passphrase}
+            result = self.compute_service().call_function(function="get_queue_statistics", args=args)
+
+            return result["statistics"]
+
     def to_data(self, passphrase=None):
         """Return a json-serialisable dictionary of this cluster"""
         if self.is_null():
@@ -1,5 +1,18 @@
 __all__ = ["ComputeJob"]
 
+# The user's authorisation is only used to find out who submitted a
+# job (the access service has already checked that they can run it),
+# so an older authorisation is accepted than usual, so that a worksheet
+# that was interrupted can still be resumed later
+_authorisation_stale_time = 7 * 24 * 3600
+
+# Each worksheet is claimed by the first submission, under
+# "compute/worksheet/<worksheet_uid>". The claim records how far the
+# submission got ("claimed", "paid" or "queued"), so that a resubmission
+# carries on from there. A claim that is still unpaid after this many
+# seconds is assumed to have been abandoned, and can be taken over
+_worksheet_claim_timeout = 60
+
 
 class ComputeJob:
     """This class holds all information about a compute job. It is used
@@ -39,15 +52,19 @@ class ComputeJob:
             return self._request
 
     @staticmethod
-    def submit(worksheet_uid, request, par, secret, cheque):
+    def submit(worksheet_uid, request, par, secret, cheque, authorisation):
         """Submit a job which has;
         worksheet_uid -
 
+        The job is queued fairly with the other jobs of the user who
+        signed the passed 'authorisation' for the request. This is
+        verified, so that users cannot claim to be someone else
         """
         from Acquire.Service import get_this_service as _get_this_service
         from Acquire.Access import RunRequest as _RunRequest
         from Acquire.Client import PAR as _PAR
         from Acquire.Client import Cheque as _Cheque
+        from Acquire.Identity import Authorisation as _Authorisation
         from Acquire.ObjectStore import create_uid as _create_uid
         from Acquire.Compute import Cluster as _Cluster
 
@@ -60,6 +77,12 @@ class ComputeJob:
         if not isinstance(cheque, _Cheque):
             raise TypeError("The cheque must be type Cheque")
 
+        if not isinstance(authorisation, _Authorisation):
+            raise TypeError("The authorisation must be type Authorisation")
+
+        authorisation.verify(resource=request.fingerprint(), stale_time=_authorisation_stale_time)
+        user_guid = authorisation.user_guid()
+
         service = _get_this_service(need_private_access=True)
         cluster = _Cluster.get_cluster()
 
@@ -69,33 +92,177 @@ class ComputeJob:
         job._par = par
         job._request = request
 
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import get_datetime_now_to_string as _get_datetime_now_to_string
+        from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
+
+        import json as _json
+        import time as _time
+
+        bucket = _get_service_account_bucket()
+
+        job._uid = _create_uid(include_date=True, short_uid=True, separator="/")
+
+        # the access service will submit the work again if it was
+        # interrupted, so only the first submission of a worksheet
+        # is run. Any later submission carries on from where the
+        # first submission got to, and returns the same job
+        worksheet_key = "compute/worksheet/%s" % worksheet_uid
+
+        while True:
+            claim = {"uid": job._uid, "stage": "claimed", "datetime": _get_datetime_now_to_string()}
+
+            if _ObjectStore.set_object_if_absent(bucket, worksheet_key, _json.dumps(claim).encode("utf-8")):
+                break
+
+            existing = ComputeJob._get_claim(bucket, worksheet_key)
+
+            if existing is None:
+                # the first submission failed before it was paid for
+                continue
+            elif existing["stage"] != "claimed":
+                job._uid = existing["uid"]
+                return ComputeJob._finish_submit(bucket, worksheet_key, existing, job, cluster, user_guid)
+            elif ComputeJob._is_abandoned(existing):
+                ComputeJob._take_abandoned_claim(bucket, worksheet_key)
+            else:
+                # the first submission is still being paid for
+                _time.sleep(0.5)
+
         cost = 10  # TODO - calculate cost of job again from request
 
         try:
-            credit_notes = cheque.cash(spend=cost, resource="work %s" % worksheet_uid)
-        except Exception as e:
-            from Acquire.Service import exception_to_string
-            from Acquire.Accounting import PaymentError
-
-            raise PaymentError(
-                "Problem cashing the cheque used to pay for the calculation: "
-                "\n\nCAUSE: %s" % exception_to_string(e)
-            )
+            try:
+                credit_notes = cheque.cash(spend=cost, resource="work %s" % worksheet_uid)
+            except Exception as e:
+                from Acquire.Service import exception_to_string
+                from Acquire.Accounting import PaymentError
 
-        if credit_notes is None or len(credit_notes) == 0:
-            from Acquire.Accounting import PaymentError
+                raise PaymentError(
+                    "Problem cashing the cheque used to pay for the calculation: "
+                    "\n\nCAUSE: %s" % exception_to_string(e)
+                )
 
-            raise PaymentError("Cannot be paid!")
+            if credit_notes is None or len(credit_notes) == 0:
+                from Acquire.Accounting import PaymentError
 
-        job._credit_notes = credit_notes
+                raise PaymentError("Cannot be paid!")
+        except:
+            # nothing has been paid, so let the worksheet be submitted again
+            _ObjectStore.delete_object(bucket, worksheet_key)
+            raise
 
-        job._uid = _create_uid(include_date=True, short_uid=True, separator="/")
+        from Acquire.ObjectStore import list_to_string as _list_to_string
+
+        # the cheque has been cashed, so from now on the claim is kept,
+        # and records the payment so that a resubmission can finish
+        # the job without paying again
+        claim["stage"] = "paid"
+        claim["credit_notes"] = _list_to_string(credit_notes)
+        _ObjectStore.set_object_from_json(bucket, worksheet_key, claim)
+
+        return ComputeJob._finish_submit(bucket, worksheet_key, claim, job, cluster, user_guid)
+
+    @staticmethod
+    def _get_claim(bucket, worksheet_key):
+        """Internal function returning the claim on the worksheet at
+        'worksheet_key', or None if it is not claimed. Claims written
+        before claims recorded their stage only hold the job UID, and
+        were written once the job had been queued
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        import json as _json
+
+        data = _ObjectStore.get_string_object_or_none(bucket, worksheet_key)
 
+        if data is None:
+            return None
+
+        try:
+            return _json.loads(data)
+        except Exception:
+            return {"uid": data, "stage": "queued"}
+
+    @staticmethod
+    def _is_abandoned(claim):
+        """Internal function returning whether or not the unpaid
+        'claim' is old enough to be taken over
+        """
+        import datetime as _datetime
+
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+        from Acquire.ObjectStore import string_to_datetime as _string_to_datetime
+
+        age = _get_datetime_now() - _string_to_datetime(claim["datetime"])
+
+        return age > _datetime.timedelta(seconds=_worksheet_claim_timeout)
+
+    @staticmethod
+    def _take_abandoned_claim(bucket, worksheet_key):
+        """Internal function that removes the abandoned claim at
+        'worksheet_key', so that the worksheet can be claimed again.
+        The claim is put back if it was paid for in the meantime
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import ObjectStoreError as _ObjectStoreError
+
+        import json as _json
+
+        try:
+            data = _ObjectStore.take_object(bucket, worksheet_key)
+        except _ObjectStoreError:
+            # someone else has already taken it
+            return
+
+        try:
+            stage = _json.loads(data.decode("utf-8"))["stage"]
+        except Exception:
+            stage = "queued"
+
+        if stage != "claimed":
+            _ObjectStore.set_object_if_absent(bucket, worksheet_key, data)
+
+    @staticmethod
+    def _is_queued(bucket, uid):
+        """Internal function returning whether or not the job with
+        UID 'uid' has already been passed to the cluster, i.e. is
+        in any of the job pools
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.Compute._cluster import JobState as _JobState
+
+        for state in _JobState:
+            if _ObjectStore.exists(bucket, "compute/%s/%s" % (state.value, uid)):
+                return True
+
+        return False
+
+    @staticmethod
+    def _finish_submit(bucket, worksheet_key, claim, job, cluster, user_guid):
+        """Internal function that finishes the submission of 'job',
+        which has been paid for, carrying on from the stage recorded
+        in the worksheet 'claim'. This saves the job and then queues
+        it on the cluster (unless it has already been queued)
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import string_to_list as _string_to_list
+        from Acquire.Accounting import CreditNote as _CreditNote
+
+        if claim["stage"] == "queued":
+            return ComputeJob.load(uid=job._uid)
+
+        job._credit_notes = _string_to_list(claim["credit_notes"], _CreditNote)
         job.save()
 
         # signal server running on cluster to fetch job and actually
         # submit to slurm
-        cluster.submit_job(job._uid)
+        if not ComputeJob._is_queued(bucket, job._uid):
+            cluster.submit_job(job._uid, request=job._request, user_guid=user_guid)
+
+        claim["stage"] = "queued"
+        claim.pop("credit_notes", None)
+        _ObjectStore.set_object_from_json(bucket, worksheet_key, claim)
 
         return job
 
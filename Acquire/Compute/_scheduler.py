@@ -0,0 +1,304 @@
+__all__ = ["JobScheduler"]
+
+# The pending jobs are indexed in the queue below this prefix, as
+# 'compute/queue/<band>/<size>/<queued>/<user>/<job_uid>'. The band is
+# (9 - priority) and the user GUID is encoded so that it is safe to
+# use in a key. Everything the scheduler needs is in the key, so the
+# queue is read with a single listing, without reading each entry
+_queue_root = "compute/queue"
+
+# Used in place of the encoded user GUID for jobs without a user
+_no_user = "~"
+
+_max_priority = 9
+
+# The maximum priority that a user can request, unless this has been
+# raised for the user by the service admin (using
+# JobScheduler.set_max_priority). The priority comes from the user's
+# RunRequest, so this stops anyone from jumping the queue
+_default_max_priority = 0
+
+# The per-user maximum priorities are stored below this prefix
+_max_priority_root = "compute/max_priority"
+
+# Jobs gain one level of priority for every this many seconds they
+# wait in the queue, so that low priority and large jobs still run
+_aging_seconds = 600
+
+
+def _encode_user(user_guid):
+    """Return the user GUID encoded so that it is safe to use as a
+    single part of a key (url-safe base64, which has no '/')
+    """
+    import base64 as _base64
+
+    if user_guid is None:
+        return _no_user
+
+    return _base64.urlsafe_b64encode(user_guid.encode("utf-8")).decode("utf-8")
+
+
+def _decode_user(user):
+    """Return the user GUID encoded by _encode_user"""
+    import base64 as _base64
+
+    if user == _no_user:
+        return None
+
+    return _base64.urlsafe_b64decode(user.encode("utf-8")).decode("utf-8")
+
+
+def _parse_resources(resources):
+    """Return the dictionary of resources requested by a RunRequest.
+    The resources can be a dictionary, or a string of comma or space
+    separated 'key=value' pairs (e.g. "cores=4, hours=2, priority=5")
+    """
+    if resources is None:
+        return {}
+
+    if isinstance(resources, dict):
+        return resources
+
+    resources = str(resources).strip()
+
+    if resources.startswith("{"):
+        import ast as _ast
+
+        try:
+            return dict(_ast.literal_eval(resources))
+        except Exception:
+            return {}
+
+    result = {}
+
+    for part in resources.replace(",", " ").split():
+        if "=" in part:
+            (key, value) = part.split("=", 1)
+            result[key.strip()] = value.strip()
+
+    return result
+
+
+def _get_number(resources, key, default):
+    """Return resources[key] as a number, or 'default'"""
+    try:
+        return float(resources[key])
+    except Exception:
+        return default
+
+
+def _get_size_class(size):
+    """Return the size class of a job that needs 'size' core-hours.
+    Jobs are compared by size class (powers of two) rather than exact
+    size, so that jobs of similar size run in submission order
+    """
+    size_class = 0
+
+    while size > 1 and size_class < 32:
+        size /= 2
+        size_class += 1
+
+    return size_class
+
+
+class JobScheduler:
+    """This class orders the pending jobs on a compute service. Jobs
+    are ordered by priority, then by size (small jobs first) and then
+    by submission time. Jobs gain priority as they wait, so that no
+    job starves, and jobs are shared fairly between users, so that
+    one user cannot fill the cluster while others are waiting
+    """
+
+    @staticmethod
+    def create_entry(uid, request=None, user_guid=None, max_priority=_default_max_priority):
+        """Return the queue entry for the job with UID 'uid' that was
+        created from the passed RunRequest by the user with GUID
+        'user_guid'. The priority and size of the job are read from
+        the 'priority', 'cores' and 'hours' resources of the request.
+        The priority is capped at 'max_priority', which should be the
+        maximum priority allowed for the user (see get_max_priority)
+        """
+        from Acquire.ObjectStore import get_datetime_now_to_string as _get_datetime_now_to_string
+
+        if request is not None:
+            resources = _parse_resources(request.resources())
+        else:
+            resources = {}
+
+        priority = int(_get_number(resources, "priority", 0))
+        priority = min(max(priority, 0), max_priority, _max_priority)
+
+        size = _get_number(resources, "cores", 1) * _get_number(resources, "hours", 1)
+
+        return {
+            "uid": uid,
+            "user_guid": user_guid,
+            "priority": priority,
+            "size": size,
+            "queued": _get_datetime_now_to_string(),
+        }
+
+    @staticmethod
+    def get_max_priority(bucket, user_guid):
+        """Return the maximum priority that the user with GUID
+        'user_guid' can request for their jobs
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        if user_guid is None:
+            return _default_max_priority
+
+        data = _ObjectStore.get_string_object_or_none(bucket, "%s/%s" % (_max_priority_root, user_guid))
+
+        if data is None:
+            return _default_max_priority
+
+        return min(max(int(data), 0), _max_priority)
+
+    @staticmethod
+    def set_max_priority(bucket, user_guid, max_priority):
+        """Set the maximum priority that the user with GUID 'user_guid'
+        can request for their jobs. This should only be called by the
+        admin of the compute service
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        max_priority = min(max(int(max_priority), 0), _max_priority)
+
+        _ObjectStore.set_string_object(bucket, "%s/%s" % (_max_priority_root, user_guid), str(max_priority))
+
+    @staticmethod
+    def get_queue_key(entry):
+        """Return the key in the queue for the passed entry"""
+        return "%s/%d/%s/%s/%s/%s" % (
+            _queue_root,
+            _max_priority - entry["priority"],
+            "%g" % entry["size"],
+            entry["queued"],
+            _encode_user(entry["user_guid"]),
+            entry["uid"],
+        )
+
+    @staticmethod
+    def _entry_from_name(name):
+        """Return the entry for the passed queue key (without the
+        queue prefix), or None if this is not a valid key
+        """
+        try:
+            (band, size, queued, user, uid) = name.split("/", 4)
+
+            return {
+                "uid": uid,
+                "user_guid": _decode_user(user),
+                "priority": _max_priority - int(band),
+                "size": float(size),
+                "queued": queued,
+            }
+        except Exception:
+            return None
+
+    @staticmethod
+    def get_entries(bucket):
+        """Return all of the entries in the queue, in priority and
+        then submission order. These are read from the names of the
+        objects in the queue, so this is a single listing
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        names = _ObjectStore.get_all_object_names(bucket=bucket, prefix="%s/" % _queue_root, without_prefix=True)
+
+        entries = []
+
+        for name in names:
+            entry = JobScheduler._entry_from_name(name)
+
+            if entry is not None:
+                entries.append(entry)
+
+        entries.sort(key=lambda entry: (-entry["priority"], entry["queued"], entry["uid"]))
+
+        return entries
+
+    @staticmethod
+    def select(entries, max_jobs, running=None, now=None):
+        """Select up to 'max_jobs' of the passed queue entries to run
+        next, returning the selected entries in the order they
+        should run. 'running' is a dictionary of the number of jobs
+        that each user already has running. Each pick takes the job
+        with the highest priority (including the priority gained by
+        waiting), then the job of the user who has the fewest jobs
+        running, then the smallest job, and then the oldest job
+        """
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+        from Acquire.ObjectStore import string_to_datetime as _string_to_datetime
+
+        if now is None:
+            now = _get_datetime_now()
+
+        if running is None:
+            running = {}
+        else:
+            running = dict(running)
+
+        candidates = []
+
+        for entry in entries:
+            waited = (now - _string_to_datetime(entry["queued"])).total_seconds()
+            priority = min(entry["priority"] + int(max(waited, 0) // _aging_seconds), _max_priority)
+            candidates.append((priority, _get_size_class(entry["size"]), entry["queued"], entry))
+
+        selected = []
+
+        while len(selected) < max_jobs and len(candidates) > 0:
+            best = min(
+                range(0, len(candidates)),
+                key=lambda i: (
+                    -candidates[i][0],
+                    running.get(candidates[i][3]["user_guid"], 0),
+                    candidates[i][1],
+                    candidates[i][2],
+                ),
+            )
+
+            entry = candidates.pop(best)[3]
+            running[entry["user_guid"]] = running.get(entry["user_guid"], 0) + 1
+            selected.append(entry)
+
+        return selected
+
+    @staticmethod
+    def get_statistics(bucket, entries=None, claimed=None):
+        """Return statistics about the queue - the number of queued
+        jobs in total, per priority and per user, and the mean and
+        maximum time that queued jobs have waited (in seconds),
+        plus the number of jobs that have been claimed by the cluster
+        """
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+        from Acquire.ObjectStore import string_to_datetime as _string_to_datetime
+
+        if entries is None:
+            entries = JobScheduler.get_entries(bucket)
+
+        now = _get_datetime_now()
+
+        by_priority = {}
+        by_user = {}
+        waits = []
+
+        for entry in entries:
+            by_priority[entry["priority"]] = by_priority.get(entry["priority"], 0) + 1
+            by_user[str(entry["user_guid"])] = by_user.get(str(entry["user_guid"]), 0) + 1
+            waits.append((now - _string_to_datetime(entry["queued"])).total_seconds())
+
+        stats = {
+            "depth": len(entries),
+            "depth_by_priority": by_priority,
+            "depth_by_user": by_user,
+            "mean_wait_seconds": sum(waits) / len(waits) if len(waits) > 0 else 0,
+            "max_wait_seconds": max(waits) if len(waits) > 0 else 0,
+        }
+
+        if claimed is not None:
+            stats["claimed"] = claimed
+
+        return stats
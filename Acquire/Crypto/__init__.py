@@ -8,6 +8,7 @@ all cryptography in Acquire uses best practice
 
 from ._hash import *
 from ._keys import *
+from ._key_pool import *
 from ._otp import *
 from ._errors import *
 
@@ -0,0 +1,182 @@
+import os as _os
+import threading as _threading
+
+__all__ = ["set_key_pool_depth", "get_key_pool_depth", "start_key_pool", "clear_key_pool", "get_key_pool_metrics"]
+
+
+def _get_default_depth():
+    """Return the default depth of the key pool, which can be set
+    using the ACQUIRE_KEY_POOL_DEPTH environment variable
+    """
+    try:
+        return max(int(_os.getenv("ACQUIRE_KEY_POOL_DEPTH", 4)), 0)
+    except Exception:
+        return 4
+
+
+class _KeyPool:
+    """A pool of pre-generated RSA private keys. Keys are generated
+    by a background thread until there are 'depth' keys in the pool.
+    Taking a key wakes the thread to generate a replacement. If the
+    pool is empty then the caller generates its own key, and this
+    is recorded as an exhaustion of the pool. Taking a key does not
+    start the background thread - use 'start' for that
+    """
+
+    def __init__(self, depth):
+        self._depth = depth
+        self._keys = []
+        self._thread = None
+        self._lock = _threading.Lock()
+        self._cond = _threading.Condition(self._lock)
+        self._metrics = {"taken": 0, "exhausted": 0, "generated": 0}
+
+    def _run(self):
+        """Internal function run by the background thread that keeps
+        the pool full
+        """
+        from ._keys import _generate_private_key
+
+        while True:
+            with self._cond:
+                while len(self._keys) >= self._depth:
+                    self._cond.wait()
+
+            try:
+                key = _generate_private_key()
+            except Exception:
+                # don't spin if key generation is broken - the
+                # callers will generate (and fail) themselves
+                with self._cond:
+                    self._thread = None
+                return
+
+            with self._cond:
+                self._keys.append(key)
+                self._metrics["generated"] += 1
+
+    def start(self):
+        """Start the background thread (if it is not running)"""
+        with self._cond:
+            if self._depth <= 0:
+                return
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = _threading.Thread(target=self._run, name="KeyPool", daemon=True)
+                self._thread.start()
+
+            self._cond.notify_all()
+
+    def take(self):
+        """Return a key from the pool, or None if the pool is empty"""
+        with self._cond:
+            self._metrics["taken"] += 1
+
+            if len(self._keys) == 0:
+                self._metrics["exhausted"] += 1
+                return None
+
+            key = self._keys.pop(0)
+            self._cond.notify_all()
+
+        return key
+
+    def set_depth(self, depth):
+        """Set the number of keys to keep in the pool"""
+        with self._cond:
+            self._depth = max(int(depth), 0)
+            self._keys = self._keys[0 : self._depth]
+            self._cond.notify_all()
+
+    def depth(self):
+        """Return the number of keys to keep in the pool"""
+        return self._depth
+
+    def clear(self):
+        """Remove all keys from the pool and reset the metrics"""
+        with self._cond:
+            self._keys = []
+            self._metrics = {"taken": 0, "exhausted": 0, "generated": 0}
+            self._cond.notify_all()
+
+    def metrics(self):
+        """Return a copy of the metrics of the pool"""
+        with self._cond:
+            metrics = dict(self._metrics)
+            metrics["size"] = len(self._keys)
+            metrics["depth"] = self._depth
+
+        return metrics
+
+
+_key_pool = _KeyPool(_get_default_depth())
+
+
+def _reset_after_fork():
+    """A forked child must never hand out the same keys as its
+    parent, and does not inherit the background thread, so it
+    starts with a new, empty pool
+    """
+    global _key_pool
+    _key_pool = _KeyPool(_key_pool.depth())
+
+
+if hasattr(_os, "register_at_fork"):
+    _os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _take_pooled_key():
+    """Internal function that returns a raw private key from the
+    pool, or None if the pool is empty. The pool is started on the
+    first take in a service. It is never started implicitly in a
+    client process (e.g. the command line tools), which only
+    needs one or two keys per login and would otherwise spend CPU
+    generating keys that are thrown away when it exits
+    """
+    from Acquire.Service import is_running_service as _is_running_service
+
+    if _is_running_service():
+        _key_pool.start()
+
+    return _key_pool.take()
+
+
+def set_key_pool_depth(depth):
+    """Set the number of private keys that are pre-generated in the
+    background. Setting this to 0 disables the pool
+
+    Args:
+         depth (int): Number of keys to keep ready
+    Returns:
+         None
+    """
+    _key_pool.set_depth(depth)
+
+
+def get_key_pool_depth():
+    """Return the number of private keys that are pre-generated"""
+    return _key_pool.depth()
+
+
+def start_key_pool():
+    """Start generating keys for the pool in the background. This is
+    called automatically when a service takes its first key, but
+    can be called earlier (e.g. when warming up a service) so that
+    the first key does not have to wait. Client processes must call
+    this explicitly if they want to use the pool
+    """
+    _key_pool.start()
+
+
+def clear_key_pool():
+    """Remove all pre-generated keys and reset the pool metrics"""
+    _key_pool.clear()
+
+
+def get_key_pool_metrics():
+    """Return the metrics of the key pool, i.e. the number of keys
+    'taken', the number of times the pool was 'exhausted' (so the
+    caller had to generate its own key), the number of keys
+    'generated' in the background, and the current 'size' and 'depth'
+    """
+    return _key_pool.metrics()
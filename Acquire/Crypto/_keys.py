@@ -76,6 +76,27 @@ def _assert_strong_passphrase(passphrase, mangleFunction):
     return passphrase
 
 
+def _traced(name):
+    """Internal decorator that records each call of the decorated
+    function as a 'crypto' span in the current trace (if any)
+    """
+
+    def decorator(func):
+        import functools as _functools
+
+        @_functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            from Acquire.Service import trace_span as _trace_span
+
+            with _trace_span("crypto", name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@_traced("generate_private_key")
 def _generate_private_key():
     """Internal function that is used to generate all of our private keys"""
     return _rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=_default_backend())
@@ -101,7 +122,7 @@ def get_private_key(key="default"):
     if key in _key_database:
         return _key_database[key]
     else:
-        privkey = PrivateKey(name="global_key %s" % key)
+        privkey = PrivateKey.from_pool(name="global_key %s" % key)
         _key_database[key] = privkey
         return privkey
 
@@ -174,6 +195,7 @@ class PublicKey:
         # return this signature as "AA:BB:CC:DD:EE:etc."
         return ":".join([h[i : i + 2] for i in range(0, len(h), 2)])
 
+    @_traced("encrypt")
     def encrypt(self, message):
         """Encrypt and return the passed message. For short messages this
         will use the private key directly. For longer messages,
@@ -211,6 +233,7 @@ class PublicKey:
         # is the token, because we are using 2048 bit (256 byte) keys
         return encrypted_key + token
 
+    @_traced("verify")
     def verify(self, signature, message):
         """Verify that the message has been correctly signed"""
         if self._pubkey is None:
@@ -277,6 +300,22 @@ class PrivateKey:
             if auto_generate:
                 self._privkey = _generate_private_key()
 
+    @staticmethod
+    def from_pool(name=None):
+        """Return a new private key, taken from the pool of keys that
+        are pre-generated in the background. A key is generated
+        directly if the pool is empty. Use this on latency-sensitive
+        paths, such as registration and login
+        """
+        from ._key_pool import _take_pooled_key
+
+        privkey = _take_pooled_key()
+
+        if privkey is None:
+            return PrivateKey(name=name)
+
+        return PrivateKey(private_key=privkey, name=name)
+
     def __str__(self):
         """Return a string representation of this key"""
         return "PrivateKey( public_key='%s' )" % self.public_key().bytes().decode("utf-8")
@@ -418,6 +457,7 @@ class PrivateKey:
         """Verify the passed signature is correct for the passed message"""
         return self.public_key().verify(signature, message)
 
+    @_traced("decrypt")
     def decrypt(self, message):
         """Decrypt and return the passed message"""
         key_size = self.key_size_in_bytes()
@@ -480,6 +520,7 @@ class PrivateKey:
         except:
             return message
 
+    @_traced("sign")
     def sign(self, message):
         """Return the signature for the passed message"""
         if self._privkey is None:
@@ -11,8 +11,9 @@ import subprocess as _subprocess
 import datetime as _datetime
 import tarfile as _tarfile
 import tempfile as _tempfile
+import threading as _threading
 
-from ._objstore import ObjectStore as objstore
+from Acquire.ObjectStore import ObjectStore as _ObjectStore
 
 try:
     from watchdog.observers import Observer as _Observer
@@ -43,135 +44,280 @@ class MDRunError(Error):
     pass
 
 
-class _FileWatcher:
-    """This class is used to watch a specific file,
-    uploading chunks of the file to an object store
-    when the watcher is updated"""
+def _log(bucket, message):
+    """Write 'message' to the log of the simulation in 'bucket'"""
+    from Acquire.ObjectStore import get_datetime_now_to_string as _get_datetime_now_to_string
+    from Acquire.ObjectStore import create_uuid as _create_uuid
+
+    _ObjectStore.set_string_object(
+        bucket, "log/%s/%s" % (_get_datetime_now_to_string(), _create_uuid(short_uid=True)), str(message)
+    )
+
+
+def _clear_log(bucket):
+    """Clear the log of the simulation in 'bucket'"""
+    _ObjectStore.delete_all_objects(bucket, prefix="log/")
+
+
+class _RingBuffer:
+    """A fixed-size circular buffer of bytes. Data is written to
+    the tail and read from the head. This is not thread-safe, so
+    must be protected by the caller's lock
+    """
+
+    def __init__(self, capacity):
+        self._data = bytearray(int(capacity))
+        self._head = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def capacity(self):
+        """Return the maximum number of bytes that can be held"""
+        return len(self._data)
+
+    def free(self):
+        """Return the number of bytes that can be written before
+        the buffer is full
+        """
+        return len(self._data) - self._size
+
+    def write(self, data):
+        """Write as much of 'data' as will fit into the buffer,
+        returning the number of bytes that were written
+        """
+        n = min(len(data), self.free())
+        capacity = len(self._data)
+        tail = (self._head + self._size) % capacity
+
+        first = min(n, capacity - tail)
+        self._data[tail : tail + first] = data[0:first]
+        self._data[0 : n - first] = data[first:n]
+
+        self._size += n
+        return n
+
+    def read(self, n):
+        """Remove and return up to 'n' bytes from the head of the buffer"""
+        n = min(int(n), self._size)
+        capacity = len(self._data)
+
+        first = min(n, capacity - self._head)
+        data = bytes(self._data[self._head : self._head + first]) + bytes(self._data[0 : n - first])
 
-    def __init__(self, filename, bucket, rootkey, sizetrigger, timetrigger):
+        self._head = (self._head + n) % capacity
+        self._size -= n
+        return data
+
+
+class _FileWatcher:
+    """This class is used to watch a specific file, streaming
+    the data written to the file to a Drive via a ChunkUploader.
+    Data is read from the file into a bounded ring buffer, and is
+    uploaded by a background thread whenever more than 'sizetrigger'
+    bytes are buffered, or 'timetrigger' seconds have passed since
+    the last upload. If the buffer fills up (because the upload
+    can't keep up) then reading from the file blocks until space
+    is freed, so memory use is bounded by 'buffersize'
+    """
+
+    def __init__(self, filename, drive, directory=None, sizetrigger=8 * 1024 * 1024, timetrigger=5, buffersize=None):
         self._filename = filename
-        self._bucket = bucket
-        self._rootkey = rootkey
+        self._drive = drive
+        self._directory = directory
         self._handle = None
-        self._key = None
-        self._buffer = None
+        self._uploader = None
+        self._thread = None
+        self._error = None
+        self._flush = False
+        self._closing = False
         self._last_upload_time = _datetime.datetime.now()
-        self._next_chunk = 0
-        self._chunksize = 8192
-        self._uploadsize = int(sizetrigger)
-        self._upload_timeout = int(timetrigger)
-
-    def _uploadBuffer(self):
-        """Internal function that uploads the current buffer to
-        a new chunk in the object store"""
-        if self._buffer is None:
-            return
-        elif len(self._buffer) == 0:
-            # nothing to upload
-            return
+        self._chunksize = 64 * 1024
+        self._uploadsize = max(int(sizetrigger), 1)
+        self._upload_timeout = float(timetrigger)
 
-        self._next_chunk += 1
-        self._last_upload_time = _datetime.datetime.now()
+        if buffersize is None:
+            buffersize = 4 * self._uploadsize
 
-        objstore.log(
-            self._bucket,
-            "Upload %s chunk (%f KB) to %s/%s"
-            % (self._filename, float(len(self._buffer)) / 1024.0, self._key, self._next_chunk),
-        )
+        self._buffer = _RingBuffer(max(int(buffersize), self._uploadsize))
+        self._lock = _threading.Lock()
+        self._cond = _threading.Condition(self._lock)
+
+    def _raise_error(self):
+        """Internal function that re-raises any error from the
+        upload thread in the calling thread
+        """
+        if self._error is not None:
+            raise Error("Failed to upload %s: %s" % (self._filename, self._error))
 
-        objstore.set_object(self._bucket, "%s/%d" % (self._key, self._next_chunk), self._buffer)
+    def _open(self):
+        """Internal function that opens the file and the uploader,
+        and starts the upload thread
+        """
+        self._handle = open(self._filename, "rb")
+        self._uploader = self._drive.chunk_upload(_os.path.basename(self._filename), directory=self._directory)
 
-        self._buffer = None
+        self._thread = _threading.Thread(target=self._run_uploads, daemon=True)
+        self._thread.start()
 
-    def finishUploads(self):
-        """Finalise the uploads"""
-        self._uploadBuffer()
+    def _should_upload(self):
+        """Internal function called with the lock held that returns
+        whether or not the buffer should be uploaded now
+        """
+        size = len(self._buffer)
+
+        if size == 0:
+            return False
+        elif size >= self._uploadsize or self._flush or self._closing:
+            return True
+        elif self._buffer.free() == 0:
+            return True
+
+        elapsed = (_datetime.datetime.now() - self._last_upload_time).total_seconds()
+
+        return elapsed >= self._upload_timeout
+
+    def _run_uploads(self):
+        """Internal function run by the background thread that
+        uploads the buffer when triggered
+        """
+        while True:
+            with self._cond:
+                while not self._should_upload():
+                    if self._closing or self._error is not None:
+                        return
+
+                    if len(self._buffer) == 0:
+                        self._flush = False
+                        self._cond.wait()
+                    else:
+                        elapsed = (_datetime.datetime.now() - self._last_upload_time).total_seconds()
+                        self._cond.wait(max(self._upload_timeout - elapsed, 0.01))
+
+                chunk = self._buffer.read(self._uploadsize)
+                self._last_upload_time = _datetime.datetime.now()
+
+                # there is now space in the buffer for the reader
+                self._cond.notify_all()
+
+            try:
+                self._uploader.upload(chunk)
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                if len(self._buffer) == 0:
+                    self._flush = False
+                    # wake anyone waiting for the flush to complete
+                    self._cond.notify_all()
+
+    def _write(self, data):
+        """Internal function that writes 'data' to the buffer,
+        blocking while the buffer is full
+        """
+        while len(data) > 0:
+            with self._cond:
+                while self._buffer.free() == 0 and self._error is None:
+                    self._cond.notify_all()
+                    self._cond.wait()
+
+                self._raise_error()
+
+                n = self._buffer.write(data)
+
+                if len(self._buffer) >= self._uploadsize:
+                    self._cond.notify_all()
+
+            data = data[n:]
 
     def update(self, force_upload=False):
-        """Called whenever the file changes"""
-        if not self._key:
-            # the file hasn't been opened or uploaded yet - create
-            # key for this file, open the file and read as much as
-            # possible into a buffer, ready for upload
-            if self._rootkey:
-                self._key = "%s/%s" % (self._rootkey, self._filename)
-            else:
-                self._key = self._filename
-
-            # open the file and connect to the filehandle
-            self._handle = open(self._filename, "rb")
-
-        # read in the next chunk of the file
+        """Called whenever the file changes. This reads everything
+        new in the file into the buffer. If 'force_upload' is True
+        then this waits until everything read has been uploaded
+        """
+        self._raise_error()
+
+        if self._handle is None:
+            self._open()
+
         while True:
             chunk = self._handle.read(self._chunksize)
 
-            if chunk:
-                if not self._buffer:
-                    self._buffer = chunk
-                else:
-                    self._buffer += chunk
-
-                if len(self._buffer) > self._uploadsize:
-                    self._uploadBuffer()
-            else:
-                # nothing more to read
+            if not chunk:
                 break
 
-        # we have read in everything that has been produced - should
-        # we upload it? Only upload if more than 5 seconds have passed
-        # since the last update
-        if force_upload:
-            try:
-                bufsize = len(self._buffer)
-            except:
-                bufsize = 0
+            self._write(chunk)
+
+        with self._cond:
+            if force_upload:
+                self._flush = True
+                self._cond.notify_all()
+
+                while len(self._buffer) > 0 and self._flush and self._error is None:
+                    self._cond.wait()
+
+            self._raise_error()
+
+            self._cond.notify_all()
 
-            if bufsize > 0:
-                objstore.log(self._bucket, "Uploading last of %s (%d bytes)" % (self._filename, 0))
+    def finishUploads(self):
+        """Finalise the uploads - this uploads the rest of the file,
+        stops the upload thread and closes the uploader
+        """
+        if self._handle is None:
+            return
+
+        try:
+            self.update(force_upload=True)
+        finally:
+            with self._cond:
+                self._closing = True
+                self._cond.notify_all()
 
-                self._uploadBuffer()
+            self._thread.join()
+            self._handle.close()
+            self._handle = None
 
-        elif (_datetime.datetime.now() - self._last_upload_time).seconds > self._upload_timeout:
-            self._uploadBuffer()
+        self._raise_error()
+        self._uploader.close()
 
 
 if _have_watchdog:
 
-    class _PosixToObjstoreEventHandler(_FileSystemEventHandler):
+    class _PosixToDriveEventHandler(_FileSystemEventHandler):
         """This class responds to events in the filesystem.
         The aim is to detect as files are created and modified,
-        and to stream this data up to the object store while
+        and to stream this data up to a Drive while
         the simulation is in progress. This is called in
         a background thread by watchdog"""
 
-        def __init__(self, bucket, rootkey=None, sizetrigger=8 * 1024 * 1024, timetrigger=5):
+        def __init__(self, drive, directory=None, sizetrigger=8 * 1024 * 1024, timetrigger=5, buffersize=None):
             _FileSystemEventHandler.__init__(self)
-            self._bucket = bucket
-            self._rootkey = rootkey
+            self._drive = drive
+            self._directory = directory
             self._sizetrigger = int(sizetrigger)
-            self._timetrigger = int(timetrigger)
+            self._timetrigger = float(timetrigger)
+            self._buffersize = buffersize
             self._files = {}
 
         def chunkSizeTrigger(self):
             """Return the size of buffer that will trigger a write to
-            the object store"""
+            the Drive"""
             return self._sizetrigger
 
         def chunkTimeTrigger(self):
             """Return the amount of time between writes that will trigger
-            a write to the object store"""
+            a write to the Drive"""
             return self._timetrigger
 
-        def finishUploads(self):
-            """Call this to complete all of the uploads"""
-            for f in self._files:
-                self._files[f].finishUploads()
-
         def on_any_event(self, event):
             """This function is called on any filesystem event. If locates
             the changed file and reads the file into a buffer. This is
-            uploaded to the object store if one of two conditions are
-            met:
+            uploaded to the Drive if one of two conditions are met:
              1. The amount of data written exceeds self.chunkSizeTrigger()
              2. More than self.chunkTimeTrigger() seconds has passsed
             """
@@ -186,10 +332,11 @@ if _have_watchdog:
             if not filename in self._files:
                 self._files[filename] = _FileWatcher(
                     filename,
-                    bucket=self._bucket,
-                    rootkey=self._rootkey,
+                    drive=self._drive,
+                    directory=self._directory,
                     sizetrigger=self.chunkSizeTrigger(),
                     timetrigger=self.chunkTimeTrigger(),
+                    buffersize=self._buffersize,
                 )
 
             self._files[filename].update()
@@ -197,40 +344,39 @@ if _have_watchdog:
         def finaliseUploads(self):
             """Ensure that the last parts of any files are uploaded
             before this observer exits"""
-            objstore.log(self._bucket, "Finalising upload...")
-
             for filename in self._files:
-                self._files[filename].update(True)
-
-            self.finishUploads()
+                self._files[filename].finishUploads()
 
 
 else:
 
-    class _PosixToObjstoreEventHandler:
-        def __init__(self, **kwargs):
+    class _PosixToDriveEventHandler:
+        def __init__(self, *args, **kwargs):
             raise Error("Cannot follow files without watchdog!")
 
 
 class GromacsRunner:
     @staticmethod
-    def run(bucket):
+    def run(bucket, drive=None, sizetrigger=8 * 1024 * 1024, timetrigger=5, buffersize=None):
         """Run the gromacs simulation whose input is contained
         in the passed bucket. Read the input from /input,
-        write a log to /log and write the output to /output
+        write a log to /log and write the output to /output.
+        If 'drive' is passed then the trajectory and log files are
+        streamed to the 'interim' directory of that Drive while
+        mdrun is running, so that long simulations can be monitored
         """
 
         # path to the gromacs executables
         gmx = "/usr/local/gromacs/bin/gmx"
 
         # Clear the log for this simulation
-        objstore.clear_log(bucket)
+        _clear_log(bucket)
 
         # create a log function for logging messages to this bucket
-        log = lambda message: objstore.log(bucket, message)
+        log = lambda message: _log(bucket, message)
 
         # create a set_status function for setting the simulation status
-        set_status = lambda status: objstore.set_string_object(bucket, "status", status)
+        set_status = lambda status: _ObjectStore.set_string_object(bucket, "status", status)
 
         set_status("Loading...")
 
@@ -243,7 +389,7 @@ class GromacsRunner:
         log("Running a gromacs simulation in %s" % tmpdir)
 
         # get the value of the input key
-        input_tar_bz2 = objstore.get_object_as_file(bucket, "input.tar.bz2", "/%s/input.tar.bz2" % tmpdir)
+        input_tar_bz2 = _ObjectStore.get_object_as_file(bucket, "input.tar.bz2", "/%s/input.tar.bz2" % tmpdir)
 
         # now unpack this file
         with _tarfile.open(input_tar_bz2, "r:bz2") as tar:
@@ -279,8 +425,8 @@ class GromacsRunner:
         log("gmx grompp completed. Return code == %s" % status.returncode)
 
         # Upload the grompp output to the object store
-        objstore.set_object_from_file(bucket, "output/grompp.out", "grompp.out")
-        objstore.set_object_from_file(bucket, "output/grompp.err", "grompp.err")
+        _ObjectStore.set_object_from_file(bucket, "output/grompp.out", "grompp.out")
+        _ObjectStore.set_object_from_file(bucket, "output/grompp.err", "grompp.err")
 
         if status.returncode != 0:
             raise GromppError("Grompp failed to run: Error code = %s" % status.returncode)
@@ -295,9 +441,13 @@ class GromacsRunner:
         set_status("Running...")
 
         # Start a watchdog process to look for new files
-        if _have_watchdog:
+        streaming = _have_watchdog and drive is not None
+
+        if streaming:
             observer = _Observer()
-            event_handler = _PosixToObjstoreEventHandler(bucket, rootkey="interim", timetrigger=1)
+            event_handler = _PosixToDriveEventHandler(
+                drive, directory="interim", sizetrigger=sizetrigger, timetrigger=timetrigger, buffersize=buffersize
+            )
 
             observer.schedule(event_handler, ".", recursive=False)
 
@@ -313,7 +463,7 @@ class GromacsRunner:
 
         log("Gromacs has finished. Waiting for filesystem observer...")
 
-        if _have_watchdog:
+        if streaming:
             # stop monitoring for events
             observer.stop()
             observer.join()
@@ -325,14 +475,14 @@ class GromacsRunner:
 
         # Upload all of the output files to the output directory
         log("Uploading mdrun.stdout")
-        objstore.set_object_from_file(bucket, "output/mdrun.stdout", "mdrun.stdout")
+        _ObjectStore.set_object_from_file(bucket, "output/mdrun.stdout", "mdrun.stdout")
         log("Uploading mdrun.stderr")
-        objstore.set_object_from_file(bucket, "output/mdrun.stderr", "mdrun.stderr")
+        _ObjectStore.set_object_from_file(bucket, "output/mdrun.stderr", "mdrun.stderr")
 
         for filename in _glob.glob("run.*"):
             if not filename.endswith("tpr"):
                 log("Uploading %s" % filename)
-                objstore.set_object_from_file(bucket, "output/%s" % filename, filename)
+                _ObjectStore.set_object_from_file(bucket, "output/%s" % filename, filename)
 
         log("Simulation and data upload complete.")
 
@@ -75,6 +75,78 @@ def _min(a, b):
         return b
 
 
+# ACLRules are compiled into integer bitmasks. The low four bits hold
+# the value of each permission, and the next four bits say whether or
+# not that permission is set (i.e. is not inherited). The value bit of
+# an inherited permission is always zero
+_OWNER = 1
+_EXECUTABLE = 2
+_WRITEABLE = 4
+_READABLE = 8
+_ALL = 15
+_SET_SHIFT = 4
+_FULLY_RESOLVED = _ALL << _SET_SHIFT
+
+
+def _mask_max(a, b):
+    """Most-permissive addition of two masks (same as _max)"""
+    return a | b
+
+
+def _mask_sub(a, b):
+    """Subtraction of two masks (same as _sub)"""
+    b_true = b & _ALL
+    return (((a >> _SET_SHIFT) | b_true) << _SET_SHIFT) | (a & _ALL & ~b_true)
+
+
+def _mask_min(a, b):
+    """Least-permissive addition of two masks (same as _min)"""
+    a_set = a >> _SET_SHIFT
+    b_set = b >> _SET_SHIFT
+    is_set = a_set | b_set
+    value = ((a & _ALL) | (~a_set & _ALL)) & ((b & _ALL) | (~b_set & _ALL)) & is_set
+    return (is_set << _SET_SHIFT) | value
+
+
+def _mask_force_resolve(mask, unresolved=False):
+    """Return 'mask' with every unset permission set to 'unresolved'"""
+    if unresolved:
+        return _FULLY_RESOLVED | (mask & _ALL) | (~(mask >> _SET_SHIFT) & _ALL)
+    else:
+        return _FULLY_RESOLVED | (mask & _ALL)
+
+
+def _mask_inherit(mask, upstream):
+    """Return 'mask' with every unset permission taken from 'upstream'"""
+    unset = ~(mask >> _SET_SHIFT) & _ALL
+    is_set = (mask >> _SET_SHIFT) | ((upstream >> _SET_SHIFT) & unset)
+    return (is_set << _SET_SHIFT) | (mask & _ALL) | (upstream & unset)
+
+
+def _mask_resolve(mask, must_resolve=True, upstream=None, unresolved=False):
+    """Resolve 'mask' against the 'upstream' mask. This is the
+    bitmask version of ACLRule.resolve
+    """
+    if (mask & _FULLY_RESOLVED) == _FULLY_RESOLVED:
+        return mask
+
+    if upstream is None:
+        if must_resolve:
+            return _mask_force_resolve(mask, unresolved)
+        else:
+            return mask
+
+    if must_resolve and (upstream & _FULLY_RESOLVED) != _FULLY_RESOLVED:
+        upstream = _mask_force_resolve(upstream, unresolved)
+
+    mask = _mask_inherit(mask, upstream)
+
+    if must_resolve:
+        mask = _mask_force_resolve(mask, unresolved)
+
+    return mask
+
+
 class ACLRule:
     """This class holds the access control list (ACL) rule for
     a particular user accessing a particular resource
@@ -225,6 +297,49 @@ class ACLRule:
         """Return the ACL rule that means 'inherit permissions from parent'"""
         return ACLRule(is_owner=None, is_readable=None, is_writeable=None, is_executable=None)
 
+    def _compile(self):
+        """Return the compiled form of this rule, which is its bitmask"""
+        return self._to_mask()
+
+    def _to_mask(self):
+        """Return the bitmask representation of this rule"""
+        mask = 0
+
+        for (value, bit) in (
+            (self._is_owner, _OWNER),
+            (self._is_executable, _EXECUTABLE),
+            (self._is_writeable, _WRITEABLE),
+            (self._is_readable, _READABLE),
+        ):
+            if value is not None:
+                mask |= bit << _SET_SHIFT
+
+                if value:
+                    mask |= bit
+
+        return mask
+
+    @staticmethod
+    def _from_mask(mask):
+        """Return the rule represented by the passed bitmask"""
+        rule = ACLRule()
+
+        is_set = mask >> _SET_SHIFT
+
+        if is_set & _OWNER:
+            rule._is_owner = (mask & _OWNER) != 0
+
+        if is_set & _EXECUTABLE:
+            rule._is_executable = (mask & _EXECUTABLE) != 0
+
+        if is_set & _WRITEABLE:
+            rule._is_writeable = (mask & _WRITEABLE) != 0
+
+        if is_set & _READABLE:
+            rule._is_readable = (mask & _READABLE) != 0
+
+        return rule
+
     def fingerprint(self):
         """A fingerprint that can be used to validate a request"""
         return "%d.%d.%d.%d" % (self._is_owner, self._is_executable, self._is_writeable, self._is_readable)
@@ -383,6 +498,15 @@ class ACLRule:
 
         return result
 
+    def _changed(self):
+        """Internal function called when this rule is changed, so that
+        the cached compiled forms of any rule sets that contain it
+        are rebuilt
+        """
+        from Acquire.Identity._aclrules import _rules_changed
+
+        _rules_changed()
+
     def set_owner(self, is_owner=True):
         """Set the user as an owner of the bucket"""
         if is_owner:
@@ -390,6 +514,8 @@ class ACLRule:
         else:
             self._is_owner = False
 
+        self._changed()
+
     def set_readable(self, is_readable=True):
         """Set the readable rule to 'is_readable'"""
         if is_readable:
@@ -397,6 +523,8 @@ class ACLRule:
         else:
             self._is_readable = False
 
+        self._changed()
+
     def set_writeable(self, is_writeable=True):
         """Set the writeable rule to 'is_writeable'"""
         if is_writeable:
@@ -404,18 +532,26 @@ class ACLRule:
         else:
             self._is_writeable = False
 
+        self._changed()
+
     def set_inherits_owner(self):
         """Set that this ACL inherits ownership from its parent"""
         self._is_owner = None
 
+        self._changed()
+
     def set_inherits_readable(self):
         """Set that this ACL inherits readable from its parent"""
         self._is_readable = None
 
+        self._changed()
+
     def set_inherits_writeable(self):
         """Set that this ACL inherits writeable from its parent"""
         self._is_writeable = None
 
+        self._changed()
+
     def set_readable_writeable(self, is_readable_writeable=True):
         """Set both the readable and writeable rules to
         'is_readable_writeable'
@@ -427,6 +563,8 @@ class ACLRule:
             self._is_readable = False
             self._is_writeable = False
 
+        self._changed()
+
     def to_data(self):
         """Return this object converted to a json-serialisable object"""
         if self.inherits_all():
@@ -1,6 +1,91 @@
+import itertools as _itertools
+import threading as _threading
 from enum import Enum as _Enum
 
-__all__ = ["ACLRules", "ACLUserRules", "ACLGroupRules", "ACLRuleOperation"]
+from cachetools import LRUCache as _LRUCache
+
+__all__ = ["ACLRules", "ACLUserRules", "ACLGroupRules", "ACLRuleOperation", "clear_acl_cache"]
+
+# Memo of resolved ACLs, indexed by (compiled rules token, user GUIDs,
+# group GUIDs, upstream mask, must_resolve, unresolved). Rules are
+# compiled into nested tuples of bitmasks, and each distinct compiled
+# form is given a small integer token, so equal rules loaded for
+# different files or drives share the same entries
+_acl_cache = _LRUCache(maxsize=4096)
+_acl_tokens = _LRUCache(maxsize=4096)
+_acl_token_counter = _itertools.count()
+_acl_cache_lock = _threading.Lock()
+
+# Incremented whenever any rule is changed. The compiled form of each
+# rule set is cached on the object until this changes, as a change to
+# a rule is also a change to every rule set that contains it
+_acl_generation = 0
+
+
+def clear_acl_cache():
+    """Call to clear the cache of resolved ACLs"""
+    global _acl_generation
+
+    with _acl_cache_lock:
+        _acl_cache.clear()
+        _acl_tokens.clear()
+        _acl_generation += 1
+
+
+def _rules_changed(rules=None):
+    """Internal function called whenever a rule is changed, so that the
+    cached compiled forms of all rule sets are rebuilt. This is only
+    needed for a changed rule set ('rules') if it has been compiled,
+    either on its own or as part of another rule set, as otherwise
+    it can't be part of any cached compiled form
+    """
+    global _acl_generation
+
+    if rules is None or "_compiled" in rules.__dict__:
+        _acl_generation += 1
+
+
+# Maximum number of resolved ACLs memoised on each rule set, in front
+# of the shared cache of resolved ACLs
+_MAX_MEMO_SIZE = 64
+
+
+def _get_compiled(rules):
+    """Return the compiled form of the passed rule set, together with
+    its token and the memo of ACLs resolved from it. These are cached
+    on the rule set until any rule is changed
+    """
+    try:
+        (generation, compiled, token, memo) = rules._compiled
+    except AttributeError:
+        generation = None
+
+    if generation == _acl_generation:
+        return (compiled, token, memo)
+
+    generation = _acl_generation
+    compiled = rules._compile()
+
+    with _acl_cache_lock:
+        token = _acl_tokens.get(compiled)
+
+        if token is None:
+            token = next(_acl_token_counter)
+            _acl_tokens[compiled] = token
+
+    memo = {}
+    rules._compiled = (generation, compiled, token, memo)
+
+    return (compiled, token, memo)
+
+
+def _get_state(rules):
+    """Return the state of the passed rule set used to compare it
+    for equality, which excludes the cached compiled form
+    """
+    state = dict(rules.__dict__)
+    state.pop("_compiled", None)
+    return state
 
 
 class ACLRuleOperation(_Enum):
@@ -35,11 +120,209 @@ class ACLRuleOperation(_Enum):
         else:
             return None
 
+    def _combine_masks(self, mask1, mask2):
+        """Combine two rule bitmasks (same as 'combine')"""
+        from Acquire.Identity._aclrule import _mask_max, _mask_min, _mask_sub
+
+        if self is ACLRuleOperation.SET:
+            return mask1
+        elif self is ACLRuleOperation.MAX:
+            return _mask_max(mask1, mask2)
+        elif self is ACLRuleOperation.MIN:
+            return _mask_min(mask1, mask2)
+        elif self is ACLRuleOperation.SUB:
+            return _mask_sub(mask1, mask2)
+        else:
+            return None
+
     @staticmethod
     def from_data(data):
         return ACLRuleOperation(data)
 
 
+def _compile_rule(rule):
+    """Return the compiled (hashable) form of the passed rule. An
+    ACLRule compiles to its bitmask, while the rule sets compile to
+    tuples of their compiled parts
+    """
+    from Acquire.Identity import ACLRule as _ACLRule
+
+    if isinstance(rule, _ACLRule):
+        return rule._compile()
+    else:
+        return _get_compiled(rule)[0]
+
+
+def _get_guids(identifiers, guids_key, guid_key):
+    """Return the tuple of GUIDs in 'identifiers' under 'guids_key'
+    and 'guid_key' (e.g. 'user_guids' and 'user_guid')
+    """
+    if identifiers is None:
+        return ()
+
+    guids = identifiers.get(guids_key)
+    guid = identifiers.get(guid_key)
+
+    if guids is None:
+        guids = ()
+    else:
+        guids = tuple(guids)
+
+    if guid is not None:
+        guids += (guid,)
+
+    return guids
+
+
+def _get_upstream_mask(upstream, identifiers):
+    """Return the bitmask of the passed upstream rule (or None)"""
+    if upstream is None:
+        return None
+
+    from Acquire.Identity import ACLRule as _ACLRule
+
+    if isinstance(upstream, _ACLRule):
+        return upstream._to_mask()
+
+    return upstream._resolve_mask(must_resolve=False, identifiers=identifiers)
+
+
+def _evaluate_guid_rules(compiled, guids, user_guids, group_guids, upstream, unresolved):
+    """Evaluate the compiled user or group rules, returning the
+    most-permissive combination of the rules of all matching GUIDs,
+    or None if no GUIDs match
+    """
+    from Acquire.Identity._aclrule import _mask_max
+
+    rules = compiled[1]
+    resolved = None
+
+    for guid in guids:
+        for (rule_guid, rule) in rules:
+            if rule_guid == guid:
+                if not isinstance(rule, int):
+                    rule = _evaluate(rule, user_guids, group_guids, upstream, False, unresolved)
+
+                if rule is None:
+                    pass
+                elif resolved is None:
+                    resolved = rule
+                else:
+                    resolved = _mask_max(resolved, rule)
+
+                break
+
+    return resolved
+
+
+def _evaluate(compiled, user_guids, group_guids, upstream, must_resolve, unresolved):
+    """Evaluate the compiled rules for the passed user and group GUIDs
+    and upstream mask, returning the resolved bitmask (or None if
+    user or group rules do not match)
+    """
+    from Acquire.Identity._aclrule import _mask_resolve, _mask_force_resolve, _FULLY_RESOLVED
+
+    if isinstance(compiled, int):
+        return _mask_resolve(compiled, must_resolve=must_resolve, upstream=upstream, unresolved=unresolved)
+
+    kind = compiled[0]
+
+    if kind == "user":
+        resolved = _evaluate_guid_rules(compiled, user_guids, user_guids, group_guids, upstream, unresolved)
+    elif kind == "group":
+        resolved = _evaluate_guid_rules(compiled, group_guids, user_guids, group_guids, upstream, unresolved)
+    elif kind == "inherit":
+        return _mask_resolve(0, must_resolve=must_resolve, upstream=upstream, unresolved=unresolved)
+    else:
+        (_kind, default_operation, rules, default_rule) = compiled
+
+        result = None
+        must_break = False
+
+        for (op, rule) in rules:
+            if op is None:
+                op = default_operation
+
+            rule = _evaluate(rule, user_guids, group_guids, upstream, False, unresolved)
+
+            if rule is not None:
+                if op is ACLRuleOperation.SET:
+                    # take the first matching rule
+                    result = rule
+                    must_break = True
+                    break
+                elif result is None:
+                    result = rule
+                else:
+                    result = op._combine_masks(result, rule)
+
+        if (not must_break) and (default_rule is not None):
+            rule = _evaluate(default_rule, user_guids, group_guids, upstream, False, unresolved)
+
+            if result is None:
+                result = rule
+            elif rule is not None:
+                result = default_operation._combine_masks(result, rule)
+
+        if result is None:
+            # nothing matched, so access is denied
+            return _FULLY_RESOLVED
+
+        if (result & _FULLY_RESOLVED) != _FULLY_RESOLVED:
+            result = _mask_resolve(result, must_resolve=True, upstream=upstream, unresolved=unresolved)
+
+        return result
+
+    if resolved is None and must_resolve:
+        return _mask_resolve(0, must_resolve=True, upstream=upstream, unresolved=unresolved)
+
+    return resolved
+
+
+def _resolve_mask(rules, must_resolve, identifiers, upstream, unresolved):
+    """Return the resolved bitmask of the passed rule set, using the
+    memo on the rule set and then the shared cache of resolved ACLs
+    """
+    (compiled, token, memo) = _get_compiled(rules)
+    user_guids = _get_guids(identifiers, "user_guids", "user_guid")
+    group_guids = _get_guids(identifiers, "group_guids", "group_guid")
+    must_resolve = bool(must_resolve)
+    unresolved = bool(unresolved)
+
+    key = (user_guids, group_guids, upstream, must_resolve, unresolved)
+
+    try:
+        return memo[key]
+    except KeyError:
+        pass
+
+    try:
+        with _acl_cache_lock:
+            mask = _acl_cache[(token,) + key]
+    except KeyError:
+        mask = _evaluate(compiled, user_guids, group_guids, upstream, must_resolve, unresolved)
+
+        with _acl_cache_lock:
+            _acl_cache[(token,) + key] = mask
+
+    if len(memo) >= _MAX_MEMO_SIZE:
+        memo.clear()
+
+    memo[key] = mask
+
+    return mask
+
+
+def _to_rule(mask):
+    """Return the ACLRule for the passed mask, or None"""
+    if mask is None:
+        return None
+
+    from Acquire.Identity import ACLRule as _ACLRule
+
+    return _ACLRule._from_mask(mask)
+
+
 def _save_rule(rule):
     """Return a json-serialisable object for the passed rule"""
     return [rule.__class__.__name__, rule.to_data()]
@@ -78,7 +361,7 @@ class ACLGroupRules:
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return _get_state(self) == _get_state(other)
         else:
             return False
 
@@ -91,51 +374,30 @@ class ACLGroupRules:
     def __repr__(self):
         return self.__str__()
 
+    def _compile(self):
+        """Return the compiled (hashable) form of these rules"""
+        return ("group", tuple((guid, _compile_rule(rule)) for (guid, rule) in self._group_rules.items()))
+
     def resolve(self, identifiers=None, must_resolve=True, upstream=None, unresolved=False):
         """Resolve the rule for the user with specified group_guid.
         This returns None if there are no rules for this group
         """
-        try:
-            group_guids = identifiers["group_guids"]
-        except:
-            group_guids = []
-
-        try:
-            group_guids.append(identifiers["group_guid"])
-        except:
-            pass
-
-        resolved = None
-
-        for group_guid in group_guids:
-            if group_guid in self._group_rules:
-                rule = self._group_rules[group_guid]
-                rule.resolve(
-                    must_resolve=must_resolve,
-                    identifers=identifiers,
-                    upstream=upstream,
-                    unresolved=unresolved,
-                )
-                if resolved is None:
-                    resolved = rule
-                else:
-                    resolved = resolved + rule
-
-        if resolved is None:
-            if must_resolve:
-                from Acquire.Identity import ACLRule as _ACLRule
-
-                return _ACLRule.inherit().resolve(
-                    must_resolve=True, identifiers=identifiers, upstream=upstream, unresolved=unresolved
-                )
-            else:
-                return None
-        else:
-            return resolved
+        upstream = _get_upstream_mask(upstream, identifiers)
+
+        return _to_rule(
+            _resolve_mask(
+                self,
+                must_resolve=must_resolve,
+                identifiers=identifiers,
+                upstream=upstream,
+                unresolved=unresolved,
+            )
+        )
 
     def add_group_rule(self, group_guid, rule):
         """Add a rule for the used with passed 'group_guid'"""
         self._group_rules[group_guid] = rule
+        _rules_changed(self)
         return self
 
     def add(self, group_guid, rule):
@@ -175,7 +437,7 @@ class ACLUserRules:
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return _get_state(self) == _get_state(other)
         else:
             return False
 
@@ -188,51 +450,30 @@ class ACLUserRules:
     def __repr__(self):
         return self.__str__()
 
+    def _compile(self):
+        """Return the compiled (hashable) form of these rules"""
+        return ("user", tuple((guid, _compile_rule(rule)) for (guid, rule) in self._user_rules.items()))
+
     def resolve(self, must_resolve=True, identifiers=None, upstream=None, unresolved=False):
         """Resolve the rule for the user with specified user_guid.
         This returns None if there are no rules for this user
         """
-        try:
-            user_guids = identifiers["user_guids"]
-        except:
-            user_guids = []
-
-        try:
-            user_guids.append(identifiers["user_guid"])
-        except:
-            pass
-
-        resolved = None
-
-        for user_guid in user_guids:
-            if user_guid in self._user_rules:
-                rule = self._user_rules[user_guid]
-                rule.resolve(
-                    must_resolve=must_resolve,
-                    identifiers=identifiers,
-                    upstream=upstream,
-                    unresolved=unresolved,
-                )
-                if resolved is None:
-                    resolved = rule
-                else:
-                    resolved = resolved + rule
-
-        if resolved is None:
-            if must_resolve:
-                from Acquire.Identity import ACLRule as _ACLRule
-
-                return _ACLRule.inherit().resolve(
-                    must_resolve=True, identifiers=identifiers, upstream=upstream, unresolved=unresolved
-                )
-            else:
-                return None
-        else:
-            return resolved
+        upstream = _get_upstream_mask(upstream, identifiers)
+
+        return _to_rule(
+            _resolve_mask(
+                self,
+                must_resolve=must_resolve,
+                identifiers=identifiers,
+                upstream=upstream,
+                unresolved=unresolved,
+            )
+        )
 
     def add_user_rule(self, user_guid, rule):
         """Add a rule for the used with passed 'user_guid'"""
         self._user_rules[user_guid] = rule
+        _rules_changed(self)
         return self
 
     def add(self, user_guid, rule):
@@ -360,7 +601,7 @@ class ACLRules:
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return _get_state(self) == _get_state(other)
         else:
             return False
 
@@ -524,6 +765,7 @@ class ACLRules:
             raise TypeError("The default operation must be type ACLRuleOperation")
 
         self._default_operation = default_operation
+        _rules_changed(self)
 
     def set_default_rule(self, aclrule):
         """Set the default rule if nothing else matches (optionally
@@ -540,6 +782,8 @@ class ACLRules:
         else:
             self._default_rule = aclrule
 
+        _rules_changed(self)
+
     def append(self, aclrule, operation=None, ensure_owner=False):
         """Append a rule onto the set of rules. This will resolve any
         conflicts in the rules. If 'ensure_owner' is True, then
@@ -590,6 +834,8 @@ class ACLRules:
             # need to write code to ensure there is at least one owner
             pass
 
+        _rules_changed(self)
+
         return self
 
     def rules(self):
@@ -609,71 +855,55 @@ class ACLRules:
 
             return r
 
-    def resolve(self, must_resolve=True, identifiers=None, upstream=None, unresolved=False):
-        """Resolve the rule based on the passed identifiers. This will
-        resolve the rules in order the final ACLRule has been
-        generated. If 'must_resolve' is True, then
-        this is guaranteed to return a fully-resolved simple ACLRule.
-        Anything unresolved is looked up from 'upstream', or set
-        equal to 'unresolved'
+    def _compile(self):
+        """Return the compiled (hashable) form of these rules, in
+        which each ACLRule is replaced by its bitmask
         """
-        from Acquire.Identity import ACLRule as _ACLRule
-
         if self._is_simple_inherit:
-            return _ACLRule.inherit().resolve(
-                must_resolve=must_resolve, identifiers=identifiers, upstream=upstream, unresolved=unresolved
-            )
+            return ("inherit",)
 
-        result = None
-        must_break = False
+        rules = []
 
         for rule in self._rules:
             if isinstance(rule, tuple):
-                trule = tuple(rule)  # casting to stop linting error
-                op = trule[0]
-                rule = trule[1]
+                rules.append((rule[0], _compile_rule(rule[1])))
             else:
-                op = self._default_operation
-
-            # resolve the rule...
-            rule = rule.resolve(
-                must_resolve=False, identifiers=identifiers, upstream=upstream, unresolved=unresolved
-            )
+                rules.append((None, _compile_rule(rule)))
 
-            if rule is not None:
-                if op is ACLRuleOperation.SET:
-                    # take the first matching rule
-                    result = rule
-                    must_break = True
-                    break
-                elif result is None:
-                    result = rule
-                else:
-                    result = op.combine(result, rule)
+        if self._default_rule is None:
+            default_rule = None
+        else:
+            default_rule = _compile_rule(self._default_rule)
 
-        if (not must_break) and (self._default_rule is not None):
-            rule = self._default_rule.resolve(
-                must_resolve=False, identifiers=identifiers, upstream=upstream, unresolved=unresolved
-            )
-            if result is None:
-                result = rule
-            else:
-                result = self._default_operation.combine(result, rule)
+        return ("rules", self._default_operation, tuple(rules), default_rule)
 
-        # should now have a fully resolved ACLRule...
-        if result is None:
-            return _ACLRule.denied()
+    def _resolve_mask(self, must_resolve=True, identifiers=None, upstream=None, unresolved=False):
+        """Internal function that resolves these rules to a bitmask"""
+        upstream = _get_upstream_mask(upstream, identifiers)
 
-        if not isinstance(result, _ACLRule):
-            raise PermissionError("Did not fully resolve the ACLRule - got %s" % str(result))
+        return _resolve_mask(
+            self,
+            must_resolve=must_resolve,
+            identifiers=identifiers,
+            upstream=upstream,
+            unresolved=unresolved,
+        )
 
-        if not result.is_fully_resolved():
-            # we have not been able to generate a fully-resolved ACL
-            result = result.resolve(
-                must_resolve=True, identifiers=identifiers, upstream=upstream, unresolved=unresolved
+    def resolve(self, must_resolve=True, identifiers=None, upstream=None, unresolved=False):
+        """Resolve the rule based on the passed identifiers. This will
+        resolve the rules in order the final ACLRule has been
+        generated. If 'must_resolve' is True, then
+        this is guaranteed to return a fully-resolved simple ACLRule.
+        Anything unresolved is looked up from 'upstream', or set
+        equal to 'unresolved'. The rules are compiled to bitmasks
+        (which are cached until any rule is changed), and the result
+        is cached
+        """
+        return _to_rule(
+            self._resolve_mask(
+                must_resolve=must_resolve, identifiers=identifiers, upstream=upstream, unresolved=unresolved
             )
-
-        return result
+        )
 
     @staticmethod
     def from_data(data):
@@ -1,5 +1,29 @@
 __all__ = ["Authorisation"]
 
+# The UIDs of authorisations that have been used by 'assert_once' are
+# recorded below this prefix, grouped into windows of this many
+# seconds according to when the authorisation was signed. Once every
+# authorisation signed in a window is stale, the whole window is
+# deleted by the garbage collector (see Acquire.Service.collect_garbage)
+_auth_once_root = "auth_once"
+_auth_once_window = 3600
+
+
+def _get_auth_once_window(signed_datetime):
+    """Internal function returning the name of the 'auth_once' window
+    that holds authorisations signed at 'signed_datetime'. This is
+    the time at the start of the window, so windows sort in time order
+    """
+    import datetime as _datetime
+
+    from Acquire.ObjectStore import datetime_to_datetime as _datetime_to_datetime
+    from Acquire.ObjectStore import datetime_to_string as _datetime_to_string
+
+    timestamp = _datetime_to_datetime(signed_datetime).timestamp()
+    start = int(timestamp // _auth_once_window) * _auth_once_window
+
+    return _datetime_to_string(_datetime.datetime.fromtimestamp(start, _datetime.timezone.utc))
+
 
 class Authorisation:
     """This class holds the information needed to show that a user
@@ -272,22 +296,24 @@ class Authorisation:
         now = _get_datetime_now()
 
         if now >= self._auth_datetime:
-            return (now - self._auth_datetime).seconds > stale_time
+            return (now - self._auth_datetime).total_seconds() > stale_time
         else:
-            # datetime returns large positive numbers if time is
-            # in the future - expect a little difference if client
-            # clock is fast. Give up to 30 seconds of leeway
+            # expect a little difference if client clock is
+            # fast. Give up to 30 seconds of leeway
             leeway_seconds = 30
-            return (self._auth_datetime - now).seconds > leeway_seconds
+            return (self._auth_datetime - now).total_seconds() > leeway_seconds
 
-    def _get_user_public_cert(self, scope=None, permissions=None):
+    def _get_user_public_cert(self, scope=None, permissions=None, refresh=False):
         """Internal function that returns the public certificate
         of the user who signed this authorisation. This will
         check that the authorisation was not signed after the
         user logged out, as well as validating the services
-        that provide the user session keys etc.
+        that provide the user session keys etc. If 'refresh'
+        is True then the session status is always re-checked
+        with the identity service, rather than using any
+        cached session information
         """
-        must_fetch = False
+        must_fetch = refresh
 
         try:
             if scope != self._scope or permissions != self._permissions:
@@ -315,7 +341,7 @@ class Authorisation:
 
         # we need to get the public signing key for this session
         from Acquire.Service import get_trusted_service as _get_trusted_service
-        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+        from Acquire.ObjectStore import string_to_datetime as _string_to_datetime
 
         try:
             identity_service = _get_trusted_service(self._identity_url)
@@ -338,8 +364,10 @@ class Authorisation:
                 "(%s)" % (self._identity_url, identity_service.uid(), self._identity_uid)
             )
 
+        # this is cached by the service, so only the first
+        # authorisation from a session needs a remote call
         response = identity_service.get_session_info(
-            session_uid=self._session_uid, scope=scope, permissions=permissions
+            session_uid=self._session_uid, scope=scope, permissions=permissions, refresh=refresh
         )
 
         try:
@@ -378,22 +406,61 @@ class Authorisation:
         self._permissions = permissions
         return pubcert
 
+    @staticmethod
+    def prefetch_session_infos(authorisations, scope=None, permissions=None):
+        """Fetch the session information needed to verify all of the
+        passed authorisations, using a single call to each identity
+        service. This information is cached, so that the authorisations
+        can then be verified without any further calls to the
+        identity services
+
+        Args:
+             authorisations (list): Authorisations to verify
+             scope (str, default=None): Scope of the authorisations
+             permissions (default=None): Permissions of the authorisations
+        Returns:
+             None
+        """
+        from Acquire.Service import get_trusted_service as _get_trusted_service
+
+        sessions = {}
+
+        for authorisation in authorisations:
+            if authorisation is None or authorisation.is_null() or getattr(authorisation, "_is_testing", False):
+                continue
+
+            sessions.setdefault(authorisation._identity_url, set()).add(authorisation._session_uid)
+
+        for (identity_url, session_uids) in sessions.items():
+            try:
+                identity_service = _get_trusted_service(identity_url)
+                identity_service.get_session_infos(
+                    [{"session_uid": uid, "scope": scope, "permissions": permissions} for uid in session_uids]
+                )
+            except:
+                # the authorisations will be verified (and any errors
+                # raised) individually
+                pass
+
     def assert_once(self, stale_time=7200, scope=None, permissions=None):
         """Assert that this is in the one and only time that this
         service has seen this authorisation. This records the
         UID of the authorisation to the object store and then
         verifies that the signature of the UID is correct.
 
-        There is a small race condition if the service asserts
-        the authorisation at the exact same time, but this is
-        a highly unlikely occurance. The aim is to prevent
-        replay attacks.
+        The UID is recorded atomically in the window of time in
+        which the authorisation was signed, so this is safe even if
+        the authorisation is replayed at the same time. Windows are
+        dropped as a whole once they are older than the stale time.
+        The aim is to prevent replay attacks.
         """
         if self.is_null():
             raise PermissionError("Cannot assert_once a null Authorisation")
 
         if self.is_stale(stale_time):
-            if now < self._auth_datetime:
+            from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+
+            if _get_datetime_now() < self._auth_datetime:
                 raise PermissionError(
                     "Cannot assert_once an Authorisation signed " "in the future - please check your clock"
                 )
@@ -405,31 +472,21 @@ class Authorisation:
         from Acquire.ObjectStore import get_datetime_now_to_string as _get_datetime_now_to_string
 
         bucket = _get_service_account_bucket()
-        authkey = "auth_once/%s" % self._uid
+        authkey = "%s/%s/%s" % (_auth_once_root, _get_auth_once_window(self._auth_datetime), self._uid)
         now = _get_datetime_now_to_string()
 
-        try:
-            data = _ObjectStore.get_string_object(bucket=bucket, key=authkey)
-        except:
-            data = None
-
-        if data is not None:
+        # Record that this authorisation has been seen. This is an
+        # atomic conditional write, so only one request can use this
+        # authorisation, even if it is replayed at the same time
+        if not _ObjectStore.set_object_if_absent(bucket=bucket, key=authkey, data=now.encode("utf-8")):
             raise PermissionError(
                 "Cannot auth_once the authorisation as it has been used " "before on this service!"
             )
 
-        # This is the first time this authorisation has been seen.
-        # Record this to the object store to prevent anyone else
-        # from using this authorisation on this service. There is a
-        # small race condition here, but this would be extremely
-        # challenging to exploit, and mitigating it would be a
-        # significant performance problem. Ideally the object store
-        # would have a "test_and_set" to enable us to set only if
-        # the previous value is None
-        _ObjectStore.set_string_object(bucket=bucket, key=authkey, string_data=now)
-
-        # Now validate that the signature of the UID is correct
-        public_cert = self._get_user_public_cert(scope=scope, permissions=permissions)
+        # Now validate that the signature of the UID is correct. This
+        # is only used once, so always check that the user has not
+        # logged out since the session information was cached
+        public_cert = self._get_user_public_cert(scope=scope, permissions=permissions, refresh=True)
 
         if public_cert is None:
             raise PermissionError(
@@ -550,7 +607,7 @@ class Authorisation:
                         return
 
         # Now validate that the signature of the UID is correct
-        public_cert = self._get_user_public_cert(scope=scope, permissions=permissions)
+        public_cert = self._get_user_public_cert(scope=scope, permissions=permissions, refresh=force)
 
         message = self._get_message(resource=resource, matched_resource=matched_resource)
 
@@ -2,6 +2,52 @@ __all__ = ["LoginSession"]
 
 _sessions_key = "identity/sessions"
 
+# Each session is saved once, as a record under _session_data_key/uid.
+# Sessions are indexed by short UID under _session_index_key/short_uid/uid,
+# with each index entry holding just the status of the session. Sessions
+# that are not approved are also listed in time-ordered expiry buckets
+# under _session_expire_key/window/uid, which the garbage collector
+# drops (together with the sessions) once they have expired
+_session_data_key = "%s/data" % _sessions_key
+_session_index_key = "%s/index" % _sessions_key
+_session_expire_key = "%s/expire" % _sessions_key
+
+# Sessions that are not approved are kept for this number of seconds,
+# and the expiry buckets each cover this number of seconds
+_session_lifetime = 86400
+_session_expire_window = 3600
+
+_session_statuses = ["approved", "pending", "denied", "suspicious", "logged_out"]
+
+# the maximum time a call will wait for the status of a session to change
+_max_status_wait_seconds = 25
+
+
+def _get_session_expire_window(expire_datetime):
+    """Internal function returning the name of the expiry bucket that
+    holds sessions that expire at 'expire_datetime'. This is the time
+    at the start of the bucket, so buckets sort in time order
+    """
+    import datetime as _datetime
+
+    from Acquire.ObjectStore import datetime_to_datetime as _datetime_to_datetime
+    from Acquire.ObjectStore import datetime_to_string as _datetime_to_string
+
+    timestamp = _datetime_to_datetime(expire_datetime).timestamp()
+    start = int(timestamp // _session_expire_window) * _session_expire_window
+
+    return _datetime_to_string(_datetime.datetime.fromtimestamp(start, _datetime.timezone.utc))
+
+
+def _get_session_keys(uid):
+    """Internal function returning the keys of the record and the
+    index entry of the session with UID 'uid'
+    """
+    return (
+        "%s/%s" % (_session_data_key, uid),
+        "%s/%s/%s" % (_session_index_key, LoginSession.to_short_uid(uid), uid),
+    )
+
 
 class LoginSession:
     """This class holds all details of a single login session"""
@@ -225,11 +271,13 @@ class LoginSession:
 
         bucket = _get_service_account_bucket()
 
-        try:
+        (_, key) = _get_session_keys(uid)
+        status = _ObjectStore.get_string_object_or_none(bucket=bucket, key=key)
+
+        if status is None:
+            # this may be a session that was saved before sessions were indexed
             key = "%s/status/%s" % (_sessions_key, uid)
-            status = _ObjectStore.get_string_object(bucket=bucket, key=key)
-        except:
-            status = None
+            status = _ObjectStore.get_string_object_or_none(bucket=bucket, key=key)
 
         if status is None:
             from Acquire.Identity import LoginSessionError
@@ -238,6 +286,31 @@ class LoginSession:
 
         return status
 
+    @staticmethod
+    def wait_for_status_change(uid, status, wait_seconds=0):
+        """Return the status of the LoginSession with specified UID,
+        waiting (long-polling) for up to 'wait_seconds' for the
+        status to change from 'status'. This lets a user who is
+        waiting for a login to be approved be told as soon as it is,
+        without having to repeatedly call the service
+        """
+        import time as _time
+
+        wait_seconds = min(max(float(wait_seconds), 0), _max_status_wait_seconds)
+
+        deadline = _time.monotonic() + wait_seconds
+        delay = 0.1
+
+        while True:
+            new_status = LoginSession.get_status(uid=uid)
+
+            if new_status != status or _time.monotonic() + delay > deadline:
+                return new_status
+
+            # reading the status key is cheap, so poll quickly at first
+            _time.sleep(delay)
+            delay = min(2 * delay, 1.0)
+
     def _set_status(self, status):
         """Internal function to set the status of the session.
         This ensures that the data for the session is saved
@@ -246,28 +319,38 @@ class LoginSession:
         if self.is_null():
             raise PermissionError("Cannot set the status of a null LoginSession")
 
-        if status not in ["approved", "pending", "denied", "suspicious", "logged_out"]:
+        if status not in _session_statuses:
             raise ValueError("Cannot set an invalid status '%s'" % status)
 
         if status == self._status:
             return
 
+        import datetime as _datetime
+
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
         from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
 
         bucket = _get_service_account_bucket()
-        key = self._get_key()
-
-        try:
-            _ObjectStore.delete_object(bucket=bucket, key=key)
-        except:
-            pass
 
         self._status = status
-        key = self._get_key()
-        _ObjectStore.set_object_from_json(bucket=bucket, key=key, data=self.to_data())
-        key = "%s/status/%s" % (_sessions_key, self._uid)
-        _ObjectStore.set_string_object(bucket=bucket, key=key, string_data=status)
+        (key, index_key) = _get_session_keys(self._uid)
+
+        # the session record is updated in place. The index entry is
+        # only written once the session is saved
+        with _ObjectStore.batch() as batch:
+            saved = batch.set_object_from_json(bucket=bucket, key=key, data=self.to_data())
+            batch.set_string_object(bucket=bucket, key=index_key, string_data=status, after=saved)
+
+            if status != "approved":
+                # this session can be dropped once it has expired
+                window = _get_session_expire_window(
+                    _get_datetime_now() + _datetime.timedelta(seconds=_session_lifetime)
+                )
+
+                batch.set_string_object(
+                    bucket=bucket, key="%s/%s/%s" % (_session_expire_key, window, self._uid), string_data=status
+                )
 
     def set_suspicious(self):
         """Put this login session into a suspicious state. This
@@ -435,9 +518,6 @@ class LoginSession:
         except:
             return None
 
-    def _get_key(self):
-        return "%s/%s/%s/%s" % (_sessions_key, self.status(), self.short_uid(), self.uid())
-
     def save(self):
         """Save the current state of this LoginSession to the
         object store
@@ -449,7 +529,7 @@ class LoginSession:
         from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
 
         bucket = _get_service_account_bucket()
-        key = self._get_key()
+        (key, _) = _get_session_keys(self._uid)
 
         _ObjectStore.set_object_from_json(bucket=bucket, key=key, data=self.to_data())
 
@@ -489,21 +569,34 @@ class LoginSession:
                 raise PermissionError(
                     "You must supply the full UID to get the status " "of a specific login session"
                 )
-
-            status = LoginSession.get_status(uid=uid)
-        else:
-            if status not in ["approved", "pending", "denied", "suspicious", "logged_out"]:
-                raise ValueError("Cannot set an invalid status '%s'" % status)
+        elif status not in _session_statuses:
+            raise ValueError("Cannot set an invalid status '%s'" % status)
 
         bucket = _get_service_account_bucket()
 
         if uid is not None:
-            short_uid = LoginSession.to_short_uid(uid)
+            (key, _) = _get_session_keys(uid)
 
-            key = "%s/%s/%s/%s" % (_sessions_key, status, short_uid, uid)
             try:
                 data = _ObjectStore.get_object_from_json(bucket=bucket, key=key)
+            except:
+                data = None
+
+            if data is None:
+                # this may be a session that was saved before sessions
+                # were indexed
+                try:
+                    legacy_status = LoginSession.get_status(uid=uid)
+                    key = "%s/%s/%s/%s" % (_sessions_key, legacy_status, LoginSession.to_short_uid(uid), uid)
+                    data = _ObjectStore.get_object_from_json(bucket=bucket, key=key)
+                except:
+                    data = None
+
+            try:
                 session = LoginSession.from_data(data)
+
+                if session.is_null() or (status is not None and session.status() != status):
+                    raise ValueError()
             except:
                 from Acquire.Identity import LoginSessionError
 
@@ -518,23 +611,53 @@ class LoginSession:
         # so remove all dots
         short_uid = short_uid.replace(".", "")
 
-        prefix = "%s/%s/%s/" % (_sessions_key, status, short_uid)
+        # find the sessions in the right state from the index, and
+        # then load just those sessions
+        prefix = "%s/%s/" % (_session_index_key, short_uid)
 
         try:
-            keys = _ObjectStore.get_all_objects_from_json(bucket=bucket, prefix=prefix)
+            index = _ObjectStore.get_all_strings(bucket=bucket, prefix=prefix)
         except:
-            keys = {}
+            index = {}
 
         sessions = []
 
-        for data in keys.values():
+        for (key, session_status) in index.items():
+            if session_status != status:
+                continue
+
             try:
+                (data_key, _) = _get_session_keys(key.split("/")[-1])
+                data = _ObjectStore.get_object_from_json(bucket=bucket, key=data_key)
                 session = LoginSession.from_data(data)
                 session._localise(scope=scope, permissions=permissions)
                 sessions.append(session)
             except:
                 pass
 
+        # sessions that were saved before sessions were indexed are
+        # stored below their status and short UID. Sessions that have
+        # since been saved again are in the index, which is up to date
+        indexed = set(key.split("/")[-1] for key in index.keys())
+        prefix = "%s/%s/%s/" % (_sessions_key, status, short_uid)
+
+        try:
+            legacy = _ObjectStore.get_all_objects_from_json(bucket=bucket, prefix=prefix)
+        except:
+            legacy = {}
+
+        for data in legacy.values():
+            try:
+                session = LoginSession.from_data(data)
+
+                if session.is_null() or session.uid() in indexed or session.status() != status:
+                    continue
+
+                session._localise(scope=scope, permissions=permissions)
+                sessions.append(session)
+            except:
+                pass
+
         if len(sessions) == 0:
             from Acquire.Identity import LoginSessionError
 
@@ -13,6 +13,11 @@ from ._osparregistry import *
 from ._encoding import *
 from ._function import *
 from ._mutex import *
+from ._metrics import *
+from ._cache import *
+from ._batch import *
+from ._chunked import *
+from ._sharding import *
 from ._errors import *
 
 try:
@@ -0,0 +1,185 @@
+__all__ = ["ObjectStoreBatch"]
+
+
+class _BatchOperation:
+    """Holds a single deferred write or delete in an ObjectStoreBatch"""
+
+    def __init__(self, name, key, function, after):
+        self.name = name
+        self.key = key
+        self.function = function
+        self.after = after
+        self.level = 0
+        self.error = None
+
+
+class ObjectStoreBatch:
+    """This class collects object store writes and deletes so that
+    they can be flushed together, concurrently. Use it via
+    ObjectStore.batch(), e.g.
+
+        with ObjectStore.batch() as batch:
+            record = batch.set_object_from_json(bucket, key, data)
+            batch.set_string_object(bucket, index_key, key, after=record)
+
+    Operations are performed when the 'with' block exits (or when
+    'flush' is called). Operations are run concurrently, except that
+    an operation will only start after all of the operations passed
+    as 'after' have completed successfully. If any operation fails
+    then every failure is reported in a single ObjectStoreBatchError
+    (operations that depend on a failed operation are not run).
+    Nothing is written if the 'with' block raises an exception.
+
+    Note that the writes are deferred, so reading a key that has been
+    written in the batch will return the old value until the batch
+    is flushed
+    """
+
+    def __init__(self, max_workers=8):
+        self._max_workers = max(1, int(max_workers))
+        self._operations = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._operations = []
+
+        return False
+
+    def __len__(self):
+        return len(self._operations)
+
+    def _add(self, name, key, function, after):
+        if after is None:
+            after = []
+        elif isinstance(after, _BatchOperation):
+            after = [after]
+        else:
+            after = list(after)
+
+        for a in after:
+            if not isinstance(a, _BatchOperation) or a not in self._operations:
+                raise ValueError("You can only depend on operations that are in this batch")
+
+        op = _BatchOperation(name=name, key=key, function=function, after=after)
+
+        if len(after) > 0:
+            op.level = 1 + max(a.level for a in after)
+
+        self._operations.append(op)
+        return op
+
+    def set_object(self, bucket, key, data, after=None):
+        """Set the value of 'key' in 'bucket' to binary 'data' when
+        the batch is flushed, after the operations in 'after' have
+        completed. This returns the operation, which can be used
+        as a dependency of later operations
+        """
+        from ._objstore import ObjectStore as _ObjectStore
+
+        return self._add("set_object", key, lambda: _ObjectStore.set_object(bucket, key, data), after)
+
+    def set_string_object(self, bucket, key, string_data, after=None):
+        """Set the value of 'key' in 'bucket' to the string 'string_data'
+        when the batch is flushed
+        """
+        return self.set_object(bucket, key, string_data.encode("utf-8"), after=after)
+
+    def set_object_from_json(self, bucket, key, data, after=None):
+        """Set the value of 'key' in 'bucket' to the json-encoded 'data'
+        when the batch is flushed
+        """
+        import json as _json
+
+        return self.set_string_object(bucket, key, _json.dumps(data), after=after)
+
+    def delete_object(self, bucket, key, after=None):
+        """Remove the object at 'key' in 'bucket' when the batch is
+        flushed
+        """
+        from ._objstore import ObjectStore as _ObjectStore
+
+        return self._add("delete_object", key, lambda: _ObjectStore.delete_object(bucket, key), after)
+
+    def flush(self):
+        """Perform all of the operations in this batch, raising an
+        ObjectStoreBatchError that lists every failure if any of
+        the operations failed
+        """
+        operations = self._operations
+        self._operations = []
+
+        if len(operations) == 0:
+            return
+
+        from Acquire.Service import trace_span as _trace_span
+
+        with _trace_span("objstore", "batch", size=len(operations)):
+            self._run(operations)
+
+        failed = [op for op in operations if op.error is not None]
+
+        if len(failed) > 0:
+            from Acquire.ObjectStore import ObjectStoreBatchError
+
+            lines = ["%s '%s': %s" % (op.name, op.key, op.error) for op in failed]
+
+            raise ObjectStoreBatchError(
+                "%d of %d operations in the batch failed:\n%s" % (len(failed), len(operations), "\n".join(lines))
+            )
+
+    def _run(self, operations):
+        """Internal function that runs the operations level by level,
+        with the operations within each level run concurrently
+        """
+        nlevels = 1 + max(op.level for op in operations)
+
+        levels = [[] for _ in range(nlevels)]
+
+        for op in operations:
+            levels[op.level].append(op)
+
+        from ._metrics import get_request_objstore_metrics, _request_stack
+
+        # make sure that calls made by the worker threads are recorded
+        # against the metrics of the request that owns this batch
+        request = get_request_objstore_metrics()
+
+        def _perform(op):
+            for a in op.after:
+                if a.error is not None:
+                    op.error = "not run as '%s' failed" % a.key
+                    return
+
+            stack = _request_stack()
+            pushed = request is not None and request not in stack
+
+            if pushed:
+                stack.append(request)
+
+            try:
+                op.function()
+            except Exception as e:
+                op.error = "%s: %s" % (e.__class__.__name__, str(e))
+            finally:
+                if pushed:
+                    stack.remove(request)
+
+        if len(operations) == 1 or self._max_workers == 1:
+            for level in levels:
+                for op in level:
+                    _perform(op)
+
+            return
+
+        from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+        nworkers = min(self._max_workers, max(len(level) for level in levels))
+
+        with _ThreadPoolExecutor(max_workers=nworkers) as pool:
+            for level in levels:
+                list(pool.map(_perform, level))
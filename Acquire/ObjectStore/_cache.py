@@ -0,0 +1,615 @@
+import os as _os
+import time as _time
+import threading as _threading
+from collections import OrderedDict as _OrderedDict
+
+__all__ = [
+    "MemoryObjectCache",
+    "DiskObjectCache",
+    "set_object_cache",
+    "get_object_cache",
+    "clear_object_cache",
+    "declare_cached_key_family",
+    "get_cached_key_families",
+    "declare_missing_key_family",
+    "get_missing_key_families",
+]
+
+# The key families (glob patterns) whose objects are cached by the
+# ObjectStore facade, together with the time-to-live in seconds
+# (None means that the objects are immutable and are cached until
+# evicted). Objects in mutable families are invalidated when they
+# are written or deleted via the ObjectStore, but may be stale for
+# up to 'ttl' seconds if they are changed by another process
+_cached_families = [
+    # old service keys and the fingerprint pointers to them are only
+    # ever written once (load_service_key_from_objstore)
+    ("_service_key/oldkeys/*", None),
+    # account line items are written once per debit/credit
+    ("accounting/accounts/*/txns/*", None),
+    # trusted service records are only rewritten when keys are refreshed
+    ("_trusted/*", 300),
+]
+
+_compiled_families = None
+
+# The key families (glob patterns) for which misses are remembered
+# for a short time-to-live (in seconds), so that repeated lookups of
+# a missing key do not each cost a round trip to the object store.
+# Misses are forgotten as soon as the key is written via the
+# ObjectStore, but a key written by another process will appear
+# to be missing for up to 'ttl' seconds. None are declared by default
+# as this must never be used for keys that act as locks or guards
+# (e.g. mutexes or auth_once)
+_missing_families = []
+
+_compiled_missing_families = None
+
+# The keys that are known to be missing, together with the time when
+# this knowledge expires
+_missing = {}
+_missing_lock = _threading.Lock()
+_max_missing = 16384
+
+_cache = None
+_cache_initialised = False
+_cache_lock = _threading.Lock()
+
+
+def declare_cached_key_family(pattern, ttl=None):
+    """Declare that objects whose keys match the glob 'pattern'
+    (e.g. 'storage/version/*') should be cached by the ObjectStore.
+    If 'ttl' is None then the objects are immutable and are cached
+    until they are evicted. Otherwise they are cached for a
+    maximum of 'ttl' seconds
+
+    Args:
+         pattern (str): Glob pattern of keys to cache
+         ttl (float, default=None): Time-to-live in seconds
+    Returns:
+         None
+    """
+    global _compiled_families
+
+    if ttl is not None:
+        ttl = float(ttl)
+
+    pattern = str(pattern)
+
+    for i, (p, _t) in enumerate(_cached_families):
+        if p == pattern:
+            _cached_families[i] = (pattern, ttl)
+            _compiled_families = None
+            return
+
+    _cached_families.append((pattern, ttl))
+    _compiled_families = None
+
+
+def get_cached_key_families():
+    """Return the list of (pattern, ttl) of the cached key families"""
+    return list(_cached_families)
+
+
+def _get_cache_policy(key):
+    """Internal function that returns (is_cached, ttl) for the
+    passed key
+    """
+    global _compiled_families
+
+    if _compiled_families is None:
+        import fnmatch as _fnmatch
+        import re as _re
+
+        _compiled_families = [
+            (_re.compile(_fnmatch.translate(pattern)), ttl) for (pattern, ttl) in _cached_families
+        ]
+
+    for regex, ttl in _compiled_families:
+        if regex.match(key):
+            return (True, ttl)
+
+    return (False, None)
+
+
+def declare_missing_key_family(pattern, ttl=5):
+    """Declare that misses for keys that match the glob 'pattern'
+    should be remembered by the ObjectStore for 'ttl' seconds. This
+    saves a round trip to the object store for repeated lookups of
+    missing keys, at the cost that a key written by another process
+    may appear to be missing for up to 'ttl' seconds. Pass a 'ttl'
+    of None to remove the family
+
+    Args:
+         pattern (str): Glob pattern of keys
+         ttl (float, default=5): Time-to-live in seconds
+    Returns:
+         None
+    """
+    global _compiled_missing_families
+
+    pattern = str(pattern)
+
+    for i, (p, _t) in enumerate(_missing_families):
+        if p == pattern:
+            _missing_families.pop(i)
+            break
+
+    if ttl is not None:
+        _missing_families.append((pattern, float(ttl)))
+
+    _compiled_missing_families = None
+
+
+def get_missing_key_families():
+    """Return the list of (pattern, ttl) of the key families whose
+    misses are remembered
+    """
+    return list(_missing_families)
+
+
+def _get_missing_ttl(key):
+    """Internal function that returns the time-to-live for a miss
+    of the passed key, or None if misses of this key should not
+    be remembered
+    """
+    global _compiled_missing_families
+
+    if len(_missing_families) == 0:
+        return None
+
+    if _compiled_missing_families is None:
+        import fnmatch as _fnmatch
+        import re as _re
+
+        _compiled_missing_families = [
+            (_re.compile(_fnmatch.translate(pattern)), ttl) for (pattern, ttl) in _missing_families
+        ]
+
+    for regex, ttl in _compiled_missing_families:
+        if regex.match(key):
+            return ttl
+
+    return None
+
+
+def _is_known_missing(cache_key):
+    """Internal function that returns whether or not the object at
+    'cache_key' is known (recently) to be missing
+    """
+    if len(_missing) == 0:
+        return False
+
+    with _missing_lock:
+        try:
+            expires = _missing[cache_key]
+        except KeyError:
+            return False
+
+        if expires < _time.time():
+            del _missing[cache_key]
+            return False
+
+    return True
+
+
+def _set_known_missing(cache_key, ttl):
+    """Internal function that remembers that the object at
+    'cache_key' is missing for 'ttl' seconds
+    """
+    now = _time.time()
+
+    with _missing_lock:
+        if len(_missing) >= _max_missing:
+            for k in [k for (k, e) in _missing.items() if e < now]:
+                del _missing[k]
+
+            if len(_missing) >= _max_missing:
+                _missing.clear()
+
+        _missing[cache_key] = now + ttl
+
+
+def _forget_missing(cache_key):
+    """Internal function called when the object at 'cache_key'
+    is written
+    """
+    if len(_missing) == 0:
+        return
+
+    with _missing_lock:
+        _missing.pop(cache_key, None)
+
+
+class MemoryObjectCache:
+    """This is a bounded, in-memory least-recently-used cache of
+    objects. The size of the cache is limited by the total number
+    of bytes held. Optionally, a second-tier cache (e.g. a
+    DiskObjectCache) can be passed, which will be used to hold
+    objects that have been evicted from memory, and which will
+    be searched on a miss
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_object_bytes=1024 * 1024, next_tier=None):
+        self._max_bytes = int(max_bytes)
+        self._max_object_bytes = int(max_object_bytes)
+        self._next_tier = next_tier
+        self._objects = _OrderedDict()
+        self._nbytes = 0
+        self._lock = _threading.Lock()
+
+    def __str__(self):
+        return "MemoryObjectCache(nobjects=%d, nbytes=%d/%d)" % (
+            len(self._objects),
+            self._nbytes,
+            self._max_bytes,
+        )
+
+    def __len__(self):
+        return len(self._objects)
+
+    def nbytes(self):
+        """Return the number of bytes held in memory by this cache"""
+        return self._nbytes
+
+    def get(self, key):
+        """Return the object cached for 'key', or None if
+        there is no (unexpired) object cached
+        """
+        now = _time.time()
+
+        with self._lock:
+            try:
+                (data, expires) = self._objects[key]
+            except KeyError:
+                data = None
+
+            if data is not None:
+                if expires is not None and expires < now:
+                    self._remove(key)
+                    data = None
+                else:
+                    self._objects.move_to_end(key)
+                    return data
+
+        if self._next_tier is not None:
+            result = self._next_tier.get_with_expiry(key)
+
+            if result is not None:
+                (data, expires) = result
+                self._put(key, data, expires)
+                return data
+
+        return None
+
+    def put(self, key, data, ttl=None):
+        """Cache 'data' for 'key', optionally for only 'ttl' seconds"""
+        if data is None:
+            return
+
+        if ttl is None:
+            expires = None
+        else:
+            expires = _time.time() + ttl
+
+        self._put(key, data, expires)
+
+    def _put(self, key, data, expires):
+        if len(data) > self._max_object_bytes:
+            # too big to hold in memory - only the next tier can hold this
+            if self._next_tier is not None:
+                self._next_tier.put_with_expiry(key, data, expires)
+
+            return
+
+        evicted = []
+
+        with self._lock:
+            self._remove(key)
+            self._objects[key] = (data, expires)
+            self._nbytes += len(data)
+
+            while self._nbytes > self._max_bytes and len(self._objects) > 0:
+                (k, (d, e)) = self._objects.popitem(last=False)
+                self._nbytes -= len(d)
+                evicted.append((k, d, e))
+
+        if self._next_tier is not None:
+            for (k, d, e) in evicted:
+                self._next_tier.put_with_expiry(k, d, e)
+
+    def _remove(self, key):
+        try:
+            (data, _expires) = self._objects.pop(key)
+            self._nbytes -= len(data)
+        except KeyError:
+            pass
+
+    def invalidate(self, key):
+        """Remove any object cached for 'key'"""
+        with self._lock:
+            self._remove(key)
+
+        if self._next_tier is not None:
+            self._next_tier.invalidate(key)
+
+    def invalidate_prefix(self, bucket_uid, prefix=None):
+        """Remove all objects cached for the bucket with UID
+        'bucket_uid' whose keys start with 'prefix'
+        """
+        with self._lock:
+            for key in list(self._objects.keys()):
+                if key[0] == bucket_uid and (prefix is None or key[1].startswith(prefix)):
+                    self._remove(key)
+
+        if self._next_tier is not None:
+            self._next_tier.invalidate_prefix(bucket_uid, prefix)
+
+    def clear(self):
+        """Remove all objects from this cache"""
+        with self._lock:
+            self._objects = _OrderedDict()
+            self._nbytes = 0
+
+        if self._next_tier is not None:
+            self._next_tier.clear()
+
+
+class DiskObjectCache:
+    """This is a cache of objects held in files on local disk. It is
+    intended to be used as the second tier of a MemoryObjectCache,
+    so that (larger) immutable objects survive eviction from memory
+    and restarts of the process. The size of the cache is limited
+    by the total number of bytes held, with the least-recently-used
+    files removed first
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self._dir = str(directory)
+        self._max_bytes = int(max_bytes)
+        self._lock = _threading.Lock()
+
+        _os.makedirs(self._dir, exist_ok=True)
+
+        self._nbytes = 0
+
+        for filename in _os.listdir(self._dir):
+            try:
+                self._nbytes += _os.path.getsize(_os.path.join(self._dir, filename))
+            except OSError:
+                pass
+
+    def __str__(self):
+        return "DiskObjectCache(%s, nbytes=%d/%d)" % (self._dir, self._nbytes, self._max_bytes)
+
+    def nbytes(self):
+        """Return the number of bytes held on disk by this cache"""
+        return self._nbytes
+
+    def _filename(self, key):
+        import hashlib as _hashlib
+
+        h = _hashlib.sha256(("%s\n%s" % key).encode("utf-8")).hexdigest()
+        return _os.path.join(self._dir, h)
+
+    def get(self, key):
+        """Return the object cached for 'key', or None"""
+        result = self.get_with_expiry(key)
+
+        if result is None:
+            return None
+        else:
+            return result[0]
+
+    def get_with_expiry(self, key):
+        """Return the (object, expiry time) cached for 'key', or None"""
+        import json as _json
+
+        filename = self._filename(key)
+
+        try:
+            with open(filename, "rb") as FILE:
+                header = _json.loads(FILE.readline().decode("utf-8"))
+                data = FILE.read()
+        except (OSError, ValueError):
+            return None
+
+        if header.get("key") != list(key):
+            # hash collision
+            return None
+
+        expires = header.get("expires")
+
+        if expires is not None and expires < _time.time():
+            self.invalidate(key)
+            return None
+
+        try:
+            # record the access so that eviction is least-recently-used
+            _os.utime(filename)
+        except OSError:
+            pass
+
+        return (data, expires)
+
+    def put(self, key, data, ttl=None):
+        """Cache 'data' for 'key', optionally for only 'ttl' seconds"""
+        if ttl is None:
+            expires = None
+        else:
+            expires = _time.time() + ttl
+
+        self.put_with_expiry(key, data, expires)
+
+    def put_with_expiry(self, key, data, expires):
+        """Cache 'data' for 'key' until the time 'expires'"""
+        import json as _json
+
+        if data is None:
+            return
+
+        header = _json.dumps({"key": list(key), "expires": expires}).encode("utf-8") + b"\n"
+        nbytes = len(header) + len(data)
+
+        if nbytes > self._max_bytes:
+            return
+
+        filename = self._filename(key)
+        tmpname = "%s.%d.%d.tmp" % (filename, _os.getpid(), _threading.get_ident())
+
+        with self._lock:
+            try:
+                self._nbytes -= _os.path.getsize(filename)
+            except OSError:
+                pass
+
+            with open(tmpname, "wb") as FILE:
+                FILE.write(header)
+                FILE.write(data)
+
+            _os.replace(tmpname, filename)
+            self._nbytes += nbytes
+
+            if self._nbytes > self._max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove the least-recently-used files until the cache
+        is within 90% of its maximum size
+        """
+        files = []
+
+        for filename in _os.listdir(self._dir):
+            path = _os.path.join(self._dir, filename)
+
+            try:
+                stat = _os.stat(path)
+            except OSError:
+                continue
+
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        files.sort()
+
+        target = int(0.9 * self._max_bytes)
+
+        for (_mtime, size, path) in files:
+            if self._nbytes <= target:
+                break
+
+            try:
+                _os.remove(path)
+                self._nbytes -= size
+            except OSError:
+                pass
+
+    def invalidate(self, key):
+        """Remove any object cached for 'key'"""
+        filename = self._filename(key)
+
+        with self._lock:
+            try:
+                size = _os.path.getsize(filename)
+                _os.remove(filename)
+                self._nbytes -= size
+            except OSError:
+                pass
+
+    def invalidate_prefix(self, bucket_uid, prefix=None):
+        """Remove all objects cached for the bucket with UID
+        'bucket_uid' whose keys start with 'prefix'. This has to
+        read the header of every file, so is slow
+        """
+        import json as _json
+
+        with self._lock:
+            for filename in _os.listdir(self._dir):
+                path = _os.path.join(self._dir, filename)
+
+                try:
+                    with open(path, "rb") as FILE:
+                        key = _json.loads(FILE.readline().decode("utf-8"))["key"]
+                except Exception:
+                    continue
+
+                if key[0] == bucket_uid and (prefix is None or key[1].startswith(prefix)):
+                    try:
+                        size = _os.path.getsize(path)
+                        _os.remove(path)
+                        self._nbytes -= size
+                    except OSError:
+                        pass
+
+    def clear(self):
+        """Remove all objects from this cache"""
+        with self._lock:
+            for filename in _os.listdir(self._dir):
+                try:
+                    _os.remove(_os.path.join(self._dir, filename))
+                except OSError:
+                    pass
+
+            self._nbytes = 0
+
+
+def _create_default_cache():
+    """Create the default cache. This is a MemoryObjectCache of
+    OBJSTORE_CACHE_MB megabytes (default 64, 0 disables the cache),
+    backed by a DiskObjectCache in OBJSTORE_CACHE_DIR (if set)
+    """
+    try:
+        max_mb = float(_os.getenv("OBJSTORE_CACHE_MB", "64"))
+    except ValueError:
+        max_mb = 64.0
+
+    if max_mb <= 0:
+        return None
+
+    next_tier = None
+    cache_dir = _os.getenv("OBJSTORE_CACHE_DIR")
+
+    if cache_dir:
+        next_tier = DiskObjectCache(cache_dir)
+
+    return MemoryObjectCache(max_bytes=int(max_mb * 1024 * 1024), next_tier=next_tier)
+
+
+def set_object_cache(cache):
+    """Set the cache used by the ObjectStore for objects in the
+    cached key families. This can be any object that provides the
+    same get/put/invalidate/invalidate_prefix/clear functions as
+    MemoryObjectCache. Pass None to switch off caching
+    """
+    global _cache, _cache_initialised
+
+    with _cache_lock:
+        _cache = cache
+        _cache_initialised = True
+
+
+def get_object_cache():
+    """Return the cache used by the ObjectStore, or None if there
+    is no cache
+    """
+    global _cache, _cache_initialised
+
+    if not _cache_initialised:
+        with _cache_lock:
+            if not _cache_initialised:
+                _cache = _create_default_cache()
+                _cache_initialised = True
+
+    return _cache
+
+
+def clear_object_cache():
+    """Remove all objects from the ObjectStore cache, and forget
+    all remembered misses
+    """
+    with _missing_lock:
+        _missing.clear()
+
+    cache = get_object_cache()
+
+    if cache is not None:
+        cache.clear()
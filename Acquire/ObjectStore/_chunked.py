@@ -0,0 +1,102 @@
+import json as _json
+import os as _os
+
+__all__ = ["create_chunk_manifest", "get_chunk_manifest", "write_chunk_manifests"]
+
+# Large objects can be stored as a set of chunks at 'key/1', 'key/2'
+# etc. The object at 'key' itself is then a small manifest that starts
+# with this marker, so that the backends can tell from a single request
+# whether an object is missing, a plain object, or chunked
+_manifest_marker = b"\x00acquire-chunked-object\x00"
+
+# Chunked objects written before manifests were introduced can only
+# be found by listing 'key/'. This costs an extra round trip for every
+# missing key. Once 'write_chunk_manifests' has been run over all of
+# the chunked objects, this can be switched off using
+# OBJSTORE_LEGACY_CHUNKS=0
+_legacy_chunk_lookup = _os.getenv("OBJSTORE_LEGACY_CHUNKS", "1") != "0"
+
+
+def create_chunk_manifest(nchunks):
+    """Return the manifest to write to 'key' for an object that has
+    been written as 'nchunks' chunks at 'key/1' to 'key/nchunks'
+
+    Args:
+         nchunks (int): Number of chunks
+    Returns:
+         bytes: The manifest
+    """
+    return _manifest_marker + _json.dumps({"nchunks": int(nchunks)}).encode("utf-8")
+
+
+def get_chunk_manifest(data):
+    """Return the number of chunks described by the passed object
+    data if this is a chunk manifest, or None if this is a normal
+    object
+
+    Args:
+         data (bytes): Object data (or the first block of the data)
+    Returns:
+         int: Number of chunks, or None
+    """
+    if data is None or not data.startswith(_manifest_marker):
+        return None
+
+    return int(_json.loads(data[len(_manifest_marker) :].decode("utf-8"))["nchunks"])
+
+
+def write_chunk_manifests(bucket, prefix):
+    """Write a manifest for each legacy chunked object (one written
+    as 'key/1', 'key/2' etc. without a manifest) under 'prefix', so
+    that these can be read without searching for legacy chunked
+    objects. Only pass a prefix that holds chunked objects, as any
+    set of objects called 'key/1', 'key/2' etc. is treated as chunks
+
+    Args:
+         bucket (dict): Bucket holding the objects
+         prefix (str): Prefix of the chunked objects
+    Returns:
+         list: The keys at which manifests were written
+    """
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+    names = set(_ObjectStore.get_all_object_names(bucket, prefix))
+    chunks = {}
+
+    for name in names:
+        (key, _sep, part) = name.rpartition("/")
+
+        if len(key) > 0 and part.isdigit():
+            chunks.setdefault(key, set()).add(int(part))
+
+    written = []
+
+    for key in sorted(chunks.keys()):
+        if key in names:
+            # this is a plain object, or already has a manifest
+            continue
+
+        nchunks = 0
+
+        while nchunks + 1 in chunks[key]:
+            nchunks += 1
+
+        if nchunks > 0:
+            _ObjectStore.set_object(bucket, key, create_chunk_manifest(nchunks))
+            written.append(key)
+
+    return written
+
+
+def _get_chunk_keys(key, nchunks):
+    """Internal function returning the keys of the 'nchunks' chunks
+    of the object at 'key'
+    """
+    return ["%s/%d" % (key, i) for i in range(1, nchunks + 1)]
+
+
+def _is_legacy_chunk_lookup():
+    """Internal function returning whether or not backends should
+    search for legacy (manifest-less) chunked objects on a miss
+    """
+    return _legacy_chunk_lookup
@@ -1,10 +1,29 @@
-__all__ = ["ObjectStoreError", "MutexTimeoutError", "EncodingError", "RequestBucketError"]
+__all__ = [
+    "ObjectStoreError",
+    "ObjectStoreBatchError",
+    "ObjectStoreMissingError",
+    "MutexTimeoutError",
+    "EncodingError",
+    "RequestBucketError",
+]
 
 
 class ObjectStoreError(Exception):
     pass
 
 
+class ObjectStoreBatchError(ObjectStoreError):
+    pass
+
+
+class ObjectStoreMissingError(ObjectStoreError):
+    """Raised when there is no object at the requested key, as
+    opposed to the object store failing to answer the request
+    """
+
+    pass
+
+
 class EncodingError(ObjectStoreError):
     pass
 
@@ -105,6 +105,48 @@ def _get_driver_details_from_data(data):
     return details
 
 
+# The maximum number of chunks of a chunked object that will be
+# downloaded at the same time
+_max_chunk_downloads = 8
+
+
+def _get_legacy_chunk_keys(bucket, key):
+    """Return the keys of the chunks ('key/1', 'key/2' etc.) of a
+    legacy chunked object (one written without a chunk manifest) at
+    'key', in order. This raises an ObjectStoreMissingError if there
+    is no such object, or if searching for legacy chunked objects is
+    switched off, and an ObjectStoreError if the chunks can't be listed
+    """
+    from Acquire.ObjectStore import ObjectStoreError, ObjectStoreMissingError
+    from ._chunked import _is_legacy_chunk_lookup
+
+    if not _is_legacy_chunk_lookup():
+        raise ObjectStoreMissingError("No data at key '%s'" % key)
+
+    try:
+        blobs = list(bucket["bucket"].list_blobs(prefix="%s/" % key))
+    except Exception as e:
+        raise ObjectStoreError("Unable to list the chunks of the object at key '%s': %s" % (key, str(e)))
+
+    chunks = {}
+
+    for blob in blobs:
+        part = blob.name[len(key) + 1 :]
+
+        if part.isdigit():
+            chunks[int(part)] = blob.name
+
+    chunk_keys = []
+
+    while len(chunk_keys) + 1 in chunks:
+        chunk_keys.append(chunks[len(chunk_keys) + 1])
+
+    if len(chunk_keys) == 0:
+        raise ObjectStoreMissingError("No data at key '%s'" % key)
+
+    return chunk_keys
+
+
 class GCP_ObjectStore:
     """This is the backend that abstracts using the Google Cloud Platform
     object store
@@ -381,7 +423,8 @@ class GCP_ObjectStore:
     @staticmethod
     def get_object(bucket, key):
         """Return the binary data contained in the key 'key' in the
-        passed bucket
+        passed bucket. Large objects that are stored as a set of
+        chunks are downloaded concurrently
 
         Args:
              bucket (dict): Bucket containing data
@@ -390,51 +433,105 @@ class GCP_ObjectStore:
              bytes: Binary data
 
         """
+        from ._chunked import get_chunk_manifest, _get_chunk_keys
 
         key = _clean_key(key)
 
-        blob = bucket["bucket"].blob(key)
-
         try:
-            response = blob.download_as_string()
-            is_chunked = False
-        except:
-            try:
-                blob = bucket["bucket"].blob("%s/1" % key)
-                response = blob.download_as_string()
-                is_chunked = True
-            except:
-                is_chunked = False
-                pass
+            data = bucket["bucket"].blob(key).download_as_string()
+        except Exception as e:
+            if getattr(e, "code", None) != 404:
+                from Acquire.ObjectStore import ObjectStoreError
+
+                raise ObjectStoreError("Unable to read the object at key '%s': %s" % (key, str(e)))
+
+            data = None
+
+        if data is not None:
+            nchunks = get_chunk_manifest(data)
+
+            if nchunks is None:
+                return data
+
+            chunk_keys = _get_chunk_keys(key, nchunks)
+        else:
+            chunk_keys = _get_legacy_chunk_keys(bucket, key)
+
+        if len(chunk_keys) == 1:
+            return GCP_ObjectStore.get_object(bucket, chunk_keys[0])
+
+        from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
 
-            # Raise the original error
-            if not is_chunked:
+        with _ThreadPoolExecutor(max_workers=min(_max_chunk_downloads, len(chunk_keys))) as pool:
+            chunks = list(pool.map(lambda k: GCP_ObjectStore.get_object(bucket, k), chunk_keys))
+
+        return b"".join(chunks)
+
+    @staticmethod
+    def iter_object(bucket, key):
+        """Iterate over the binary data contained in the key 'key' in
+        the passed bucket, yielding the data one chunk at a time
+
+        Args:
+             bucket (dict): Bucket containing data
+             key (str): Key for data in bucket
+        Returns:
+             generator: Blocks of binary data
+        """
+        from ._chunked import get_chunk_manifest, _get_chunk_keys
+
+        key = _clean_key(key)
+
+        try:
+            data = bucket["bucket"].blob(key).download_as_string()
+        except Exception as e:
+            if getattr(e, "code", None) != 404:
                 from Acquire.ObjectStore import ObjectStoreError
 
-                raise ObjectStoreError("No data at key '%s'" % key)
+                raise ObjectStoreError("Unable to read the object at key '%s': %s" % (key, str(e)))
+
+            data = None
 
-        data = response
+        if data is not None:
+            nchunks = get_chunk_manifest(data)
 
-        if is_chunked:
-            # keep going through to find more chunks
-            next_chunk = 1
+            if nchunks is None:
+                yield data
+                return
 
-            while True:
-                next_chunk += 1
+            chunk_keys = _get_chunk_keys(key, nchunks)
+        else:
+            chunk_keys = _get_legacy_chunk_keys(bucket, key)
 
-                try:
-                    blob = bucket["bucket"].blob("%s/%s" % (key, next_chunk))
-                    response = blob.download_as_string()
-                except:
-                    response = None
-                    break
+        for chunk_key in chunk_keys:
+            yield from GCP_ObjectStore.iter_object(bucket, chunk_key)
 
-                if not data:
-                    data = response
-                else:
-                    data += response
+    @staticmethod
+    def exists(bucket, key):
+        """Return whether or not there is an object at 'key' in the
+        passed bucket. This only fetches the object's metadata
 
-        return data
+        Args:
+             bucket (dict): Bucket containing data
+             key (str): Key for data in bucket
+        Returns:
+             bool: Whether or not the object exists
+        """
+        from Acquire.ObjectStore import ObjectStoreError, ObjectStoreMissingError
+
+        key = _clean_key(key)
+
+        try:
+            if bucket["bucket"].blob(key).exists():
+                return True
+        except Exception as e:
+            raise ObjectStoreError("Unable to check for the object at key '%s': %s" % (key, str(e)))
+
+        try:
+            _get_legacy_chunk_keys(bucket, key)
+            return True
+        except ObjectStoreMissingError:
+            return False
 
     @staticmethod
     def take_object(bucket, key):
@@ -447,14 +544,36 @@ class GCP_ObjectStore:
 
         Returns:
              bytes: Binary data
+
+        The delete is conditional on the generation that was read,
+        so only one caller can take any given object. An
+        ObjectStoreError is raised if there is no object at this key
+        or if it was taken (or changed) by someone else
         """
-        # ideally the get and delete should be atomic... would like this API
-        data = GCP_ObjectStore.get_object(bucket, key)
+        from Acquire.ObjectStore import ObjectStoreError
+        from ._chunked import get_chunk_manifest
+
+        key = _clean_key(key)
+
+        blob = bucket["bucket"].get_blob(key)
+
+        if blob is None:
+            raise ObjectStoreError("No data at key '%s'" % key)
+
+        generation = blob.generation
 
         try:
-            GCP_ObjectStore.delete_object(bucket, key)
-        except:
-            pass
+            data = blob.download_as_string(if_generation_match=generation)
+
+            if get_chunk_manifest(data) is not None:
+                data = GCP_ObjectStore.get_object(bucket, key)
+
+            blob.delete(if_generation_match=generation)
+        except Exception as e:
+            if getattr(e, "code", None) in (404, 412):
+                raise ObjectStoreError("The object at key '%s' has already been taken" % key)
+
+            raise
 
         return data
 
@@ -528,18 +647,57 @@ class GCP_ObjectStore:
         blob = bucket["bucket"].blob(key)
         blob.upload_from_string(data)
 
+    @staticmethod
+    def set_object_if_absent(bucket, key, data):
+        """Atomically set the value of 'key' in 'bucket' to binary
+        'data' if (and only if) there is no object at this key. This
+        uses an upload that is conditional on there being no
+        existing generation of the object
+
+        Args:
+             bucket (dict): Bucket containing data
+             key (str): Key for data in bucket
+             data (bytes): Binary data to store in bucket
+
+        Returns:
+             bool: Whether or not the object was set
+        """
+        if data is None:
+            data = b"0"
+
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        key = _clean_key(key)
+
+        blob = bucket["bucket"].blob(key)
+
+        try:
+            blob.upload_from_string(data, if_generation_match=0)
+        except Exception as e:
+            if getattr(e, "code", None) == 412:
+                # there is already an object at this key
+                return False
+
+            raise
+
+        return True
+
     @staticmethod
     def delete_all_objects(bucket, prefix=None):
         """Deletes all objects...
 
         Args:
              bucket (dict): Bucket containing data
-             prefix (str, default=None): Prefix for data,
-             currently unused
+             prefix (str, default=None): Only delete the objects
+             below this prefix
          Returns:
              None
         """
-        blobs = bucket["bucket"].list_blobs()
+        if prefix:
+            blobs = bucket["bucket"].list_blobs(prefix="%s/" % _clean_key(prefix).rstrip("/"))
+        else:
+            blobs = bucket["bucket"].list_blobs()
 
         for blob in blobs:
             blob.delete()
@@ -560,6 +718,42 @@ class GCP_ObjectStore:
         except:
             pass
 
+    @staticmethod
+    def delete_object_if_unchanged(bucket, key, data):
+        """Atomically remove the object at 'key' if (and only if) it
+        still holds the binary 'data'. The delete is conditional on
+        the generation that was read and compared
+
+        Args:
+             bucket (dict): Bucket containing data
+             key (str): Key for data
+             data (bytes): Data that the object must still hold
+        Returns:
+             bool: Whether or not the object was removed
+        """
+        key = _clean_key(key)
+
+        blob = bucket["bucket"].get_blob(key)
+
+        if blob is None:
+            return False
+
+        generation = blob.generation
+
+        try:
+            if blob.download_as_string(if_generation_match=generation) != data:
+                return False
+
+            blob.delete(if_generation_match=generation)
+        except Exception as e:
+            if getattr(e, "code", None) in (404, 412):
+                # changed or removed by someone else
+                return False
+
+            raise
+
+        return True
+
     @staticmethod
     def get_size_and_checksum(bucket, key):
         """Return the object size (in bytes) and MD5 checksum of the
@@ -0,0 +1,339 @@
+import os as _os
+import threading as _threading
+
+__all__ = [
+    "ObjectStoreMetrics",
+    "enable_objstore_metrics",
+    "disable_objstore_metrics",
+    "is_collecting_objstore_metrics",
+    "get_container_objstore_metrics",
+    "get_request_objstore_metrics",
+    "start_objstore_metrics",
+    "end_objstore_metrics",
+    "get_key_family",
+]
+
+# Metrics are switched on by setting OBJSTORE_METRICS=1 in the
+# environment, or by calling enable_objstore_metrics()
+_metrics_enabled = _os.getenv("OBJSTORE_METRICS") == "1"
+
+# The upper bounds (in milliseconds) of the buckets of the latency
+# histograms. The last bucket holds everything slower than this
+_latency_buckets = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+_local = _threading.local()
+
+
+def get_key_family(key):
+    """Return the key-prefix family of the passed key. This is used to
+    group object store calls together, e.g. 'accounting/transactions',
+    'registry/pars', 'storage/file' or 'mutexes'. Keys with three or more
+    parts are grouped by their first two parts, while shorter keys are
+    grouped by their first part
+
+    Args:
+         key (str): Key to classify
+    Returns:
+         str: The key family
+    """
+    if key is None:
+        return "/"
+
+    parts = [part for part in str(key).split("/") if len(part) > 0]
+
+    if len(parts) == 0:
+        return "/"
+    elif len(parts) < 3:
+        return parts[0]
+    else:
+        return "%s/%s" % (parts[0], parts[1])
+
+
+class _Stats:
+    """Holds the counts, bytes and latency histogram for a single
+    (operation, key family) pair
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.nbytes_read = 0
+        self.nbytes_written = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * (len(_latency_buckets) + 1)
+
+    def record(self, seconds, nbytes_read, nbytes_written, error):
+        self.count += 1
+        self.seconds += seconds
+        self.nbytes_read += nbytes_read
+        self.nbytes_written += nbytes_written
+
+        if error:
+            self.errors += 1
+
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+        ms = 1000.0 * seconds
+
+        for i, bound in enumerate(_latency_buckets):
+            if ms <= bound:
+                self.histogram[i] += 1
+                return
+
+        self.histogram[-1] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.errors += other.errors
+        self.nbytes_read += other.nbytes_read
+        self.nbytes_written += other.nbytes_written
+        self.seconds += other.seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+
+        for i, value in enumerate(other.histogram):
+            self.histogram[i] += value
+
+    def percentile(self, q):
+        """Return an estimate of the q'th percentile latency in
+        milliseconds, taken as the upper bound of the histogram
+        bucket that contains that percentile
+        """
+        if self.count == 0:
+            return 0.0
+
+        target = q * self.count / 100.0
+        total = 0
+
+        for i, value in enumerate(self.histogram):
+            total += value
+
+            if total >= target and value > 0:
+                if i < len(_latency_buckets):
+                    return float(_latency_buckets[i])
+                else:
+                    return 1000.0 * self.max_seconds
+
+        return 1000.0 * self.max_seconds
+
+    def to_data(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes_read": self.nbytes_read,
+            "bytes_written": self.nbytes_written,
+            "total_ms": 1000.0 * self.seconds,
+            "max_ms": 1000.0 * self.max_seconds,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "histogram": list(self.histogram),
+        }
+
+    @staticmethod
+    def from_data(data):
+        s = _Stats()
+        s.count = int(data["count"])
+        s.errors = int(data["errors"])
+        s.nbytes_read = int(data["bytes_read"])
+        s.nbytes_written = int(data["bytes_written"])
+        s.seconds = float(data["total_ms"]) / 1000.0
+        s.max_seconds = float(data["max_ms"]) / 1000.0
+        s.histogram = [int(x) for x in data["histogram"]]
+        return s
+
+
+class ObjectStoreMetrics:
+    """This class collects the number of calls, the number of bytes
+    read and written, and a histogram of the latency of calls made
+    through the ObjectStore facade, grouped by operation and by
+    key family (see get_key_family)
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = _threading.Lock()
+
+    def __str__(self):
+        return "ObjectStoreMetrics(calls=%d)" % self.count()
+
+    def is_empty(self):
+        """Return whether or not any calls have been recorded"""
+        return len(self._stats) == 0
+
+    def count(self, operation=None, family=None):
+        """Return the number of calls recorded, optionally restricted
+        to the passed operation and/or key family
+        """
+        total = 0
+
+        for (op, fam), stats in list(self._stats.items()):
+            if operation is not None and op != operation:
+                continue
+
+            if family is not None and fam != family:
+                continue
+
+            total += stats.count
+
+        return total
+
+    def record(self, operation, key, seconds, nbytes_read=0, nbytes_written=0, error=False):
+        """Record a single call of 'operation' on 'key' that took
+        'seconds', read 'nbytes_read' and wrote 'nbytes_written'
+        """
+        k = (operation, get_key_family(key))
+
+        with self._lock:
+            try:
+                stats = self._stats[k]
+            except KeyError:
+                stats = _Stats()
+                self._stats[k] = stats
+
+            stats.record(seconds, nbytes_read, nbytes_written, error)
+
+    def merge(self, other):
+        """Merge the metrics from 'other' into these metrics"""
+        if other is None:
+            return
+
+        with self._lock:
+            for k, stats in list(other._stats.items()):
+                try:
+                    self._stats[k].merge(stats)
+                except KeyError:
+                    s = _Stats()
+                    s.merge(stats)
+                    self._stats[k] = s
+
+    def clear(self):
+        """Clear all of the recorded metrics"""
+        with self._lock:
+            self._stats = {}
+
+    def to_data(self):
+        """Return a json-serialisable dictionary of these metrics,
+        keyed by operation and then key family
+        """
+        data = {}
+
+        with self._lock:
+            for (op, fam), stats in self._stats.items():
+                if op not in data:
+                    data[op] = {}
+
+                data[op][fam] = stats.to_data()
+
+        return data
+
+    @staticmethod
+    def from_data(data):
+        """Return metrics constructed from the passed json-deserialised
+        dictionary
+        """
+        metrics = ObjectStoreMetrics()
+
+        if data is None:
+            return metrics
+
+        for op, families in data.items():
+            for fam, stats in families.items():
+                metrics._stats[(op, fam)] = _Stats.from_data(stats)
+
+        return metrics
+
+
+_container_metrics = ObjectStoreMetrics()
+
+
+def enable_objstore_metrics():
+    """Switch on the collection of object store metrics"""
+    global _metrics_enabled
+    _metrics_enabled = True
+
+
+def disable_objstore_metrics():
+    """Switch off the collection of object store metrics"""
+    global _metrics_enabled
+    _metrics_enabled = False
+
+
+def is_collecting_objstore_metrics():
+    """Return whether or not object store metrics are being collected"""
+    return _metrics_enabled
+
+
+def get_container_objstore_metrics():
+    """Return the metrics aggregated over all requests handled by
+    this process (container)
+    """
+    return _container_metrics
+
+
+def _request_stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+def get_request_objstore_metrics():
+    """Return the metrics of the request being handled in this
+    thread, or None if there is no such request
+    """
+    stack = _request_stack()
+
+    if len(stack) == 0:
+        return None
+    else:
+        return stack[-1]
+
+
+def start_objstore_metrics():
+    """Start collecting object store metrics for a new request in
+    this thread. This returns None if metrics are not enabled
+    """
+    if not _metrics_enabled:
+        return None
+
+    metrics = ObjectStoreMetrics()
+    _request_stack().append(metrics)
+    return metrics
+
+
+def end_objstore_metrics(metrics, results=None):
+    """Finish collecting the passed request metrics, so that later
+    calls in this thread are no longer recorded against them. If
+    'results' is passed then the metrics are dumped into 'results'
+    under 'objstore_metrics'. Each call has already been recorded
+    in the container metrics as it was made
+    """
+    if metrics is None:
+        return results
+
+    stack = _request_stack()
+
+    try:
+        stack.remove(metrics)
+    except ValueError:
+        pass
+
+    if results is not None and not metrics.is_empty():
+        results["objstore_metrics"] = metrics.to_data()
+
+    return results
+
+
+def _record_call(operation, key, seconds, nbytes_read, nbytes_written, error):
+    """Internal function called by the ObjectStore facade to record
+    a call against the container and current request metrics
+    """
+    _container_metrics.record(operation, key, seconds, nbytes_read, nbytes_written, error)
+
+    request = get_request_objstore_metrics()
+
+    if request is not None:
+        request.record(operation, key, seconds, nbytes_read, nbytes_written, error)
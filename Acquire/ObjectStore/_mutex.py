@@ -122,10 +122,7 @@ class Mutex:
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
         from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
 
-        try:
-            holder = _ObjectStore.get_string_object(self._bucket, self._key)
-        except:
-            holder = None
+        holder = _ObjectStore.get_string_object_or_none(self._bucket, self._key)
 
         if holder == self._lockstring:
             # we hold the mutex - delete the key
@@ -171,6 +168,14 @@ class Mutex:
         Returns:
              None
         """
+        from Acquire.Service import trace_span as _trace_span
+
+        # record the time spent waiting for the mutex
+        with _trace_span("mutex", "lock", key=self._key):
+            self._lock(timeout=timeout, lease_time=lease_time)
+
+    def _lock(self, timeout=None, lease_time=None):
+        """Internal function that performs the work of 'lock'"""
         # if the user does not provide a timeout, then we will set a timeout
         # to 10 seconds
         if timeout is None:
@@ -215,10 +220,7 @@ class Mutex:
         # This is the first time we are trying to get a lock
         while now < endtime:
             # does anyone else hold the lock?
-            try:
-                holder = _ObjectStore.get_string_object(self._bucket, self._key)
-            except:
-                holder = None
+            holder = _ObjectStore.get_string_object_or_none(self._bucket, self._key)
 
             is_held = True
 
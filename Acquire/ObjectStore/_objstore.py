@@ -3,6 +3,11 @@ import datetime as _datetime
 import uuid as _uuid
 import json as _json
 import os as _os
+import time as _time
+
+from ._cache import _get_missing_ttl, _is_known_missing, _set_known_missing, _forget_missing
+from ._sharding import _get_sharded_key, _get_unsharded_key, _get_shard_prefixes
+from ._sharding import get_sharded_key_families as _get_sharded_key_families
 
 __all__ = [
     "ObjectStore",
@@ -10,11 +15,88 @@ __all__ = [
     "use_testing_object_store_backend",
     "use_oci_object_store_backend",
     "use_gcp_object_store_backend",
+    "use_sqlite_object_store_backend",
 ]
 
 _objstore_backend = None
 
 
+class _ObjectStoreCall:
+    """Internal context manager used by the ObjectStore facade to time
+    the passed object store 'operation'. This records a tracing span
+    and, if enabled, the object store metrics for the call. Set
+    'nbytes_read' and 'nbytes_written' on the returned object to
+    record the amount of data transferred
+    """
+
+    __slots__ = ["operation", "key", "nbytes_read", "nbytes_written", "_span", "_start"]
+
+    def __init__(self, operation, key=None):
+        self.operation = operation
+        self.key = key
+        self.nbytes_read = 0
+        self.nbytes_written = 0
+
+    def __enter__(self):
+        from Acquire.Service import trace_span as _trace_span
+
+        try:
+            backend = _objstore_backend.__name__
+        except AttributeError:
+            backend = str(_objstore_backend)
+
+        if self.key is None:
+            self._span = _trace_span("objstore", self.operation, backend=backend)
+        else:
+            self._span = _trace_span("objstore", self.operation, backend=backend, key=str(self.key))
+
+        self._span.__enter__()
+        self._start = _time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        from ._metrics import is_collecting_objstore_metrics, _record_call
+
+        if is_collecting_objstore_metrics():
+            _record_call(
+                operation=self.operation,
+                key=self.key,
+                seconds=_time.perf_counter() - self._start,
+                nbytes_read=self.nbytes_read,
+                nbytes_written=self.nbytes_written,
+                error=exc_type is not None,
+            )
+
+        return self._span.__exit__(exc_type, exc_value, tb)
+
+
+def _get_bucket_uid(bucket):
+    """Internal function that returns a unique identifier for the
+    passed bucket, used to key objects in the object cache
+    """
+    if isinstance(bucket, dict):
+        namespace = bucket.get("namespace", bucket.get("filename", ""))
+        return "%s/%s" % (namespace, bucket.get("bucket_name", ""))
+    else:
+        return str(bucket)
+
+
+def _get_cache(key):
+    """Internal function that returns the (cache, is_cached, ttl) for
+    the passed key. The cache is None if caching is switched off
+    """
+    from ._cache import get_object_cache, _get_cache_policy
+
+    cache = get_object_cache()
+
+    if cache is None:
+        return (None, False, None)
+
+    (is_cached, ttl) = _get_cache_policy(key)
+
+    return (cache, is_cached, ttl)
+
+
 def use_testing_object_store_backend(backend):
     from ._testing_objstore import Testing_ObjectStore as _Testing_ObjectStore
 
@@ -42,6 +124,24 @@ def use_gcp_object_store_backend():
     set_object_store_backend(_GCP_ObjectStore)
 
 
+def use_sqlite_object_store_backend(filename, bucket_name="acquire"):
+    """Use the SQLite object store backend, storing all objects in
+    the database in 'filename'. This returns the bucket called
+    'bucket_name' in this database
+    """
+    from ._sqlite_objstore import SQLite_ObjectStore as _SQLite_ObjectStore
+
+    filename = _os.path.abspath(str(filename))
+    directory = _os.path.dirname(filename)
+
+    if not _os.path.exists(directory):
+        _os.makedirs(directory, exist_ok=True)
+
+    set_object_store_backend(_SQLite_ObjectStore)
+
+    return _SQLite_ObjectStore.get_bucket({"filename": filename}, bucket_name)
+
+
 class ObjectStore:
     @staticmethod
     def create_bucket(bucket, bucket_name):
@@ -49,7 +149,8 @@ class ObjectStore:
         'bucket_name'. This will raise an
         ObjectStoreError if this bucket already exists
         """
-        return _objstore_backend.create_bucket(bucket, bucket_name)
+        with _ObjectStoreCall("create_bucket"):
+            return _objstore_backend.create_bucket(bucket, bucket_name)
 
     @staticmethod
     def get_bucket(bucket, bucket_name, create_if_needed=True):
@@ -58,7 +159,8 @@ class ObjectStore:
         then the bucket will be created if it doesn't exist. Otherwise,
         if the bucket does not exist then an exception will be raised.
         """
-        return _objstore_backend.get_bucket(bucket, bucket_name, create_if_needed)
+        with _ObjectStoreCall("get_bucket"):
+            return _objstore_backend.get_bucket(bucket, bucket_name, create_if_needed)
 
     @staticmethod
     def get_bucket_name(bucket):
@@ -97,15 +199,16 @@ class ObjectStore:
         """
         from Acquire.ObjectStore import OSPar as _OSPar
 
-        par = _objstore_backend.create_par(
-            bucket=bucket,
-            encrypt_key=encrypt_key,
-            key=key,
-            readable=readable,
-            writeable=writeable,
-            duration=duration,
-            cleanup_function=cleanup_function,
-        )
+        with _ObjectStoreCall("create_par", key):
+            par = _objstore_backend.create_par(
+                bucket=bucket,
+                encrypt_key=encrypt_key,
+                key=_get_sharded_key(key),
+                readable=readable,
+                writeable=writeable,
+                duration=duration,
+                cleanup_function=cleanup_function,
+            )
 
         if not isinstance(par, _OSPar):
             raise TypeError(
@@ -120,22 +223,166 @@ class ObjectStore:
         """Close the passed OSPar, which provides access to data in the
         passed bucket
         """
-        _objstore_backend.close_par(par=par, par_uid=par_uid, url_checksum=url_checksum)
+        with _ObjectStoreCall("close_par"):
+            _objstore_backend.close_par(par=par, par_uid=par_uid, url_checksum=url_checksum)
 
     @staticmethod
     def get_object(bucket, key):
         """Return the binary data contained in the key 'key' in the
         passed bucket"""
-        return _objstore_backend.get_object(bucket, key)
+        (cache, is_cached, ttl) = _get_cache(key)
+
+        if cache is not None:
+            cache_key = (_get_bucket_uid(bucket), key)
+            data = cache.get(cache_key)
+
+            if data is not None:
+                with _ObjectStoreCall("get_cached_object", key) as call:
+                    call.nbytes_read = len(data)
+
+                return data
+
+        from Acquire.ObjectStore import ObjectStoreMissingError
+
+        missing_ttl = _get_missing_ttl(key)
+
+        if missing_ttl is not None:
+            missing_key = (_get_bucket_uid(bucket), key)
+
+            if _is_known_missing(missing_key):
+                with _ObjectStoreCall("get_missing_object", key):
+                    pass
+
+                raise ObjectStoreMissingError("No object at key '%s'" % key)
+
+        try:
+            with _ObjectStoreCall("get_object", key) as call:
+                data = _objstore_backend.get_object(bucket, _get_sharded_key(key))
+
+                if data is not None:
+                    call.nbytes_read = len(data)
+        except ObjectStoreMissingError:
+            # only remember that there is no object here - any other
+            # error (e.g. a timeout) says nothing about the key
+            if missing_ttl is not None:
+                _set_known_missing(missing_key, missing_ttl)
+
+            raise
+
+        if is_cached:
+            cache.put(cache_key, data, ttl)
+
+        return data
+
+    @staticmethod
+    def get_object_or_none(bucket, key):
+        """Return the binary data contained in the key 'key' in the
+        passed bucket, or None if there is no object at this key
+        """
+        from Acquire.ObjectStore import ObjectStoreError
+
+        try:
+            return ObjectStore.get_object(bucket, key)
+        except ObjectStoreError:
+            return None
+
+    @staticmethod
+    def get_string_object_or_none(bucket, key):
+        """Return the string in 'bucket' associated with 'key', or
+        None if there is no object at this key
+        """
+        data = ObjectStore.get_object_or_none(bucket, key)
+
+        if data is None:
+            return None
+        else:
+            return data.decode("utf-8")
+
+    @staticmethod
+    def exists(bucket, key):
+        """Return whether or not there is an object at 'key' in the
+        passed bucket. This is cheaper than reading the object, as
+        only the object's metadata is requested from the backend
+        """
+        (cache, _is_cached, _ttl) = _get_cache(key)
+
+        if cache is not None and cache.get((_get_bucket_uid(bucket), key)) is not None:
+            return True
+
+        missing_ttl = _get_missing_ttl(key)
+
+        if missing_ttl is not None and _is_known_missing((_get_bucket_uid(bucket), key)):
+            return False
+
+        with _ObjectStoreCall("exists", key):
+            try:
+                exists = _objstore_backend.exists(bucket, _get_sharded_key(key))
+            except AttributeError:
+                from Acquire.ObjectStore import ObjectStoreMissingError
+
+                try:
+                    _objstore_backend.get_object(bucket, _get_sharded_key(key))
+                    exists = True
+                except ObjectStoreMissingError:
+                    exists = False
+
+        if missing_ttl is not None and not exists:
+            _set_known_missing((_get_bucket_uid(bucket), key), missing_ttl)
+
+        return exists
+
+    @staticmethod
+    def iter_object(bucket, key):
+        """Iterate over the binary data contained in the key 'key' in
+        the passed bucket, yielding the data in blocks. This avoids
+        holding large objects in memory
+        """
+        (cache, _is_cached, _ttl) = _get_cache(key)
+
+        if cache is not None:
+            data = cache.get((_get_bucket_uid(bucket), key))
+
+            if data is not None:
+                with _ObjectStoreCall("get_cached_object", key) as call:
+                    call.nbytes_read = len(data)
+
+                yield data
+                return
+
+        try:
+            iter_object = _objstore_backend.iter_object
+        except AttributeError:
+            iter_object = None
+
+        with _ObjectStoreCall("iter_object", key) as call:
+            if iter_object is None:
+                blocks = [_objstore_backend.get_object(bucket, _get_sharded_key(key))]
+            else:
+                blocks = iter_object(bucket, _get_sharded_key(key))
+
+            for block in blocks:
+                if block:
+                    call.nbytes_read += len(block)
+                    yield block
 
     @staticmethod
     def get_object_as_file(bucket, key, filename):
         """Get the object contained in the key 'key' in the passed 'bucket'
-        and writing this to the file called 'filename'"""
-        data = ObjectStore.get_object(bucket, key)
+        and writing this to the file called 'filename'. The object
+        is streamed to the file, so is never held in memory
+        """
+        blocks = ObjectStore.iter_object(bucket, key)
+
+        # read the first block before creating the file, so that no
+        # file is created if there is no object at this key
+        first = next(blocks, None)
 
         with open(filename, "wb") as FILE:
-            FILE.write(data)
+            if first is not None:
+                FILE.write(first)
+
+            for block in blocks:
+                FILE.write(block)
 
     @staticmethod
     def get_string_object(bucket, key):
@@ -157,7 +404,15 @@ class ObjectStore:
         """Take (delete) the object from the object store, returning
         the object
         """
-        return _objstore_backend.take_object(bucket, key)
+        ObjectStore.invalidate_cached_object(bucket, key)
+
+        with _ObjectStoreCall("take_object", key) as call:
+            data = _objstore_backend.take_object(bucket, _get_sharded_key(key))
+
+            if data is not None:
+                call.nbytes_read = len(data)
+
+            return data
 
     @staticmethod
     def take_string_object(bucket, key):
@@ -189,7 +444,58 @@ class ObjectStore:
     @staticmethod
     def get_all_object_names(bucket, prefix=None, without_prefix=False):
         """Returns the names of all objects in the passed bucket"""
-        return _objstore_backend.get_all_object_names(bucket, prefix, without_prefix)
+        (shard_prefixes, include_unsharded) = _get_shard_prefixes(prefix)
+
+        if len(shard_prefixes) == 0:
+            with _ObjectStoreCall("get_all_object_names", prefix):
+                names = _objstore_backend.get_all_object_names(bucket, prefix, without_prefix)
+
+            if len(_get_sharded_key_families()) == 0 or prefix:
+                return names
+            else:
+                # the names include objects in any shards
+                return [_get_unsharded_key(name) for name in names]
+
+        # search every shard that may hold matching objects, together
+        # with the unsharded objects, and merge the results
+        prefixes = list(shard_prefixes)
+
+        if include_unsharded:
+            prefixes.append(prefix)
+
+        def _list(p):
+            with _ObjectStoreCall("get_all_object_names", prefix):
+                return _objstore_backend.get_all_object_names(bucket, p)
+
+        if len(prefixes) == 1:
+            results = [_list(prefixes[0])]
+        else:
+            from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+            with _ThreadPoolExecutor(max_workers=min(16, len(prefixes))) as pool:
+                results = list(pool.map(_list, prefixes))
+
+        names = []
+        seen = set()
+
+        for result in results:
+            for name in result:
+                name = _get_unsharded_key(name)
+
+                if name in seen:
+                    continue
+
+                seen.add(name)
+
+                if without_prefix:
+                    name = name[len(prefix) :].lstrip("/")
+
+                    if len(name) == 0:
+                        continue
+
+                names.append(name)
+
+        return names
 
     @staticmethod
     def get_all_objects(bucket, prefix=None):
@@ -239,7 +545,36 @@ class ObjectStore:
     @staticmethod
     def set_object(bucket, key, data):
         """Set the value of 'key' in 'bucket' to binary 'data'"""
-        _objstore_backend.set_object(bucket, key, data)
+        (cache, is_cached, ttl) = _get_cache(key)
+
+        if cache is not None:
+            cache_key = (_get_bucket_uid(bucket), key)
+            cache.invalidate(cache_key)
+
+        _forget_missing((_get_bucket_uid(bucket), key))
+
+        with _ObjectStoreCall("set_object", key) as call:
+            if data is not None:
+                call.nbytes_written = len(data)
+
+            _objstore_backend.set_object(bucket, _get_sharded_key(key), data)
+
+        if is_cached and isinstance(data, bytes):
+            cache.put(cache_key, data, ttl)
+
+    @staticmethod
+    def batch(max_workers=8):
+        """Return an ObjectStoreBatch that collects writes and deletes
+        and performs them concurrently when it is flushed (on exit
+        of a 'with' block), e.g.
+
+            with ObjectStore.batch() as batch:
+                batch.set_object_from_json(bucket, key1, data1)
+                batch.delete_object(bucket, key2)
+        """
+        from ._batch import ObjectStoreBatch as _ObjectStoreBatch
+
+        return _ObjectStoreBatch(max_workers=max_workers)
 
     @staticmethod
     def set_object_from_file(bucket, key, filename):
@@ -247,6 +582,45 @@ class ObjectStore:
         of the file located by 'filename'"""
         ObjectStore.set_object(bucket, key, open(filename, "rb").read())
 
+    @staticmethod
+    def set_object_if_absent(bucket, key, data):
+        """Set the value of 'key' in 'bucket' to binary 'data' if (and
+        only if) there is no object at this key. This returns whether
+        or not the object was set. This is atomic for backends that
+        support conditional writes, and is otherwise guarded by a Mutex
+        """
+        try:
+            set_if_absent = _objstore_backend.set_object_if_absent
+        except AttributeError:
+            set_if_absent = None
+
+        if set_if_absent is None:
+            from Acquire.ObjectStore import Mutex as _Mutex
+
+            m = _Mutex(bucket=bucket, key=key)
+
+            try:
+                if ObjectStore.exists(bucket, key):
+                    return False
+
+                ObjectStore.set_object(bucket, key, data)
+                return True
+            finally:
+                m.unlock()
+
+        (cache, _is_cached, _ttl) = _get_cache(key)
+
+        if cache is not None:
+            cache.invalidate((_get_bucket_uid(bucket), key))
+
+        _forget_missing((_get_bucket_uid(bucket), key))
+
+        with _ObjectStoreCall("set_object_if_absent", key) as call:
+            if data is not None:
+                call.nbytes_written = len(data)
+
+            return set_if_absent(bucket, _get_sharded_key(key), data)
+
     @staticmethod
     def set_ins_object_from_json(bucket, key, data):
         """Set the value of 'key' in 'bucket' to equal to contents
@@ -256,26 +630,10 @@ class ObjectStore:
         (either the set object or the value that was previously
         set
         """
-        from Acquire.ObjectStore import Mutex as _Mutex
-
-        m = _Mutex(bucket=bucket, key=key)
-
-        try:
-            old_data = ObjectStore.get_object_from_json(bucket, key)
-        except:
-            old_data = None
-
-        if old_data is not None:
-            m.unlock()
-            return old_data
-        else:
-            try:
-                ObjectStore.set_object_from_json(bucket, key, data)
-            except:
-                m.unlock()
-                raise
-
+        if ObjectStore.set_object_if_absent(bucket, key, _json.dumps(data).encode("utf-8")):
             return data
+        else:
+            return ObjectStore.get_object_from_json(bucket, key)
 
     @staticmethod
     def set_ins_string_object(bucket, key, string_data):
@@ -285,26 +643,10 @@ class ObjectStore:
         key after the operation (either the set string, or the value
         that was previously set)
         """
-        from Acquire.ObjectStore import Mutex as _Mutex
-
-        m = _Mutex(bucket=bucket, key=key)
-
-        try:
-            val = ObjectStore.get_string_object(bucket, key)
-        except:
-            val = None
-
-        if val is not None:
-            m.unlock()
-            return val
-        else:
-            try:
-                ObjectStore.set_string_object(bucket, key, string_data)
-            except:
-                m.unlock()
-                raise
-
+        if ObjectStore.set_object_if_absent(bucket, key, string_data.encode("utf-8")):
             return string_data
+        else:
+            return ObjectStore.get_string_object(bucket, key)
 
     @staticmethod
     def set_string_object(bucket, key, string_data):
@@ -320,12 +662,89 @@ class ObjectStore:
     @staticmethod
     def delete_all_objects(bucket, prefix=None):
         """Deletes all objects..."""
-        _objstore_backend.delete_all_objects(bucket, prefix)
+        from ._cache import get_object_cache
+
+        cache = get_object_cache()
+
+        if cache is not None:
+            cache.invalidate_prefix(_get_bucket_uid(bucket), prefix)
+
+        (shard_prefixes, include_unsharded) = _get_shard_prefixes(prefix)
+
+        if include_unsharded:
+            shard_prefixes.append(prefix)
+
+        for p in shard_prefixes:
+            with _ObjectStoreCall("delete_all_objects", prefix):
+                _objstore_backend.delete_all_objects(bucket, p)
 
     @staticmethod
     def delete_object(bucket, key):
         """Removes the object at 'key'"""
-        _objstore_backend.delete_object(bucket, key)
+        ObjectStore.invalidate_cached_object(bucket, key)
+
+        with _ObjectStoreCall("delete_object", key):
+            _objstore_backend.delete_object(bucket, _get_sharded_key(key))
+
+    @staticmethod
+    def delete_object_if_unchanged(bucket, key, data):
+        """Remove the object at 'key' in 'bucket' if (and only if) it
+        still holds the binary 'data', e.g. the value that was read
+        when deciding that the object could be removed. This returns
+        whether or not the object was removed. This is atomic for
+        backends that support conditional deletes, and is otherwise
+        guarded by a Mutex
+        """
+        try:
+            delete_if_unchanged = _objstore_backend.delete_object_if_unchanged
+        except AttributeError:
+            delete_if_unchanged = None
+
+        if delete_if_unchanged is None:
+            from Acquire.ObjectStore import Mutex as _Mutex
+
+            m = _Mutex(bucket=bucket, key=key)
+
+            try:
+                if ObjectStore.get_object_or_none(bucket, key) != data:
+                    return False
+
+                ObjectStore.delete_object(bucket, key)
+                return True
+            finally:
+                m.unlock()
+
+        ObjectStore.invalidate_cached_object(bucket, key)
+
+        with _ObjectStoreCall("delete_object_if_unchanged", key):
+            return delete_if_unchanged(bucket, _get_sharded_key(key), data)
+
+    @staticmethod
+    def invalidate_cached_object(bucket, key):
+        """Remove any cached copy of the object at 'key' in 'bucket'.
+        Call this if the object has been changed without going
+        through the ObjectStore, e.g. via a PAR
+        """
+        from ._cache import get_object_cache
+
+        cache = get_object_cache()
+
+        if cache is not None:
+            cache.invalidate((_get_bucket_uid(bucket), key))
+
+    @staticmethod
+    def cache_immutable_object(bucket, key, data):
+        """Tell the ObjectStore that the object at 'key' in 'bucket',
+        whose current value is 'data', will never change again, and
+        so can be cached even though it is not in a cached key family
+        (e.g. a ledger record that has been settled)
+        """
+        from ._cache import get_object_cache
+
+        cache = get_object_cache()
+
+        if cache is not None and data is not None:
+            cache.put((_get_bucket_uid(bucket), key), data)
 
     @staticmethod
     def clear_all_except(bucket, keys):
@@ -350,7 +769,8 @@ class ObjectStore:
         """Return the object size (in bytes) and checksum of the
         object in the passed bucket at the specified key
         """
-        return _objstore_backend.get_size_and_checksum(bucket, key)
+        with _ObjectStoreCall("get_size_and_checksum", key):
+            return _objstore_backend.get_size_and_checksum(bucket, _get_sharded_key(key))
 
 
 def set_object_store_backend(backend):
@@ -119,6 +119,80 @@ def _get_driver_details_from_data(data):
     return details
 
 
+# The maximum number of chunks of a chunked object that will be
+# downloaded at the same time
+_max_chunk_downloads = 8
+
+
+def _stream_response(response):
+    """Yield the body of the passed get_object response in
+    blocks of 1 MB
+    """
+    for block in response.data.raw.stream(1024 * 1024, decode_content=False):
+        if block:
+            yield block
+
+
+def _list_objects(bucket, prefix=None):
+    """Return all of the objects in the passed bucket whose names
+    start with 'prefix'. Each call to list_objects returns at most
+    one page of objects, so this follows 'next_start_with' until
+    every page has been read
+    """
+    objects = []
+    start = None
+
+    while True:
+        kwargs = {"prefix": prefix}
+
+        if start is not None:
+            kwargs["start"] = start
+
+        page = bucket["client"].list_objects(bucket["namespace"], bucket["bucket_name"], **kwargs).data
+        objects += page.objects
+        start = page.next_start_with
+
+        if start is None:
+            return objects
+
+
+def _get_legacy_chunk_keys(bucket, key):
+    """Return the keys of the chunks ('key/1', 'key/2' etc.) of a
+    legacy chunked object (one written without a chunk manifest) at
+    'key', in order. This raises an ObjectStoreMissingError if there
+    is no such object, or if searching for legacy chunked objects is
+    switched off, and an ObjectStoreError if the chunks can't be listed
+    """
+    from Acquire.ObjectStore import ObjectStoreError, ObjectStoreMissingError
+    from ._chunked import _is_legacy_chunk_lookup
+
+    if not _is_legacy_chunk_lookup():
+        raise ObjectStoreMissingError("No data at key '%s'" % key)
+
+    try:
+        objects = _list_objects(bucket, prefix="%s/" % key)
+    except Exception as e:
+        raise ObjectStoreError("Unable to list the chunks of the object at key '%s': %s" % (key, str(e)))
+
+    chunks = {}
+
+    for obj in objects:
+        part = obj.name[len(key) + 1 :]
+
+        if part.isdigit():
+            chunks[int(part)] = obj.name
+
+    chunk_keys = []
+
+    while len(chunk_keys) + 1 in chunks:
+        chunk_keys.append(chunks[len(chunk_keys) + 1])
+
+    if len(chunk_keys) == 0:
+        raise ObjectStoreMissingError("No data at key '%s'" % key)
+
+    return chunk_keys
+
+
 class OCI_ObjectStore:
     """This is the backend that abstracts using the Oracle Cloud
     Infrastructure object store
@@ -528,7 +602,8 @@ class OCI_ObjectStore:
     @staticmethod
     def get_object(bucket, key):
         """Return the binary data contained in the key 'key' in the
-        passed bucket
+        passed bucket. Large objects that are stored as a set of
+        chunks are downloaded concurrently
 
         Args:
              bucket (dict): Bucket containing data
@@ -537,58 +612,115 @@ class OCI_ObjectStore:
              bytes: Binary data
 
         """
+        from ._chunked import get_chunk_manifest, _get_chunk_keys
 
         key = _clean_key(key)
 
         try:
             response = bucket["client"].get_object(bucket["namespace"], bucket["bucket_name"], key)
-            is_chunked = False
-        except:
-            try:
-                response = bucket["client"].get_object(
-                    bucket["namespace"], bucket["bucket_name"], "%s/1" % key
-                )
-                is_chunked = True
-            except:
-                is_chunked = False
-                pass
+        except Exception as e:
+            if getattr(e, "status", None) != 404:
+                from Acquire.ObjectStore import ObjectStoreError
 
-            # Raise the original error
-            if not is_chunked:
+                raise ObjectStoreError("Unable to read the object at key '%s': %s" % (key, str(e)))
+
+            response = None
+
+        if response is not None:
+            data = b"".join(_stream_response(response))
+            nchunks = get_chunk_manifest(data)
+
+            if nchunks is None:
+                return data
+
+            chunk_keys = _get_chunk_keys(key, nchunks)
+        else:
+            chunk_keys = _get_legacy_chunk_keys(bucket, key)
+
+        if len(chunk_keys) == 1:
+            return OCI_ObjectStore.get_object(bucket, chunk_keys[0])
+
+        from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+        with _ThreadPoolExecutor(max_workers=min(_max_chunk_downloads, len(chunk_keys))) as pool:
+            chunks = list(pool.map(lambda k: OCI_ObjectStore.get_object(bucket, k), chunk_keys))
+
+        return b"".join(chunks)
+
+    @staticmethod
+    def iter_object(bucket, key):
+        """Iterate over the binary data contained in the key 'key' in
+        the passed bucket, yielding the data in blocks of at most
+        1 MB. This holds at most one block in memory at a time
+
+        Args:
+             bucket (dict): Bucket containing data
+             key (str): Key for data in bucket
+        Returns:
+             generator: Blocks of binary data
+        """
+        from ._chunked import get_chunk_manifest, _get_chunk_keys
+
+        key = _clean_key(key)
+
+        try:
+            response = bucket["client"].get_object(bucket["namespace"], bucket["bucket_name"], key)
+        except Exception as e:
+            if getattr(e, "status", None) != 404:
                 from Acquire.ObjectStore import ObjectStoreError
 
-                raise ObjectStoreError("No data at key '%s'" % key)
+                raise ObjectStoreError("Unable to read the object at key '%s': %s" % (key, str(e)))
 
-        data = None
+            response = None
 
-        for chunk in response.data.raw.stream(1024 * 1024, decode_content=False):
-            if not data:
-                data = chunk
-            else:
-                data += chunk
+        if response is not None:
+            blocks = _stream_response(response)
+            first = next(blocks, None)
 
-        if is_chunked:
-            # keep going through to find more chunks
-            next_chunk = 1
+            # a chunk manifest is small, so is always in the first block
+            nchunks = get_chunk_manifest(first)
 
-            while True:
-                next_chunk += 1
+            if nchunks is None:
+                if first is not None:
+                    yield first
 
-                try:
-                    response = bucket["client"].get_object(
-                        bucket["namespace"], bucket["bucket_name"], "%s/%d" % (key, next_chunk)
-                    )
-                except:
-                    response = None
-                    break
+                yield from blocks
+                return
 
-                for chunk in response.data.raw.stream(1024 * 1024, decode_content=False):
-                    if not data:
-                        data = chunk
-                    else:
-                        data += chunk
+            chunk_keys = _get_chunk_keys(key, nchunks)
+        else:
+            chunk_keys = _get_legacy_chunk_keys(bucket, key)
 
-        return data
+        for chunk_key in chunk_keys:
+            yield from OCI_ObjectStore.iter_object(bucket, chunk_key)
+
+    @staticmethod
+    def exists(bucket, key):
+        """Return whether or not there is an object at 'key' in the
+        passed bucket. This only fetches the object's headers
+
+        Args:
+             bucket (dict): Bucket containing data
+             key (str): Key for data in bucket
+        Returns:
+             bool: Whether or not the object exists
+        """
+        from Acquire.ObjectStore import ObjectStoreError, ObjectStoreMissingError
+
+        key = _clean_key(key)
+
+        try:
+            bucket["client"].head_object(bucket["namespace"], bucket["bucket_name"], key)
+            return True
+        except Exception as e:
+            if getattr(e, "status", None) != 404:
+                raise ObjectStoreError("Unable to check for the object at key '%s': %s" % (key, str(e)))
+
+        try:
+            _get_legacy_chunk_keys(bucket, key)
+            return True
+        except ObjectStoreMissingError:
+            return False
 
     @staticmethod
     def take_object(bucket, key):
@@ -601,14 +733,35 @@ class OCI_ObjectStore:
 
         Returns:
              bytes: Binary data
+
+        The delete is conditional (If-Match) on the etag that was
+        read, so only one caller can take any given object. An
+        ObjectStoreError is raised if there is no object at this key
+        or if it was taken (or changed) by someone else
         """
-        # ideally the get and delete should be atomic... would like this API
-        data = OCI_ObjectStore.get_object(bucket, key)
+        from Acquire.ObjectStore import ObjectStoreError
+        from ._chunked import get_chunk_manifest
+
+        key = _clean_key(key)
 
         try:
-            OCI_ObjectStore.delete_object(bucket, key)
+            response = bucket["client"].get_object(bucket["namespace"], bucket["bucket_name"], key)
         except:
-            pass
+            raise ObjectStoreError("No data at key '%s'" % key)
+
+        etag = response.headers["etag"]
+        data = b"".join(_stream_response(response))
+
+        if get_chunk_manifest(data) is not None:
+            data = OCI_ObjectStore.get_object(bucket, key)
+
+        try:
+            bucket["client"].delete_object(bucket["namespace"], bucket["bucket_name"], key, if_match=etag)
+        except Exception as e:
+            if getattr(e, "status", None) in (404, 409, 412):
+                raise ObjectStoreError("The object at key '%s' has already been taken" % key)
+
+            raise
 
         return data
 
@@ -626,16 +779,14 @@ class OCI_ObjectStore:
         if prefix is not None:
             prefix = _clean_key(prefix)
 
-        objects = (
-            bucket["client"].list_objects(bucket["namespace"], bucket["bucket_name"], prefix=prefix).data
-        )
+        objects = _list_objects(bucket, prefix=prefix)
 
         names = []
 
         if without_prefix:
             prefix_len = len(prefix)
 
-        for obj in objects.objects:
+        for obj in objects:
             if prefix:
                 if obj.name.startswith(prefix):
                     name = obj.name
@@ -679,19 +830,53 @@ class OCI_ObjectStore:
         key = _clean_key(key)
         bucket["client"].put_object(bucket["namespace"], bucket["bucket_name"], key, f)
 
+    @staticmethod
+    def set_object_if_absent(bucket, key, data):
+        """Atomically set the value of 'key' in 'bucket' to binary
+        'data' if (and only if) there is no object at this key. This
+        uses a conditional (If-None-Match) put
+
+        Args:
+             bucket (dict): Bucket containing data
+             key (str): Key for data in bucket
+             data (bytes): Binary data to store in bucket
+
+        Returns:
+             bool: Whether or not the object was set
+        """
+        if data is None:
+            data = b"0"
+
+        f = _io.BytesIO(data)
+
+        key = _clean_key(key)
+
+        try:
+            bucket["client"].put_object(bucket["namespace"], bucket["bucket_name"], key, f, if_none_match="*")
+        except Exception as e:
+            if getattr(e, "status", None) in (409, 412):
+                # there is already an object at this key
+                return False
+
+            raise
+
+        return True
+
     @staticmethod
     def delete_all_objects(bucket, prefix=None):
         """Deletes all objects...
 
         Args:
              bucket (dict): Bucket containing data
-             prefix (str, default=None): Prefix for data,
-             currently unused
+             prefix (str, default=None): Only delete the objects
+             below this prefix
          Returns:
              None
         """
+        if prefix:
+            prefix = "%s/" % prefix.rstrip("/")
 
-        for obj in OCI_ObjectStore.get_all_object_names(bucket):
+        for obj in OCI_ObjectStore.get_all_object_names(bucket, prefix):
             bucket["client"].delete_object(bucket["namespace"], bucket["bucket_name"], obj)
 
     @staticmethod
@@ -710,6 +895,38 @@ class OCI_ObjectStore:
         except:
             pass
 
+    @staticmethod
+    def delete_object_if_unchanged(bucket, key, data):
+        """Atomically remove the object at 'key' if (and only if) it
+        still holds the binary 'data'. The delete is conditional
+        (If-Match) on the etag that was read and compared
+
+        Args:
+             bucket (dict): Bucket containing data
+             key (str): Key for data
+             data (bytes): Data that the object must still hold
+        Returns:
+             bool: Whether or not the object was removed
+        """
+        key = _clean_key(key)
+
+        try:
+            response = bucket["client"].get_object(bucket["namespace"], bucket["bucket_name"], key)
+            etag = response.headers["etag"]
+
+            if b"".join(_stream_response(response)) != data:
+                return False
+
+            bucket["client"].delete_object(bucket["namespace"], bucket["bucket_name"], key, if_match=etag)
+        except Exception as e:
+            if getattr(e, "status", None) in (404, 409, 412):
+                # changed or removed by someone else
+                return False
+
+            raise
+
+        return True
+
     @staticmethod
     def get_size_and_checksum(bucket, key):
         """Return the object size (in bytes) and MD5 checksum of the
@@ -61,13 +61,14 @@ class OSParRegistry:
 
         expire_string = _datetime_to_string(par.expires_when())
 
-        key = "%s/uid/%s/%s" % (_registry_key, par.uid(), expire_string)
-
         bucket = _get_service_account_bucket()
-        _ObjectStore.set_object_from_json(bucket, key, data)
 
-        key = "%s/expire/%s/%s" % (_registry_key, expire_string, par.uid())
-        _ObjectStore.set_object_from_json(bucket, key, par.uid())
+        with _ObjectStore.batch() as batch:
+            key = "%s/uid/%s/%s" % (_registry_key, par.uid(), expire_string)
+            batch.set_object_from_json(bucket, key, data)
+
+            key = "%s/expire/%s/%s" % (_registry_key, expire_string, par.uid())
+            batch.set_object_from_json(bucket, key, par.uid())
 
     @staticmethod
     def get(par_uid, details_function, url_checksum=None):
@@ -96,7 +97,9 @@ class OSParRegistry:
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
         from Acquire.ObjectStore import string_to_datetime as _string_to_datetime
 
-        key = "%s/uid/%s" % (_registry_key, par_uid)
+        # the trailing '/' means that only one shard needs to be
+        # searched if the registry is sharded
+        key = "%s/uid/%s/" % (_registry_key, par_uid)
 
         bucket = _get_service_account_bucket()
 
@@ -0,0 +1,187 @@
+import os as _os
+import hashlib as _hashlib
+
+__all__ = ["declare_sharded_key_family", "get_sharded_key_families"]
+
+# The key families (key prefixes) whose objects are spread across
+# a number of hash-prefixed shards, so that writes are not all
+# concentrated on a single prefix (cloud object stores rate-limit
+# requests per prefix). Each family is (prefix, nshards, depth), where
+# 'depth' is the number of path components after the prefix that
+# are hashed to choose the shard. Keys that share these components
+# are in the same shard, so listings below that depth only need to
+# look in one shard
+_sharded_families = []
+
+# Sharded objects are stored at '_shardXX/<key>', so that the shard
+# is at the start of the physical key
+_shard_format = "_shard%02x"
+_shard_root = "_shard"
+
+
+def declare_sharded_key_family(prefix, nshards=16, depth=1):
+    """Declare that objects whose keys start with 'prefix' (e.g.
+    'mutexes' or 'registry/pars') should be spread across 'nshards'
+    hash-prefixed shards. This is applied transparently by the
+    ObjectStore. The shard is chosen by hashing the first 'depth'
+    path components of the key after 'prefix'.
+
+    Note that this changes where objects are stored, so must be
+    declared identically by every service that shares a bucket,
+    before any objects in the family are written
+
+    Args:
+         prefix (str): Key prefix of the family
+         nshards (int, default=16): Number of shards (max 256)
+         depth (int, default=1): Number of path components to hash
+    Returns:
+         None
+    """
+    prefix = str(prefix).strip("/")
+    nshards = int(nshards)
+    depth = int(depth)
+
+    if nshards < 1 or nshards > 256:
+        raise ValueError("The number of shards must be between 1 and 256")
+
+    if depth < 1:
+        raise ValueError("The shard depth must be at least 1")
+
+    for i, (p, _n, _d) in enumerate(_sharded_families):
+        if p == prefix:
+            _sharded_families.pop(i)
+            break
+
+    if nshards > 1:
+        _sharded_families.append((prefix, nshards, depth))
+
+
+def get_sharded_key_families():
+    """Return the list of (prefix, nshards, depth) of the sharded
+    key families
+    """
+    return list(_sharded_families)
+
+
+def _load_families_from_environment():
+    """Declare the sharded families in OBJSTORE_SHARDED_FAMILIES.
+    This is a comma-separated list of 'prefix[:nshards[:depth]]',
+    e.g. 'mutexes:16,registry/pars:16:2'
+    """
+    families = _os.getenv("OBJSTORE_SHARDED_FAMILIES")
+
+    if not families:
+        return
+
+    for family in families.split(","):
+        parts = family.strip().split(":")
+
+        if len(parts[0]) == 0:
+            continue
+
+        nshards = int(parts[1]) if len(parts) > 1 else 16
+        depth = int(parts[2]) if len(parts) > 2 else 1
+
+        declare_sharded_key_family(parts[0], nshards=nshards, depth=depth)
+
+
+_load_families_from_environment()
+
+
+def _get_family(key):
+    """Return the (prefix, nshards, depth) of the sharded family
+    containing 'key', or None
+    """
+    for family in _sharded_families:
+        prefix = family[0]
+
+        if key == prefix or key.startswith(prefix + "/"):
+            return family
+
+    return None
+
+
+def _get_shard(family, key):
+    """Return the shard of 'key' in the passed family, or None if the
+    shard is not determined by 'key' (as it has fewer than 'depth'
+    complete path components after the family prefix)
+    """
+    (prefix, nshards, depth) = family
+
+    parts = key[len(prefix) + 1 :].split("/")
+
+    if len(parts) <= depth:
+        return None
+
+    h = _hashlib.md5("/".join(parts[0:depth]).encode("utf-8")).digest()
+
+    return int.from_bytes(h[0:4], "big") % nshards
+
+
+def _get_sharded_key(key):
+    """Internal function that returns the physical key at which the
+    object with (logical) 'key' is stored
+    """
+    if len(_sharded_families) == 0 or key is None:
+        return key
+
+    family = _get_family(key)
+
+    if family is None:
+        return key
+
+    # append a '/' so that a key with exactly 'depth' components
+    # is hashed on all of them
+    shard = _get_shard(family, key + "/")
+
+    if shard is None:
+        shard = 0
+
+    return "%s/%s" % (_shard_format % shard, key)
+
+
+def _get_unsharded_key(key):
+    """Internal function that returns the logical key of the object
+    stored at the physical 'key'
+    """
+    if key.startswith(_shard_root):
+        parts = key.split("/", 1)
+
+        if len(parts) == 2 and len(parts[0]) == len(_shard_root) + 2:
+            return parts[1]
+
+    return key
+
+
+def _get_shard_prefixes(prefix):
+    """Internal function that returns the physical prefixes that must
+    be searched to find all objects whose logical keys start with
+    'prefix'. This returns (prefixes, include_unsharded), where
+    'include_unsharded' says whether or not unsharded objects
+    may also match the prefix
+    """
+    if len(_sharded_families) == 0 or not prefix:
+        return ([], True)
+
+    family = _get_family(prefix)
+
+    if family is not None:
+        # the prefix is inside a sharded family
+        if prefix.rstrip("/") == family[0]:
+            shard = None
+        else:
+            shard = _get_shard(family, prefix)
+
+        if shard is not None:
+            return (["%s/%s" % (_shard_format % shard, prefix)], False)
+
+        return (["%s/%s" % (_shard_format % i, prefix) for i in range(0, family[1])], False)
+
+    # the prefix may contain one or more sharded families
+    nshards = 0
+
+    for (p, n, _d) in _sharded_families:
+        if p.startswith(prefix):
+            nshards = max(nshards, n)
+
+    return (["%s/%s" % (_shard_format % i, prefix) for i in range(0, nshards)], True)
@@ -0,0 +1,369 @@
+import hashlib as _hashlib
+import sqlite3 as _sqlite3
+import threading as _threading
+
+__all__ = ["SQLite_ObjectStore"]
+
+_local = _threading.local()
+
+_schema = [
+    "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS objects ("
+    "bucket TEXT NOT NULL, key TEXT NOT NULL, data BLOB, size INTEGER, md5 TEXT)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS objects_key ON objects (bucket, key)",
+]
+
+
+def _connect(filename):
+    """Return the connection to the database in 'filename' for this
+    thread. Each thread has its own connection, so that readers
+    can run concurrently (the database uses write-ahead logging)
+    """
+    try:
+        connections = _local.connections
+    except AttributeError:
+        connections = {}
+        _local.connections = connections
+
+    try:
+        return connections[filename]
+    except KeyError:
+        pass
+
+    conn = _sqlite3.connect(filename, timeout=60, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    for statement in _schema:
+        conn.execute(statement)
+
+    connections[filename] = conn
+    return conn
+
+
+class _Transaction:
+    """Context manager for a write transaction on the passed connection"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self._conn.execute("COMMIT")
+        else:
+            self._conn.execute("ROLLBACK")
+
+        return False
+
+
+def _get_prefix_range(prefix):
+    """Return the (lower, upper) bounds of the keys that start with
+    'prefix'. Keys are compared as UTF-8 bytes, which preserves the
+    order of the code points, so the upper bound is the prefix with
+    its last character incremented
+    """
+    return (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def _get_row(data):
+    """Return the (data, size, md5) to store for the passed data"""
+    if data is None:
+        data = b""
+
+    data = bytes(data)
+
+    return (data, len(data), _hashlib.md5(data).hexdigest())
+
+
+class SQLite_ObjectStore:
+    """This is the backend that stores objects in a single SQLite
+    database file. This is intended for single-node (on-premises)
+    deployments. Keys are held in an ordered index, so prefix
+    listings are O(log n), writes are transactional, and readers
+    do not block each other. Buckets are dictionaries holding the
+    'filename' of the database and the 'bucket_name'
+    """
+
+    @staticmethod
+    def create_bucket(bucket, bucket_name):
+        """Create and return a new bucket in the object store called
+        'bucket_name'. This will raise an
+        ObjectStoreError if this bucket already exists
+        """
+        bucket_name = str(bucket_name)
+        conn = _connect(bucket["filename"])
+
+        with _Transaction(conn):
+            cursor = conn.execute("INSERT OR IGNORE INTO buckets (name) VALUES (?)", (bucket_name,))
+
+        if cursor.rowcount == 0:
+            from Acquire.ObjectStore import ObjectStoreError
+
+            raise ObjectStoreError("CANNOT CREATE NEW BUCKET '%s': EXISTS!" % bucket_name)
+
+        return {"filename": bucket["filename"], "bucket_name": bucket_name}
+
+    @staticmethod
+    def get_bucket(bucket, bucket_name, create_if_needed=True):
+        """Find and return a new bucket in the object store called
+        'bucket_name'. If 'create_if_needed' is True
+        then the bucket will be created if it doesn't exist. Otherwise,
+        if the bucket does not exist then an exception will be raised.
+        """
+        bucket_name = str(bucket_name)
+        conn = _connect(bucket["filename"])
+
+        if create_if_needed:
+            with _Transaction(conn):
+                conn.execute("INSERT OR IGNORE INTO buckets (name) VALUES (?)", (bucket_name,))
+        else:
+            row = conn.execute("SELECT name FROM buckets WHERE name = ?", (bucket_name,)).fetchone()
+
+            if row is None:
+                from Acquire.ObjectStore import ObjectStoreError
+
+                raise ObjectStoreError("There is no bucket available called '%s'" % (bucket_name))
+
+        return {"filename": bucket["filename"], "bucket_name": bucket_name}
+
+    @staticmethod
+    def get_bucket_name(bucket):
+        """Return the name of the passed bucket"""
+        return bucket["bucket_name"]
+
+    @staticmethod
+    def is_bucket_empty(bucket):
+        """Return whether or not the passed bucket is empty"""
+        conn = _connect(bucket["filename"])
+        row = conn.execute("SELECT 1 FROM objects WHERE bucket = ? LIMIT 1", (bucket["bucket_name"],)).fetchone()
+        return row is None
+
+    @staticmethod
+    def delete_bucket(bucket, force=False):
+        """Delete the passed bucket. This should be used with caution.
+        Normally you can only delete a bucket if it is empty. If
+        'force' is True then it will remove all objects from
+        the bucket first, and then delete the bucket. This
+        can cause a LOSS OF DATA!
+        """
+        if not SQLite_ObjectStore.is_bucket_empty(bucket=bucket):
+            if not force:
+                raise PermissionError(
+                    "You cannot delete the bucket %s as it is not empty" % bucket["bucket_name"]
+                )
+
+        conn = _connect(bucket["filename"])
+
+        with _Transaction(conn):
+            conn.execute("DELETE FROM objects WHERE bucket = ?", (bucket["bucket_name"],))
+            conn.execute("DELETE FROM buckets WHERE name = ?", (bucket["bucket_name"],))
+
+    @staticmethod
+    def create_par(
+        bucket, encrypt_key, key=None, readable=True, writeable=False, duration=3600, cleanup_function=None
+    ):
+        """Pre-authenticated requests need a URL that clients can use
+        to access the object directly, which an embedded database
+        cannot provide. This therefore always raises a PARError
+        """
+        from Acquire.Client import PARError
+
+        raise PARError("The SQLite object store does not support pre-authenticated requests")
+
+    @staticmethod
+    def close_par(par=None, par_uid=None, url_checksum=None):
+        """Close the passed PAR. This always raises a PARError, as the
+        SQLite object store cannot create PARs
+        """
+        from Acquire.Client import PARError
+
+        raise PARError("The SQLite object store does not support pre-authenticated requests")
+
+    @staticmethod
+    def get_object(bucket, key):
+        """Return the binary data contained in the key 'key' in the
+        passed bucket"""
+        from ._chunked import get_chunk_manifest, _get_chunk_keys
+
+        conn = _connect(bucket["filename"])
+
+        row = conn.execute(
+            "SELECT data FROM objects WHERE bucket = ? AND key = ?", (bucket["bucket_name"], key)
+        ).fetchone()
+
+        if row is None:
+            from Acquire.ObjectStore import ObjectStoreMissingError
+
+            raise ObjectStoreMissingError("No object at key '%s'" % key)
+
+        data = row[0]
+        nchunks = get_chunk_manifest(data)
+
+        if nchunks is None:
+            return data
+
+        return b"".join(
+            SQLite_ObjectStore.get_object(bucket, chunk_key) for chunk_key in _get_chunk_keys(key, nchunks)
+        )
+
+    @staticmethod
+    def exists(bucket, key):
+        """Return whether or not there is an object at 'key' in
+        the passed bucket
+        """
+        conn = _connect(bucket["filename"])
+
+        row = conn.execute(
+            "SELECT 1 FROM objects WHERE bucket = ? AND key = ?", (bucket["bucket_name"], key)
+        ).fetchone()
+
+        return row is not None
+
+    @staticmethod
+    def take_object(bucket, key):
+        """Take (delete) the object from the object store, returning
+        the object. This is atomic
+        """
+        conn = _connect(bucket["filename"])
+
+        with _Transaction(conn):
+            row = conn.execute(
+                "SELECT data FROM objects WHERE bucket = ? AND key = ?", (bucket["bucket_name"], key)
+            ).fetchone()
+
+            if row is not None:
+                conn.execute("DELETE FROM objects WHERE bucket = ? AND key = ?", (bucket["bucket_name"], key))
+
+        if row is None:
+            from Acquire.ObjectStore import ObjectStoreMissingError
+
+            raise ObjectStoreMissingError("No object at key '%s'" % key)
+
+        return row[0]
+
+    @staticmethod
+    def get_all_object_names(bucket, prefix=None, without_prefix=False):
+        """Returns the names of all objects in the passed bucket"""
+        conn = _connect(bucket["filename"])
+
+        if prefix:
+            (lower, upper) = _get_prefix_range(prefix)
+            rows = conn.execute(
+                "SELECT key FROM objects WHERE bucket = ? AND key >= ? AND key < ? ORDER BY key",
+                (bucket["bucket_name"], lower, upper),
+            )
+        else:
+            rows = conn.execute("SELECT key FROM objects WHERE bucket = ? ORDER BY key", (bucket["bucket_name"],))
+
+        names = []
+
+        for (name,) in rows:
+            if without_prefix and prefix:
+                name = name[len(prefix) :]
+
+            name = name.strip("/")
+
+            if len(name) > 0:
+                names.append(name)
+
+        return names
+
+    @staticmethod
+    def set_object(bucket, key, data):
+        """Set the value of 'key' in 'bucket' to binary 'data'"""
+        conn = _connect(bucket["filename"])
+
+        with _Transaction(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO objects (bucket, key, data, size, md5) VALUES (?, ?, ?, ?, ?)",
+                (bucket["bucket_name"], key) + _get_row(data),
+            )
+
+    @staticmethod
+    def set_object_if_absent(bucket, key, data):
+        """Atomically set the value of 'key' in 'bucket' to binary
+        'data' if (and only if) there is no object at this key.
+        This returns whether or not the object was set
+        """
+        conn = _connect(bucket["filename"])
+
+        with _Transaction(conn):
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO objects (bucket, key, data, size, md5) VALUES (?, ?, ?, ?, ?)",
+                (bucket["bucket_name"], key) + _get_row(data),
+            )
+
+        return cursor.rowcount > 0
+
+    @staticmethod
+    def set_objects(bucket, objects):
+        """Set all of the objects in the passed dictionary of
+        {key: data} in a single transaction
+        """
+        conn = _connect(bucket["filename"])
+
+        with _Transaction(conn):
+            conn.executemany(
+                "INSERT OR REPLACE INTO objects (bucket, key, data, size, md5) VALUES (?, ?, ?, ?, ?)",
+                [(bucket["bucket_name"], key) + _get_row(data) for (key, data) in objects.items()],
+            )
+
+    @staticmethod
+    def delete_all_objects(bucket, prefix=None):
+        """Deletes all objects..."""
+        conn = _connect(bucket["filename"])
+
+        with _Transaction(conn):
+            if prefix:
+                (lower, upper) = _get_prefix_range("%s/" % prefix.rstrip("/"))
+                conn.execute(
+                    "DELETE FROM objects WHERE bucket = ? AND key >= ? AND key < ?",
+                    (bucket["bucket_name"], lower, upper),
+                )
+            else:
+                conn.execute("DELETE FROM objects WHERE bucket = ?", (bucket["bucket_name"],))
+
+    @staticmethod
+    def delete_object(bucket, key):
+        """Removes the object at 'key'"""
+        conn = _connect(bucket["filename"])
+
+        with _Transaction(conn):
+            conn.execute("DELETE FROM objects WHERE bucket = ? AND key = ?", (bucket["bucket_name"], key))
+
+    @staticmethod
+    def delete_object_if_unchanged(bucket, key, data):
+        """Atomically remove the object at 'key' if (and only if) it
+        still holds the binary 'data'. This returns whether or not
+        the object was removed
+        """
+        conn = _connect(bucket["filename"])
+
+        with _Transaction(conn):
+            cursor = conn.execute(
+                "DELETE FROM objects WHERE bucket = ? AND key = ? AND data = ?", (bucket["bucket_name"], key, data)
+            )
+
+        return cursor.rowcount > 0
+
+    @staticmethod
+    def get_size_and_checksum(bucket, key):
+        """Return the object size (in bytes) and MD5 checksum of the
+        object in the passed bucket at the specified key
+        """
+        conn = _connect(bucket["filename"])
+
+        row = conn.execute(
+            "SELECT size, md5 FROM objects WHERE bucket = ? AND key = ?", (bucket["bucket_name"], key)
+        ).fetchone()
+
+        if row is None:
+            from Acquire.ObjectStore import ObjectStoreMissingError
+
+            raise ObjectStoreMissingError("No object at key '%s'" % key)
+
+        return (row[0], row[1])
@@ -233,30 +233,85 @@ class Testing_ObjectStore:
         """Return the binary data contained in the key 'key' in the
         passed bucket"""
 
+        from ._chunked import get_chunk_manifest, _get_chunk_keys
+
         with _rlock:
             filepath = "%s/%s._data" % (bucket, key)
             if _os.path.exists(filepath):
-                return open(filepath, "rb").read()
+                data = open(filepath, "rb").read()
             else:
-                from Acquire.ObjectStore import ObjectStoreError
+                from Acquire.ObjectStore import ObjectStoreMissingError
+
+                raise ObjectStoreMissingError("No object at key '%s'" % key)
+
+            nchunks = get_chunk_manifest(data)
+
+            if nchunks is None:
+                return data
 
-                raise ObjectStoreError("No object at key '%s'" % key)
+            return b"".join(
+                Testing_ObjectStore.get_object(bucket, chunk_key) for chunk_key in _get_chunk_keys(key, nchunks)
+            )
+
+    @staticmethod
+    def iter_object(bucket, key):
+        """Iterate over the binary data contained in the key 'key' in
+        the passed bucket, yielding the data in blocks of at most 1 MB
+        """
+        with _rlock:
+            filepath = "%s/%s._data" % (bucket, key)
+
+            try:
+                FILE = open(filepath, "rb")
+            except FileNotFoundError:
+                from Acquire.ObjectStore import ObjectStoreMissingError
+
+                raise ObjectStoreMissingError("No object at key '%s'" % key)
+
+        from ._chunked import get_chunk_manifest, _get_chunk_keys
+
+        with FILE:
+            block = FILE.read(1024 * 1024)
+            nchunks = get_chunk_manifest(block)
+
+            while nchunks is None:
+                if not block:
+                    return
+
+                yield block
+                block = FILE.read(1024 * 1024)
+
+        for chunk_key in _get_chunk_keys(key, nchunks):
+            yield from Testing_ObjectStore.iter_object(bucket, chunk_key)
+
+    @staticmethod
+    def exists(bucket, key):
+        """Return whether or not there is an object at 'key' in
+        the passed bucket
+        """
+        return _os.path.exists("%s/%s._data" % (bucket, key))
 
     @staticmethod
     def take_object(bucket, key):
         """Take (delete) the object from the object store, returning
         the object
         """
-        with _rlock:
-            filepath = "%s/%s._data" % (bucket, key)
-            if _os.path.exists(filepath):
-                data = open(filepath, "rb").read()
-                _os.remove(filepath)
-                return data
-            else:
-                from Acquire.ObjectStore import ObjectStoreError
+        filepath = "%s/%s._data" % (bucket, key)
+        takenpath = "%s.%s._taken" % (filepath, _uuid.uuid4().hex)
+
+        # the rename is atomic, so only one process can take the object
+        try:
+            _os.rename(filepath, takenpath)
+        except OSError:
+            from Acquire.ObjectStore import ObjectStoreMissingError
 
-                raise ObjectStoreError("No object at key '%s'" % key)
+            raise ObjectStoreMissingError("No object at key '%s'" % key)
+
+        with open(takenpath, "rb") as FILE:
+            data = FILE.read()
+
+        _os.remove(takenpath)
+        return data
 
     @staticmethod
     def get_all_object_names(bucket, prefix=None, without_prefix=False):
@@ -322,6 +377,21 @@ class Testing_ObjectStore:
                         FILE.write(data)
                     FILE.flush()
 
+    @staticmethod
+    def set_object_if_absent(bucket, key, data):
+        """Atomically set the value of 'key' in 'bucket' to binary
+        'data' if (and only if) there is no object at this key.
+        This returns whether or not the object was set
+        """
+        filename = "%s/%s._data" % (bucket, key)
+
+        with _rlock:
+            if _os.path.exists(filename):
+                return False
+
+            Testing_ObjectStore.set_object(bucket, key, data)
+            return True
+
     @staticmethod
     def delete_all_objects(bucket, prefix=None):
         """Deletes all objects..."""
@@ -338,6 +408,27 @@ class Testing_ObjectStore:
         except:
             pass
 
+    @staticmethod
+    def delete_object_if_unchanged(bucket, key, data):
+        """Atomically remove the object at 'key' if (and only if) it
+        still holds the binary 'data'. This returns whether or not
+        the object was removed
+        """
+        filename = "%s/%s._data" % (bucket, key)
+
+        with _rlock:
+            try:
+                with open(filename, "rb") as FILE:
+                    current = FILE.read()
+            except OSError:
+                return False
+
+            if current != data:
+                return False
+
+            _os.remove(filename)
+            return True
+
     @staticmethod
     def get_size_and_checksum(bucket, key):
         """Return the object size (in bytes) and checksum of the
@@ -346,10 +437,10 @@ class Testing_ObjectStore:
         filepath = "%s/%s._data" % (bucket, key)
 
         if not _os.path.exists(filepath):
-            from Acquire.ObjectStore import ObjectStoreError
+            from Acquire.ObjectStore import ObjectStoreMissingError
 
-            raise ObjectStoreError("No object at key '%s'" % key)
+            raise ObjectStoreMissingError("No object at key '%s'" % key)
 
         from Acquire.Access import get_filesize_and_checksum as _get_filesize_and_checksum
 
-        return _get_filesize_and_checksum(filepath)
+        return _get_filesize_and_checksum(filepath, algorithm="md5")
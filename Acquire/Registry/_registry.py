@@ -413,15 +413,18 @@ class Registry:
         # save this service to the object store
         uidkey = self._get_key_for_uid(service_uid)
 
-        _ObjectStore.set_object_from_json(bucket=bucket, key=uidkey, data=service.to_data())
+        domainkey = self._get_root_key_for_domain(domain=domain)
 
-        _ObjectStore.set_string_object(bucket=bucket, key=urlkey, string_data=uidkey)
+        # the url and domain pointers are only written once the
+        # service itself has been saved
+        with _ObjectStore.batch() as batch:
+            saved = batch.set_object_from_json(bucket=bucket, key=uidkey, data=service.to_data())
 
-        domainkey = self._get_root_key_for_domain(domain=domain)
+            batch.set_string_object(bucket=bucket, key=urlkey, string_data=uidkey, after=saved)
 
-        _ObjectStore.set_string_object(
-            bucket=bucket, key="%s/pending/%s" % (domainkey, service_uid), string_data=uidkey
-        )
+            batch.set_string_object(
+                bucket=bucket, key="%s/pending/%s" % (domainkey, service_uid), string_data=uidkey, after=saved
+            )
 
         return service_uid
 
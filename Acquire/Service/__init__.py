@@ -16,6 +16,8 @@ from ._profile import *
 from ._errors import *
 from ._cache_management import *
 from ._trust_service import *
+from ._garbage_collector import *
+from ._warm_pool import *
 
 
 try:
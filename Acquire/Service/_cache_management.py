@@ -9,7 +9,9 @@ def clear_service_cache():
 
     from Acquire.Service import clear_services_cache
     from Acquire.Service import clear_serviceinfo_cache, clear_login_cache
+    from Acquire.Service import clear_session_info_cache
 
     clear_services_cache()
     clear_login_cache()
     clear_serviceinfo_cache()
+    clear_session_info_cache()
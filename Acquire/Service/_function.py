@@ -4,6 +4,8 @@ from Acquire.Crypto import PublicKey
 
 __all__ = [
     "call_function",
+    "async_call_function",
+    "close_async_connections",
     "pack_arguments",
     "unpack_arguments",
     "create_return_value",
@@ -153,6 +155,16 @@ def pack_return_value(
     result["synctime"] = now
     result["function"] = function
 
+    # propagate the trace context (if any) so that the called service
+    # can join its spans to this trace
+    from ._profile import get_trace_context as _get_trace_context
+
+    (trace_id, span_id) = _get_trace_context()
+
+    if trace_id is not None:
+        result["trace_id"] = trace_id
+        result["trace_parent"] = span_id
+
     if key is None:
         if sign_result:
             from Acquire.Service import PackingError
@@ -470,10 +482,25 @@ def call_function(
     if args is None:
         args = {}
 
-    from Acquire.Service import is_running_service as _is_running_service
-    from Acquire.Stubs import requests as _requests
+    from ._profile import trace_span as _trace_span
+
+    with _trace_span("call_function", str(function), service_url=str(service_url)):
+        return _call_function(
+            service_url=service_url,
+            function=function,
+            args=args,
+            args_key=args_key,
+            response_key=response_key,
+            public_cert=public_cert,
+        )
 
-    service = None
+
+def _call_local_function(service_url, function, args):
+    """Internal function that calls 'function' directly if this is
+    running on the service at 'service_url'. This returns a tuple of
+    whether or not the function was called, and its result
+    """
+    from Acquire.Service import is_running_service as _is_running_service
 
     if _is_running_service():
         from Acquire.Service import get_this_service as _get_this_service
@@ -481,13 +508,21 @@ def call_function(
         try:
             service = _get_this_service(need_private_access=False)
         except Exception:
-            pass
+            service = None
 
         if service is not None:
             if service.canonical_url() == service_url:
                 result = service._call_local_function(function=function, args=args)
-                return unpack_return_value(return_value=result)
+                return (True, unpack_return_value(return_value=result))
+
+    return (False, None)
 
+
+def _pack_call(function, args, args_key, response_key, public_cert):
+    """Internal function that packs the arguments for a call to a
+    remote function, returning the packed arguments and the key
+    that will be used to decrypt the response
+    """
     response_key = _get_key(response_key)
 
     # If we have a key encrypt the arguments and ask the function to encrypt
@@ -503,25 +538,25 @@ def call_function(
     else:
         args_msgpack = pack_arguments(function=function, args=args, key=args_key)
 
-    response = None
+    return (args_msgpack, response_key)
 
-    try:
-        response = _requests.post(
-            url=service_url,
-            data=args_msgpack,
-            timeout=60.0,
-        )
-    except Exception as e:
-        from Acquire.Service import RemoteFunctionCallError
 
-        raise RemoteFunctionCallError(
-            "Cannot call remote function '%s' at '%s' because of a possible "
-            "network issue: requests exception = '%s'" % (function, service_url, str(e))
-        )
+def _raise_call_error(function, service_url, e):
+    """Internal function that raises the error for a call to a remote
+    function that failed because of the exception 'e'
+    """
+    from Acquire.Service import RemoteFunctionCallError
 
-    args = None
-    args_key = None
+    raise RemoteFunctionCallError(
+        "Cannot call remote function '%s' at '%s' because of a possible "
+        "network issue: requests exception = '%s'" % (function, service_url, str(e))
+    )
 
+
+def _unpack_response(response, function, service_url, response_key, public_cert):
+    """Internal function that checks and unpacks the response from
+    a call to a remote function
+    """
     # Check the call was a success
     if response.status_code != 200:
         from Acquire.Service import RemoteFunctionCallError
@@ -550,3 +585,93 @@ def call_function(
     )
 
     return unpacked_data
+
+
+def _call_function(service_url, function, args, args_key, response_key, public_cert):
+    """Internal function that performs the work of call_function"""
+    from Acquire.Stubs import requests as _requests
+
+    (is_local, result) = _call_local_function(service_url=service_url, function=function, args=args)
+
+    if is_local:
+        return result
+
+    (args_msgpack, response_key) = _pack_call(
+        function=function, args=args, args_key=args_key, response_key=response_key, public_cert=public_cert
+    )
+
+    response = None
+
+    try:
+        response = _requests.post(
+            url=service_url,
+            data=args_msgpack,
+            timeout=60.0,
+        )
+    except Exception as e:
+        _raise_call_error(function, service_url, e)
+
+    args = None
+    args_key = None
+
+    return _unpack_response(
+        response=response,
+        function=function,
+        service_url=service_url,
+        response_key=response_key,
+        public_cert=public_cert,
+    )
+
+
+async def async_call_function(
+    service_url,
+    function: str = None,
+    args: Dict = None,
+    args_key=None,
+    response_key=None,
+    public_cert=None,
+):
+    """Asynchronous version of call_function. The call is made using
+    a connection pool that is shared by all calls on the running
+    event loop, so that many calls can be made concurrently, e.g.
+    using asyncio.gather. This needs aiohttp to be installed
+    """
+    if args is None:
+        args = {}
+
+    from Acquire.Stubs import async_requests as _async_requests
+
+    # this is not traced, as spans are nested per thread, and many
+    # calls can be interleaved on the same thread
+    (is_local, result) = _call_local_function(service_url=service_url, function=function, args=args)
+
+    if is_local:
+        return result
+
+    (args_msgpack, response_key) = _pack_call(
+        function=function, args=args, args_key=args_key, response_key=response_key, public_cert=public_cert
+    )
+
+    response = None
+
+    try:
+        response = await _async_requests.post(url=service_url, data=args_msgpack, timeout=60.0)
+    except Exception as e:
+        _raise_call_error(function, service_url, e)
+
+    return _unpack_response(
+        response=response,
+        function=function,
+        service_url=service_url,
+        response_key=response_key,
+        public_cert=public_cert,
+    )
+
+
+async def close_async_connections():
+    """Close the pool of connections used by async_call_function on
+    the running event loop. Call this before the event loop is closed
+    """
+    from Acquire.Stubs import async_requests as _async_requests
+
+    await _async_requests.close()
@@ -0,0 +1,605 @@
+__all__ = ["collect_garbage"]
+
+# Progress through each family of keys is recorded under this
+# prefix, so that each (time-limited) run carries on from where
+# the last run stopped
+_checkpoint_root = "gc/checkpoints"
+
+# Only one collector should run at a time
+_gc_mutex_key = "garbage_collector"
+
+
+def _get_checkpoint(bucket, name):
+    """Return the position recorded by the last run for the
+    family 'name', or None if there is no checkpoint
+    """
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+    data = _ObjectStore.get_object_or_none(bucket, "%s/%s" % (_checkpoint_root, name))
+
+    if data is None:
+        return None
+
+    import json as _json
+
+    return _json.loads(data.decode("utf-8"))["position"]
+
+
+def _set_checkpoint(bucket, name, position):
+    """Record that the family 'name' has been collected up to
+    'position'
+    """
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+    from Acquire.ObjectStore import get_datetime_now_to_string as _get_datetime_now_to_string
+
+    _ObjectStore.set_object_from_json(
+        bucket, "%s/%s" % (_checkpoint_root, name), {"position": position, "datetime": _get_datetime_now_to_string()}
+    )
+
+
+class _Collector:
+    """Internal class that holds the state of a single run of the
+    garbage collector - the deadline, the batch size and the
+    counts of what has been collected
+    """
+
+    def __init__(self, bucket, max_seconds, batch_size):
+        import time as _time
+
+        from Acquire.ObjectStore import get_datetime_now as _get_datetime_now
+
+        self.bucket = bucket
+        self.batch_size = max(1, int(batch_size))
+        self.now = _get_datetime_now()
+        self.collected = {}
+        self.errors = []
+        self.complete = True
+
+        if max_seconds is None:
+            self._deadline = None
+        else:
+            self._deadline = _time.monotonic() + float(max_seconds)
+
+    def out_of_time(self):
+        """Return whether or not this run has used its time budget.
+        The run is then marked as incomplete
+        """
+        import time as _time
+
+        if self._deadline is not None and _time.monotonic() > self._deadline:
+            self.complete = False
+            return True
+
+        return False
+
+    def add_error(self, key, e):
+        """Record that collecting 'key' failed with 'e'"""
+        self.errors.append("%s: %s" % (key, str(e)))
+
+    def delete(self, name, keys):
+        """Delete the passed keys in a single batch, counting them as
+        collected from the family 'name'
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        if len(keys) == 0:
+            return
+
+        with _ObjectStore.batch() as batch:
+            for key in keys:
+                batch.delete_object(self.bucket, key)
+
+        self.collected[name] = self.collected.get(name, 0) + len(keys)
+
+    def take(self, name, values):
+        """Delete each of the keys in the passed dictionary of
+        {key: value} only if the key still holds the value that was
+        read when it was found to be garbage, counting them as
+        collected from the family 'name'. Keys that have been
+        written again since are left alone
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        for (key, value) in values.items():
+            try:
+                if _ObjectStore.delete_object_if_unchanged(self.bucket, key, value.encode("utf-8")):
+                    self.collected[name] = self.collected.get(name, 0) + 1
+            except Exception as e:
+                self.add_error(key, e)
+
+    def walk(self, name, prefix, is_garbage, conditional=False):
+        """Walk the keys below 'prefix' in order, starting after the
+        key recorded in the checkpoint for family 'name', deleting
+        (in batches) every key for which 'is_garbage(key, value)'
+        returns True. If 'conditional' is True then each key is only
+        deleted if it still holds the value that was checked (see
+        'take'), for keys that may be re-written while they are
+        walked. The checkpoint wraps back to the start once the last
+        key has been visited
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+        position = _get_checkpoint(self.bucket, name)
+        names = sorted(_ObjectStore.get_all_object_names(self.bucket, "%s/" % prefix, without_prefix=True))
+
+        if position is not None:
+            names = [n for n in names if n > position]
+
+        while len(names) > 0:
+            if self.out_of_time():
+                return
+
+            values = {}
+
+            for n in names[0 : self.batch_size]:
+                key = "%s/%s" % (prefix, n)
+
+                try:
+                    value = _ObjectStore.get_string_object_or_none(self.bucket, key)
+
+                    if value is not None and is_garbage(key, value):
+                        values[key] = value
+                except Exception as e:
+                    self.add_error(key, e)
+
+            try:
+                if conditional:
+                    self.take(name, values)
+                else:
+                    self.delete(name, list(values.keys()))
+            except Exception as e:
+                self.add_error(prefix, e)
+                return
+
+            _set_checkpoint(self.bucket, name, names[0 : self.batch_size][-1])
+            names = names[self.batch_size :]
+
+        # we have reached the end - start again from the beginning
+        # next time
+        _set_checkpoint(self.bucket, name, None)
+
+
+def _collect_pars(collector):
+    """Close all registered PARs that have expired, calling their
+    cleanup functions. The registry is indexed by expiry time, so
+    this walks forwards one day at a time from the last checkpoint,
+    and only has to list the days that have passed since the last run
+    """
+    import datetime as _datetime
+
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+    from Acquire.ObjectStore import OSPar as _OSPar
+    from Acquire.ObjectStore import Function as _Function
+    from Acquire.ObjectStore import datetime_to_string as _datetime_to_string
+    from Acquire.ObjectStore._osparregistry import _registry_key
+
+    bucket = collector.bucket
+    now_string = _datetime_to_string(collector.now)
+    today = now_string[0:10]
+
+    checkpoint = _get_checkpoint(bucket, "pars")
+
+    if checkpoint is None:
+        # first run - search every registered PAR
+        days = [""]
+    else:
+        day = _datetime.date.fromisoformat(checkpoint)
+        days = []
+
+        while day.isoformat() <= today:
+            days.append(day.isoformat())
+            day += _datetime.timedelta(days=1)
+
+    expire_root = "%s/expire" % _registry_key
+
+    for day in days:
+        names = _ObjectStore.get_all_object_names(bucket, "%s/%s" % (expire_root, day))
+
+        expired = []
+
+        for name in sorted(names):
+            # names are 'expire_root/expire_string/par_uid'
+            parts = name[len(expire_root) + 1 :].split("/")
+
+            if len(parts) == 2 and parts[0] < now_string:
+                expired.append((name, parts[0], parts[1]))
+
+        while len(expired) > 0:
+            if collector.out_of_time():
+                return
+
+            keys = []
+
+            for (expire_key, expire_string, par_uid) in expired[0 : collector.batch_size]:
+                keys.append(expire_key)
+
+                # take the registration so that the cleanup function
+                # is only called once, even if the PAR is being closed
+                # at the same time
+                uid_key = "%s/uid/%s/%s" % (_registry_key, par_uid, expire_string)
+
+                try:
+                    data = _ObjectStore.take_object_from_json(bucket, uid_key)
+                except:
+                    data = None
+
+                if data is None or "cleanup_function" not in data:
+                    continue
+
+                try:
+                    par = _OSPar.from_data(data["par"])
+                    cleanup_function = _Function.from_data(data["cleanup_function"])
+                    cleanup_function(par=par)
+                except Exception as e:
+                    collector.add_error(uid_key, e)
+
+            collector.delete("pars", keys)
+            expired = expired[collector.batch_size :]
+
+        # only whole days that have passed can be checkpointed, as
+        # PARs expiring later today are still to be collected
+        if checkpoint is None:
+            _set_checkpoint(bucket, "pars", today)
+        elif day < today:
+            next_day = _datetime.date.fromisoformat(day) + _datetime.timedelta(days=1)
+            _set_checkpoint(bucket, "pars", next_day.isoformat())
+
+
+def _collect_mutexes(collector, grace_time):
+    """Delete the mutex keys whose lease ended more than 'grace_time'
+    seconds ago. These are left behind by processes that were killed
+    while holding a mutex. An expired lease can be taken by anyone,
+    so these keys no longer protect anything. A mutex can be locked
+    again at any time, so each key is only deleted if it still holds
+    the expired lease that was read
+    """
+    import datetime as _datetime
+
+    from Acquire.ObjectStore import string_to_datetime as _string_to_datetime
+
+    cutoff = collector.now - _datetime.timedelta(seconds=grace_time)
+
+    def _is_abandoned(key, holder):
+        return _string_to_datetime(holder.split("{}")[-1]) < cutoff
+
+    collector.walk("mutexes", "mutexes", _is_abandoned, conditional=True)
+
+
+def _collect_auth_once(collector, stale_time):
+    """Drop the windows of used authorisations in which every
+    authorisation is older than 'stale_time' seconds. These are
+    rejected as stale by 'assert_once', so the records are no longer
+    needed to prevent replay. Windows are named by the time they
+    start, so this walks forwards one window at a time from the
+    last checkpoint. The first run also deletes the stale records
+    written before authorisations were grouped into windows
+    """
+    import datetime as _datetime
+
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+    from Acquire.ObjectStore import string_to_datetime as _string_to_datetime
+    from Acquire.Identity._authorisation import _auth_once_root, _auth_once_window, _get_auth_once_window
+
+    bucket = collector.bucket
+    cutoff = collector.now - _datetime.timedelta(seconds=stale_time)
+
+    # every window before this one is completely stale
+    last = _get_auth_once_window(cutoff - _datetime.timedelta(seconds=_auth_once_window))
+
+    checkpoint = _get_checkpoint(bucket, "auth_once")
+
+    if checkpoint is None:
+        windows = set()
+        legacy = []
+
+        for name in _ObjectStore.get_all_object_names(bucket, "%s/" % _auth_once_root, without_prefix=True):
+            parts = name.split("/")
+
+            if len(parts) == 1:
+                legacy.append("%s/%s" % (_auth_once_root, name))
+            elif parts[0] < last:
+                windows.add(parts[0])
+
+        keys = []
+
+        for key in legacy:
+            used = _ObjectStore.get_string_object_or_none(bucket, key)
+
+            if used is not None and _string_to_datetime(used) < cutoff:
+                keys.append(key)
+
+        for i in range(0, len(keys), collector.batch_size):
+            if collector.out_of_time():
+                return
+
+            collector.delete("auth_once", keys[i : i + collector.batch_size])
+
+        windows = sorted(windows)
+    else:
+        window = _string_to_datetime(checkpoint)
+        windows = []
+
+        while checkpoint < last:
+            windows.append(checkpoint)
+            window += _datetime.timedelta(seconds=_auth_once_window)
+            checkpoint = _get_auth_once_window(window)
+
+    for window in windows:
+        if collector.out_of_time():
+            return
+
+        _ObjectStore.delete_all_objects(bucket, "%s/%s" % (_auth_once_root, window))
+        collector.collected["auth_once"] = collector.collected.get("auth_once", 0) + 1
+
+        next_window = _string_to_datetime(window) + _datetime.timedelta(seconds=_auth_once_window)
+        _set_checkpoint(bucket, "auth_once", _get_auth_once_window(next_window))
+
+    _set_checkpoint(bucket, "auth_once", last)
+
+
+def _collect_transfers(collector, name, prefix, lifetime):
+    """Delete the chunked uploader or downloader records below 'prefix'
+    that were opened more than 'lifetime' seconds ago, and so have
+    been abandoned by the client. Records written before the opening
+    time was saved are stamped with the current time, so that they
+    are collected one 'lifetime' from now
+    """
+    import datetime as _datetime
+    import json as _json
+
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+    from Acquire.ObjectStore import string_to_datetime as _string_to_datetime
+    from Acquire.ObjectStore import datetime_to_string as _datetime_to_string
+
+    cutoff = collector.now - _datetime.timedelta(seconds=lifetime)
+
+    def _is_abandoned(key, value):
+        data = _json.loads(value)
+
+        if "datetime" not in data:
+            data["datetime"] = _datetime_to_string(collector.now)
+            _ObjectStore.set_object_from_json(collector.bucket, key, data)
+            return False
+
+        return _string_to_datetime(data["datetime"]) < cutoff
+
+    collector.walk(name, prefix, _is_abandoned)
+
+
+def _collect_legacy_login_sessions(collector):
+    """Delete the sessions that were saved, by status, before sessions
+    were indexed, and which were created more than the session
+    lifetime ago. Approved sessions are kept. This returns whether
+    or not every legacy session that is not approved has now been
+    deleted
+    """
+    import datetime as _datetime
+
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+    from Acquire.ObjectStore import string_to_datetime as _string_to_datetime
+    from Acquire.Identity._loginsession import _sessions_key, _session_lifetime, _session_statuses
+
+    bucket = collector.bucket
+    cutoff = collector.now - _datetime.timedelta(seconds=_session_lifetime)
+    remaining = 0
+
+    for status in _session_statuses:
+        if status == "approved":
+            continue
+
+        prefix = "%s/%s" % (_sessions_key, status)
+        names = _ObjectStore.get_all_object_names(bucket, "%s/" % prefix, without_prefix=True)
+
+        while len(names) > 0:
+            if collector.out_of_time():
+                return False
+
+            keys = []
+
+            for name in names[0 : collector.batch_size]:
+                key = "%s/%s" % (prefix, name)
+                status_key = "%s/status/%s" % (_sessions_key, name.split("/")[-1])
+
+                try:
+                    data = _ObjectStore.get_object_from_json(bucket, key)
+                    created = _string_to_datetime(data["request_datetime"])
+
+                    if created >= cutoff:
+                        # this session may still be in use
+                        remaining += 1
+                        continue
+
+                    keys.append(key)
+
+                    # the status may have moved on since this copy was saved
+                    if _ObjectStore.get_string_object_or_none(bucket, status_key) == status:
+                        keys.append(status_key)
+                except Exception as e:
+                    collector.add_error(key, e)
+                    remaining += 1
+
+            collector.delete("login_sessions", keys)
+            names = names[collector.batch_size :]
+
+    return remaining == 0
+
+
+def _collect_login_sessions(collector):
+    """Drop the expiry buckets of login sessions that have expired,
+    deleting the sessions listed in each bucket unless they have
+    since been approved. Buckets are named by the time they start,
+    so this walks forwards one bucket at a time from the last
+    checkpoint. Until they have all gone, each run also deletes the
+    expired sessions that were saved before sessions were indexed
+    (see '_collect_legacy_login_sessions')
+    """
+    import datetime as _datetime
+
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+    from Acquire.ObjectStore import string_to_datetime as _string_to_datetime
+    from Acquire.Identity._loginsession import (
+        _session_expire_key,
+        _session_expire_window,
+        _get_session_expire_window,
+        _get_session_keys,
+    )
+
+    bucket = collector.bucket
+
+    if _get_checkpoint(bucket, "legacy_login_sessions") is None:
+        if _collect_legacy_login_sessions(collector):
+            _set_checkpoint(bucket, "legacy_login_sessions", "complete")
+
+        if collector.out_of_time():
+            return
+
+    # every bucket before this one has completely expired
+    last = _get_session_expire_window(collector.now)
+
+    checkpoint = _get_checkpoint(bucket, "login_sessions")
+
+    if checkpoint is None:
+        windows = set()
+
+        for name in _ObjectStore.get_all_object_names(bucket, "%s/" % _session_expire_key, without_prefix=True):
+            window = name.split("/")[0]
+
+            if window < last:
+                windows.add(window)
+
+        windows = sorted(windows)
+    else:
+        window = _string_to_datetime(checkpoint)
+        windows = []
+
+        while checkpoint < last:
+            windows.append(checkpoint)
+            window += _datetime.timedelta(seconds=_session_expire_window)
+            checkpoint = _get_session_expire_window(window)
+
+    for window in windows:
+        prefix = "%s/%s" % (_session_expire_key, window)
+        uids = _ObjectStore.get_all_object_names(bucket, "%s/" % prefix, without_prefix=True)
+
+        while len(uids) > 0:
+            if collector.out_of_time():
+                return
+
+            keys = []
+
+            for uid in uids[0 : collector.batch_size]:
+                (key, index_key) = _get_session_keys(uid)
+
+                try:
+                    status = _ObjectStore.get_string_object_or_none(bucket, index_key)
+                except Exception as e:
+                    collector.add_error(index_key, e)
+                    continue
+
+                if status == "approved":
+                    # this session is still in use
+                    continue
+
+                keys.append(key)
+
+                if status is not None:
+                    keys.append(index_key)
+
+            collector.delete("login_sessions", keys)
+            uids = uids[collector.batch_size :]
+
+        _ObjectStore.delete_all_objects(bucket, prefix)
+
+        next_window = _string_to_datetime(window) + _datetime.timedelta(seconds=_session_expire_window)
+        _set_checkpoint(bucket, "login_sessions", _get_session_expire_window(next_window))
+
+    _set_checkpoint(bucket, "login_sessions", last)
+
+
+def collect_garbage(
+    bucket=None,
+    max_seconds=None,
+    batch_size=100,
+    mutex_grace_time=60,
+    auth_once_stale_time=7200,
+    uploader_lifetime=7 * 86400,
+    downloader_lifetime=86400,
+):
+    """Collect the expired records that are left in the object store
+    by this service. This closes expired PARs (calling their cleanup
+    functions), and deletes abandoned mutexes, windows of stale
+    'auth_once' records, abandoned chunked uploaders and downloaders,
+    and expired login sessions.
+
+    Records are deleted in batches of 'batch_size'. If 'max_seconds'
+    is set then this will stop once this time has passed. Progress is
+    checkpointed in the object store, so the next call will carry on
+    from where this one stopped. Only one collector can run at a time -
+    this returns immediately if another collector is running
+
+    Args:
+         bucket (dict, default=None): Bucket to collect (defaults to
+         the service account bucket)
+         max_seconds (float, default=None): Time budget for this run
+         batch_size (int, default=100): Number of records per batch
+         mutex_grace_time (int, default=60): Seconds after a mutex lease
+         ends before the mutex is deleted
+         auth_once_stale_time (int, default=7200): Seconds after which
+         authorisations are stale
+         uploader_lifetime (int, default=1 week): Seconds before an
+         open uploader is abandoned
+         downloader_lifetime (int, default=1 day): Seconds before an
+         open downloader is abandoned
+    Returns:
+         dict: Numbers of records collected from each family, whether
+         or not the collection completed, and any errors
+    """
+    from Acquire.ObjectStore import Mutex as _Mutex
+    from Acquire.ObjectStore import MutexTimeoutError as _MutexTimeoutError
+    from Acquire.Service import trace_span as _trace_span
+    from Acquire.Storage._driveinfo import _uploader_root, _downloader_root
+
+    if bucket is None:
+        from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
+
+        bucket = _get_service_account_bucket()
+
+    if max_seconds is None:
+        lease_time = 3600
+    else:
+        lease_time = float(max_seconds) + 60
+
+    try:
+        mutex = _Mutex(_gc_mutex_key, timeout=1, lease_time=lease_time, bucket=bucket)
+    except _MutexTimeoutError:
+        return {"collected": {}, "complete": False, "errors": ["Another garbage collector is running"]}
+
+    collector = _Collector(bucket=bucket, max_seconds=max_seconds, batch_size=batch_size)
+
+    steps = [
+        ("pars", lambda: _collect_pars(collector)),
+        ("mutexes", lambda: _collect_mutexes(collector, mutex_grace_time)),
+        ("auth_once", lambda: _collect_auth_once(collector, auth_once_stale_time)),
+        ("uploaders", lambda: _collect_transfers(collector, "uploaders", _uploader_root, uploader_lifetime)),
+        ("downloaders", lambda: _collect_transfers(collector, "downloaders", _downloader_root, downloader_lifetime)),
+        ("login_sessions", lambda: _collect_login_sessions(collector)),
+    ]
+
+    try:
+        with _trace_span("gc", "collect_garbage"):
+            for (name, step) in steps:
+                if collector.out_of_time():
+                    break
+
+                try:
+                    step()
+                except Exception as e:
+                    collector.add_error(name, e)
+                    collector.complete = False
+    finally:
+        try:
+            mutex.unlock()
+        except _MutexTimeoutError:
+            pass
+
+    return {"collected": collector.collected, "complete": collector.complete, "errors": collector.errors}
@@ -49,6 +49,15 @@ def pop_testing_objstore():
     _clear_service_cache()
 
 
+def _is_using_testing_objstore_stack():
+    """Internal function returning whether or not services are being
+    mocked in-process by pushing their object stores onto the testing
+    stack. The stack is global, so calls between services must then
+    be made from a single thread
+    """
+    return _current_testing_objstore is not None
+
+
 # Cache this function as the result changes very infrequently, as involves
 # lots of round trips to the object store, and it will give the same
 # result regardless of which Fn function on the service makes the call
@@ -197,4 +206,16 @@ def get_service_account_bucket(testing_dir: Union[str, Path] = None):
         except Exception as e:
             raise ServiceAccountError("Error connecting to the service account: %s" % str(e))
 
+    elif cloud_backend == "sqlite":
+        # we are running on a single node (on-premises), with all
+        # objects stored in a local SQLite database
+        from Acquire.ObjectStore import use_sqlite_object_store_backend as _use_sqlite_object_store_backend
+
+        try:
+            account_bucket = _use_sqlite_object_store_backend(
+                filename=bucket_data["filename"], bucket_name=bucket_data["bucket"]
+            )
+        except Exception as e:
+            raise ServiceAccountError("Error connecting to the service account: %s" % str(e))
+
     return account_bucket
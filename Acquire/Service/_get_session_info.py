@@ -1,26 +1,75 @@
-__all__ = ["get_session_info"]
+import threading as _threading
 
+from cachetools import TTLCache as _TTLCache
 
-def get_session_info(identity_url, session_uid, scope=None, permissions=None):
-    """Call the identity_url to obtain information about the
-    specified login session_uid. Optionally limit
-    the scope and permissions for which these certs would
-    be valid
+__all__ = ["get_session_info", "get_session_infos", "invalidate_session_info", "clear_session_info_cache"]
+
+# Process-wide cache of the session information returned by identity
+# services, indexed by (identity service UID, session UID, scope,
+# permissions). Only information for sessions that have been approved
+# or logged out is cached. A logout only clears the cache in the
+# process that handled it, so other services (and other instances of
+# the identity service) can accept authorisations signed after a
+# logout for up to '_session_info_ttl' seconds. Sensitive calls
+# should pass 'refresh=True' to re-check the session status
+_session_info_ttl = 10
+_session_info_cache = _TTLCache(maxsize=1024, ttl=_session_info_ttl)
+_session_info_lock = _threading.Lock()
+
+
+def clear_session_info_cache():
+    """Call to clear the cache of session information"""
+    with _session_info_lock:
+        _session_info_cache.clear()
+
+
+def invalidate_session_info(session_uid):
+    """Remove all cached information about the session with UID
+    'session_uid'. This should be called when the user logs out
+    of the session. Note that this only affects the cache in this
+    process
     """
-    from Acquire.Service import get_trusted_service as _get_trusted_service
+    with _session_info_lock:
+        for key in list(_session_info_cache.keys()):
+            if key[1] == session_uid:
+                _session_info_cache.pop(key, None)
 
-    service = _get_trusted_service(identity_url)
 
-    args = {"session_uid": session_uid}
+def _get_cache_key(identity_uid, session_uid, scope, permissions):
+    """Internal function returning the cache key for the passed session"""
+    if permissions is not None and not isinstance(permissions, str):
+        permissions = tuple(permissions)
 
-    if scope is not None:
-        args["scope"] = scope
+    return (identity_uid, session_uid, scope, permissions)
+
+
+def _get_cached(key):
+    """Internal function returning a copy of the cached session info
+    at 'key', or None
+    """
+    with _session_info_lock:
+        response = _session_info_cache.get(key)
+
+    if response is None:
+        return None
+
+    return dict(response)
 
-    if permissions is not None:
-        args["permissions"] = permissions
 
-    response = service.call_function(function="get_session_info", args=args)
+def _set_cached(key, response):
+    """Internal function that caches the passed session info if the
+    session has been approved or logged out (so its certificate is
+    known). The status of other sessions can still change
+    """
+    if isinstance(response, dict) and "public_cert" in response:
+        with _session_info_lock:
+            _session_info_cache[key] = dict(response)
+
 
+def _clean_response(response):
+    """Internal function that removes the call status from the
+    passed session info and converts the keys
+    """
     try:
         del response["status"]
     except:
@@ -38,3 +87,84 @@ def get_session_info(identity_url, session_uid, scope=None, permissions=None):
             response[key] = _PublicKey.from_data(response[key])
 
     return response
+
+
+def get_session_info(identity_url, session_uid, scope=None, permissions=None, refresh=False):
+    """Call the identity_url to obtain information about the
+    specified login session_uid. Optionally limit
+    the scope and permissions for which these certs would
+    be valid. If 'refresh' is True then the cached information
+    is not used, so that a recent logout is always seen
+    """
+    from Acquire.Service import get_trusted_service as _get_trusted_service
+
+    service = _get_trusted_service(identity_url)
+
+    key = _get_cache_key(service.uid(), session_uid, scope, permissions)
+
+    if not refresh:
+        response = _get_cached(key)
+
+        if response is not None:
+            return response
+
+    args = {"session_uid": session_uid}
+
+    if scope is not None:
+        args["scope"] = scope
+
+    if permissions is not None:
+        args["permissions"] = permissions
+
+    response = _clean_response(service.call_function(function="get_session_info", args=args))
+
+    _set_cached(key, response)
+
+    return response
+
+
+def get_session_infos(identity_url, sessions):
+    """Call the identity_url to obtain information about all of the
+    passed sessions in a single call. 'sessions' is a list of
+    session UIDs, or of dictionaries containing 'session_uid' and
+    (optionally) 'scope' and 'permissions'. Sessions whose information
+    is already cached are not requested again. This returns the list
+    of session information in the same order as 'sessions', with
+    None for any session whose information could not be found
+    """
+    from Acquire.Service import get_trusted_service as _get_trusted_service
+
+    service = _get_trusted_service(identity_url)
+
+    requests = []
+
+    for session in sessions:
+        if isinstance(session, dict):
+            requests.append(session)
+        else:
+            requests.append({"session_uid": session})
+
+    keys = [
+        _get_cache_key(service.uid(), r["session_uid"], r.get("scope", None), r.get("permissions", None))
+        for r in requests
+    ]
+
+    responses = [_get_cached(key) for key in keys]
+
+    missing = [i for i in range(0, len(responses)) if responses[i] is None]
+
+    if len(missing) == 0:
+        return responses
+
+    args = {"sessions": [requests[i] for i in missing]}
+
+    result = service.call_function(function="get_session_infos", args=args)
+
+    for (i, response) in zip(missing, result["session_infos"]):
+        if response is not None:
+            response = _clean_response(response)
+            _set_cached(keys[i], response)
+
+        responses[i] = response
+
+    return responses
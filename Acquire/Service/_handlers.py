@@ -4,16 +4,45 @@ from typing import Union, Callable, Dict
 __all__ = ["handle_call", "create_handler"]
 
 
-def handle_call(data: Union[bytes, Dict] = None, routing_function: Callable = None) -> Dict:
+def handle_call(
+    data: Union[bytes, Dict] = None, routing_function: Callable = None, use_warm_pool: bool = False
+) -> Dict:
     """Handles asynchronous function calls for the functions. This brings together the old create_async_handler
     and base_handler functions
 
     Args:
         data: Data to be passed into function
         routing_function: If not local call, function call will be routed to this function
+        use_warm_pool: If True, hand the call to an idle worker in the warm pool if one is
+                       running (starting a pool in the background if not). The call is
+                       handled in this process if it could not be handed to a worker. An
+                       error is returned if the worker fails after it has received the
+                       call, as the call may already have (partly) run
     Returns:
         dict: Dictionary of data
     """
+    if use_warm_pool:
+        from Acquire.Service._warm_pool import call_warm_pool, start_warm_pool, _log_error
+
+        try:
+            result = call_warm_pool(data)
+        except Exception as e:
+            # the worker may already have run the call (e.g. cashed a
+            # cheque), so it must not be run again here
+            _log_error("The warm pool failed to handle the call")
+
+            from Acquire.Service import create_return_value, pack_return_value
+
+            return pack_return_value(payload=create_return_value(payload=e))
+
+        if result is not None:
+            return result
+
+        try:
+            start_warm_pool(routing_module=getattr(routing_function, "__module__", None))
+        except Exception:
+            _log_error("Unable to start the warm pool")
+
     from Acquire.Service import (
         push_is_running_service,
         unpack_arguments,
@@ -21,10 +50,19 @@ def handle_call(data: Union[bytes, Dict] = None, routing_function: Callable = No
         pop_is_running_service,
         pack_return_value,
         create_return_value,
+        start_profile,
+        end_profile,
+        start_trace,
+        end_trace,
     )
+    from Acquire.ObjectStore import start_objstore_metrics, end_objstore_metrics
 
     push_is_running_service()
 
+    profiler = start_profile()
+    trace = start_trace()
+    metrics = start_objstore_metrics()
+
     result = None
 
     try:
@@ -36,6 +74,10 @@ def handle_call(data: Union[bytes, Dict] = None, routing_function: Callable = No
         result = e
         keys = None
 
+    if trace is not None and keys is not None:
+        # join the trace that was started by the calling service
+        trace.adopt(trace_id=keys.get("trace_id"), parent_id=keys.get("trace_parent"), name=function)
+
     if result is None:
         try:
             # Route the function call and arguments either to our internal functions or the
@@ -46,6 +88,10 @@ def handle_call(data: Union[bytes, Dict] = None, routing_function: Callable = No
 
     result = create_return_value(payload=result)
 
+    end_profile(profiler, result)
+    end_trace(trace, result)
+    end_objstore_metrics(metrics, result)
+
     try:
         result = pack_return_value(payload=result, key=keys)
     except Exception as e:
@@ -101,12 +147,13 @@ def _route_function(function: str, args: Dict, routing_function: Callable = None
         raise MissingFunctionError(f"Unable to match call to {function} to known functions")
 
 
-def create_handler(routing_function: Callable = None) -> Callable:
+def create_handler(routing_function: Callable = None, use_warm_pool: bool = False) -> Callable:
     """Function that creates the handler functions for all standard functions,
     plus the passed routing_function
 
     Args:
          routing_function: Function to route call to if not internal call
+         use_warm_pool: Whether or not to hand calls to the warm pool
     Returns:
         function: Handler function
     """
@@ -121,6 +168,6 @@ def create_handler(routing_function: Callable = None) -> Callable:
          Returns:
              function: A handler function
         """
-        return handle_call(data=data, routing_function=routing_function)
+        return handle_call(data=data, routing_function=routing_function, use_warm_pool=use_warm_pool)
 
     return handler
@@ -1,4 +1,8 @@
 import os as _os
+import json as _json
+import time as _time
+import uuid as _uuid
+import threading as _threading
 
 if _os.getenv("PROFILE") == "1":
     profiling_code = True
@@ -33,4 +37,477 @@ else:
         return results
 
 
-__all__ = ["start_profile", "end_profile"]
+__all__ = [
+    "start_profile",
+    "end_profile",
+    "Trace",
+    "Span",
+    "enable_tracing",
+    "disable_tracing",
+    "is_tracing",
+    "start_trace",
+    "end_trace",
+    "get_current_trace",
+    "get_trace_context",
+    "trace_span",
+    "set_trace_exporter",
+]
+
+# Tracing is switched on either by setting TRACE=1 in the environment
+# (mirroring PROFILE=1 above) or by calling enable_tracing() at runtime.
+# Finished traces are written as JSON lines to TRACE_FILE and/or posted
+# as OTLP/HTTP JSON to the collector at TRACE_COLLECTOR
+_tracing_enabled = _os.getenv("TRACE") == "1"
+_trace_file = _os.getenv("TRACE_FILE")
+_trace_collector = _os.getenv("TRACE_COLLECTOR")
+_trace_service_name = _os.getenv("TRACE_SERVICE_NAME", "acquire")
+
+# Traces are held per-thread as a stack, as services can (in testing
+# or for local calls) call functions on other services from within
+# the same thread
+_local = _threading.local()
+
+
+def _new_trace_id():
+    """Return a new 128-bit trace ID as a hex string"""
+    return _uuid.uuid4().hex
+
+
+def _new_span_id():
+    """Return a new 64-bit span ID as a hex string"""
+    return _uuid.uuid4().hex[0:16]
+
+
+def _trace_stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+class Span:
+    """This is a single timed operation (e.g. an object store get,
+    an RSA decryption or a remote function call) that was performed
+    as part of a Trace
+    """
+
+    def __init__(self, trace, category, name, parent_id=None, attributes=None):
+        self._trace = trace
+        self._category = category
+        self._name = name
+        self._span_id = _new_span_id()
+        self._parent_id = parent_id
+        self._attributes = attributes
+        self._start = _time.time_ns()
+        self._end = None
+        self._error = None
+
+    def __str__(self):
+        return "Span(%s.%s, %.3f ms)" % (self._category, self._name, self.duration() * 1000.0)
+
+    def span_id(self):
+        """Return the ID of this span"""
+        return self._span_id
+
+    def parent_id(self):
+        """Return the ID of the parent span, or None if this is a root span"""
+        return self._parent_id
+
+    def category(self):
+        """Return the category of this span, e.g. 'objstore', 'crypto',
+        'mutex' or 'call_function'
+        """
+        return self._category
+
+    def name(self):
+        """Return the name of the operation in this span"""
+        return self._name
+
+    def attributes(self):
+        """Return the attributes (if any) of this span"""
+        if self._attributes is None:
+            return {}
+        else:
+            return self._attributes
+
+    def duration(self):
+        """Return the duration of this span in seconds. This is the
+        time so far if the span has not yet finished
+        """
+        if self._end is None:
+            end = _time.time_ns()
+        else:
+            end = self._end
+
+        return (end - self._start) / 1.0e9
+
+    def finish(self, error=None):
+        """Finish this span, optionally recording the error that
+        ended it
+        """
+        if self._end is None:
+            self._end = _time.time_ns()
+
+            if error is not None:
+                self._error = "%s: %s" % (error.__class__.__name__, str(error))
+
+    def to_data(self):
+        """Return a json-serialisable dictionary of this span"""
+        data = {
+            "trace_id": self._trace.trace_id(),
+            "span_id": self._span_id,
+            "parent_id": self._parent_id,
+            "category": self._category,
+            "name": self._name,
+            "start_ns": self._start,
+            "end_ns": self._end,
+        }
+
+        if self._attributes:
+            data["attributes"] = self._attributes
+
+        if self._error is not None:
+            data["error"] = self._error
+
+        return data
+
+
+class Trace:
+    """This holds all of the spans recorded while processing a
+    single request on a service. The trace_id is propagated to
+    other services via the packed arguments of call_function, so
+    that the spans recorded on all services for a single user
+    request can be joined together
+    """
+
+    def __init__(self, trace_id=None, parent_id=None, name=None):
+        if trace_id is None:
+            trace_id = _new_trace_id()
+
+        self._trace_id = trace_id
+        self._spans = []
+        self._open = []
+        self._root = Span(trace=self, category="request", name=name, parent_id=parent_id)
+        self._open.append(self._root)
+
+    def __str__(self):
+        return "Trace(%s, nspans=%d)" % (self._trace_id, len(self._spans))
+
+    def trace_id(self):
+        """Return the ID of this trace"""
+        return self._trace_id
+
+    def adopt(self, trace_id, parent_id=None, name=None):
+        """Adopt the passed trace_id (and parent span) that were
+        propagated from a calling service, and the name of the
+        function being called. This is used as the trace context
+        is only known once the arguments have been unpacked
+        """
+        if name is not None:
+            self._root._name = str(name)
+
+        if trace_id is None:
+            return
+
+        self._trace_id = str(trace_id)
+
+        if parent_id is not None:
+            self._root._parent_id = str(parent_id)
+
+    def current_span_id(self):
+        """Return the ID of the innermost open span"""
+        return self._open[-1].span_id()
+
+    def spans(self):
+        """Return all of the spans recorded in this trace, including
+        the root span for the request
+        """
+        return [self._root] + self._spans
+
+    def start_span(self, category, name, attributes=None):
+        """Start and return a new span as a child of the innermost
+        open span
+        """
+        span = Span(
+            trace=self,
+            category=category,
+            name=name,
+            parent_id=self.current_span_id(),
+            attributes=attributes,
+        )
+        self._spans.append(span)
+        self._open.append(span)
+        return span
+
+    def end_span(self, span, error=None):
+        """End the passed span"""
+        span.finish(error=error)
+
+        try:
+            self._open.remove(span)
+        except ValueError:
+            pass
+
+    def finish(self, error=None):
+        """Finish this trace"""
+        self._root.finish(error=error)
+
+    def summary(self):
+        """Return a summary of the time spent in each category of
+        span, in seconds, together with the number of calls
+        """
+        summary = {}
+
+        for span in self._spans:
+            key = "%s.%s" % (span.category(), span.name())
+
+            try:
+                s = summary[key]
+            except KeyError:
+                s = {"count": 0, "seconds": 0.0}
+                summary[key] = s
+
+            s["count"] += 1
+            s["seconds"] += span.duration()
+
+        return summary
+
+    def to_data(self):
+        """Return a json-serialisable dictionary of this trace"""
+        return {"trace_id": self._trace_id, "spans": [span.to_data() for span in self.spans()]}
+
+    def to_otlp(self, service_name=None):
+        """Return this trace as an OTLP/HTTP JSON document that can be
+        posted to an OpenTelemetry collector
+        """
+        if service_name is None:
+            service_name = _trace_service_name
+
+        def _attribute(key, value):
+            if isinstance(value, bool):
+                v = {"boolValue": value}
+            elif isinstance(value, int):
+                v = {"intValue": str(value)}
+            elif isinstance(value, float):
+                v = {"doubleValue": value}
+            else:
+                v = {"stringValue": str(value)}
+
+            return {"key": key, "value": v}
+
+        spans = []
+
+        for span in self.spans():
+            attributes = [_attribute("acquire.category", span.category())]
+
+            for key, value in span.attributes().items():
+                attributes.append(_attribute(key, value))
+
+            s = {
+                "traceId": self._trace_id,
+                "spanId": span.span_id(),
+                "name": "%s.%s" % (span.category(), span.name()),
+                "startTimeUnixNano": str(span._start),
+                "endTimeUnixNano": str(span._end if span._end is not None else span._start),
+                "attributes": attributes,
+            }
+
+            if span.parent_id() is not None:
+                s["parentSpanId"] = span.parent_id()
+
+            if span._error is not None:
+                s["status"] = {"code": 2, "message": span._error}
+
+            spans.append(s)
+
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_attribute("service.name", service_name)]},
+                    "scopeSpans": [{"scope": {"name": "Acquire"}, "spans": spans}],
+                }
+            ]
+        }
+
+
+class _NullSpan:
+    """Returned by trace_span when there is no active trace"""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+class _SpanContext:
+    def __init__(self, trace, category, name, attributes):
+        self._trace = trace
+        self._category = category
+        self._name = name
+        self._attributes = attributes
+        self._span = None
+
+    def __enter__(self):
+        self._span = self._trace.start_span(self._category, self._name, self._attributes)
+        return self._span
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._trace.end_span(self._span, error=exc_value)
+        return False
+
+
+def enable_tracing(trace_file=None, collector=None, service_name=None):
+    """Switch on per-request tracing. Finished traces are written
+    as JSON lines to 'trace_file' and/or posted as OTLP/HTTP JSON
+    to the collector at the URL 'collector'
+    """
+    global _tracing_enabled, _trace_file, _trace_collector, _trace_service_name
+
+    _tracing_enabled = True
+
+    if trace_file is not None:
+        _trace_file = str(trace_file)
+
+    if collector is not None:
+        _trace_collector = str(collector)
+
+    if service_name is not None:
+        _trace_service_name = str(service_name)
+
+
+def disable_tracing():
+    """Switch off per-request tracing"""
+    global _tracing_enabled
+    _tracing_enabled = False
+
+
+def is_tracing():
+    """Return whether or not tracing is switched on"""
+    return _tracing_enabled
+
+
+def get_current_trace():
+    """Return the trace that is active in this thread, or None"""
+    if not _tracing_enabled:
+        return None
+
+    stack = _trace_stack()
+
+    if len(stack) == 0:
+        return None
+    else:
+        return stack[-1]
+
+
+def get_trace_context():
+    """Return the (trace_id, span_id) of the current trace, so that
+    this can be propagated to another service. This returns
+    (None, None) if there is no active trace
+    """
+    trace = get_current_trace()
+
+    if trace is None:
+        return (None, None)
+    else:
+        return (trace.trace_id(), trace.current_span_id())
+
+
+def start_trace(trace_id=None, parent_id=None, name=None):
+    """Start a new trace for a request in this thread, returning
+    the Trace. This returns None if tracing is not enabled
+    """
+    if not _tracing_enabled:
+        return None
+
+    trace = Trace(trace_id=trace_id, parent_id=parent_id, name=name)
+    _trace_stack().append(trace)
+    return trace
+
+
+def end_trace(trace, results=None):
+    """End the passed trace, exporting it to any configured
+    file or collector. If 'results' is passed then the
+    trace_id is added so that the caller can find this trace
+    """
+    if trace is None:
+        return results
+
+    trace.finish()
+
+    stack = _trace_stack()
+
+    try:
+        stack.remove(trace)
+    except ValueError:
+        pass
+
+    try:
+        _export_trace(trace)
+    except Exception:
+        # tracing must never break the request
+        pass
+
+    if results is not None:
+        results["trace_id"] = trace.trace_id()
+
+    return results
+
+
+def trace_span(category, name, **attributes):
+    """Return a context manager that records a span called 'name'
+    in 'category' (e.g. 'objstore', 'crypto', 'mutex',
+    'call_function') in the current trace. This is cheap and does
+    nothing if there is no active trace
+    """
+    if not _tracing_enabled:
+        return _null_span
+
+    stack = _trace_stack()
+
+    if len(stack) == 0:
+        return _null_span
+
+    return _SpanContext(stack[-1], category, name, attributes)
+
+
+_exporter = None
+
+
+def set_trace_exporter(exporter):
+    """Set a custom function that is called with each finished
+    Trace, e.g. to collect traces in memory during testing. Pass
+    None to return to the default file/collector export
+    """
+    global _exporter
+    _exporter = exporter
+
+
+def _export_trace(trace):
+    """Export the passed trace to the configured exporter, file
+    and/or collector
+    """
+    if _exporter is not None:
+        _exporter(trace)
+
+    if _trace_file:
+        lines = [_json.dumps(span.to_data()) for span in trace.spans()]
+
+        with open(_trace_file, "a") as FILE:
+            FILE.write("\n".join(lines) + "\n")
+
+    if _trace_collector:
+        # use urllib rather than requests so that tracing does not
+        # pass through (or get counted in) the requests used for
+        # function calls
+        import urllib.request as _urllib_request
+
+        body = _json.dumps(trace.to_otlp()).encode("utf-8")
+        request = _urllib_request.Request(
+            _trace_collector, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        _urllib_request.urlopen(request, timeout=2.0).close()
@@ -399,9 +399,10 @@ class Service:
 
         return _get_trusted_service(service_url=service_url, service_uid=service_uid)
 
-    def get_session_info(self, session_uid, scope=None, permissions=None):
+    def get_session_info(self, session_uid, scope=None, permissions=None, refresh=False):
         """Return information about the passed session,
-        optionally limited to the provided scope and permissions
+        optionally limited to the provided scope and permissions.
+        Cached information is not used if 'refresh' is True
         """
         if self.is_null():
             return None
@@ -409,9 +410,26 @@ class Service:
         from Acquire.Service import get_session_info as _get_session_info
 
         return _get_session_info(
-            identity_url=self.canonical_url(), session_uid=session_uid, scope=scope, permissions=permissions
+            identity_url=self.canonical_url(),
+            session_uid=session_uid,
+            scope=scope,
+            permissions=permissions,
+            refresh=refresh,
         )
 
+    def get_session_infos(self, sessions):
+        """Return information about all of the passed sessions, which
+        are fetched in a single call. 'sessions' is a list of session
+        UIDs, or of dictionaries containing 'session_uid' and
+        (optionally) 'scope' and 'permissions'
+        """
+        if self.is_null():
+            return None
+
+        from Acquire.Service import get_session_infos as _get_session_infos
+
+        return _get_session_infos(identity_url=self.canonical_url(), sessions=sessions)
+
     def assert_unlocked(self):
         """Assert that this service object is unlocked"""
         if self.is_locked():
@@ -499,8 +517,8 @@ class Service:
             # now generate a new key and certificate
             from Acquire.Crypto import PrivateKey as _PrivateKey
 
-            self._privkey = _PrivateKey(name="%s_refresh_privkey" % self._canonical_url)
-            self._privcert = _PrivateKey(name="%s_refresh_privcert" % self._canonical_url)
+            self._privkey = _PrivateKey.from_pool(name="%s_refresh_privkey" % self._canonical_url)
+            self._privcert = _PrivateKey.from_pool(name="%s_refresh_privcert" % self._canonical_url)
             self._pubkey = self._privkey.public_key()
             self._pubcert = self._privcert.public_key()
 
@@ -858,6 +876,56 @@ class Service:
             response_key=_get_private_key("function"),
         )
 
+    async def async_call_function(self, function, args=None):
+        """Asynchronous version of call_function, which uses
+        Acquire.Service.async_call_function so that many calls can
+        be made concurrently from a single event loop. Refreshing
+        or refetching the service's keys (which is rare) is still
+        performed synchronously
+        """
+        if self.is_null():
+            from Acquire.Service import RemoteFunctionCallError
+
+            raise RemoteFunctionCallError("You cannot call the function '%s' on a null service!" % function)
+
+        from Acquire.Crypto import get_private_key as _get_private_key
+        from ._function import async_call_function as _async_call_function
+
+        if self.should_refresh_keys():
+            self.refresh_keys()
+
+        from Acquire.Service import ServiceAccountMissingKeyError
+
+        try:
+            return await _async_call_function(
+                service_url=self.service_url(),
+                function=function,
+                args=args,
+                args_key=self.public_key(),
+                public_cert=self.public_certificate(),
+                response_key=_get_private_key("function"),
+            )
+
+        except ServiceAccountMissingKeyError:
+            pass
+
+        from Acquire.Service import refetch_trusted_service as _refetch_trusted_service
+
+        service = _refetch_trusted_service(self)
+
+        from copy import copy as _copy
+
+        self.__dict__ = _copy(service.__dict__)
+
+        return await _async_call_function(
+            service_url=self.service_url(),
+            function=function,
+            args=args,
+            args_key=self.public_key(),
+            public_cert=self.public_certificate(),
+            response_key=_get_private_key("function"),
+        )
+
     def sign(self, message):
         """Sign the specified message"""
         if self.is_null():
@@ -0,0 +1,448 @@
+import os as _os
+import socket as _socket
+import struct as _struct
+import sys as _sys
+
+__all__ = ["WarmPool", "warm_up", "call_warm_pool", "start_warm_pool"]
+
+# The abstract UNIX socket on which the warm pool listens for calls.
+# Abstract sockets (prefixed with a null byte) are removed by the
+# kernel when the supervisor exits, and binding one is also the lock
+# that ensures only one supervisor runs per container
+_default_address = "\0acquire_warm_pool"
+
+# Calls are sent as an 8 byte length followed by the packed data
+_header = _struct.Struct(">Q")
+
+# Whether or not this process has already started a warm pool
+_started_pool = False
+
+# The default number of seconds to wait for a warm pool worker to
+# handle a call, after which the caller handles the call itself
+_default_timeout = 60.0
+
+# The default number of calls handled by each worker before it exits.
+# Workers keep their caches (e.g. of session info and chunked transfers)
+# between calls, so a worker that handles a single call never benefits
+# from them, while exiting every so often bounds any growth in memory
+_default_max_calls = 100
+
+
+def _get_timeout(timeout=None):
+    """Return the number of seconds to wait for a worker to handle
+    a call, which defaults to ACQUIRE_WARM_POOL_TIMEOUT
+    """
+    if timeout is None:
+        try:
+            timeout = float(_os.getenv("ACQUIRE_WARM_POOL_TIMEOUT", _default_timeout))
+        except Exception:
+            timeout = _default_timeout
+
+    return timeout
+
+
+def _get_max_calls(max_calls=None):
+    """Return the number of calls handled by each worker, which
+    defaults to ACQUIRE_WARM_POOL_MAX_CALLS
+    """
+    if max_calls is None:
+        try:
+            max_calls = int(_os.getenv("ACQUIRE_WARM_POOL_MAX_CALLS", _default_max_calls))
+        except Exception:
+            max_calls = _default_max_calls
+
+    return max(int(max_calls), 1)
+
+
+def _log_error(message):
+    """Write 'message' and the traceback of the exception being
+    handled to stderr, which is captured in the service logs
+    """
+    import traceback as _traceback
+
+    _sys.stderr.write("%s\n%s" % (message, _traceback.format_exc()))
+    _sys.stderr.flush()
+
+
+def _get_address(address=None):
+    """Return the address of the warm pool socket"""
+    if address is None:
+        address = _os.getenv("ACQUIRE_WARM_POOL_ADDRESS", _default_address)
+
+    return address
+
+
+def _send_message(sock, data):
+    """Send 'data' (bytes) as a length-prefixed message"""
+    sock.sendall(_header.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, n):
+    """Receive exactly 'n' bytes from 'sock'"""
+    parts = []
+
+    while n > 0:
+        part = sock.recv(min(n, 1024 * 1024))
+
+        if not part:
+            raise EOFError("The warm pool connection was closed")
+
+        parts.append(part)
+        n -= len(part)
+
+    return b"".join(parts)
+
+
+def _recv_message(sock):
+    """Receive a length-prefixed message from 'sock'"""
+    (size,) = _header.unpack(_recv_exactly(sock, _header.size))
+    return _recv_exactly(sock, size)
+
+
+def warm_up(modules=None):
+    """Do the slow work needed before this process can handle calls,
+    so that it is not paid by the first call. This imports the passed
+    'modules' (e.g. 'route' or 'admin.login'), connects to the service
+    account bucket and decrypts the service keys. Failures are
+    ignored, as the service may not yet have been set up
+
+    Args:
+         modules (list, optional): Names of modules to import
+    Returns:
+         list: The names of the modules that were imported
+    """
+    from importlib import import_module as _import_module
+    from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
+    from Acquire.Service import get_service_private_key as _get_service_private_key
+    from Acquire.Service import push_is_running_service as _push_is_running_service
+    from Acquire.Service import pop_is_running_service as _pop_is_running_service
+
+    imported = []
+
+    for module in modules or []:
+        try:
+            _import_module(module)
+            imported.append(module)
+        except Exception:
+            pass
+
+    _push_is_running_service()
+
+    try:
+        _get_service_account_bucket()
+        _get_service_private_key()
+    except Exception:
+        pass
+    finally:
+        _pop_is_running_service()
+
+    return imported
+
+
+def _run_worker(listener, notify, routing_function, max_calls):
+    """The main loop of a warm worker process. This waits on the
+    shared listening socket for a call, tells the supervisor that it
+    is busy (so that a replacement can be started) and then handles
+    the call, exiting after 'max_calls' calls, or once the supervisor
+    has stopped. A worker that is stopped (SIGTERM) while handling
+    a call finishes the call before it exits
+    """
+    import signal as _signal
+    from Acquire.Service import handle_call as _handle_call
+    from Acquire.Crypto import start_key_pool as _start_key_pool
+    from Acquire.Crypto import get_key_pool_depth as _get_key_pool_depth
+    from Acquire.Crypto import set_key_pool_depth as _set_key_pool_depth
+
+    state = {"busy": False, "stopping": False}
+
+    def _stop(signum, frame):
+        if state["busy"]:
+            state["stopping"] = True
+        else:
+            raise SystemExit(0)
+
+    _signal.signal(_signal.SIGTERM, _stop)
+
+    # use the time spent waiting to pre-generate the keys that
+    # login and registration calls need, but never more keys than
+    # this worker can use. Single-call workers don't pre-generate,
+    # as they exit (discarding the pool) after their one call
+    if max_calls > 1:
+        _set_key_pool_depth(min(_get_key_pool_depth(), max_calls))
+        _start_key_pool()
+    else:
+        _set_key_pool_depth(0)
+
+    for i in range(0, max_calls):
+        (conn, _addr) = listener.accept()
+        state["busy"] = True
+
+        try:
+            notify.send("busy")
+        except Exception:
+            pass
+
+        with conn:
+            try:
+                data = _recv_message(conn)
+                result = _handle_call(data=data, routing_function=routing_function)
+                _send_message(conn, result)
+            except Exception:
+                # the caller sees the connection close, and so will
+                # handle the call itself
+                _log_error("Warm pool worker %d failed to handle a call" % _os.getpid())
+
+        state["busy"] = False
+
+        if state["stopping"]:
+            break
+
+        if i + 1 < max_calls:
+            try:
+                notify.send("idle")
+            except Exception:
+                # the supervisor has stopped, so stop taking calls
+                break
+
+    notify.close()
+
+
+class WarmPool:
+    """This is a supervisor that keeps 'size' idle worker processes
+    ready to handle calls. The supervisor warms itself up (imports
+    'modules', connects to the service account bucket and decrypts
+    the service keys) and then forks the workers, so each worker
+    starts warm. Workers wait on a shared UNIX socket, so each call
+    is handed by the kernel to an idle worker. As soon as a worker
+    takes a call, a replacement is forked in the background. Each
+    worker handles up to 'max_calls' calls before it exits (default
+    ACQUIRE_WARM_POOL_MAX_CALLS, or 100)
+    """
+
+    def __init__(self, size=1, routing_function=None, modules=None, address=None, max_calls=None):
+        self._size = max(int(size), 1)
+        self._routing_function = routing_function
+        self._modules = modules
+        self._address = _get_address(address)
+        self._max_calls = _get_max_calls(max_calls)
+        self._listener = None
+        self._workers = {}
+        self._stopped = False
+
+    def address(self):
+        """Return the address of the socket on which the pool listens"""
+        return self._address
+
+    def is_running(self):
+        """Return whether or not the pool has been started"""
+        return self._listener is not None
+
+    def num_idle(self):
+        """Return the number of idle workers"""
+        return len([w for w in self._workers.values() if w["idle"]])
+
+    def num_workers(self):
+        """Return the total number of worker processes"""
+        return len(self._workers)
+
+    def start(self):
+        """Bind the socket, warm up and fork the workers. This raises
+        a ServiceError if another pool is already listening
+        """
+        if self.is_running():
+            return
+
+        from Acquire.Service import ServiceError
+
+        listener = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+
+        try:
+            listener.bind(self._address)
+            listener.listen(128)
+        except OSError as e:
+            listener.close()
+            raise ServiceError("Cannot start the warm pool as the socket is in use: %s" % str(e))
+
+        self._listener = listener
+        self._stopped = False
+
+        warm_up(self._modules)
+
+        for _ in range(0, self._size):
+            self._spawn()
+
+    def _spawn(self):
+        """Internal function that forks a new idle worker"""
+        import multiprocessing as _mp
+
+        ctx = _mp.get_context("fork")
+        (reader, writer) = ctx.Pipe(duplex=False)
+
+        process = ctx.Process(
+            target=_run_worker, args=(self._listener, writer, self._routing_function, self._max_calls)
+        )
+        process.start()
+        writer.close()
+
+        self._workers[process.pid] = {"process": process, "reader": reader, "idle": True}
+
+    def _replenish(self):
+        """Internal function that forks workers until there are
+        'size' idle workers
+        """
+        while not self._stopped and self.num_idle() < self._size:
+            self._spawn()
+
+    def poll(self, timeout=1.0):
+        """Wait up to 'timeout' seconds for workers to take calls or
+        exit, and replace them so that there are always 'size'
+        idle workers
+        """
+        from multiprocessing.connection import wait as _wait
+
+        readers = {}
+
+        for (pid, worker) in self._workers.items():
+            readers[worker["reader"]] = pid
+            readers[worker["process"].sentinel] = pid
+
+        if len(readers) == 0:
+            self._replenish()
+            return
+
+        for ready in _wait(list(readers.keys()), timeout=timeout):
+            pid = readers[ready]
+            worker = self._workers.get(pid)
+
+            if worker is None:
+                continue
+
+            if ready is worker["reader"]:
+                try:
+                    worker["idle"] = worker["reader"].recv() == "idle"
+                except (EOFError, OSError):
+                    worker["idle"] = False
+            else:
+                worker["process"].join()
+                worker["reader"].close()
+                del self._workers[pid]
+
+        self._replenish()
+
+    def serve(self, max_seconds=None):
+        """Start the pool (if needed) and supervise it until 'stop'
+        is called, or 'max_seconds' have passed
+        """
+        import time as _time
+
+        self.start()
+
+        start_time = _time.monotonic()
+
+        try:
+            while not self._stopped:
+                if max_seconds is not None and _time.monotonic() - start_time > max_seconds:
+                    break
+
+                self.poll()
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stop the pool. All workers are told to stop, which idle
+        workers do straight away, while busy workers first finish
+        their calls
+        """
+        self._stopped = True
+
+        for worker in list(self._workers.values()):
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+
+        for worker in list(self._workers.values()):
+            if worker["idle"]:
+                worker["process"].join()
+
+            worker["reader"].close()
+
+        self._workers = {}
+
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+
+def call_warm_pool(data, address=None, timeout=None):
+    """Hand the packed call in 'data' to an idle worker in the warm
+    pool, returning the packed result. This returns None if the call
+    could not be handed over (there is no warm pool listening, or
+    the call could not be sent), in which case the caller should
+    handle the call itself. This waits up to 'timeout' seconds
+    (default ACQUIRE_WARM_POOL_TIMEOUT, or 60) for the result, and
+    raises a ServiceError if the worker fails or does not reply in
+    time. The worker may already have handled (some of) the call by
+    then, so the call must not be handled again
+    """
+    if isinstance(data, dict):
+        import msgpack as _msgpack
+
+        data = _msgpack.packb(data)
+
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+
+    try:
+        sock.connect(_get_address(address))
+    except OSError:
+        sock.close()
+        return None
+
+    with sock:
+        sock.settimeout(_get_timeout(timeout))
+
+        try:
+            _send_message(sock, data)
+        except OSError:
+            # the whole call was not sent, so no worker can handle it
+            return None
+
+        try:
+            return _recv_message(sock)
+        except (EOFError, OSError) as e:
+            from Acquire.Service import ServiceError
+
+            raise ServiceError("The warm pool worker failed to handle the call: %s" % str(e))
+
+
+def start_warm_pool(size=None, routing_module=None):
+    """Start a warm pool supervisor with 'size' workers in the
+    background (once per process). The workers route calls using
+    the 'route' function in 'routing_module'. The size defaults to
+    ACQUIRE_WARM_POOL_SIZE (default 1), and no pool is started if
+    this is 0. The supervisor exits straight away if a pool is
+    already running
+    """
+    global _started_pool
+
+    if _started_pool:
+        return
+
+    _started_pool = True
+
+    if size is None:
+        try:
+            size = int(_os.getenv("ACQUIRE_WARM_POOL_SIZE", 1))
+        except Exception:
+            size = 1
+
+    if size <= 0:
+        return
+
+    import subprocess as _subprocess
+
+    cmd = ["nohup", _sys.executable, "-m", "admin.one_hot_spare", str(int(size))]
+
+    if routing_module is not None:
+        cmd.append(str(routing_module))
+
+    devnull = open(_os.devnull, "w")
+    _subprocess.Popen(cmd, stdout=devnull, stderr=_subprocess.STDOUT)
@@ -1,4 +1,8 @@
-__all__ = ["DriveInfo"]
+import threading as _threading
+
+from cachetools import TTLCache as _TTLCache
+
+__all__ = ["DriveInfo", "clear_transfer_cache"]
 
 _drive_root = "storage/drive"
 
@@ -7,6 +11,20 @@ _fileinfo_root = "storage/file"
 _uploader_root = "storage/uploader"
 _downloader_root = "storage/downloader"
 
+# Process-wide cache of the state of the open chunked uploaders and
+# downloaders, indexed by the key of their record in the object store.
+# This saves reading the record, and opening the file bucket, for every
+# chunk. Entries expire after a short time, so that a transfer that is
+# closed by another instance of the storage service is seen quickly
+_transfer_cache = _TTLCache(maxsize=1024, ttl=60)
+_transfer_lock = _threading.Lock()
+
+
+def clear_transfer_cache():
+    """Call to clear the cache of chunked uploaders and downloaders"""
+    with _transfer_lock:
+        _transfer_cache.clear()
+
 
 def _validate_file_upload(par, file_bucket, file_key, objsize, checksum):
     """Call this function to signify that the file associated with
@@ -22,7 +40,10 @@ def _validate_file_upload(par, file_bucket, file_key, objsize, checksum):
 
     file_bucket = _ObjectStore.get_bucket(bucket=bucket, bucket_name=file_bucket, create_if_needed=True)
 
-    # check that the file uploaded matches what was promised
+    # check that the file uploaded matches what was promised. This
+    # uses the MD5 checksum calculated by the object store, so that
+    # the file doesn't have to be read back (uploads via an OSPar
+    # must be checksummed using MD5 - see DriveInfo.upload)
     (real_objsize, real_checksum) = _ObjectStore.get_size_and_checksum(file_bucket, file_key)
 
     if real_objsize != objsize or real_checksum != checksum:
@@ -182,6 +203,85 @@ class DriveInfo:
 
         return (drive_acl, identifiers)
 
+    def _cache_transfer(self, key, data, file_bucket=None):
+        """Internal function that caches and returns the state of the
+        chunked uploader or downloader whose record 'data' is saved
+        at 'key'. The MD5 of the shared secret is cached so that each
+        chunk secret is checked using a single hash
+        """
+        from Acquire.Crypto import Hash as _Hash
+
+        if file_bucket is None:
+            file_bucket = self._get_file_bucket(data["filekey"])
+
+        transfer = {"data": data, "secret_md5": _Hash.md5(data["secret"]), "file_bucket": file_bucket}
+
+        with _transfer_lock:
+            _transfer_cache[key] = transfer
+
+        return transfer
+
+    def _get_transfer(self, key):
+        """Internal function returning the state of the chunked uploader
+        or downloader whose record is saved at 'key', or None if this
+        has been closed
+        """
+        with _transfer_lock:
+            transfer = _transfer_cache.get(key)
+
+        if transfer is not None:
+            return transfer
+
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
+
+        bucket = _get_service_account_bucket()
+
+        try:
+            data = _ObjectStore.get_object_from_json(bucket, key)
+        except:
+            data = None
+
+        if data is None:
+            return None
+
+        return self._cache_transfer(key, data)
+
+    def _take_transfer(self, key):
+        """Internal function that removes the record of the chunked
+        uploader or downloader saved at 'key', returning the record,
+        or None if someone else has already removed it
+        """
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
+
+        with _transfer_lock:
+            _transfer_cache.pop(key, None)
+
+        bucket = _get_service_account_bucket()
+
+        try:
+            return _ObjectStore.take_object_from_json(bucket, key)
+        except:
+            return None
+
+    def _assert_chunk_secret(self, transfer, file_uid, chunk_index, secret):
+        """Internal function that validates the secret passed for the
+        chunk at 'chunk_index'. This should be the multi_md5 hash
+        of the shared secret with the concatenated drive_uid,
+        file_uid and chunk_index
+        """
+        from Acquire.Crypto import Hash as _Hash
+
+        shared_secret = _Hash.md5(
+            transfer["secret_md5"] + _Hash.md5("%s%s%d" % (self._drive_uid, file_uid, chunk_index))
+        )
+
+        if secret != shared_secret:
+            raise PermissionError(
+                "Invalid chunked upload secret. You do not have permission " "to upload chunks to this file!"
+            )
+
     def open_uploader(self, filename, aclrules=None, authorisation=None, par=None, identifiers=None):
         """Create a return a ChunkUploader that will allow a file
         to be uploaded chunk-by-chunk (bit-by-bit). The filename
@@ -233,6 +333,7 @@ class DriveInfo:
         fileinfo.save()
 
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.ObjectStore import get_datetime_now_to_string as _get_datetime_now_to_string
         from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
 
         bucket = _get_service_account_bucket()
@@ -243,9 +344,11 @@ class DriveInfo:
             "version": filemeta.uid(),
             "filekey": fileinfo.latest_version()._file_key(),
             "secret": uploader.secret(),
+            "datetime": _get_datetime_now_to_string(),
         }
 
         _ObjectStore.set_object_from_json(bucket, key, data)
+        self._cache_transfer(key, data)
 
         return (filemeta, uploader)
 
@@ -253,32 +356,20 @@ class DriveInfo:
         """Close the uploader associated with the passed file_uid,
         authenticated using the passed secret
         """
-        from Acquire.ObjectStore import ObjectStore as _ObjectStore
-        from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
-
-        bucket = _get_service_account_bucket()
         key = "%s/%s/%s" % (_uploader_root, self._drive_uid, file_uid)
 
-        try:
-            data = _ObjectStore.get_object_from_json(bucket, key)
-        except:
-            data = None
+        transfer = self._get_transfer(key)
 
-        if data is None:
+        if transfer is None:
             # the uploader has already been closed
             return
 
-        shared_secret = data["secret"]
+        data = transfer["data"]
 
-        if secret != shared_secret:
+        if secret != data["secret"]:
             raise PermissionError("Invalid request - you do not have permission to " "close this uploader")
 
-        try:
-            data2 = _ObjectStore.take_object_from_json(bucket, key)
-        except:
-            data2 = None
-
-        if data2 is None:
+        if self._take_transfer(key) is None:
             # someone else is already in the process of closing
             # this uploader - let them do it!
             return
@@ -291,9 +382,7 @@ class DriveInfo:
 
         fileinfo = _FileInfo.load(drive=self, filename=filename, version=version)
 
-        file_key = data["filekey"]
-        file_bucket = self._get_file_bucket(file_key)
-        fileinfo.close_uploader(file_bucket=file_bucket)
+        fileinfo.close_uploader(file_bucket=transfer["file_bucket"])
         fileinfo.save()
 
     def close_downloader(self, downloader_uid, file_uid, secret):
@@ -301,30 +390,18 @@ class DriveInfo:
         downloader_uid and file_uid,
         authenticated using the passed secret
         """
-        from Acquire.ObjectStore import ObjectStore as _ObjectStore
-        from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
-
-        bucket = _get_service_account_bucket()
         key = "%s/%s/%s/%s" % (_downloader_root, self._drive_uid, file_uid, downloader_uid)
 
-        try:
-            data = _ObjectStore.get_object_from_json(bucket, key)
-        except:
-            data = None
+        transfer = self._get_transfer(key)
 
-        if data is None:
+        if transfer is None:
             # the downloader has already been closed
             return
 
-        shared_secret = data["secret"]
-
-        if secret != shared_secret:
+        if secret != transfer["data"]["secret"]:
             raise PermissionError("Invalid request - you do not have permission to " "close this downloader")
 
-        try:
-            _ObjectStore.take_object_from_json(bucket, key)
-        except:
-            pass
+        self._take_transfer(key)
 
     def upload_chunk(self, file_uid, chunk_index, secret, chunk, checksum):
         """Upload a chunk of the file with UID 'file_uid'. This is the
@@ -334,44 +411,37 @@ class DriveInfo:
         multi_md5 has of the shared secret with the concatenated
         drive_uid, file_uid and chunk_index
         """
-        from Acquire.ObjectStore import ObjectStore as _ObjectStore
-        from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
-
-        bucket = _get_service_account_bucket()
         key = "%s/%s/%s" % (_uploader_root, self._drive_uid, file_uid)
-        data = _ObjectStore.get_object_from_json(bucket, key)
-        shared_secret = data["secret"]
 
-        from Acquire.Crypto import Hash as _Hash
+        transfer = self._get_transfer(key)
 
-        shared_secret = _Hash.multi_md5(shared_secret, "%s%s%d" % (self._drive_uid, file_uid, chunk_index))
+        if transfer is None:
+            raise PermissionError("There is no uploader available to let you upload " "this chunked file!")
 
-        if secret != shared_secret:
-            raise PermissionError(
-                "Invalid chunked upload secret. You do not have permission " "to upload chunks to this file!"
-            )
+        self._assert_chunk_secret(transfer, file_uid, chunk_index, secret)
 
-        # validate the data checksum
-        check = _Hash.md5(chunk)
+        # validate the data checksum, using the algorithm chosen
+        # by the uploader
+        from Acquire.Access import get_checksum as _get_checksum
+        from Acquire.Access import get_checksum_algorithm as _get_checksum_algorithm
+
+        check = _get_checksum(chunk, algorithm=_get_checksum_algorithm(checksum))
 
         if check != checksum:
             from Acquire.Storage import FileValidationError
 
             raise FileValidationError("Invalid checksum for chunk: %s versus %s" % (check, checksum))
 
-        meta = {"filesize": len(chunk), "checksum": checksum, "compression": "bz2"}
-
-        file_key = data["filekey"]
-        chunk_index = int(chunk_index)
-
-        file_bucket = self._get_file_bucket(file_key)
-        data_key = "%s/data/%d" % (file_key, chunk_index)
-        meta_key = "%s/meta/%d" % (file_key, chunk_index)
-
+        # this is the only object written per chunk - a chunk that is
+        # uploaded again replaces the earlier upload. The size and
+        # checksum of each chunk are saved in the manifest written
+        # when the uploader is closed
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.Storage._fileinfo import _get_chunk_key
 
-        _ObjectStore.set_object_from_json(file_bucket, meta_key, meta)
-        _ObjectStore.set_object(file_bucket, data_key, chunk)
+        chunk_key = _get_chunk_key(transfer["data"]["filekey"], int(chunk_index))
+
+        _ObjectStore.set_object(transfer["file_bucket"], chunk_key, chunk)
 
     def download_chunk(self, file_uid, downloader_uid, chunk_index, secret):
         """Download a chunk of the file with UID 'file_uid' at chunk
@@ -380,47 +450,58 @@ class DriveInfo:
         multi_md5 has of the shared secret with the concatenated
         drive_uid, file_uid and chunk_index
         """
-        from Acquire.ObjectStore import ObjectStore as _ObjectStore
-        from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
-
-        bucket = _get_service_account_bucket()
         key = "%s/%s/%s/%s" % (_downloader_root, self._drive_uid, file_uid, downloader_uid)
 
-        try:
-            data = _ObjectStore.get_object_from_json(bucket, key)
-        except:
-            data = None
+        transfer = self._get_transfer(key)
 
-        if data is None:
+        if transfer is None:
             raise PermissionError(
                 "There is no downloader available to let you download " "this chunked file!"
             )
 
-        shared_secret = data["secret"]
+        self._assert_chunk_secret(transfer, file_uid, chunk_index, secret)
 
-        from Acquire.Crypto import Hash as _Hash
-
-        shared_secret = _Hash.multi_md5(shared_secret, "%s%s%d" % (self._drive_uid, file_uid, chunk_index))
-
-        if secret != shared_secret:
-            raise PermissionError(
-                "Invalid chunked upload secret. You do not have permission " "to upload chunks to this file!"
-            )
+        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+        from Acquire.Storage._fileinfo import _get_chunk_manifest, _get_chunk_meta
 
+        data = transfer["data"]
         file_key = data["filekey"]
+        file_bucket = transfer["file_bucket"]
         chunk_index = int(chunk_index)
 
-        file_bucket = self._get_file_bucket(file_key)
-        data_key = "%s/data/%d" % (file_key, chunk_index)
-        meta_key = "%s/meta/%d" % (file_key, chunk_index)
+        manifest = transfer.get("manifest")
 
-        num_chunks = None
+        if manifest is None:
+            manifest = _get_chunk_manifest(file_bucket, file_key)
 
-        from Acquire.ObjectStore import ObjectStore as _ObjectStore
+            if manifest is not None:
+                # the file has been closed, so the manifest won't change
+                transfer["manifest"] = manifest
 
-        try:
-            meta = _ObjectStore.get_object_from_json(file_bucket, meta_key)
-        except:
+        if manifest is not None:
+            num_chunks = len(manifest)
+
+            if chunk_index < 0:
+                chunk_index = num_chunks + chunk_index
+
+            if chunk_index < 0 or chunk_index > num_chunks:
+                raise IndexError("Invalid chunk index")
+            elif chunk_index == num_chunks:
+                # signal we've reached the end of the file
+                return (None, None, num_chunks)
+
+            meta = dict(manifest[chunk_index])
+            chunk = _ObjectStore.get_object(file_bucket, meta.pop("key"))
+
+            return (chunk, meta, None)
+
+        # the file is still being uploaded, or was uploaded before
+        # manifests were written, so look for this chunk
+        num_chunks = None
+
+        if chunk_index >= 0:
+            meta = _get_chunk_meta(file_bucket, file_key, chunk_index)
+        else:
             meta = None
 
         if meta is None:
@@ -447,9 +528,13 @@ class DriveInfo:
                 return (None, None, num_chunks)
 
             # we should be able to read this metadata...
-            meta = _ObjectStore.get_object_from_json(file_bucket, meta_key)
+            meta = _get_chunk_meta(file_bucket, file_key, chunk_index)
+
+            if meta is None:
+                raise IndexError("Invalid chunk index")
 
-        chunk = _ObjectStore.get_object(file_bucket, data_key)
+        meta.pop("index")
+        chunk = _ObjectStore.get_object(file_bucket, meta.pop("key"))
 
         return (chunk, meta, num_chunks)
 
@@ -489,6 +574,16 @@ class DriveInfo:
                 "Your permissions are %s" % str(drive_acl)
             )
 
+        if not filehandle.is_localdata():
+            # the upload is validated using the MD5 checksum calculated
+            # by the object store, rather than by reading the file
+            from Acquire.Access import get_checksum_algorithm as _get_checksum_algorithm
+
+            if _get_checksum_algorithm(filehandle.checksum()) != "md5":
+                from Acquire.Storage import FileValidationError
+
+                raise FileValidationError("Files that are uploaded using an OSPar must have an MD5 checksum")
+
         # now generate a FileInfo for this FileHandle
         fileinfo = _FileInfo(
             drive_uid=self._drive_uid, filehandle=filehandle, identifiers=identifiers, upstream=drive_acl
@@ -617,6 +712,7 @@ class DriveInfo:
             downloader = _ChunkDownloader(drive_uid=self._drive_uid, file_uid=fileinfo.version().uid())
 
             from Acquire.ObjectStore import ObjectStore as _ObjectStore
+            from Acquire.ObjectStore import get_datetime_now_to_string as _get_datetime_now_to_string
             from Acquire.Service import get_service_account_bucket as _get_service_account_bucket
 
             bucket = _get_service_account_bucket()
@@ -627,9 +723,11 @@ class DriveInfo:
                 "version": filemeta.uid(),
                 "filekey": fileinfo.version()._file_key(),
                 "secret": downloader.secret(),
+                "datetime": _get_datetime_now_to_string(),
             }
 
             _ObjectStore.set_object_from_json(bucket, key, data)
+            self._cache_transfer(key, data, file_bucket=file_bucket)
 
         elif must_chunk:
             raise PermissionError("Cannot download this file in a chunked manner!")
@@ -109,7 +109,15 @@ class FileHandle:
             from Acquire.Access import get_filesize_and_checksum as _get_filesize_and_checksum
             import os as _os
 
-            (filesize, cksum) = _get_filesize_and_checksum(filename=filename)
+            if _os.path.getsize(filename) < local_cutoff:
+                algorithm = None
+            else:
+                # this file will be uploaded using an OSPar, which is
+                # validated using the MD5 checksum calculated by the
+                # object store, so this must be an MD5 checksum
+                algorithm = "md5"
+
+            (filesize, cksum) = _get_filesize_and_checksum(filename=filename, algorithm=algorithm)
 
             if compress and _should_compress(filename=filename, filesize=filesize):
                 import bz2 as _bz2
@@ -132,7 +140,9 @@ class FileHandle:
 
                     if self._compressed_filename is not None:
                         self._compression = "bz2"
-                        (filesize, cksum) = _get_filesize_and_checksum(filename=self._compressed_filename)
+                        (filesize, cksum) = _get_filesize_and_checksum(
+                            filename=self._compressed_filename, algorithm=algorithm
+                        )
             elif filesize < local_cutoff:
                 # this is small enough to hold in memory
                 self._local_filedata = open(filename, "rb").read()
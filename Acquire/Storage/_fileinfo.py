@@ -7,6 +7,105 @@ _fileinfo_root = "storage/file"
 _file_root = "storage/file"
 
 
+def _get_chunk_key(file_key, chunk_index):
+    """Internal function returning the key of the chunk at 'chunk_index'
+    of the chunked file at 'file_key'. Each chunk has a single key, so
+    uploading a chunk again replaces the earlier upload (the last
+    write wins)
+    """
+    return "%s/chunk/%d" % (file_key, chunk_index)
+
+
+def _get_manifest_key(file_key):
+    """Internal function returning the key of the manifest of the
+    chunks of the chunked file at 'file_key'
+    """
+    return "%s/manifest" % file_key
+
+
+def _get_stored_chunk_meta(file_bucket, file_key, chunk_index):
+    """Internal function returning the metadata (and key) of the chunk
+    at 'chunk_index' of the chunked file at 'file_key', or None if
+    this chunk has not been uploaded. The size and (MD5) checksum are
+    those calculated by the object store, so that no metadata needs
+    to be written when the chunk is uploaded
+    """
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+    from Acquire.ObjectStore import ObjectStoreError as _ObjectStoreError
+
+    key = _get_chunk_key(file_key, chunk_index)
+
+    try:
+        (filesize, checksum) = _ObjectStore.get_size_and_checksum(file_bucket, key)
+    except _ObjectStoreError:
+        return None
+
+    return {"index": chunk_index, "filesize": filesize, "checksum": checksum, "compression": "bz2", "key": key}
+
+
+def _name_to_chunk_meta(file_key, name):
+    """Internal function returning the metadata (and key) of a chunk
+    that was uploaded with its metadata in its name, i.e. at
+    "file_key/chunk/index/filesize/checksum"
+    """
+    (chunk_index, filesize, checksum) = name.split("/", 2)
+
+    return {
+        "index": int(chunk_index),
+        "filesize": int(filesize),
+        "checksum": checksum,
+        "compression": "bz2",
+        "key": "%s/chunk/%s" % (file_key, name),
+    }
+
+
+def _get_chunk_meta(file_bucket, file_key, chunk_index):
+    """Internal function returning the metadata (and key) of the
+    uploaded chunk at 'chunk_index' of the chunked file at 'file_key',
+    or None if this chunk has not been uploaded. This also finds
+    chunks that were uploaded with their metadata in their names,
+    or with separate "meta" and "data" objects
+    """
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+    meta = _get_stored_chunk_meta(file_bucket, file_key, chunk_index)
+
+    if meta is not None:
+        return meta
+
+    prefix = "%s/chunk/%d/" % (file_key, chunk_index)
+    names = _ObjectStore.get_all_object_names(file_bucket, prefix, without_prefix=True)
+
+    if len(names) > 0:
+        return _name_to_chunk_meta(file_key, "%d/%s" % (chunk_index, sorted(names)[-1]))
+
+    try:
+        meta = _ObjectStore.get_object_from_json(file_bucket, "%s/meta/%d" % (file_key, chunk_index))
+    except:
+        meta = None
+
+    if meta is not None:
+        meta["index"] = chunk_index
+        meta["key"] = "%s/data/%d" % (file_key, chunk_index)
+
+    return meta
+
+
+def _get_chunk_manifest(file_bucket, file_key):
+    """Internal function returning the manifest of the chunked file
+    at 'file_key', which is the list of the metadata (and key) of
+    each chunk, in order. This returns None if the manifest has not
+    been written, i.e. the upload has not been closed, or the file
+    was uploaded before manifests were written
+    """
+    from Acquire.ObjectStore import ObjectStore as _ObjectStore
+
+    try:
+        return _ObjectStore.get_object_from_json(file_bucket, _get_manifest_key(file_key))
+    except:
+        return None
+
+
 class VersionInfo:
     """This class holds specific info about a version of a file"""
 
@@ -132,38 +231,74 @@ class VersionInfo:
     def close_uploader(self, file_bucket):
         """Close the uploader. This will count the number of chunks,
         and will also create a checksum of all of the chunk's
-        checksums
+        checksums. The size and checksum of each chunk are read
+        from the object store and saved in a manifest that is used
+        to download the file
         """
         if not self.is_uploading():
             return
 
+        from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
         from Acquire.ObjectStore import ObjectStore as _ObjectStore
 
-        meta_root = "%s/meta/" % self._file_key()
+        file_key = self._file_key()
+
+        names = _ObjectStore.get_all_object_names(
+            bucket=file_bucket, prefix="%s/chunk/" % file_key, without_prefix=True
+        )
 
-        keys = _ObjectStore.get_all_object_names(bucket=file_bucket, prefix=meta_root)
+        indexes = [int(name) for name in names if "/" not in name]
 
-        meta_keys = {}
-        for key in keys:
-            idx = int(key.split("/")[-1])
-            meta_keys[idx] = key
+        with _ThreadPoolExecutor(max_workers=8) as pool:
+            metas = pool.map(lambda i: _get_stored_chunk_meta(file_bucket, file_key, i), indexes)
+            chunks = {meta["index"]: meta for meta in metas if meta is not None}
 
-        nchunks = len(keys)
-        size = 0
-        from Acquire.Crypto import Hash as _Hash
-        from hashlib import md5 as _md5
+        # chunks uploaded with their metadata in their names
+        for name in sorted(names):
+            if "/" in name:
+                meta = _name_to_chunk_meta(file_key, name)
+                chunks.setdefault(meta["index"], meta)
+
+        if len(chunks) == 0:
+            # this may have been uploaded with separate "meta" objects
+            names = _ObjectStore.get_all_object_names(
+                bucket=file_bucket, prefix="%s/meta/" % file_key, without_prefix=True
+            )
 
-        md5 = _md5()
+            for name in names:
+                meta = _get_chunk_meta(file_bucket, file_key, int(name))
+                chunks[meta["index"]] = meta
+
+        nchunks = len(chunks)
+        manifest = []
 
         for i in range(0, nchunks):
-            key = meta_keys[i]
-            meta = _ObjectStore.get_object_from_json(bucket=file_bucket, key="%s/%d" % (meta_root, i))
+            try:
+                meta = chunks[i]
+            except KeyError:
+                from Acquire.Storage import FileValidationError
+
+                raise FileValidationError("Cannot close the upload as chunk %d is missing" % i)
+
+            meta.pop("index")
+            manifest.append(meta)
+
+        # save the manifest so that downloads don't need to look up
+        # each chunk
+        _ObjectStore.set_object_from_json(bucket=file_bucket, key=_get_manifest_key(file_key), data=manifest)
 
-            size += meta["filesize"]
-            md5.update(meta["checksum"].encode("utf-8"))
+        size = sum([meta["filesize"] for meta in manifest])
+        checksums = [meta["checksum"] for meta in manifest]
+
+        # the checksum of the file is calculated from the chunk
+        # checksums, so the chunks don't need to be read again. This
+        # is a checksum of the list of chunks, so (unless the chunks
+        # are all 4 MB) it differs from a checksum of the whole file
+        from Acquire.Access import combine_checksums as _combine_checksums
 
         self._filesize = size
-        self._checksum = md5.hexdigest()
+        self._checksum = _combine_checksums(checksums)
         self._nchunks = nchunks
 
     def num_chunks(self):
@@ -575,17 +710,18 @@ class FileInfo:
 
         metadata_bucket = self.drive()._get_metadata_bucket()
 
-        # save the version information (saves old versions)
-        _ObjectStore.set_object_from_json(
-            bucket=metadata_bucket,
-            key=self._latest_version._key(self._drive_uid, self._encoded_filename),
-            data=self._latest_version.to_data(),
-        )
+        with _ObjectStore.batch() as batch:
+            # save the version information (saves old versions)
+            version = batch.set_object_from_json(
+                bucket=metadata_bucket,
+                key=self._latest_version._key(self._drive_uid, self._encoded_filename),
+                data=self._latest_version.to_data(),
+            )
 
-        # save the fileinfo itself
-        _ObjectStore.set_object_from_json(
-            bucket=metadata_bucket, key=self._fileinfo_key(), data=self.to_data()
-        )
+            # save the fileinfo itself, only once its version is saved
+            batch.set_object_from_json(
+                bucket=metadata_bucket, key=self._fileinfo_key(), data=self.to_data(), after=version
+            )
 
     @staticmethod
     def list_versions(drive, filename, identifiers=None, upstream=None, include_metadata=False):
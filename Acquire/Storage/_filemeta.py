@@ -295,16 +295,21 @@ class FileMeta:
 
     def assert_correct_data(self, filedata=None, filename=None):
         """Assert that the passed data is correct (right size and
-        checksum)
+        checksum). The checksum is calculated using the same
+        algorithm as was used for this file
         """
+        from Acquire.Access import get_checksum_algorithm as _get_checksum_algorithm
+
+        algorithm = _get_checksum_algorithm(self._checksum)
+
         if filedata is not None:
             from Acquire.Access import get_size_and_checksum as _get_size_and_checksum
 
-            (filesize, checksum) = _get_size_and_checksum(filedata)
+            (filesize, checksum) = _get_size_and_checksum(filedata, algorithm=algorithm)
         else:
             from Acquire.Access import get_filesize_and_checksum as _get_filesize_and_checksum
 
-            (filesize, checksum) = _get_filesize_and_checksum(filename)
+            (filesize, checksum) = _get_filesize_and_checksum(filename, algorithm=algorithm)
 
         if (filesize != self._filesize) or (checksum != self._checksum):
             from Acquire.Storage import FileValidationError
@@ -18,3 +18,7 @@ except:
     from ._lazy_import import *
 
 requests = lazy_import.lazy_module("requests")
+
+# asynchronous requests (built on aiohttp, which is only imported
+# if asynchronous calls are made)
+from ._async_requests import async_requests
@@ -0,0 +1,89 @@
+import weakref as _weakref
+
+__all__ = ["async_requests"]
+
+
+class _AsyncResponse:
+    """The response from an asynchronous post. This has the same
+    'status_code' and 'content' as a requests response
+    """
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+
+class _AsyncRequests:
+    """This is a thin asynchronous version of the part of the requests
+    API used by Acquire, built on aiohttp (which is only imported when
+    it is first used). A single aiohttp session, and so a single pool
+    of connections, is shared by all calls made on each event loop
+    """
+
+    def __init__(self, limit=100):
+        self._limit = limit
+        self._sessions = _weakref.WeakKeyDictionary()
+
+    def set_connection_limit(self, limit):
+        """Set the maximum number of simultaneous connections that
+        will be made from each event loop. This applies to sessions
+        that are created after this call
+        """
+        self._limit = max(int(limit), 0)
+
+    def _get_session(self):
+        """Return the session for the running event loop, creating it
+        if needed
+        """
+        import asyncio as _asyncio
+
+        loop = _asyncio.get_running_loop()
+
+        session = self._sessions.get(loop)
+
+        if session is None or session.closed:
+            try:
+                import aiohttp as _aiohttp
+            except ImportError:
+                raise ImportError(
+                    "Cannot import aiohttp. Please install aiohttp, e.g. via "
+                    "'pip install aiohttp' so that you can call services "
+                    "asynchronously"
+                )
+
+            session = _aiohttp.ClientSession(connector=_aiohttp.TCPConnector(limit=self._limit))
+            self._sessions[loop] = session
+
+        return session
+
+    async def post(self, url, data, timeout=None):
+        """Asynchronously post 'data' to 'url', returning the response"""
+        import aiohttp as _aiohttp
+
+        session = self._get_session()
+
+        async with session.post(url, data=data, timeout=_aiohttp.ClientTimeout(total=timeout)) as response:
+            return _AsyncResponse(status_code=response.status, content=await response.read())
+
+    async def get(self, url, data=None, timeout=None):
+        """Asynchronously get 'url', returning the response"""
+        import aiohttp as _aiohttp
+
+        session = self._get_session()
+
+        async with session.get(url, data=data, timeout=_aiohttp.ClientTimeout(total=timeout)) as response:
+            return _AsyncResponse(status_code=response.status, content=await response.read())
+
+    async def close(self):
+        """Close the session (and its connections) of the running
+        event loop. Call this before the event loop is closed
+        """
+        import asyncio as _asyncio
+
+        session = self._sessions.pop(_asyncio.get_running_loop(), None)
+
+        if session is not None:
+            await session.close()
+
+
+async_requests = _AsyncRequests()
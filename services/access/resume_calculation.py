@@ -0,0 +1,38 @@
+from Acquire.Identity import Authorisation, AuthorisationError
+from Acquire.Access import WorkSheet
+
+from typing import Dict
+
+
+def run(args: Dict) -> Dict:
+    """This function is used to resume the submission of a compute job
+    whose submission was interrupted (e.g. because the access service
+    was restarted). The job carries on from the last step that was
+    completed, so the user is not charged again.
+
+    Args:
+        args: Dictionary containing the 'uid' of the job and an
+        'authorisation' from the user who requested the job
+    Returns:
+        dict: Dictionary of job details
+    """
+    try:
+        uid = args["uid"]
+    except KeyError:
+        raise ValueError("You must provide the UID of the job to resume")
+
+    if "authorisation" in args:
+        authorisation = Authorisation.from_data(args["authorisation"])
+    else:
+        raise AuthorisationError(f"You must provide a valid authorisation to resume the job {uid}")
+
+    authorisation.verify(resource=f"resume {uid}")
+
+    worksheet = WorkSheet.load(uid)
+
+    if authorisation.user_guid() != worksheet.user_guid():
+        raise AuthorisationError(f"Only the user who requested the job {uid} can resume it")
+
+    worksheet.resume()
+
+    return {"uid": worksheet.uid(), "output": worksheet.output_location().to_string()}
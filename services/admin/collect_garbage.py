@@ -0,0 +1,33 @@
+from Acquire.Service import get_this_service, collect_garbage
+from Acquire.Identity import Authorisation
+
+
+def run(args):
+    """Call this function to collect the expired PARs, abandoned
+       mutexes, stale auth_once records and abandoned chunked
+       uploaders and downloaders from the object store. Pass
+       'max_seconds' to limit the time spent - the next call
+       will carry on from where this call stopped
+
+       Args:
+            args (dict): contains authorisation details for the request
+    """
+    try:
+        authorisation = Authorisation.from_data(args["authorisation"])
+    except:
+        raise PermissionError(
+            "Only an authorised admin can collect garbage")
+
+    service = get_this_service(need_private_access=True)
+    service.assert_admin_authorised(
+            authorisation, "collect_garbage %s" % service.uid())
+
+    try:
+        max_seconds = float(args["max_seconds"])
+    except:
+        max_seconds = None
+
+    return_value = {}
+    return_value["garbage"] = collect_garbage(max_seconds=max_seconds)
+
+    return return_value
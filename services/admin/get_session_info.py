@@ -6,7 +6,9 @@ from Acquire.ObjectStore import datetime_to_string
 
 def run(args):
     """This function will allow anyone to obtain the public
-       keys for the passed login session
+       keys for the passed login session. If 'wait_for_status'
+       is passed then this will wait for up to 'wait_seconds'
+       for the session to leave that status before returning
     """
     try:
         session_uid = args["session_uid"]
@@ -28,7 +30,23 @@ def run(args):
     except:
         permissions = None
 
+    try:
+        wait_for_status = args["wait_for_status"]
+    except:
+        wait_for_status = None
+
     if session_uid:
+        if wait_for_status is not None:
+            # long-poll - wait for the session status to change
+            try:
+                wait_seconds = float(args["wait_seconds"])
+            except:
+                wait_seconds = 0
+
+            LoginSession.wait_for_status_change(uid=session_uid,
+                                                status=wait_for_status,
+                                                wait_seconds=wait_seconds)
+
         login_session = LoginSession.load(uid=session_uid, scope=scope,
                                           permissions=permissions)
     else:
@@ -0,0 +1,38 @@
+from admin.get_session_info import run as get_session_info
+
+
+def run(args):
+    """This function will allow anyone to obtain the public
+       keys for all of the passed login sessions in a single call.
+       This is used by services that need to verify many
+       authorisations at once
+
+       Args:
+            args (dict): contains 'sessions', a list of dictionaries
+            that each contain the 'session_uid' and optionally the
+            'scope' and 'permissions'
+       Returns:
+            dict: contains 'session_infos', the list of session
+            information (or None if the session could not be loaded)
+            in the same order as 'sessions'
+    """
+    try:
+        sessions = args["sessions"]
+    except:
+        sessions = []
+
+    session_infos = []
+
+    for session in sessions:
+        try:
+            session_infos.append(get_session_info(
+                {"session_uid": session["session_uid"],
+                 "scope": session.get("scope", None),
+                 "permissions": session.get("permissions", None)}))
+        except:
+            session_infos.append(None)
+
+    return_value = {}
+    return_value["session_infos"] = session_infos
+
+    return return_value
@@ -1,24 +1,17 @@
-import sys
-import os
-import subprocess
-
-
-def _one_hot_spare():
+def _one_hot_spare(size=None, routing_module=None):
     """This function will (in the background) cause the function service
-    to spin up another hot spare ready to process another request.
+    to spin up a pool of hot spares ready to process the next requests.
     This ensures that, if a user makes a request while this
     thread is busy, then the cold-start time to spin up another
     thread has been mitigated.
 
     Args:
-         None
+         size (int, optional): Number of hot spares
+         routing_module (str, optional): Module containing 'route'
      Returns:
          None
 
     """
-    devnull = open(os.devnull, "w")
-    subprocess.Popen(
-        ["nohup", sys.executable, "one_hot_spare.py"],
-        stdout=devnull,
-        stderr=subprocess.STDOUT,
-    )
+    from Acquire.Service import start_warm_pool
+
+    start_warm_pool(size=size, routing_module=routing_module)
@@ -1,5 +1,6 @@
 
 from Acquire.Identity import LoginSession, Authorisation
+from Acquire.Service import invalidate_session_info
 
 
 def run(args):
@@ -31,3 +32,8 @@ def run(args):
 
     login_session.set_logged_out(authorisation=authorisation,
                                  signature=signature)
+
+    # make sure that this service sees the logout immediately. Other
+    # services will see it once their cached session info expires,
+    # or at once for sensitive (refreshed) calls
+    invalidate_session_info(session_uid)
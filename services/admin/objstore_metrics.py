@@ -0,0 +1,38 @@
+from Acquire.Service import get_this_service
+from Acquire.Identity import Authorisation
+from Acquire.ObjectStore import get_container_objstore_metrics
+
+
+def run(args):
+    """Call this function to return the object store metrics that
+       have been aggregated over all requests handled by this
+       container. Pass 'reset' as True to clear the metrics
+       after they have been returned
+
+       Args:
+            args (dict): contains authorisation details for the request
+    """
+    try:
+        authorisation = Authorisation.from_data(args["authorisation"])
+    except:
+        raise PermissionError(
+            "Only an authorised admin can read the object store metrics")
+
+    service = get_this_service(need_private_access=True)
+    service.assert_admin_authorised(
+            authorisation, "objstore_metrics %s" % service.uid())
+
+    metrics = get_container_objstore_metrics()
+
+    return_value = {}
+    return_value["objstore_metrics"] = metrics.to_data()
+
+    try:
+        reset = bool(args["reset"])
+    except:
+        reset = False
+
+    if reset:
+        metrics.clear()
+
+    return return_value
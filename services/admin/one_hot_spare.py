@@ -1,30 +1,53 @@
+import sys
 
-from io import BytesIO
 
-import json
+def one_hot_spare(size=1, routing_module=None, max_seconds=None):
+    """Call this function to run the warm pool supervisor, which
+       ensures that there are always 'size' hot spare copies of
+       route waiting to service the next request. The workers route
+       calls using the 'route' function in 'routing_module'. This
+       returns immediately if a warm pool is already running
 
-import socket
-import sys
+       Args:
+            size (int, default=1): Number of idle workers to keep
+            routing_module (str, optional): Module containing 'route'
+            max_seconds (float, optional): How long to run for
+       Returns:
+            None
 
+    """
+    from importlib import import_module
+    from Acquire.Service import WarmPool, ServiceError
 
-def one_hot_spare():
-    """Call this function to ensure that there is one hot spare
-       copy of route waiting to service the next request
+    routing_function = None
+    modules = ["admin.root", "admin.login"]
 
-       Args: None
-       Returns: None
+    if routing_module is not None:
+        # the workers can't route calls without this, so don't start
+        module = import_module(routing_module)
+        routing_function = getattr(module, "route")
+        modules.append(routing_module)
+
+    pool = WarmPool(size=size, routing_function=routing_function, modules=modules)
+
+    try:
+        pool.start()
+    except ServiceError:
+        # there is already a warm pool running
+        return
+
+    pool.serve(max_seconds=max_seconds)
 
-    """
-    
-    pass
 
+if __name__ == "__main__":
+    try:
+        size = int(sys.argv[1])
+    except Exception:
+        size = 1
 
-try:
-    import socket
-    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    # Create an abstract socket, by prefixing it with null.
-    s.bind('\0one_hot_spare_lock')
+    try:
+        routing_module = sys.argv[2]
+    except Exception:
+        routing_module = None
 
-    one_hot_spare()
-except:
-    sys.exit(0)
+    one_hot_spare(size=size, routing_module=routing_module)
@@ -1,11 +1,24 @@
-
 def run(args):
-    """This function does absolutely nothing. It is called to pre-warm
-       a set of functions so that we can hide the long cold-start time
+    """This function is called to pre-warm a set of functions so that
+       we can hide the long cold-start time. The warm pool is started
+       by the service's handler (which knows how to route calls), so
+       is not started here. As it is called regularly, it can also
+       be asked to do a little garbage collection, by passing
+       'collect_garbage' as the number of seconds to spend collecting
 
        Args:
-         args: unused
+         args: can contain 'collect_garbage'
        Returns:
-         dict: empty dict
+         dict: empty dict, or the garbage collected
     """
-    return {}
+    try:
+        max_seconds = float(args["collect_garbage"])
+    except:
+        max_seconds = None
+
+    if max_seconds is None or max_seconds <= 0:
+        return {}
+
+    from Acquire.Service import collect_garbage
+
+    return {"garbage": collect_garbage(max_seconds=max_seconds)}
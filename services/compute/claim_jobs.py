@@ -0,0 +1,39 @@
+from Acquire.Compute import Cluster
+
+from typing import Dict
+
+
+def run(args: Dict) -> Dict:
+    """This function claims a batch of pending jobs for the cluster,
+    waiting (long-polling) for up to 'wait_seconds' if there are no
+    pending jobs. The claimed jobs are leased to the cluster for
+    'lease_seconds', after which they are returned to the pending pool
+
+    Args:
+        args: Dictionary containing the passphrase and claim options
+    Returns:
+        dict: Dictionary holding the encrypted list of job data
+    """
+    passphrase = str(args["passphrase"])
+
+    try:
+        max_jobs = int(args["max_jobs"])
+    except KeyError:
+        max_jobs = 10
+
+    try:
+        lease_seconds = int(args["lease_seconds"])
+    except KeyError:
+        lease_seconds = 600
+
+    try:
+        wait_seconds = float(args["wait_seconds"])
+    except KeyError:
+        wait_seconds = 0
+
+    cluster = Cluster.get_cluster()
+
+    jobs = cluster.claim_jobs(max_jobs=max_jobs, lease_seconds=lease_seconds,
+                              wait_seconds=wait_seconds, passphrase=passphrase)
+
+    return {"jobs": cluster.encrypt_data([job.to_data() for job in jobs])}
@@ -0,0 +1,14 @@
+from Acquire.Compute import Cluster
+
+
+def run(args):
+    """This function returns statistics about the queue of
+       pending jobs, e.g. the queue depth and waiting times
+    """
+    passphrase = str(args["passphrase"])
+
+    cluster = Cluster.get_cluster()
+
+    statistics = cluster.get_queue_statistics(passphrase=passphrase)
+
+    return {"statistics": statistics}
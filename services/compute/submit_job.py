@@ -3,6 +3,7 @@ from Acquire.Client import PAR, Cheque, Drive
 from Acquire.Access import RunRequest
 from Acquire.Service import get_this_service
 from Acquire.Compute import ComputeJob
+from Acquire.Identity import Authorisation
 
 
 def run(args):
@@ -17,9 +18,11 @@ def run(args):
     par = PAR.from_data(args["par"])
     secret = args["secret"]
     cheque = Cheque.from_data(args["cheque"])
+    authorisation = Authorisation.from_data(args["authorisation"])
 
     job = ComputeJob.submit(worksheet_uid=worksheet_uid,
                             request=request, par=par,
-                            secret=secret, cheque=cheque)
+                            secret=secret, cheque=cheque,
+                            authorisation=authorisation)
 
     return {"uid": job.uid()}
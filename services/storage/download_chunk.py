@@ -14,7 +14,9 @@ def run(args):
     chunk_idx = int(args["chunk_index"])
     secret = str(args["secret"])
 
-    drive = DriveInfo(drive_uid=drive_uid)
+    # the chunk is authenticated using its secret, so there is
+    # no need to load the drive's metadata
+    drive = DriveInfo.from_data({"uid": drive_uid})
 
     try:
         (data, meta, num_chunks) = drive.download_chunk(file_uid=file_uid,
@@ -41,7 +41,7 @@ async def handle_invocation(ctx: InvokeContext, data: BytesIO) -> Response:
         error_str = str(format_tb())
         return Response(ctx=ctx, response_data=error_str)
 
-    returned_data = handle_call(data=data, routing_function=route)
+    returned_data = handle_call(data=data, routing_function=route, use_warm_pool=True)
     headers = {"Content-Type": "application/octet-stream"}
 
     return Response(ctx=ctx, response_data=returned_data, headers=headers)
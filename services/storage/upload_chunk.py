@@ -13,7 +13,9 @@ def run(args):
     data = string_to_bytes(args["data"])
     checksum = str(args["checksum"])
 
-    drive = DriveInfo(drive_uid=drive_uid)
+    # the chunk is authenticated using its secret, so there is
+    # no need to load the drive's metadata
+    drive = DriveInfo.from_data({"uid": drive_uid})
 
     drive.upload_chunk(file_uid=file_uid, chunk_index=chunk_idx,
                        secret=secret, chunk=data, checksum=checksum)
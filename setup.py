@@ -44,6 +44,7 @@ setuptools.setup(
         "console_scripts": [
             "acquire_login = Acquire.Client.Scripts.__acquire_login__:main",
             "aq = Acquire.Client.Scripts.__aq__:main",
+            "aq_benchmark = Acquire.Client.Scripts.__aq_benchmark__:main",
         ]
     },
     install_requires=requirements,
@@ -0,0 +1,106 @@
+
+import pytest
+import os
+
+from hashlib import md5, blake2b
+
+from Acquire.Access import _checksum
+from Acquire.Access import get_checksum, get_size_and_checksum, \
+    get_filesize_and_checksum, get_checksum_algorithm, \
+    get_checksum_algorithms, combine_checksums, \
+    register_checksum_algorithm, set_default_checksum_algorithm, \
+    get_default_checksum_algorithm
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(_checksum, "_tree_chunk_size", 1000)
+    return 1000
+
+
+def test_checksum_formats():
+    data = b"Some data to checksum"
+
+    # MD5 is the default, and is compatible with older checksums
+    assert(get_default_checksum_algorithm() == "md5")
+    assert(get_checksum(data) == md5(data).hexdigest())
+    assert(get_checksum_algorithm(get_checksum(data)) == "md5")
+
+    checksum = get_checksum(data, algorithm="blake2b")
+    assert(checksum == "blake2b:%s" % blake2b(data, digest_size=32).hexdigest())
+    assert(get_checksum_algorithm(checksum) == "blake2b")
+
+    checksum = get_checksum(data, algorithm="blake2b-tree")
+    assert(checksum.startswith("blake2b-tree:"))
+    assert(get_checksum_algorithm(checksum) == "blake2b-tree")
+
+    for algorithm in get_checksum_algorithms():
+        assert(get_size_and_checksum(data, algorithm)[0] == len(data))
+
+    with pytest.raises(ValueError):
+        get_checksum(data, algorithm="unknown")
+
+
+@pytest.mark.parametrize("size", [0, 999, 1000, 1001, 5500])
+def test_tree_checksum(size, small_chunks, tmpdir):
+    data = os.urandom(size)
+
+    filename = os.path.join(str(tmpdir), "data")
+
+    with open(filename, "wb") as FILE:
+        FILE.write(data)
+
+    for algorithm in get_checksum_algorithms():
+        assert(get_filesize_and_checksum(filename, algorithm) ==
+               get_size_and_checksum(data, algorithm))
+
+    # the tree checksum can be calculated from the chunk checksums
+    chunks = [data[i:i + small_chunks]
+              for i in range(0, max(size, 1), small_chunks)]
+
+    checksums = [get_checksum(chunk, "blake2b") for chunk in chunks]
+
+    assert(combine_checksums(checksums) ==
+           get_checksum(data, "blake2b-tree"))
+
+    # MD5 chunk checksums are combined as they always have been
+    checksums = [get_checksum(chunk, "md5") for chunk in chunks]
+
+    assert(combine_checksums(checksums) ==
+           md5("".join(checksums).encode("utf-8")).hexdigest())
+
+    with pytest.raises(ValueError):
+        combine_checksums([get_checksum(data, "md5"),
+                           get_checksum(data, "blake2b")])
+
+
+def test_register_checksum_algorithm():
+    from hashlib import sha1
+
+    register_checksum_algorithm("sha1", sha1)
+
+    assert("sha1" in get_checksum_algorithms())
+    assert("sha1-tree" in get_checksum_algorithms())
+
+    set_default_checksum_algorithm("sha1-tree")
+
+    try:
+        assert(get_checksum_algorithm(get_checksum(b"data")) == "sha1-tree")
+    finally:
+        set_default_checksum_algorithm("md5")
+
+    with pytest.raises(ValueError):
+        register_checksum_algorithm("bad:name", sha1)
+
+    with pytest.raises(ValueError):
+        set_default_checksum_algorithm("unknown")
+
+
+def test_chunk_checksum():
+    from Acquire.Access import get_chunk_checksum
+
+    data = b"Some chunk of data"
+
+    assert(get_chunk_checksum(data, "blake2b-tree") ==
+           get_checksum(data, "blake2b"))
+    assert(get_chunk_checksum(data) == get_checksum(data, "md5"))
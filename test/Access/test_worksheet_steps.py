@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from Acquire.Access._worksheet import _Step, _run_step_graph
+
+
+def test_step_graph():
+    barrier = threading.Barrier(2, timeout=10)
+    order = []
+    completed = []
+
+    def _record(name, wait=False):
+        def _run(context):
+            if wait:
+                # only passes if both steps run at the same time
+                barrier.wait()
+            order.append(name)
+            context[name] = True
+        return _run
+
+    steps = [_Step("service", [], _record("service")),
+             _Step("a", ["service"], _record("a", wait=True), persist=True),
+             _Step("b", ["service"], _record("b", wait=True), persist=True),
+             _Step("c", ["a", "b"], _record("c"), persist=True)]
+
+    context = {}
+    _run_step_graph(steps, context, completed=[],
+                    on_complete=lambda step: completed.append(step.name))
+
+    assert(order[0] == "service")
+    assert(order[-1] == "c")
+    assert(sorted(completed) == ["a", "b", "c"])
+
+    # resuming only runs the steps that have not completed, plus the
+    # unpersisted steps that they need
+    order.clear()
+    _run_step_graph(steps, {}, completed=["a", "b", "c"],
+                    on_complete=lambda step: None)
+    assert(order == [])
+
+    steps[1] = _Step("a", ["service"], _record("a"), persist=True)
+    _run_step_graph(steps, {}, completed=["b", "c"],
+                    on_complete=lambda step: None)
+    assert(order == ["service", "a"])
+
+
+def test_step_graph_failure():
+    order = []
+
+    def _fail(context):
+        raise ValueError("failed")
+
+    steps = [_Step("a", [], _fail, persist=True),
+             _Step("b", ["a"], lambda context: order.append("b"),
+                   persist=True)]
+
+    with pytest.raises(ValueError):
+        _run_step_graph(steps, {}, completed=[],
+                        on_complete=lambda step: None)
+
+    assert(order == [])
@@ -0,0 +1,64 @@
+
+from Acquire.Benchmark import run_benchmark, get_percentile, \
+    load_baseline, save_baseline, compare_to_baseline, format_results
+
+
+def test_percentile():
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+
+    assert(get_percentile(values, 0) == 1.0)
+    assert(get_percentile(values, 50) == 3.0)
+    assert(get_percentile(values, 100) == 5.0)
+    assert(get_percentile(values, 25) == 2.0)
+    assert(get_percentile([], 50) == 0.0)
+
+
+def test_run_benchmark():
+    calls = []
+
+    def _function():
+        calls.append(bytearray(64 * 1024))
+
+    result = run_benchmark("test", _function, repeats=5, warmup=2)
+
+    # warmup, timed and traced calls
+    assert(len(calls) == 8)
+
+    assert(result["name"] == "test")
+    assert(result["repeats"] == 5)
+    assert(result["min_ms"] <= result["p50_ms"] <= result["p95_ms"])
+    assert(result["p95_ms"] <= result["p99_ms"] <= result["max_ms"])
+    assert(result["objstore_ops"] == 0)
+    assert(result["alloc_peak_kb"] >= 64)
+
+
+def test_baseline(tmpdir):
+    filename = str(tmpdir.join("baseline.json"))
+
+    assert(load_baseline(filename) == {})
+
+    base = {"name": "a", "p50_ms": 10.0, "p95_ms": 20.0,
+            "p99_ms": 30.0, "objstore_ops": 5, "alloc_peak_kb": 100.0}
+
+    save_baseline(filename, [base])
+    save_baseline(filename, [dict(base, name="b")])
+
+    baseline = load_baseline(filename)
+    assert(sorted(baseline.keys()) == ["a", "b"])
+
+    # within tolerance, so no regression
+    same = [dict(base, p50_ms=12.0, alloc_peak_kb=100.5)]
+    assert(compare_to_baseline(same, baseline, tolerance=0.25) == [])
+
+    slower = [dict(base, p95_ms=30.0, objstore_ops=6)]
+    regressions = compare_to_baseline(slower, baseline, tolerance=0.25)
+
+    assert(sorted(r["metric"] for r in regressions) ==
+           ["objstore_ops", "p95_ms"])
+
+    output = format_results(slower, baseline, regressions)
+    assert("REGRESSION" in output)
+
+    # unknown benchmarks are not compared
+    assert(compare_to_baseline([dict(base, name="c", p50_ms=100.0)],
+                               baseline) == [])
@@ -0,0 +1,42 @@
+
+from Acquire.Benchmark import run_micro_benchmarks, \
+    get_micro_benchmark_names, append_history, load_history
+
+
+def test_micro_benchmarks(tmpdir):
+    names = get_micro_benchmark_names()
+
+    for name in ["pack_unpack_arguments", "pack_unpack_return_value",
+                 "encrypt", "decrypt", "fingerprint", "bytes_to_string",
+                 "datetime_x1000", "transaction_info_x1000",
+                 "aclrules_resolve_x1000"]:
+        assert(name in names)
+
+    results = run_micro_benchmarks(names=["pack_unpack_return_value",
+                                          "fingerprint"],
+                                   sizes=[1024, 2048], repeats=2, warmup=1,
+                                   measure_allocations=False)
+
+    assert([r["name"] for r in results] ==
+           ["pack_unpack_return_value[1KB]", "pack_unpack_return_value[2KB]",
+            "fingerprint"])
+
+    assert(results[0]["payload_bytes"] == 1024)
+    assert(results[0]["throughput_mb_s"] > 0)
+    assert("payload_bytes" not in results[2])
+
+    filename = str(tmpdir.join("history.jsonl"))
+
+    assert(load_history(filename) == [])
+
+    append_history(filename, results, label="first")
+    append_history(filename, results[0:1], label="second")
+
+    history = load_history(filename)
+    assert(len(history) == 4)
+    assert(history[-1]["label"] == "second")
+    assert("python" in history[-1])
+    assert("datetime" in history[-1])
+
+    history = load_history(filename, name="pack_unpack_return_value[1KB]")
+    assert([h["label"] for h in history] == ["first", "second"])
@@ -0,0 +1,208 @@
+import pytest
+
+from Acquire.Compute import Cluster, ComputeJob
+from Acquire.ObjectStore import ObjectStore
+from Acquire.Service import get_service_account_bucket, \
+    push_testing_objstore, pop_testing_objstore, \
+    push_is_running_service, pop_is_running_service
+
+
+@pytest.fixture
+def cluster(tmpdir, monkeypatch):
+    push_testing_objstore(str(tmpdir))
+    push_is_running_service()
+
+    # the job records are not needed to test claiming
+    monkeypatch.setattr(ComputeJob, "load", staticmethod(lambda uid: uid))
+
+    # start without any claims swept from other tests
+    from Acquire.Compute import _cluster
+    monkeypatch.setattr(_cluster, "_claim_sweep", {"next": None, "running": {}})
+
+    cluster = Cluster()
+    cluster._uid = "cluster"
+    cluster._secret = "secret"
+
+    yield cluster
+
+    pop_is_running_service()
+    pop_testing_objstore()
+
+
+def test_claim_jobs(cluster):
+    passphrase = cluster.passphrase("claim_jobs")
+
+    with pytest.raises(PermissionError):
+        cluster.claim_jobs(passphrase="wrong")
+
+    assert(cluster.claim_jobs(passphrase=passphrase) == [])
+
+    for i in range(0, 5):
+        cluster.submit_job("job%d" % i)
+
+    jobs = cluster.claim_jobs(max_jobs=3, passphrase=passphrase)
+    assert(jobs == ["job0", "job1", "job2"])
+
+    bucket = get_service_account_bucket()
+    assert(sorted(ObjectStore.get_all_object_names(bucket, "compute/pending/",
+                                                   without_prefix=True)) ==
+           ["job3", "job4"])
+
+    # the remaining jobs are claimed with a lease that expires at once
+    jobs = cluster.claim_jobs(max_jobs=10, lease_seconds=1,
+                              passphrase=passphrase)
+    assert(jobs == ["job3", "job4"])
+
+    import time
+    time.sleep(1.5)
+
+    # the expired claims are returned to the pending pool
+    jobs = cluster.claim_jobs(max_jobs=10, passphrase=passphrase)
+    assert(jobs == ["job3", "job4"])
+
+    # moving a job on from 'claimed' keeps it from being returned
+    data = ObjectStore.take_object_from_json(bucket, "compute/claimed/job0")
+    assert(data["uid"] == "job0")
+
+
+def test_claim_jobs_wait(cluster):
+    import threading
+    import time
+
+    passphrase = cluster.passphrase("claim_jobs")
+
+    timer = threading.Timer(0.5, lambda: cluster.submit_job("late"))
+    timer.start()
+
+    start = time.monotonic()
+    jobs = cluster.claim_jobs(wait_seconds=5, passphrase=passphrase)
+    timer.join()
+
+    assert(jobs == ["late"])
+    assert(time.monotonic() - start < 5)
+
+
+def test_claim_jobs_sweep(cluster):
+    from Acquire.ObjectStore import enable_objstore_metrics, \
+        disable_objstore_metrics, get_container_objstore_metrics, \
+        get_key_family
+
+    passphrase = cluster.passphrase("claim_jobs")
+
+    for i in range(0, 3):
+        cluster.submit_job("job%d" % i)
+
+    assert(cluster.claim_jobs(max_jobs=2, passphrase=passphrase) ==
+           ["job0", "job1"])
+
+    metrics = get_container_objstore_metrics()
+    enable_objstore_metrics()
+
+    try:
+        metrics.clear()
+
+        # the queue is listed without reading the entries, and the
+        # claimed jobs are not swept while long-polling
+        assert(cluster.claim_jobs(max_jobs=2, passphrase=passphrase) ==
+               ["job2"])
+
+        family = get_key_family("compute/claimed/job0")
+        assert(metrics.count("get_object", family) == 0)
+        assert(metrics.count("get_object",
+                             get_key_family("compute/queue/0/1")) == 0)
+
+        metrics.clear()
+        assert(cluster.claim_jobs(wait_seconds=1.5,
+                                  passphrase=passphrase) == [])
+        assert(metrics.count("get_object", family) == 0)
+        assert(metrics.count("get_all_object_names", family) == 0)
+    finally:
+        disable_objstore_metrics()
+
+
+def test_claim_jobs_concurrent(cluster):
+    from concurrent.futures import ThreadPoolExecutor
+
+    passphrase = cluster.passphrase("claim_jobs")
+
+    for i in range(0, 20):
+        cluster.submit_job("job%d" % i)
+
+    def claim(i):
+        return cluster.claim_jobs(max_jobs=5, passphrase=passphrase)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        jobs = [job for claimed in pool.map(claim, range(0, 8))
+                for job in claimed]
+
+    # jobs that lost every race are left for the next claim
+    jobs += cluster.claim_jobs(max_jobs=20, passphrase=passphrase)
+
+    # each job is claimed by exactly one claimer
+    assert(sorted(jobs) == sorted("job%d" % i for i in range(0, 20)))
+
+    bucket = get_service_account_bucket()
+    assert(ObjectStore.get_all_object_names(bucket, "compute/pending/") == [])
+    assert(len(ObjectStore.get_all_object_names(bucket, "compute/claimed/"))
+           == 20)
+
+
+def test_claim_jobs_failed_record(cluster, monkeypatch):
+    passphrase = cluster.passphrase("claim_jobs")
+
+    for i in range(0, 3):
+        cluster.submit_job("job%d" % i)
+
+    set_object = ObjectStore.set_object
+
+    def _set_object(bucket, key, data):
+        if key == "compute/claimed/job1":
+            raise ConnectionError("Unable to write '%s'" % key)
+
+        return set_object(bucket, key, data)
+
+    monkeypatch.setattr(ObjectStore, "set_object", staticmethod(_set_object))
+
+    # the job whose claim could not be recorded is not returned...
+    jobs = cluster.claim_jobs(max_jobs=3, passphrase=passphrase)
+    assert(jobs == ["job0", "job2"])
+
+    bucket = get_service_account_bucket()
+    assert(ObjectStore.get_all_object_names(bucket, "compute/pending/",
+                                            without_prefix=True) == ["job1"])
+
+    # ...but is left pending, in the queue, to be claimed again
+    monkeypatch.setattr(ObjectStore, "set_object", staticmethod(set_object))
+
+    assert(cluster.claim_jobs(max_jobs=3, passphrase=passphrase) == ["job1"])
+    assert(sorted(ObjectStore.get_all_object_names(
+        bucket, "compute/claimed/", without_prefix=True)) ==
+           ["job0", "job1", "job2"])
+
+
+def test_claim_jobs_counts_running(cluster, monkeypatch):
+    from Acquire.Compute import _cluster
+
+    passphrase = cluster.passphrase("claim_jobs")
+
+    cluster.submit_job("job0", user_guid="alice")
+    assert(cluster.claim_jobs(passphrase=passphrase) == ["job0"])
+
+    # the claimed job is counted...
+    assert(_cluster.Cluster._return_expired_claims() == {"alice": 1})
+
+    # ...and is still counted once it has moved on to be run
+    def get_job(uid, start_state, end_state):
+        resource = "get_job %s %s->%s" % (uid, start_state, end_state)
+        return cluster.get_job(uid=uid, start_state=start_state,
+                               end_state=end_state,
+                               passphrase=cluster.passphrase(resource))
+
+    get_job("job0", "claimed", "submitting")
+    assert(_cluster.Cluster._return_expired_claims() == {"alice": 1})
+
+    get_job("job0", "submitting", "running")
+    assert(_cluster.Cluster._return_expired_claims() == {"alice": 1})
+
+    get_job("job0", "running", "completed")
+    assert(_cluster.Cluster._return_expired_claims() == {})
@@ -0,0 +1,174 @@
+import datetime
+
+from Acquire.Compute import JobScheduler
+from Acquire.ObjectStore import get_datetime_now, datetime_to_string
+
+
+def _entry(uid, user="user", priority=0, size=1, waited=0):
+    queued = get_datetime_now() - datetime.timedelta(seconds=waited)
+    return {"uid": uid, "user_guid": user, "priority": priority,
+            "size": size, "queued": datetime_to_string(queued)}
+
+
+class _Request:
+    def __init__(self, resources):
+        self._resources = resources
+
+    def resources(self):
+        return self._resources
+
+
+def _uids(entries):
+    return [entry["uid"] for entry in entries]
+
+
+def test_create_entry():
+    request = _Request("cores=4, hours=2, priority=5")
+
+    entry = JobScheduler.create_entry("2026-10-19/abc", request=request,
+                                      user_guid="user", max_priority=9)
+
+    assert(entry["priority"] == 5)
+    assert(entry["size"] == 8)
+    assert(entry["user_guid"] == "user")
+
+    # everything the scheduler needs is in the queue key
+    key = JobScheduler.get_queue_key(entry)
+    assert(key.startswith("compute/queue/4/8/"))
+    assert(key.endswith("/2026-10-19/abc"))
+    assert(JobScheduler._entry_from_name(key[len("compute/queue/"):]) ==
+           entry)
+
+    entry = JobScheduler.create_entry("a")
+    assert(entry["priority"] == 0)
+    assert(entry["size"] == 1)
+
+    entry = JobScheduler.create_entry("a", request=_Request({"priority": 20}),
+                                      max_priority=9)
+    assert(entry["priority"] == 9)
+
+    # users cannot request more than their maximum priority
+    entry = JobScheduler.create_entry("a", request=request)
+    assert(entry["priority"] == 0)
+
+    entry = JobScheduler.create_entry("a", request=request, max_priority=3)
+    assert(entry["priority"] == 3)
+
+
+def test_max_priority(tmpdir):
+    from Acquire.Service import push_testing_objstore, \
+        pop_testing_objstore, push_is_running_service, \
+        pop_is_running_service, get_service_account_bucket
+
+    push_testing_objstore(str(tmpdir))
+    push_is_running_service()
+
+    try:
+        bucket = get_service_account_bucket()
+
+        assert(JobScheduler.get_max_priority(bucket, "user") == 0)
+        assert(JobScheduler.get_max_priority(bucket, None) == 0)
+
+        JobScheduler.set_max_priority(bucket, "user", 4)
+        assert(JobScheduler.get_max_priority(bucket, "user") == 4)
+        assert(JobScheduler.get_max_priority(bucket, "other") == 0)
+
+        JobScheduler.set_max_priority(bucket, "user", 20)
+        assert(JobScheduler.get_max_priority(bucket, "user") == 9)
+    finally:
+        pop_is_running_service()
+        pop_testing_objstore()
+
+
+def test_select_order():
+    entries = [_entry("large", size=64, waited=20),
+               _entry("small", size=1, waited=10),
+               _entry("urgent", priority=3, size=64),
+               _entry("old", size=1, waited=30)]
+
+    # priority first, then small jobs before large, then oldest first
+    assert(_uids(JobScheduler.select(entries, max_jobs=4)) ==
+           ["urgent", "old", "small", "large"])
+
+    assert(_uids(JobScheduler.select(entries, max_jobs=2)) ==
+           ["urgent", "old"])
+
+
+def test_select_aging():
+    # a low priority job that has waited long enough overtakes
+    entries = [_entry("new", priority=2),
+               _entry("waiting", priority=0, waited=3 * 600 + 1)]
+
+    assert(_uids(JobScheduler.select(entries, max_jobs=2)) ==
+           ["waiting", "new"])
+
+
+def test_select_fair_share():
+    entries = [_entry("a1", user="a", waited=50),
+               _entry("a2", user="a", waited=40),
+               _entry("a3", user="a", waited=30),
+               _entry("b1", user="b", waited=20),
+               _entry("b2", user="b", waited=10)]
+
+    # users take turns
+    assert(_uids(JobScheduler.select(entries, max_jobs=5)) ==
+           ["a1", "b1", "a2", "b2", "a3"])
+
+    # a user with jobs already running waits for the others
+    assert(_uids(JobScheduler.select(entries, max_jobs=3,
+                                     running={"a": 2})) ==
+           ["b1", "b2", "a1"])
+
+
+def test_statistics():
+    entries = [_entry("a", user="a", priority=1, waited=10),
+               _entry("b", user="b", waited=30)]
+
+    stats = JobScheduler.get_statistics(None, entries=entries, claimed=3)
+
+    assert(stats["depth"] == 2)
+    assert(stats["depth_by_priority"] == {0: 1, 1: 1})
+    assert(stats["depth_by_user"] == {"a": 1, "b": 1})
+    assert(29 < stats["max_wait_seconds"] < 40)
+    assert(19 < stats["mean_wait_seconds"] < 30)
+    assert(stats["claimed"] == 3)
+
+
+def test_get_entries(tmpdir):
+    from Acquire.ObjectStore import ObjectStore, enable_objstore_metrics, \
+        disable_objstore_metrics, get_container_objstore_metrics
+    from Acquire.Service import push_testing_objstore, \
+        pop_testing_objstore, push_is_running_service, \
+        pop_is_running_service, get_service_account_bucket
+
+    push_testing_objstore(str(tmpdir))
+    push_is_running_service()
+
+    try:
+        bucket = get_service_account_bucket()
+
+        entries = [_entry("a", user=None, waited=10),
+                   _entry("b", user="b@z0/z0+", priority=2, size=0.5),
+                   _entry("c", user="a", waited=20)]
+
+        for entry in entries:
+            ObjectStore.set_object_from_json(
+                bucket, JobScheduler.get_queue_key(entry), entry)
+
+        metrics = get_container_objstore_metrics()
+        enable_objstore_metrics()
+
+        try:
+            metrics.clear()
+            result = JobScheduler.get_entries(bucket)
+
+            # the queue is read with a single listing
+            assert(metrics.count() == 1)
+            assert(metrics.count("get_all_object_names") == 1)
+        finally:
+            disable_objstore_metrics()
+
+        assert(result == [entries[1], entries[2], entries[0]])
+    finally:
+        pop_is_running_service()
+        pop_testing_objstore()
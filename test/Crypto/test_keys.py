@@ -94,3 +94,65 @@ def test_keys():
     assert(symkey == symkey2)
 
     assert(long_message == symkey2.decrypt(c))
+
+
+def test_key_pool():
+    import time
+    from Acquire.Crypto import set_key_pool_depth, get_key_pool_depth, \
+        start_key_pool, clear_key_pool, get_key_pool_metrics
+
+    depth = get_key_pool_depth()
+
+    try:
+        set_key_pool_depth(2)
+        clear_key_pool()
+        start_key_pool()
+
+        for _ in range(0, 100):
+            if get_key_pool_metrics()["size"] == 2:
+                break
+            time.sleep(0.1)
+
+        assert(get_key_pool_metrics()["size"] == 2)
+
+        keys = [PrivateKey.from_pool(name="test") for _ in range(0, 3)]
+
+        # the third key had to be generated directly
+        metrics = get_key_pool_metrics()
+        assert(metrics["taken"] == 3)
+        assert(metrics["exhausted"] == 1)
+
+        fingerprints = set(key.fingerprint() for key in keys)
+        assert(len(fingerprints) == 3)
+
+        message = "hello from the key pool"
+        assert(keys[0].decrypt(keys[0].public_key().encrypt(message)) == message)
+
+        set_key_pool_depth(0)
+        clear_key_pool()
+
+        assert(PrivateKey.from_pool() is not None)
+        assert(get_key_pool_metrics()["exhausted"] == 1)
+    finally:
+        set_key_pool_depth(depth)
+
+
+def test_key_pool_not_started_by_clients(monkeypatch):
+    from Acquire.Crypto import _key_pool
+    from Acquire.Service import push_is_running_service, \
+        pop_is_running_service
+
+    pool = _key_pool._KeyPool(1)
+    monkeypatch.setattr(_key_pool, "_key_pool", pool)
+
+    # taking a key in a client process does not start the pool
+    assert(PrivateKey.from_pool() is not None)
+    assert(pool._thread is None)
+
+    push_is_running_service()
+
+    try:
+        assert(PrivateKey.from_pool() is not None)
+        assert(pool._thread is not None)
+    finally:
+        pop_is_running_service()
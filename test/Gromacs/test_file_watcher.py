@@ -0,0 +1,78 @@
+import threading
+import time
+
+from Acquire.Gromacs._gromacs_runner import _FileWatcher, _RingBuffer
+
+
+class _Uploader:
+    def __init__(self, delay=0):
+        self.chunks = []
+        self.closed = False
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def upload(self, chunk):
+        time.sleep(self.delay)
+        with self.lock:
+            self.chunks.append(chunk)
+
+    def close(self):
+        self.closed = True
+
+
+class _Drive:
+    def __init__(self, uploader):
+        self.uploader = uploader
+        self.opened = []
+
+    def chunk_upload(self, filename, directory=None):
+        self.opened.append((filename, directory))
+        return self.uploader
+
+
+def test_ring_buffer():
+    buffer = _RingBuffer(8)
+
+    assert(buffer.write(b"abcdef") == 6)
+    assert(buffer.read(4) == b"abcd")
+    assert(buffer.write(b"ghijklmn") == 6)
+    assert(buffer.free() == 0)
+    assert(buffer.read(100) == b"efghijkl")
+    assert(len(buffer) == 0)
+
+
+def test_file_watcher(tmpdir):
+    filename = str(tmpdir.join("run.log"))
+    uploader = _Uploader(delay=0.001)
+    drive = _Drive(uploader)
+
+    watcher = _FileWatcher(filename, drive=drive, directory="interim",
+                           sizetrigger=1024, timetrigger=0.05, buffersize=2048)
+
+    with open(filename, "wb") as FILE:
+        FILE.write(b"x" * 10000)
+        FILE.flush()
+        watcher.update()
+
+        # chunks are only uploaded once they reach the size trigger,
+        # and the buffer never holds more than 'buffersize'
+        assert(len(watcher._buffer) <= 2048)
+
+        FILE.write(b"tail")
+        FILE.flush()
+        watcher.update()
+
+        # the time trigger uploads the partial chunk
+        for _ in range(0, 100):
+            if sum(len(c) for c in uploader.chunks) == 10004:
+                break
+            time.sleep(0.01)
+
+        assert(sum(len(c) for c in uploader.chunks) == 10004)
+
+    watcher.finishUploads()
+
+    assert(drive.opened == [("run.log", "interim")])
+    assert(uploader.closed)
+    assert(b"".join(uploader.chunks) == b"x" * 10000 + b"tail")
+    assert(max(len(c) for c in uploader.chunks) <= 1024)
@@ -0,0 +1,90 @@
+import pytest
+
+from Acquire.ObjectStore import ObjectStore, ObjectStoreError, \
+    ObjectStoreBatchError, \
+    enable_objstore_metrics, disable_objstore_metrics, \
+    start_objstore_metrics, end_objstore_metrics
+from Acquire.Service import get_service_account_bucket, \
+    push_is_running_service, pop_is_running_service, is_running_service
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    d = tmpdir_factory.mktemp("batch_objstore")
+    push_is_running_service()
+    bucket = get_service_account_bucket(str(d))
+
+    while is_running_service():
+        pop_is_running_service()
+
+    return bucket
+
+
+def test_batch(bucket):
+    ObjectStore.set_string_object(bucket, "batch/old", "old")
+
+    with ObjectStore.batch() as batch:
+        record = batch.set_object_from_json(bucket, "batch/record",
+                                            {"a": 1})
+        batch.set_string_object(bucket, "batch/pointer", "batch/record",
+                                after=record)
+
+        for i in range(10):
+            batch.set_object(bucket, "batch/many/%d" % i, b"x" * i)
+
+        batch.delete_object(bucket, "batch/old")
+
+        # nothing is written until the batch is flushed
+        assert(len(batch) == 13)
+        assert(ObjectStore.get_string_object(bucket, "batch/old") == "old")
+
+    assert(ObjectStore.get_object_from_json(bucket, "batch/record") ==
+           {"a": 1})
+    assert(ObjectStore.get_string_object(bucket, "batch/pointer") ==
+           "batch/record")
+    assert(len(ObjectStore.get_all_object_names(bucket, "batch/many")) == 10)
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object(bucket, "batch/old")
+
+
+def test_batch_errors(bucket):
+    with pytest.raises(ObjectStoreBatchError) as e:
+        with ObjectStore.batch() as batch:
+            bad = batch.set_object(bucket, "batch/bad", 12345)
+            batch.set_string_object(bucket, "batch/after_bad", "x", after=bad)
+            batch.set_string_object(bucket, "batch/good", "x")
+
+    assert("2 of 3" in str(e.value))
+    assert("batch/after_bad" in str(e.value))
+    assert(ObjectStore.get_string_object(bucket, "batch/good") == "x")
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object(bucket, "batch/after_bad")
+
+    # nothing is written if the block raises
+    with pytest.raises(KeyError):
+        with ObjectStore.batch() as batch:
+            batch.set_string_object(bucket, "batch/never", "x")
+            raise KeyError("fail")
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object(bucket, "batch/never")
+
+
+def test_batch_metrics(bucket):
+    enable_objstore_metrics()
+
+    try:
+        request = start_objstore_metrics()
+
+        with ObjectStore.batch(max_workers=4) as batch:
+            for i in range(8):
+                batch.set_string_object(bucket, "batch/metrics/%d" % i, "x")
+
+        end_objstore_metrics(request)
+    finally:
+        disable_objstore_metrics()
+
+    # the writes from the worker threads are recorded against the request
+    assert(request.count("set_object", "batch/metrics") == 8)
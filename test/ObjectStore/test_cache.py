@@ -0,0 +1,196 @@
+import os
+import pytest
+
+from Acquire.ObjectStore import ObjectStore, ObjectStoreError, \
+    MemoryObjectCache, DiskObjectCache, set_object_cache, \
+    get_object_cache, declare_cached_key_family, declare_missing_key_family
+from Acquire.Service import get_service_account_bucket, \
+    push_is_running_service, pop_is_running_service, is_running_service
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    d = tmpdir_factory.mktemp("cache_objstore")
+    push_is_running_service()
+    bucket = get_service_account_bucket(str(d))
+
+    while is_running_service():
+        pop_is_running_service()
+
+    return bucket
+
+
+@pytest.fixture
+def cache():
+    old_cache = get_object_cache()
+    cache = MemoryObjectCache(max_bytes=1024)
+    set_object_cache(cache)
+    yield cache
+    set_object_cache(old_cache)
+
+
+def _set_behind_cache(bucket, key, data):
+    """Change the object in the testing object store without
+    going through the ObjectStore
+    """
+    filename = "%s/%s._data" % (bucket, key)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "wb") as FILE:
+        FILE.write(data)
+
+
+def test_memory_cache():
+    cache = MemoryObjectCache(max_bytes=100, max_object_bytes=50)
+
+    cache.put(("b", "k1"), b"x" * 40)
+    cache.put(("b", "k2"), b"y" * 40)
+    assert(cache.nbytes() == 80)
+    assert(cache.get(("b", "k1")) == b"x" * 40)
+
+    # k2 is now least recently used, so is evicted
+    cache.put(("b", "k3"), b"z" * 40)
+    assert(cache.nbytes() == 80)
+    assert(cache.get(("b", "k2")) is None)
+    assert(cache.get(("b", "k1")) is not None)
+
+    # too large to cache in memory
+    cache.put(("b", "big"), b"x" * 60)
+    assert(cache.get(("b", "big")) is None)
+
+    cache.put(("b", "ttl"), b"t", ttl=-1)
+    assert(cache.get(("b", "ttl")) is None)
+
+    cache.invalidate_prefix("b", "k")
+    assert(len(cache) == 0)
+    assert(cache.nbytes() == 0)
+
+
+def test_disk_tier(tmpdir):
+    disk = DiskObjectCache(str(tmpdir.join("disk_cache")), max_bytes=10000)
+    cache = MemoryObjectCache(max_bytes=100, max_object_bytes=50,
+                              next_tier=disk)
+
+    cache.put(("b", "k1"), b"x" * 40)
+    cache.put(("b", "k2"), b"y" * 40)
+    cache.put(("b", "k3"), b"z" * 40)
+    cache.put(("b", "big"), b"w" * 500)
+
+    # evicted and large objects are held on disk
+    assert(disk.get(("b", "k1")) == b"x" * 40)
+    assert(cache.get(("b", "k1")) == b"x" * 40)
+    assert(cache.get(("b", "big")) == b"w" * 500)
+
+    # the disk tier survives a restart
+    disk2 = DiskObjectCache(str(tmpdir.join("disk_cache")), max_bytes=10000)
+    assert(disk2.get(("b", "big")) == b"w" * 500)
+    assert(disk2.nbytes() == disk.nbytes())
+
+    cache.invalidate(("b", "big"))
+    assert(disk2.get(("b", "big")) is None)
+
+    cache.clear()
+    assert(disk.nbytes() == 0)
+
+
+def test_read_through(bucket, cache):
+    declare_cached_key_family("immutable/*")
+    declare_cached_key_family("mutable/*", ttl=-1)
+
+    ObjectStore.set_object(bucket, "immutable/a", b"hello")
+    _set_behind_cache(bucket, "immutable/a", b"changed")
+
+    # served from the cache
+    assert(ObjectStore.get_object(bucket, "immutable/a") == b"hello")
+
+    ObjectStore.invalidate_cached_object(bucket, "immutable/a")
+    assert(ObjectStore.get_object(bucket, "immutable/a") == b"changed")
+
+    # writes and deletes through the ObjectStore invalidate the cache
+    ObjectStore.set_object(bucket, "immutable/a", b"again")
+    assert(ObjectStore.get_object(bucket, "immutable/a") == b"again")
+
+    ObjectStore.delete_object(bucket, "immutable/a")
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object(bucket, "immutable/a")
+
+    # expired objects are re-read
+    ObjectStore.set_object(bucket, "mutable/b", b"one")
+    _set_behind_cache(bucket, "mutable/b", b"two")
+    assert(ObjectStore.get_object(bucket, "mutable/b") == b"two")
+
+    # objects outside the cached families are not cached
+    ObjectStore.set_object(bucket, "other/c", b"one")
+    _set_behind_cache(bucket, "other/c", b"two")
+    assert(ObjectStore.get_object(bucket, "other/c") == b"two")
+
+    # ...unless they are explicitly marked as immutable
+    ObjectStore.cache_immutable_object(bucket, "other/c", b"two")
+    _set_behind_cache(bucket, "other/c", b"three")
+    assert(ObjectStore.get_object(bucket, "other/c") == b"two")
+
+    ObjectStore.delete_all_objects(bucket, "other")
+    assert(cache.get((str(bucket), "other/c")) is None)
+
+
+def test_no_cache(bucket):
+    old_cache = get_object_cache()
+    set_object_cache(None)
+
+    try:
+        declare_cached_key_family("immutable/*")
+        ObjectStore.set_object(bucket, "immutable/d", b"hello")
+        _set_behind_cache(bucket, "immutable/d", b"changed")
+        assert(ObjectStore.get_object(bucket, "immutable/d") == b"changed")
+    finally:
+        set_object_cache(old_cache)
+
+
+def test_missing_cache(bucket):
+    declare_missing_key_family("missing/*", ttl=60)
+
+    try:
+        assert(ObjectStore.get_object_or_none(bucket, "missing/a") is None)
+
+        # the miss is remembered, even if the key is written behind
+        # the ObjectStore's back
+        _set_behind_cache(bucket, "missing/a", b"hello")
+        assert(not ObjectStore.exists(bucket, "missing/a"))
+
+        # ...but is forgotten as soon as the key is written
+        ObjectStore.set_object(bucket, "missing/a", b"hello")
+        assert(ObjectStore.exists(bucket, "missing/a"))
+        assert(ObjectStore.get_object_or_none(bucket, "missing/a") == b"hello")
+
+        # misses of other keys are not remembered
+        assert(not ObjectStore.exists(bucket, "present/b"))
+        _set_behind_cache(bucket, "present/b", b"hello")
+        assert(ObjectStore.exists(bucket, "present/b"))
+    finally:
+        declare_missing_key_family("missing/*", ttl=None)
+
+
+def test_missing_cache_ignores_errors(bucket, monkeypatch):
+    from Acquire.ObjectStore import _objstore
+
+    declare_missing_key_family("missing/*", ttl=60)
+
+    def _failing_get_object(bucket, key):
+        raise ObjectStoreError("Timed out reading '%s'" % key)
+
+    try:
+        ObjectStore.set_object(bucket, "missing/e", b"hello")
+
+        with monkeypatch.context() as m:
+            m.setattr(_objstore._objstore_backend, "get_object",
+                      _failing_get_object)
+
+            with pytest.raises(ObjectStoreError):
+                ObjectStore.get_object(bucket, "missing/e")
+
+        # the failed read is not remembered as a missing key
+        assert(ObjectStore.get_object(bucket, "missing/e") == b"hello")
+        assert(ObjectStore.exists(bucket, "missing/e"))
+    finally:
+        declare_missing_key_family("missing/*", ttl=None)
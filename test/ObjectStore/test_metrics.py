@@ -0,0 +1,94 @@
+import pytest
+
+from Acquire.ObjectStore import ObjectStore, ObjectStoreMetrics, \
+    enable_objstore_metrics, disable_objstore_metrics, \
+    get_container_objstore_metrics, start_objstore_metrics, \
+    end_objstore_metrics, get_key_family
+from Acquire.Service import get_service_account_bucket, \
+    push_is_running_service, pop_is_running_service, is_running_service
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    d = tmpdir_factory.mktemp("metrics_objstore")
+    push_is_running_service()
+    bucket = get_service_account_bucket(str(d))
+
+    while is_running_service():
+        pop_is_running_service()
+
+    return bucket
+
+
+@pytest.fixture
+def metrics():
+    enable_objstore_metrics()
+    get_container_objstore_metrics().clear()
+    yield get_container_objstore_metrics()
+    disable_objstore_metrics()
+    get_container_objstore_metrics().clear()
+
+
+def test_key_family():
+    assert(get_key_family("accounting/transactions/abc/123") ==
+           "accounting/transactions")
+    assert(get_key_family("registry/pars/uid/xyz") == "registry/pars")
+    assert(get_key_family("mutexes/something") == "mutexes")
+    assert(get_key_family("auth_once/uid") == "auth_once")
+    assert(get_key_family("test") == "test")
+    assert(get_key_family(None) == "/")
+
+
+def test_metrics(bucket, metrics):
+    request = start_objstore_metrics()
+
+    for i in range(5):
+        ObjectStore.set_string_object(bucket, "accounting/transactions/%d" % i,
+                                      "x" * 10)
+
+    for i in range(5):
+        ObjectStore.get_string_object(bucket, "accounting/transactions/%d" % i)
+
+    with pytest.raises(Exception):
+        ObjectStore.get_object(bucket, "mutexes/missing")
+
+    names = ObjectStore.get_all_object_names(bucket, "accounting/transactions")
+    assert(len(names) == 5)
+
+    results = end_objstore_metrics(request, {})
+
+    for m in [request, metrics]:
+        assert(m.count("set_object", "accounting/transactions") == 5)
+        assert(m.count("get_object", "accounting/transactions") == 5)
+        assert(m.count("get_object", "mutexes") == 1)
+        assert(m.count("get_all_object_names") == 1)
+        assert(m.count() == 12)
+
+    data = results["objstore_metrics"]
+    stats = data["set_object"]["accounting/transactions"]
+    assert(stats["bytes_written"] == 50)
+    assert(stats["bytes_read"] == 0)
+    assert(data["get_object"]["accounting/transactions"]["bytes_read"] == 50)
+    assert(data["get_object"]["mutexes"]["errors"] == 1)
+    assert(sum(stats["histogram"]) == 5)
+    assert(stats["p50_ms"] <= stats["p99_ms"])
+
+    # calls outside a request are only added to the container metrics
+    ObjectStore.delete_object(bucket, "accounting/transactions/0")
+    assert(metrics.count("delete_object") == 1)
+    assert(request.count("delete_object") == 0)
+
+    # metrics can be serialised and aggregated
+    other = ObjectStoreMetrics.from_data(data)
+    assert(other.to_data() == data)
+    other.merge(request)
+    assert(other.count("set_object") == 10)
+
+
+def test_metrics_disabled(bucket):
+    disable_objstore_metrics()
+    get_container_objstore_metrics().clear()
+
+    assert(start_objstore_metrics() is None)
+    ObjectStore.set_string_object(bucket, "disabled", "x")
+    assert(get_container_objstore_metrics().is_empty())
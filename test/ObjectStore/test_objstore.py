@@ -1,7 +1,8 @@
 
 import pytest
 
-from Acquire.ObjectStore import ObjectStore, ObjectStoreError
+from Acquire.ObjectStore import ObjectStore, ObjectStoreError, \
+    create_chunk_manifest, write_chunk_manifests
 from Acquire.Service import get_service_account_bucket, \
     push_is_running_service, pop_is_running_service, \
     is_running_service
@@ -95,3 +96,59 @@ def test_objstore(bucket):
     test_value2 = ObjectStore.get_string_object(new_bucket2, test_key)
 
     assert(test_value == test_value2)
+
+
+def test_iter_object(bucket, tmpdir):
+    stream_bucket = ObjectStore.create_bucket(bucket, "stream_bucket")
+
+    data = b"0123456789" * (300 * 1024)
+    ObjectStore.set_object(stream_bucket, "large", data)
+
+    blocks = list(ObjectStore.iter_object(stream_bucket, "large"))
+    assert(len(blocks) == 3)
+    assert(b"".join(blocks) == data)
+
+    filename = str(tmpdir.join("large"))
+    ObjectStore.get_object_as_file(stream_bucket, "large", filename)
+
+    with open(filename, "rb") as FILE:
+        assert(FILE.read() == data)
+
+    filename = str(tmpdir.join("missing"))
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object_as_file(stream_bucket, "missing", filename)
+
+    assert(not tmpdir.join("missing").exists())
+
+
+def test_chunked_object(bucket):
+    chunk_bucket = ObjectStore.create_bucket(bucket, "chunk_bucket")
+
+    for i in range(1, 4):
+        ObjectStore.set_object(chunk_bucket, "chunked/%d" % i,
+                               b"%d" % i * 10)
+
+    # chunks without a manifest are not found
+    assert(not ObjectStore.exists(chunk_bucket, "chunked"))
+    assert(ObjectStore.get_object_or_none(chunk_bucket, "chunked") is None)
+
+    ObjectStore.set_object(chunk_bucket, "chunked", create_chunk_manifest(3))
+
+    data = b"1" * 10 + b"2" * 10 + b"3" * 10
+
+    assert(ObjectStore.exists(chunk_bucket, "chunked"))
+    assert(ObjectStore.get_object(chunk_bucket, "chunked") == data)
+    assert(b"".join(ObjectStore.iter_object(chunk_bucket, "chunked")) == data)
+
+    # manifests are written for legacy chunked objects
+    for i in range(1, 3):
+        ObjectStore.set_object(chunk_bucket, "legacy/a/%d" % i, b"%d" % i)
+
+    ObjectStore.set_object(chunk_bucket, "legacy/b", b"plain")
+    ObjectStore.set_object(chunk_bucket, "legacy/b/1", b"1")
+
+    assert(write_chunk_manifests(chunk_bucket, "legacy") == ["legacy/a"])
+    assert(ObjectStore.get_object(chunk_bucket, "legacy/a") == b"12")
+    assert(ObjectStore.get_object(chunk_bucket, "legacy/b") == b"plain")
+    assert(write_chunk_manifests(chunk_bucket, "legacy") == [])
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from Acquire.ObjectStore._oci_objstore import OCI_ObjectStore, \
+    _get_legacy_chunk_keys
+
+from unittest.mock import MagicMock
+
+
+def _paged_bucket(names, page_size):
+    """Return a bucket whose client lists 'names' 'page_size' at
+    a time, as the OCI object store does
+    """
+    def list_objects(namespace, bucket_name, prefix=None, start=None):
+        matched = sorted(n for n in names
+                         if prefix is None or n.startswith(prefix))
+
+        if start is not None:
+            matched = [n for n in matched if n >= start]
+
+        page = matched[0:page_size]
+        rest = matched[page_size:]
+
+        return SimpleNamespace(data=SimpleNamespace(
+            objects=[SimpleNamespace(name=n) for n in page],
+            next_start_with=rest[0] if len(rest) > 0 else None))
+
+    client = MagicMock()
+    client.list_objects.side_effect = list_objects
+
+    return {"client": client, "namespace": "ns", "bucket_name": "bucket"}
+
+
+def test_legacy_chunk_keys_are_paged():
+    names = ["big/%d" % i for i in range(1, 12)] + ["other/1"]
+    bucket = _paged_bucket(names, page_size=5)
+
+    assert(_get_legacy_chunk_keys(bucket, "big") ==
+           ["big/%d" % i for i in range(1, 12)])
+    assert(bucket["client"].list_objects.call_count == 3)
+
+
+def test_object_names_are_paged():
+    names = ["a/%02d" % i for i in range(0, 12)]
+    bucket = _paged_bucket(names, page_size=5)
+
+    assert(OCI_ObjectStore.get_all_object_names(bucket, "a/",
+                                                without_prefix=True) ==
+           ["%02d" % i for i in range(0, 12)])
@@ -0,0 +1,80 @@
+import os
+import pytest
+
+from Acquire.ObjectStore import ObjectStore, declare_sharded_key_family
+from Acquire.Service import get_service_account_bucket, \
+    push_is_running_service, pop_is_running_service, is_running_service
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    d = tmpdir_factory.mktemp("sharded_objstore")
+    push_is_running_service()
+    bucket = get_service_account_bucket(str(d))
+
+    while is_running_service():
+        pop_is_running_service()
+
+    return bucket
+
+
+@pytest.fixture
+def sharded():
+    declare_sharded_key_family("hot", nshards=8)
+    declare_sharded_key_family("index/pars", nshards=4, depth=2)
+    yield
+    declare_sharded_key_family("hot", nshards=1)
+    declare_sharded_key_family("index/pars", nshards=1)
+
+
+def test_sharding(bucket, sharded):
+    for i in range(20):
+        ObjectStore.set_string_object(bucket, "hot/%d" % i, "%d" % i)
+
+    ObjectStore.set_string_object(bucket, "cold/a", "a")
+    ObjectStore.set_string_object(bucket, "hotter", "b")
+
+    # the objects are spread over the shards
+    shards = [d for d in os.listdir(bucket) if d.startswith("_shard")]
+    assert(len(shards) > 1)
+    assert(os.path.exists("%s/cold/a._data" % bucket))
+
+    # but are found transparently
+    assert(ObjectStore.get_string_object(bucket, "hot/7") == "7")
+    assert(ObjectStore.exists(bucket, "hot/7"))
+
+    names = ObjectStore.get_all_object_names(bucket, "hot/")
+    assert(sorted(names) == sorted(["hot/%d" % i for i in range(20)]))
+
+    names = ObjectStore.get_all_object_names(bucket, "hot",
+                                             without_prefix=True)
+    assert(len(names) == 20)
+    assert("0" in names)
+
+    names = ObjectStore.get_all_object_names(bucket, "ho")
+    assert(len(names) == 21)
+    assert("hotter" in names)
+
+    names = ObjectStore.get_all_object_names(bucket)
+    assert(len(names) == 22)
+    assert("hot/3" in names)
+
+    ObjectStore.delete_object(bucket, "hot/3")
+    assert(not ObjectStore.exists(bucket, "hot/3"))
+
+    ObjectStore.delete_all_objects(bucket, "hot")
+    assert(len(ObjectStore.get_all_object_names(bucket, "hot/")) == 0)
+    assert(ObjectStore.get_string_object(bucket, "hotter") == "b")
+
+
+def test_sharding_depth(bucket, sharded):
+    for uid in ["a", "b", "c"]:
+        for expire in ["1", "2"]:
+            ObjectStore.set_string_object(
+                bucket, "index/pars/uid/%s/%s" % (uid, expire), uid)
+
+    names = ObjectStore.get_all_object_names(bucket, "index/pars/uid/b/")
+    assert(sorted(names) == ["index/pars/uid/b/1", "index/pars/uid/b/2"])
+
+    names = ObjectStore.get_all_object_names(bucket, "index/pars/uid")
+    assert(len(names) == 6)
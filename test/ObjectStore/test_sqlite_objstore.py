@@ -0,0 +1,88 @@
+import pytest
+import threading
+
+from Acquire.ObjectStore import ObjectStore, ObjectStoreError, \
+    use_sqlite_object_store_backend
+
+import Acquire.ObjectStore._objstore as _objstore
+
+
+@pytest.fixture
+def bucket(tmpdir, monkeypatch):
+    # the backend cannot normally be changed once set, so temporarily
+    # clear it (monkeypatch restores the original backend afterwards)
+    monkeypatch.setattr(_objstore, "_objstore_backend", None)
+    return use_sqlite_object_store_backend(str(tmpdir.join("objects.db")))
+
+
+def test_sqlite_objstore(bucket):
+    ObjectStore.set_string_object(bucket, "test", "hello")
+    ObjectStore.set_string_object(bucket, "test/something", "∂∂∂")
+    ObjectStore.set_object_from_json(bucket, "test/object", {"cat": "mieow"})
+    ObjectStore.set_string_object(bucket, "testing", "other")
+
+    assert(ObjectStore.get_string_object(bucket, "test/something") == "∂∂∂")
+    assert(ObjectStore.get_object_from_json(bucket, "test/object") ==
+           {"cat": "mieow"})
+
+    assert(len(ObjectStore.get_all_object_names(bucket)) == 4)
+    assert(len(ObjectStore.get_all_object_names(bucket, "test/")) == 2)
+    assert(ObjectStore.get_all_object_names(bucket, "test/",
+                                            without_prefix=True) ==
+           ["object", "something"])
+
+    assert(ObjectStore.exists(bucket, "testing"))
+    assert(ObjectStore.take_string_object(bucket, "testing") == "other")
+    assert(not ObjectStore.exists(bucket, "testing"))
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.get_object(bucket, "testing")
+
+    (size, checksum) = ObjectStore.get_size_and_checksum(bucket, "test")
+    assert(size == 5)
+    assert(checksum == "5d41402abc4b2a76b9719d911017c592")
+
+    # buckets are independent
+    other = ObjectStore.create_bucket(bucket, "other")
+    assert(ObjectStore.is_bucket_empty(other))
+    assert(ObjectStore.get_object_or_none(other, "test") is None)
+
+    with pytest.raises(ObjectStoreError):
+        ObjectStore.create_bucket(bucket, "other")
+
+    ObjectStore.delete_all_objects(bucket, "test")
+    assert(ObjectStore.get_all_object_names(bucket) == ["test"])
+
+
+def test_sqlite_conditional_writes(bucket):
+    results = []
+
+    def _set(i):
+        results.append(ObjectStore.set_ins_string_object(bucket, "once",
+                                                         "%d" % i))
+
+    threads = [threading.Thread(target=_set, args=(i,)) for i in range(8)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    # only one thread wins, and everyone sees the winning value
+    assert(len(set(results)) == 1)
+    assert(ObjectStore.get_string_object(bucket, "once") == results[0])
+
+
+def test_sqlite_conditional_delete(bucket):
+    ObjectStore.set_string_object(bucket, "lease", "old")
+
+    # the object is only deleted if it still holds the value read
+    assert(not ObjectStore.delete_object_if_unchanged(bucket, "lease",
+                                                      b"older"))
+    assert(ObjectStore.get_string_object(bucket, "lease") == "old")
+
+    assert(ObjectStore.delete_object_if_unchanged(bucket, "lease", b"old"))
+    assert(not ObjectStore.exists(bucket, "lease"))
+    assert(not ObjectStore.delete_object_if_unchanged(bucket, "lease",
+                                                      b"old"))
@@ -0,0 +1,204 @@
+import pytest
+
+from Acquire.Service import collect_garbage, get_service_account_bucket, \
+    push_is_running_service, pop_is_running_service, is_running_service
+from Acquire.ObjectStore import ObjectStore, Function, \
+    get_datetime_now, get_datetime_now_to_string
+from Acquire.Identity import LoginSession
+from Acquire.Identity._authorisation import _get_auth_once_window
+
+_cleaned_up = []
+
+
+def _cleanup(par):
+    _cleaned_up.append(par)
+
+
+@pytest.fixture
+def bucket(tmpdir):
+    push_is_running_service()
+    bucket = get_service_account_bucket(str(tmpdir))
+    while is_running_service():
+        pop_is_running_service()
+    return bucket
+
+
+def _set_par(bucket, uid, expire_string):
+    data = {"par": {}, "driver_details": {}, "url_checksum": None,
+            "cleanup_function": Function(_cleanup).to_data()}
+
+    ObjectStore.set_object_from_json(
+        bucket, "registry/pars/uid/%s/%s" % (uid, expire_string), data)
+    ObjectStore.set_object_from_json(
+        bucket, "registry/pars/expire/%s/%s" % (expire_string, uid), uid)
+
+
+def test_collect_garbage(bucket):
+    old = "2000-01-01T00:00:00"
+    future = "2100-01-01T00:00:00"
+    now = get_datetime_now_to_string()
+
+    _set_par(bucket, "old", old)
+    _set_par(bucket, "new", future)
+
+    ObjectStore.set_string_object(bucket, "mutexes/dead", "x{}%s" % old)
+    ObjectStore.set_string_object(bucket, "mutexes/live", "x{}%s" % future)
+
+    # a record from before windows were used, an old window and
+    # the current window
+    new_window = _get_auth_once_window(get_datetime_now())
+    ObjectStore.set_string_object(bucket, "auth_once/legacy", old)
+    ObjectStore.set_string_object(bucket, "auth_once/%s/a" % old, old)
+    ObjectStore.set_string_object(bucket, "auth_once/%s/b" % old, old)
+    ObjectStore.set_string_object(bucket, "auth_once/%s/c" % new_window, now)
+
+    ObjectStore.set_object_from_json(bucket, "storage/uploader/d/old",
+                                     {"secret": "s", "datetime": old})
+    ObjectStore.set_object_from_json(bucket, "storage/uploader/d/legacy",
+                                     {"secret": "s"})
+    ObjectStore.set_object_from_json(bucket, "storage/downloader/d/f/new",
+                                     {"secret": "s", "datetime": now})
+
+    # nothing is collected if there is no time
+    result = collect_garbage(bucket=bucket, max_seconds=0)
+    assert(not result["complete"])
+    assert(result["collected"] == {})
+
+    _cleaned_up.clear()
+    result = collect_garbage(bucket=bucket, batch_size=1)
+
+    assert(result["complete"])
+    assert(result["errors"] == [])
+    assert(result["collected"] == {"pars": 1, "mutexes": 1,
+                                   "auth_once": 2, "uploaders": 1})
+    assert(len(_cleaned_up) == 1)
+
+    names = ObjectStore.get_all_object_names(bucket, "registry/pars")
+    assert(sorted(names) == ["registry/pars/expire/%s/new" % future,
+                             "registry/pars/uid/new/%s" % future])
+
+    assert(ObjectStore.exists(bucket, "mutexes/live"))
+    assert(not ObjectStore.exists(bucket, "mutexes/dead"))
+    assert(ObjectStore.get_all_object_names(bucket, "auth_once/") ==
+           ["auth_once/%s/c" % new_window])
+    assert(ObjectStore.exists(bucket, "storage/downloader/d/f/new"))
+
+    # legacy uploaders are stamped, so that they are collected later
+    legacy = ObjectStore.get_object_from_json(bucket,
+                                              "storage/uploader/d/legacy")
+    assert("datetime" in legacy)
+
+    # the next run carries on from the checkpoints
+    result = collect_garbage(bucket=bucket)
+    assert(result["complete"])
+    assert(result["collected"] == {})
+    assert(len(_cleaned_up) == 1)
+
+
+def test_collect_relocked_mutex(bucket, monkeypatch):
+    old = "2000-01-01T00:00:00"
+    future = "2100-01-01T00:00:00"
+
+    ObjectStore.set_string_object(bucket, "mutexes/relocked", "x{}%s" % old)
+
+    get_string_object_or_none = ObjectStore.get_string_object_or_none
+
+    def _relock(bucket, key):
+        # the mutex is locked again just after the collector reads it
+        value = get_string_object_or_none(bucket, key)
+
+        if key == "mutexes/relocked":
+            ObjectStore.set_string_object(bucket, key, "y{}%s" % future)
+
+        return value
+
+    monkeypatch.setattr(ObjectStore, "get_string_object_or_none",
+                        staticmethod(_relock))
+
+    result = collect_garbage(bucket=bucket)
+
+    assert(result["errors"] == [])
+    assert("mutexes" not in result["collected"])
+    assert(ObjectStore.get_string_object(bucket, "mutexes/relocked") ==
+           "y{}%s" % future)
+
+
+def test_auth_once_window():
+    from Acquire.ObjectStore import string_to_datetime
+
+    d = string_to_datetime("2026-10-19T12:34:56.789")
+    assert(_get_auth_once_window(d) == "2026-10-19T12:00:00")
+
+
+def _set_session(bucket, uid, status, window=None):
+    short_uid = LoginSession.to_short_uid(uid)
+
+    ObjectStore.set_object_from_json(
+        bucket, "identity/sessions/data/%s" % uid, {"uid": uid})
+    ObjectStore.set_string_object(
+        bucket, "identity/sessions/index/%s/%s" % (short_uid, uid), status)
+
+    if window is not None:
+        ObjectStore.set_string_object(
+            bucket, "identity/sessions/expire/%s/%s" % (window, uid), status)
+
+
+def test_collect_login_sessions(bucket):
+    old = "2000-01-01T00:00:00"
+    future = "2100-01-01T00:00:00"
+
+    _set_session(bucket, "aaaaaaaa-denied", "denied", old)
+    _set_session(bucket, "bbbbbbbb-approved", "approved", old)
+    _set_session(bucket, "cccccccc-pending", "pending", future)
+
+    # sessions saved before sessions were indexed - only those created
+    # more than a session lifetime ago are deleted
+    now = get_datetime_now_to_string()
+
+    ObjectStore.set_object_from_json(
+        bucket, "identity/sessions/logged_out/dddddddd/dddddddd-x",
+        {"request_datetime": old})
+    ObjectStore.set_string_object(
+        bucket, "identity/sessions/status/dddddddd-x", "logged_out")
+    ObjectStore.set_object_from_json(
+        bucket, "identity/sessions/approved/eeeeeeee/eeeeeeee-x",
+        {"request_datetime": old})
+    ObjectStore.set_string_object(
+        bucket, "identity/sessions/status/eeeeeeee-x", "approved")
+    ObjectStore.set_object_from_json(
+        bucket, "identity/sessions/pending/ffffffff/ffffffff-x",
+        {"request_datetime": now})
+    ObjectStore.set_string_object(
+        bucket, "identity/sessions/status/ffffffff-x", "pending")
+
+    result = collect_garbage(bucket=bucket, batch_size=1)
+
+    assert(result["complete"])
+    assert(result["errors"] == [])
+    assert(result["collected"] == {"login_sessions": 4})
+
+    names = ObjectStore.get_all_object_names(bucket, "identity/sessions")
+
+    assert(sorted(names) == sorted([
+        "identity/sessions/approved/eeeeeeee/eeeeeeee-x",
+        "identity/sessions/status/eeeeeeee-x",
+        "identity/sessions/pending/ffffffff/ffffffff-x",
+        "identity/sessions/status/ffffffff-x",
+        "identity/sessions/data/bbbbbbbb-approved",
+        "identity/sessions/index/bbbbbbbb/bbbbbbbb-approved",
+        "identity/sessions/data/cccccccc-pending",
+        "identity/sessions/index/cccccccc/cccccccc-pending",
+        "identity/sessions/expire/%s/cccccccc-pending" % future]))
+
+    # the next run carries on from the checkpoint
+    result = collect_garbage(bucket=bucket)
+    assert(result["complete"])
+    assert(result["collected"] == {})
+
+
+def test_session_expire_window():
+    from Acquire.ObjectStore import string_to_datetime
+    from Acquire.Identity._loginsession import _get_session_expire_window
+
+    d = string_to_datetime("2026-10-19T12:34:56.789")
+    assert(_get_session_expire_window(d) == "2026-10-19T12:00:00")
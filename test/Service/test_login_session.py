@@ -0,0 +1,52 @@
+
+import pytest
+
+from Acquire.Crypto import PrivateKey
+from Acquire.Identity import LoginSession, LoginSessionError
+from Acquire.ObjectStore import ObjectStore
+from Acquire.Service import get_service_account_bucket, \
+    push_testing_objstore, pop_testing_objstore, \
+    push_is_running_service, pop_is_running_service
+
+
+@pytest.fixture
+def bucket(tmpdir):
+    push_testing_objstore(str(tmpdir))
+    push_is_running_service()
+
+    yield get_service_account_bucket()
+
+    pop_is_running_service()
+    pop_testing_objstore()
+
+
+def test_load_legacy_session(bucket):
+    key = PrivateKey()
+    session = LoginSession(username="someone",
+                           public_key=key.public_key(),
+                           public_cert=key.public_key())
+
+    uid = session.uid()
+    short_uid = session.short_uid()
+
+    # move the session to where it was saved before sessions were indexed
+    data = ObjectStore.take_object_from_json(
+        bucket, "identity/sessions/data/%s" % uid)
+    ObjectStore.delete_object(
+        bucket, "identity/sessions/index/%s/%s" % (short_uid, uid))
+    ObjectStore.set_object_from_json(
+        bucket, "identity/sessions/pending/%s/%s" % (short_uid, uid), data)
+
+    loaded = LoginSession.load(status="pending", short_uid=short_uid)
+    assert(loaded.uid() == uid)
+
+    with pytest.raises(LoginSessionError):
+        LoginSession.load(status="approved", short_uid=short_uid)
+
+    # a session that has been saved again is only loaded from the index
+    loaded.save()
+    ObjectStore.set_string_object(
+        bucket, "identity/sessions/index/%s/%s" % (short_uid, uid), "pending")
+
+    loaded = LoginSession.load(status="pending", short_uid=short_uid)
+    assert(loaded.uid() == uid)
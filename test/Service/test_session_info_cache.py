@@ -0,0 +1,79 @@
+import pytest
+
+import Acquire.Service
+from Acquire.Service import get_session_info, get_session_infos, \
+    invalidate_session_info, clear_session_info_cache
+
+
+class _MockIdentityService:
+    def __init__(self):
+        self.calls = []
+
+    def uid(self):
+        return "identity_uid"
+
+    def call_function(self, function, args):
+        self.calls.append(function)
+
+        def _info(session_uid):
+            if session_uid.startswith("pending"):
+                return {"session_status": "pending"}
+            else:
+                return {"session_status": "approved", "public_cert": {},
+                        "user_uid": "user_%s" % session_uid}
+
+        if function == "get_session_info":
+            return _info(args["session_uid"])
+        else:
+            return {"session_infos": [_info(s["session_uid"])
+                                      for s in args["sessions"]]}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = _MockIdentityService()
+    monkeypatch.setattr(Acquire.Service, "get_trusted_service",
+                        lambda url: service)
+    clear_session_info_cache()
+    yield service
+    clear_session_info_cache()
+
+
+def test_session_info_cache(service):
+    info = get_session_info("identity", "a")
+    assert(info["user_uid"] == "user_a")
+
+    # cached, so no further call is made
+    assert(get_session_info("identity", "a") == info)
+    assert(len(service.calls) == 1)
+
+    # the scope is part of the key
+    get_session_info("identity", "a", scope="other")
+    assert(len(service.calls) == 2)
+
+    # sessions that are not yet approved are not cached
+    get_session_info("identity", "pending")
+    get_session_info("identity", "pending")
+    assert(len(service.calls) == 4)
+
+    invalidate_session_info("a")
+    get_session_info("identity", "a")
+    assert(len(service.calls) == 5)
+
+    # refreshing always re-checks the session with the identity service
+    get_session_info("identity", "a", refresh=True)
+    assert(len(service.calls) == 6)
+
+
+def test_get_session_infos(service):
+    get_session_info("identity", "a")
+
+    infos = get_session_infos("identity", ["a", "b", {"session_uid": "c"}])
+    assert([info["user_uid"] for info in infos] ==
+           ["user_a", "user_b", "user_c"])
+    assert(service.calls == ["get_session_info", "get_session_infos"])
+
+    # all are now cached
+    get_session_infos("identity", ["a", "b", "c"])
+    get_session_info("identity", "c")
+    assert(len(service.calls) == 2)
@@ -0,0 +1,121 @@
+import json
+import pytest
+
+from Acquire.Crypto import get_private_key
+from Acquire.ObjectStore import ObjectStore
+from Acquire.Service import get_service_account_bucket, \
+    push_is_running_service, pop_is_running_service, is_running_service
+from Acquire.Service import pack_arguments, unpack_arguments, \
+    unpack_return_value, handle_call
+from Acquire.Service import enable_tracing, disable_tracing, \
+    start_trace, end_trace, trace_span, get_current_trace, \
+    set_trace_exporter
+
+import msgpack
+
+
+@pytest.fixture(scope="module")
+def bucket(tmpdir_factory):
+    d = tmpdir_factory.mktemp("tracing_objstore")
+    push_is_running_service()
+    bucket = get_service_account_bucket(str(d))
+
+    while is_running_service():
+        pop_is_running_service()
+
+    return bucket
+
+
+@pytest.fixture
+def traces(tmpdir):
+    collected = []
+    trace_file = tmpdir.join("traces.jsonl")
+    enable_tracing(trace_file=str(trace_file))
+    set_trace_exporter(collected.append)
+
+    yield (collected, trace_file)
+
+    set_trace_exporter(None)
+    disable_tracing()
+
+
+def test_no_trace_is_cheap():
+    assert(get_current_trace() is None)
+
+    with trace_span("objstore", "get_object") as span:
+        assert(span is None)
+
+    assert(start_trace() is None)
+    assert(end_trace(None, {"a": 1}) == {"a": 1})
+
+
+def test_trace_spans(bucket, traces):
+    (collected, trace_file) = traces
+
+    trace = start_trace(name="test")
+    assert(get_current_trace() is trace)
+
+    ObjectStore.set_string_object(bucket, "traced/key", "hello")
+    assert(ObjectStore.get_string_object(bucket, "traced/key") == "hello")
+
+    key = get_private_key("testing")
+    key.decrypt(key.public_key().encrypt(b"secret"))
+
+    results = end_trace(trace, {})
+
+    assert(get_current_trace() is None)
+    assert(results["trace_id"] == trace.trace_id())
+    assert(collected == [trace])
+
+    summary = trace.summary()
+    assert(summary["objstore.set_object"]["count"] == 1)
+    assert(summary["objstore.get_object"]["count"] == 1)
+    assert(summary["crypto.encrypt"]["count"] == 1)
+    assert(summary["crypto.decrypt"]["count"] == 1)
+
+    spans = [json.loads(line) for line in trace_file.readlines()]
+    assert(len(spans) == len(trace.spans()))
+    assert(all(s["trace_id"] == trace.trace_id() for s in spans))
+
+    root = spans[0]
+    assert(root["parent_id"] is None)
+    assert(root["name"] == "test")
+
+    for span in spans[1:]:
+        assert(span["parent_id"] == root["span_id"])
+
+    otlp = trace.to_otlp()
+    otlp_spans = otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert(len(otlp_spans) == len(spans))
+    assert(otlp_spans[1]["parentSpanId"] == root["span_id"])
+
+
+def test_trace_propagation(traces):
+    (collected, _trace_file) = traces
+
+    trace = start_trace(name="client")
+
+    with trace_span("call_function", "admin.warm") as span:
+        packed = pack_arguments(function="admin.warm", args={})
+
+        data = msgpack.unpackb(packed)
+        assert(data["trace_id"] == trace.trace_id())
+        assert(data["trace_parent"] == span.span_id())
+
+        (_f, _args, keys) = unpack_arguments(args=packed)
+        assert(keys["trace_id"] == trace.trace_id())
+
+        result = handle_call(data=packed)
+
+    end_trace(trace)
+
+    assert(unpack_return_value(result) == {})
+
+    # the service trace is exported first, and joins the client trace
+    assert(len(collected) == 2)
+    service_trace = collected[0]
+    assert(service_trace.trace_id() == trace.trace_id())
+
+    service_root = service_trace.spans()[0]
+    assert(service_root.name() == "admin.warm")
+    assert(service_root.parent_id() == span.span_id())
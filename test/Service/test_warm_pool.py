@@ -0,0 +1,218 @@
+import os
+import pytest
+
+from Acquire.Service import get_service_account_bucket, \
+    push_is_running_service, pop_is_running_service, is_running_service
+from Acquire.Service import pack_arguments, unpack_return_value, \
+    WarmPool, ServiceError, call_warm_pool
+
+
+def _route(function_name, data):
+    return {"function": function_name, "pid": os.getpid()}
+
+
+@pytest.fixture
+def pool(tmpdir):
+    push_is_running_service()
+    get_service_account_bucket(str(tmpdir))
+
+    while is_running_service():
+        pop_is_running_service()
+
+    pool = WarmPool(size=2, routing_function=_route, max_calls=1,
+                    address="\0acquire_warm_pool_test_%d" % os.getpid())
+    pool.start()
+
+    yield pool
+
+    pool.stop()
+
+
+def test_no_warm_pool():
+    packed = pack_arguments(function="admin.warm", args={})
+    address = "\0acquire_warm_pool_missing_%d" % os.getpid()
+
+    assert(call_warm_pool(packed, address=address) is None)
+
+
+def test_warm_pool(pool):
+    assert(pool.num_idle() == 2)
+
+    # only one pool can listen on the socket
+    with pytest.raises(ServiceError):
+        WarmPool(address=pool.address()).start()
+
+    packed = pack_arguments(function="admin.warm", args={})
+    result = call_warm_pool(packed, address=pool.address(), timeout=30)
+    assert(unpack_return_value(result) == {})
+
+    pids = set()
+
+    for _ in range(0, 3):
+        packed = pack_arguments(function="warm_pool_echo", args={})
+        result = unpack_return_value(call_warm_pool(packed, address=pool.address(), timeout=30))
+
+        assert(result["function"] == "warm_pool_echo")
+        assert(result["pid"] != os.getpid())
+        pids.add(result["pid"])
+
+        # the supervisor replaces the workers that took the calls
+        for _ in range(0, 20):
+            pool.poll(timeout=0.5)
+
+            if pool.num_idle() == 2 and pool.num_workers() == 2:
+                break
+
+        assert(pool.num_idle() == 2)
+
+    # each worker handles a single call
+    assert(len(pids) == 3)
+
+
+def test_warm_pool_reuses_workers(tmpdir):
+    push_is_running_service()
+    get_service_account_bucket(str(tmpdir))
+
+    while is_running_service():
+        pop_is_running_service()
+
+    pool = WarmPool(size=1, routing_function=_route, max_calls=3,
+                    address="\0acquire_warm_pool_reuse_%d" % os.getpid())
+    pool.start()
+
+    try:
+        pids = []
+
+        for _ in range(0, 6):
+            packed = pack_arguments(function="warm_pool_echo", args={})
+            result = unpack_return_value(
+                call_warm_pool(packed, address=pool.address(), timeout=30))
+            pids.append(result["pid"])
+
+            # wait for the worker to be idle again, or be replaced
+            for _ in range(0, 20):
+                pool.poll(timeout=0.5)
+
+                if pool.num_idle() >= 1 and pool.num_idle() == pool.num_workers():
+                    break
+
+        # a worker handles up to 'max_calls' calls, keeping its caches
+        assert(len(set(pids)) < len(pids))
+
+        for pid in set(pids):
+            assert(pids.count(pid) <= 3)
+    finally:
+        pool.stop()
+
+
+@pytest.fixture
+def warm_pool_address(tmpdir, monkeypatch):
+    from Acquire.Service import _warm_pool
+
+    push_is_running_service()
+    get_service_account_bucket(str(tmpdir))
+
+    while is_running_service():
+        pop_is_running_service()
+
+    address = str(tmpdir.join("warm_pool.sock"))
+    monkeypatch.setenv("ACQUIRE_WARM_POOL_ADDRESS", address)
+    monkeypatch.setenv("ACQUIRE_WARM_POOL_TIMEOUT", "1")
+
+    # don't start a real pool when the call is handled here
+    monkeypatch.setattr(_warm_pool, "_started_pool", True)
+
+    return address
+
+
+def _count_local_calls(monkeypatch):
+    from Acquire.Service import _handlers
+
+    calls = []
+    route_function = _handlers._route_function
+
+    def _route(**kwargs):
+        calls.append(kwargs["function"])
+        return route_function(**kwargs)
+
+    monkeypatch.setattr(_handlers, "_route_function", _route)
+
+    return calls
+
+
+@pytest.mark.parametrize("send_fails", [False, True])
+def test_warm_pool_fallback(warm_pool_address, monkeypatch, send_fails):
+    """A call is handled in-process if it could not be handed to a
+       worker in the warm pool
+    """
+    import socket
+    from Acquire.Service import handle_call, _warm_pool
+
+    calls = _count_local_calls(monkeypatch)
+
+    if send_fails:
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(warm_pool_address)
+        listener.listen(1)
+
+        def _send_message(sock, data):
+            raise BrokenPipeError("the worker went away")
+
+        monkeypatch.setattr(_warm_pool, "_send_message", _send_message)
+
+    try:
+        packed = pack_arguments(function="admin.warm", args={})
+        result = handle_call(data=packed, use_warm_pool=True)
+
+        assert(unpack_return_value(result) == {})
+        assert(calls == ["admin.warm"])
+    finally:
+        if send_fails:
+            listener.close()
+
+
+@pytest.mark.parametrize("reply", [False, True])
+def test_warm_pool_worker_fails(warm_pool_address, monkeypatch, reply):
+    """A call that has been received by a warm pool worker is not
+       handled again in-process if the worker closes the connection
+       or does not reply within the timeout - an error is returned
+    """
+    import socket
+    import threading
+    import time
+    from Acquire.Service import handle_call
+
+    calls = _count_local_calls(monkeypatch)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(warm_pool_address)
+    listener.listen(1)
+
+    def broken_worker():
+        (conn, _addr) = listener.accept()
+        conn.recv(1024 * 1024)
+
+        if reply:
+            # take the call but never reply
+            time.sleep(3)
+
+        conn.close()
+
+    thread = threading.Thread(target=broken_worker)
+    thread.start()
+
+    try:
+        packed = pack_arguments(function="admin.warm", args={})
+
+        start = time.monotonic()
+        result = handle_call(data=packed, use_warm_pool=True)
+        elapsed = time.monotonic() - start
+
+        with pytest.raises(Exception):
+            unpack_return_value(result)
+
+        assert(calls == [])
+        assert(elapsed < 2.5)
+    finally:
+        thread.join()
+        listener.close()
@@ -53,3 +53,223 @@ def test_aclrules():
     assert(rule7.resolve(identifiers=identifiers1).is_owner())
     assert(rule7.resolve(identifiers=identifiers2).is_readable())
     assert(rule7.resolve(identifiers=identifiers3).is_denied())
+
+
+def test_compiled_aclrules():
+    from Acquire.Identity import ACLGroupRules, ACLRuleOperation, \
+        clear_acl_cache
+    import itertools
+
+    clear_acl_cache()
+
+    # the bitmask form round-trips every possible rule, and the
+    # bitmask operations match the ACLRule operations
+    values = [None, True, False]
+    rules = [ACLRule(is_owner=o, is_readable=r, is_writeable=w,
+                     is_executable=x)
+             for (o, r, w, x) in itertools.product(values, repeat=4)]
+
+    for rule in rules:
+        assert(ACLRule._from_mask(rule._to_mask()) == rule)
+
+    for op in [ACLRuleOperation.MAX, ACLRuleOperation.MIN,
+               ACLRuleOperation.SUB]:
+        for (rule1, rule2) in itertools.product(rules[0:81:7], rules):
+            expect = op.combine(rule1, rule2)
+            mask = op._combine_masks(rule1._to_mask(), rule2._to_mask())
+            assert(ACLRule._from_mask(mask) == expect)
+
+    user_guid = "12345@z0-z0"
+    group_guid = "group@z0-z0"
+
+    group_rule = ACLGroupRules().add(group_guid, ACLRule.writer())
+    rules = ACLRules(rule=group_rule, default_rule=ACLRule.denied())
+
+    identifiers = {"user_guid": user_guid, "group_guids": [group_guid]}
+
+    assert(rules.resolve(identifiers=identifiers).is_writeable())
+    assert(rules.resolve(identifiers={"user_guid": user_guid}).is_denied())
+
+    # the identifiers are not modified by resolution
+    assert(identifiers["group_guids"] == [group_guid])
+
+    # equal rules share cached results, and the returned rules are
+    # independent copies
+    acl = ACLRules.from_data(rules.to_data()).resolve(
+                                        identifiers=identifiers)
+    assert(acl == rules.resolve(identifiers=identifiers))
+    acl.set_owner()
+    assert(not rules.resolve(identifiers=identifiers).is_owner())
+
+    # changes to the rules are seen straight away
+    group_rule.add(group_guid, ACLRule.owner())
+    assert(rules.resolve(identifiers=identifiers).is_owner())
+
+    # inherited permissions come from upstream
+    acl = ACLRules().resolve(identifiers=identifiers,
+                             upstream=ACLRule.reader())
+    assert(acl == ACLRule.reader())
+
+    acl = ACLRules(default_rule=ACLRule(is_owner=True)).resolve(
+                        identifiers=identifiers, upstream=rules)
+    assert(acl == ACLRule.owner())
+
+
+def _reference_resolve(rule, identifiers, upstream, must_resolve=True,
+                       unresolved=False):
+    """Reference copy of the original resolver, which walks the rule
+       objects on every call rather than compiling them
+    """
+    from Acquire.Identity import ACLGroupRules, ACLRuleOperation
+
+    if isinstance(rule, ACLRule):
+        return rule.resolve(must_resolve=must_resolve,
+                            identifiers=identifiers, upstream=upstream,
+                            unresolved=unresolved)
+
+    if isinstance(rule, (ACLUserRules, ACLGroupRules)):
+        if isinstance(rule, ACLUserRules):
+            (key, rules) = ("user_guid", rule._user_rules)
+        else:
+            (key, rules) = ("group_guid", rule._group_rules)
+
+        guids = list(identifiers.get("%ss" % key, []))
+
+        if key in identifiers:
+            guids.append(identifiers[key])
+
+        resolved = None
+
+        for guid in guids:
+            if guid in rules:
+                if resolved is None:
+                    resolved = rules[guid]
+                else:
+                    resolved = resolved + rules[guid]
+
+        if resolved is None and must_resolve:
+            return ACLRule.inherit().resolve(
+                        must_resolve=True, identifiers=identifiers,
+                        upstream=upstream, unresolved=unresolved)
+
+        return resolved
+
+    if rule._is_simple_inherit:
+        return ACLRule.inherit().resolve(
+                    must_resolve=must_resolve, identifiers=identifiers,
+                    upstream=upstream, unresolved=unresolved)
+
+    result = None
+    must_break = False
+
+    for r in rule._rules:
+        if isinstance(r, tuple):
+            (op, r) = r
+        else:
+            op = rule._default_operation
+
+        r = _reference_resolve(r, identifiers, upstream, False, unresolved)
+
+        if r is not None:
+            if op is ACLRuleOperation.SET:
+                result = r
+                must_break = True
+                break
+            elif result is None:
+                result = r
+            else:
+                result = op.combine(result, r)
+
+    if (not must_break) and (rule._default_rule is not None):
+        r = _reference_resolve(rule._default_rule, identifiers, upstream,
+                               False, unresolved)
+
+        if result is None:
+            result = r
+        else:
+            result = rule._default_operation.combine(result, r)
+
+    if result is None:
+        return ACLRule.denied()
+
+    if not result.is_fully_resolved():
+        result = result.resolve(must_resolve=True, identifiers=identifiers,
+                                upstream=upstream, unresolved=unresolved)
+
+    return result
+
+
+def test_aclrules_match_reference():
+    from Acquire.Identity import ACLGroupRules, ACLRuleOperation, \
+        clear_acl_cache
+    import random
+
+    clear_acl_cache()
+
+    rng = random.Random(42)
+    values = [None, True, False]
+    users = ["user%d@z0-z0" % i for i in range(3)]
+    groups = ["group%d@z0-z0" % i for i in range(3)]
+    ops = [None, ACLRuleOperation.MAX, ACLRuleOperation.MIN,
+           ACLRuleOperation.SUB, ACLRuleOperation.SET]
+
+    def random_rule():
+        return ACLRule(is_owner=rng.choice(values),
+                       is_readable=rng.choice(values),
+                       is_writeable=rng.choice(values),
+                       is_executable=rng.choice(values))
+
+    def random_rules(depth=0):
+        rules = ACLRules(default_rule=rng.choice([None, random_rule()]),
+                         default_operation=rng.choice(ops[1:]))
+
+        for _i in range(rng.randint(0, 3)):
+            kind = rng.randint(0, 3)
+
+            if kind == 0:
+                rule = random_rule()
+            elif kind == 1:
+                rule = ACLUserRules()
+                for user in rng.sample(users, rng.randint(1, 2)):
+                    rule.add(user, random_rule())
+            elif kind == 2:
+                rule = ACLGroupRules()
+                for group in rng.sample(groups, rng.randint(1, 2)):
+                    rule.add(group, random_rule())
+            elif depth < 2:
+                rule = random_rules(depth + 1)
+            else:
+                rule = random_rule()
+
+            rules.append(rule, operation=rng.choice(ops))
+
+        return rules
+
+    for _i in range(500):
+        rules = random_rules()
+
+        for _j in range(4):
+            identifiers = {"user_guid": rng.choice(users),
+                           "group_guids": rng.sample(groups,
+                                                     rng.randint(0, 2))}
+            upstream = rng.choice([None, random_rule()])
+            must_resolve = rng.choice([True, False])
+            unresolved = rng.choice([True, False])
+
+            expect = _reference_resolve(rules, identifiers, upstream,
+                                        must_resolve, unresolved)
+
+            # resolve twice so that the cached result is checked too
+            for _k in range(2):
+                acl = rules.resolve(identifiers=identifiers,
+                                    upstream=upstream,
+                                    must_resolve=must_resolve,
+                                    unresolved=unresolved)
+                assert(acl == expect)
+
+        # changing a nested rule is seen by the next resolve
+        rules.set_default_rule(random_rule())
+        expect = _reference_resolve(rules, identifiers, upstream)
+        assert(rules.resolve(identifiers=identifiers,
+                             upstream=upstream) == expect)
+
@@ -21,3 +21,22 @@ def test_filehandle():
     assert(f1.local_filedata() == f2.local_filedata())
     assert(f1.fingerprint() == f2.fingerprint())
     assert(f1.drive_uid() == f2.drive_uid())
+
+
+def test_filehandle_par_checksum():
+    from Acquire.Access import set_default_checksum_algorithm, \
+        get_checksum_algorithm
+
+    set_default_checksum_algorithm("blake2b")
+
+    try:
+        local = FileHandle(filename=__file__)
+        assert(local.is_localdata())
+        assert(get_checksum_algorithm(local.checksum()) == "blake2b")
+
+        # files uploaded using an OSPar are always checksummed with MD5
+        par = FileHandle(filename=__file__, local_cutoff=0)
+        assert(not par.is_localdata())
+        assert(get_checksum_algorithm(par.checksum()) == "md5")
+    finally:
+        set_default_checksum_algorithm("md5")
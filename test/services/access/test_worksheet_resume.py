@@ -0,0 +1,121 @@
+
+import pytest
+
+from Acquire.Access import RunRequest, WorkSheet
+from Acquire.Identity import Authorisation
+from Acquire.Client import Account, deposit, Cheque, Service, \
+                           Drive, StorageCreds
+from Acquire.Compute import Cluster, JobScheduler
+from Acquire.Service import push_testing_objstore, pop_testing_objstore, \
+                            push_is_running_service, pop_is_running_service, \
+                            get_service_account_bucket
+
+
+@pytest.mark.parametrize("fail", ["before_submit", "after_submit",
+                                  "after_payment"])
+def test_worksheet_resume(fail, aaai_services,
+                          authenticated_user, monkeypatch, tmpdir):
+    cluster = Cluster.create(service_url="compute",
+                             user=aaai_services["compute"]["user"])
+
+    user = authenticated_user
+
+    deposit(user, 100.0, "Adding money to the account",
+            accounting_url="accounting")
+
+    account = Account(user=user, account_name="deposits",
+                      accounting_url="accounting")
+
+    creds = StorageCreds(user=user, service_url="storage")
+    drive = Drive(name="resume_input", creds=creds, autocreate=True)
+
+    filename = tmpdir.join("input.txt")
+    filename.write("Some input\n")
+    location = drive.upload(str(filename)).location()
+
+    r = RunRequest(image="docker://test_image:latest", input=location)
+
+    cheque = Cheque.write(account=account, recipient_url="access",
+                          resource=r.fingerprint(), max_spend=50.0)
+
+    args = {"request": r.to_data(),
+            "authorisation": Authorisation(
+                user=user, resource=r.fingerprint()).to_data(),
+            "cheque": cheque.to_data()}
+
+    # interrupt the submission, either before or after the compute
+    # service has received the job, or after the compute service
+    # has been paid but before the job was queued
+    worksheet_uids = []
+    step_submit = WorkSheet._step_submit
+
+    def _interrupted_submit(self, context):
+        worksheet_uids.append(self.uid())
+
+        if fail == "before_submit":
+            self._status = "submitting"
+            context["save"]()
+        else:
+            step_submit(self, context)
+
+        raise ConnectionError("Submission interrupted")
+
+    def _interrupted_submit_job(self, uid, request=None, user_guid=None):
+        raise ConnectionError("Submission interrupted")
+
+    monkeypatch.setattr(WorkSheet, "_step_submit", _interrupted_submit)
+
+    if fail == "after_payment":
+        # the compute service cashes the cheque, but fails to queue
+        # the job, so the resumed submission must not pay again
+        monkeypatch.setattr(Cluster, "submit_job", _interrupted_submit_job)
+
+    pending_uids = cluster.get_pending_job_uids()
+
+    result = Service("access").call_function("run_calculation", args)
+    assert("Submission interrupted" in result["Error"])
+
+    monkeypatch.undo()
+
+    assert(len(worksheet_uids) == 1)
+
+    # resume the worksheet, which reruns only the unpersisted steps
+    # that submission needs (e.g. finding the compute service)
+    push_testing_objstore(aaai_services["_services"]["access"])
+    push_is_running_service()
+
+    try:
+        worksheet = WorkSheet.load(worksheet_uids[0])
+        assert(worksheet.status() == "submitting")
+        assert("submit" not in worksheet._completed_steps)
+
+        worksheet.resume()
+        assert(worksheet.status() == "submitted")
+
+        worksheet = WorkSheet.load(worksheet_uids[0])
+        assert(worksheet.status() == "submitted")
+        assert("submit" in worksheet._completed_steps)
+    finally:
+        pop_is_running_service()
+        pop_testing_objstore()
+
+    # the job is only submitted once, even if the compute service
+    # received it before the interruption
+    new_uids = [uid for uid in cluster.get_pending_job_uids()
+                if uid not in pending_uids]
+
+    assert(len(new_uids) == 1)
+
+    # the job is queued for the user who signed the authorisation
+    push_testing_objstore(aaai_services["_services"]["compute"])
+    push_is_running_service()
+
+    try:
+        entries = JobScheduler.get_entries(get_service_account_bucket())
+    finally:
+        pop_is_running_service()
+        pop_testing_objstore()
+
+    entries = [entry for entry in entries if entry["uid"] == new_uids[0]]
+    assert(len(entries) == 1)
+    assert(entries[0]["user_guid"] == user.guid())
@@ -92,3 +92,87 @@ def test_login(username, password, aaai_services, tmpdir):
     auth.verify("test")
 
     user.logout()
+
+
+def test_login_long_poll(aaai_services):
+    import time
+
+    username = "longpoll"
+    password = "ABCdef12345"
+
+    result = User.register(username=username,
+                           password=password,
+                           identity_url="identity")
+
+    otp = OTP(result["otpsecret"])
+
+    user = User(username=username, identity_url="identity",
+                auto_logout=False)
+
+    result = user.request_login()
+    login_url = result["login_url"]
+
+    # the identity service should wait until the timeout as the
+    # login is still pending
+    start = time.monotonic()
+    assert(not user.wait_for_login(timeout=1))
+    assert(time.monotonic() - start >= 1)
+    assert(user.is_logging_in())
+
+    wallet = Wallet()
+
+    wallet.send_password(url=login_url, username=username,
+                         password=password, otpcode=otp.generate(),
+                         remember_password=False)
+
+    # the approved login should be returned without waiting
+    start = time.monotonic()
+    assert(user.wait_for_login(timeout=10))
+    assert(time.monotonic() - start < 5)
+    assert(user.is_logged_in())
+
+    user.logout()
+
+
+@pytest.mark.parametrize("long_poll", [True, False])
+def test_login_timeout(long_poll, aaai_services):
+    import time
+
+    username = "timeout%s" % long_poll
+    password = "ABCdef12345"
+
+    User.register(username=username, password=password,
+                  identity_url="identity")
+
+    user = User(username=username, identity_url="identity",
+                auto_logout=False)
+
+    user.request_login()
+
+    polls = []
+    poll_session_status = user._poll_session_status
+
+    def _poll_session_status(wait_seconds=0):
+        polls.append(wait_seconds)
+        return poll_session_status(wait_seconds=wait_seconds)
+
+    user._poll_session_status = _poll_session_status
+
+    # the login is never approved, so this should poll at t=0, t=2
+    # (sleeping only for the rest of 'polling_delta') and then at
+    # the deadline, returning as soon as 'timeout' has passed
+    timeout = 3
+    polling_delta = 2
+
+    start = time.monotonic()
+    assert(not user.wait_for_login(timeout=timeout,
+                                   polling_delta=polling_delta,
+                                   long_poll=long_poll))
+    elapsed = time.monotonic() - start
+
+    assert(elapsed >= timeout)
+    assert(elapsed < timeout + 0.5 * polling_delta)
+    assert(user.is_logging_in())
+
+    if not long_poll:
+        assert(len(polls) == 3)
@@ -0,0 +1,86 @@
+
+import asyncio
+import os
+
+import pytest
+
+from Acquire.Client import Drive, StorageCreds, create_account
+
+
+def test_async_drive(authenticated_user, tmpdir):
+    user = authenticated_user
+    creds = StorageCreds(user=user, service_url="storage")
+
+    drive = Drive(name="test_async_drive", creds=creds, autocreate=True)
+
+    filenames = []
+
+    for i in range(0, 5):
+        filename = os.path.join(str(tmpdir), "file_%d.txt" % i)
+
+        with open(filename, "w") as FILE:
+            FILE.write("This is file %d\n" % i)
+
+        filenames.append(filename)
+
+    accounts = [create_account(user, "async_%d" % i,
+                               description="async test account",
+                               accounting_url="accounting")
+                for i in range(0, 3)]
+
+    async def run():
+        uploaded = await asyncio.gather(
+            *[drive.async_upload(filename) for filename in filenames])
+
+        (files, versions, balances) = await asyncio.gather(
+            drive.async_list_files(),
+            uploaded[0].open().async_list_versions(),
+            asyncio.gather(*[account.async_balance() for account in accounts]))
+
+        downloaded = await asyncio.gather(
+            *[drive.async_download(os.path.basename(filename),
+                                   directory=str(tmpdir))
+              for filename in filenames])
+
+        return (uploaded, files, versions, balances, downloaded)
+
+    (uploaded, files, versions, balances,
+     downloaded) = asyncio.run(run())
+
+    assert(len(uploaded) == len(filenames))
+
+    for filemeta in uploaded:
+        assert(filemeta.is_complete())
+        assert(filemeta.uploaded_by() == user.guid())
+
+    assert(sorted([f.filename() for f in files]) ==
+           sorted([os.path.basename(f) for f in filenames]))
+
+    assert(len(versions) == 1)
+
+    for (account, balance) in zip(accounts, balances):
+        assert(balance == 0)
+        assert(balance == account.balance())
+
+    for (filename, download) in zip(filenames, downloaded):
+        assert(download != filename)
+
+        with open(filename) as FILE:
+            expected = FILE.read()
+
+        with open(download) as FILE:
+            assert(FILE.read() == expected)
+
+    # async and sync calls should give the same results
+    assert(len(drive.list_files()) == len(files))
+
+
+def test_async_drive_errors(authenticated_user):
+    creds = StorageCreds(user=authenticated_user, service_url="storage")
+    drive = Drive(name="test_async_drive", creds=creds, autocreate=True)
+
+    async def run():
+        return await drive.async_download("does_not_exist.txt")
+
+    with pytest.raises(Exception):
+        asyncio.run(run())
@@ -54,3 +54,121 @@ def test_chunking(authenticated_user, tempdir):
 
     assert(lines[0] == "This is some text\n")
     assert(lines[1] == "Here is some more!\n")
+
+
+@pytest.mark.parametrize("algorithm", ["blake2b", "blake2b-tree"])
+def test_checksum_algorithms(algorithm, authenticated_user, tempdir):
+    import os
+    from Acquire.Access import set_default_checksum_algorithm, \
+        get_checksum_algorithm
+
+    creds = StorageCreds(user=authenticated_user, service_url="storage")
+    drive = Drive(name="test_checksums", creds=creds, autocreate=True)
+
+    set_default_checksum_algorithm(algorithm)
+
+    try:
+        filemeta = drive.upload(__file__, uploaded_name=algorithm)
+        assert(get_checksum_algorithm(filemeta.checksum()) == algorithm)
+
+        filename = drive.download(algorithm, directory=tempdir)
+        assert(_same_file(filename, __file__))
+
+        # also upload using a PAR, which is validated by the service
+        # using the MD5 checksum calculated by the object store
+        name = "%s_par" % algorithm
+        filemeta = drive.upload(__file__, uploaded_name=name, force_par=True)
+        assert(get_checksum_algorithm(filemeta.checksum()) == "md5")
+        filename = drive.download(name, directory=tempdir, force_par=True)
+        assert(_same_file(filename, __file__))
+
+        uploader = drive.chunk_upload("%s_chunked" % algorithm)
+        uploader.upload("This is some text\n")
+        uploader.upload("Here is some more!\n")
+        uploader.close()
+
+        filename = drive.download("%s_chunked" % algorithm,
+                                  directory=tempdir)
+
+        lines = open(filename).readlines()
+        assert(lines == ["This is some text\n", "Here is some more!\n"])
+    finally:
+        set_default_checksum_algorithm("md5")
+
+
+def test_chunk_objstore_calls(authenticated_user, tempdir):
+    from Acquire.ObjectStore import enable_objstore_metrics, \
+        disable_objstore_metrics, get_container_objstore_metrics
+    from Acquire.Storage import clear_transfer_cache
+
+    creds = StorageCreds(user=authenticated_user, service_url="storage")
+    drive = Drive(name="test_chunk_calls", creds=creds, autocreate=True)
+
+    uploader = drive.chunk_upload("test_chunk_calls.txt")
+    uploader.upload("chunk 0\n")
+
+    metrics = get_container_objstore_metrics()
+    enable_objstore_metrics()
+
+    try:
+        metrics.clear()
+
+        for i in range(1, 5):
+            uploader.upload("chunk %d\n" % i)
+
+        # each chunk is a single write, and the uploader is cached
+        assert(metrics.count(family="storage/file") == 4)
+        assert(metrics.count("set_object", "storage/file") == 4)
+        assert(metrics.count(family="storage/uploader") == 0)
+
+        uploader.close()
+
+        downloader = drive.chunk_download("test_chunk_calls.txt",
+                                          directory=tempdir)
+        filename = downloader.local_filename()
+        assert(downloader.download_next_chunk())
+
+        metrics.clear()
+
+        for i in range(0, 2):
+            assert(downloader.download_next_chunk())
+
+        # the manifest is read once, then each chunk is a single read
+        assert(metrics.count(family="storage/file") == 2)
+        assert(metrics.count(family="storage/downloader") == 0)
+
+        # the state of the downloader is reloaded if it is not cached
+        clear_transfer_cache()
+        metrics.clear()
+
+        while downloader.download_next_chunk():
+            pass
+
+        assert(metrics.count("get_object", "storage/downloader") == 1)
+    finally:
+        disable_objstore_metrics()
+        metrics.clear()
+
+    lines = open(filename).readlines()
+
+    assert(lines == ["chunk %d\n" % i for i in range(0, 5)])
+
+
+def test_chunk_reupload(authenticated_user, tempdir):
+    creds = StorageCreds(user=authenticated_user, service_url="storage")
+    drive = Drive(name="test_chunk_reupload", creds=creds, autocreate=True)
+
+    uploader = drive.chunk_upload("test_chunk_reupload.txt")
+    uploader.upload("first 0, which is longer than the second\n")
+
+    # upload the first chunk again, with different data
+    uploader._chunk_idx = None
+    uploader.upload("second 0\n")
+    uploader.upload("chunk 1\n")
+    uploader.close()
+
+    filename = drive.download("test_chunk_reupload.txt", directory=tempdir)
+
+    lines = open(filename).readlines()
+
+    assert(lines == ["second 0\n", "chunk 1\n"])